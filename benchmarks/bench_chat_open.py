@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк открытия чата: холодный и теплый локальный кэш клиента
+
+Сервер (asyncio) с диалогом из N сообщений в messenger.db. Время от
+открытия чата до показа последней страницы (CHAT_PAGE_SIZE сообщений) в
+ChatView:
+  "холодный кэш" - кэш пуст: history_request к серверу, ответ ставится в
+                   кэш и показывается,
+  "теплый кэш"   - страница читается из локального кэша (MessageCache),
+                   сервер не нужен,
+  "база сервера" - прежний путь: чтение из messenger.db сервера (работает
+                   только на одной машине с сервером).
+С --load другой клиент во время замера отправляет сообщения с указанной
+частотой: прежний путь читает базу, в которую сервер в это время пишет.
+
+Пример:
+    python benchmarks/bench_chat_open.py --messages 100000 --repeat 50 --load 500
+"""
+
+import argparse
+import contextlib
+import datetime
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from PySide6.QtWidgets import QApplication
+
+from src.config import client_config
+from src.database.database import Database, conversation_key
+from src.database.message_cache import MessageCache
+from src.network.network_manager import NetworkManager
+from src.ui.chat_view import ChatView
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def fill_conversation(database, count):
+    """Диалог user1 <-> user2 из count сообщений"""
+    key = conversation_key("user1", "user2")
+    started = datetime.datetime(2024, 1, 1)
+
+    def rows():
+        for i in range(count):
+            timestamp = (started + datetime.timedelta(seconds=i)).strftime("%Y-%m-%d %H:%M:%S")
+            sender, receiver = ("user1", "user2") if i % 2 else ("user2", "user1")
+            yield sender, receiver, f"Сообщение {i}", key, timestamp
+
+    with database.connection() as conn:
+        conn.executemany(
+            "INSERT INTO messages (sender_id, receiver_id, message_text, conversation, timestamp) "
+            "VALUES (?, ?, ?, ?, ?)", rows())
+
+
+def summary(timings):
+    timings = sorted(timings)
+    return statistics.median(timings) * 1000, timings[int(len(timings) * 0.95)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Открытие чата из кэша клиента и с сервера")
+    parser.add_argument('--messages', type=int, default=100000, help="сообщений в диалоге")
+    parser.add_argument('--repeat', type=int, default=50, help="открытий на каждый способ")
+    parser.add_argument('--load', type=int, default=0, help="сообщений в секунду от другого клиента во время замера")
+    args = parser.parse_args()
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    page = client_config.CHAT_PAGE_SIZE
+    directory = tempfile.mkdtemp()
+    server_path = os.path.join(directory, "messenger.db")
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        database = Database(server_path)
+        fill_conversation(database, args.messages)
+        port = free_port()
+        server = NetworkManager(database)
+        server.start_server('127.0.0.1', port, mode='asyncio')
+
+        received = threading.Event()
+        responses = []
+
+        def on_message(message):
+            if message.get('type') == 'history_response':
+                responses.append(message)
+                received.set()
+
+        client = NetworkManager(Database(server_path))
+        client.message_callback = on_message
+        client.connect_to_server('127.0.0.1', port, "user1")
+        peer = NetworkManager(Database(server_path))
+        peer.connect_to_server('127.0.0.1', port, "user3")
+
+    stop_load = threading.Event()
+
+    def send_load():
+        interval = 1.0 / args.load
+        next_send = time.perf_counter()
+        while not stop_load.is_set():
+            peer.send_client_message({'type': 'message', 'sender_id': "user3", 'receiver_id': "user4",
+                                      'message_text': "нагрузка"})
+            next_send += interval
+            time.sleep(max(0.0, next_send - time.perf_counter()))
+
+    if args.load:
+        threading.Thread(target=send_load, daemon=True).start()
+
+    view = ChatView("user1", page_size=page)
+    view.resize(400, 600)
+    view.show()
+    app.processEvents()
+
+    def show(messages):
+        view.set_history(messages)
+        app.processEvents()
+
+    # Для каждого способа: получение страницы и полное время с показом
+    cold, warm, shared = ([], []), ([], []), ([], [])
+    for i in range(args.repeat):
+        cache = MessageCache("user1", os.path.join(directory, f"cache_{i}.db"))
+
+        # Холодный кэш: страница с сервера
+        received.clear()
+        responses.clear()
+        started = time.perf_counter()
+        client.request_history("user2", limit=page)
+        received.wait(10)
+        messages = responses[0]['messages']
+        cache.store(messages)
+        cold[0].append(time.perf_counter() - started)
+        show(messages)
+        cold[1].append(time.perf_counter() - started)
+        cache.flush()
+
+        # Теплый кэш: та же страница без сервера
+        view.clear()
+        started = time.perf_counter()
+        messages = cache.get_messages("user2", limit=page)
+        warm[0].append(time.perf_counter() - started)
+        show(messages)
+        warm[1].append(time.perf_counter() - started)
+        cache.close()
+
+        # Прежний путь: база сервера
+        view.clear()
+        started = time.perf_counter()
+        messages = client.database.get_messages("user1", "user2", limit=page)
+        shared[0].append(time.perf_counter() - started)
+        show(messages)
+        shared[1].append(time.perf_counter() - started)
+        view.clear()
+
+    stop_load.set()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        peer.stop_server()
+        client.stop_server()
+        server.stop_server()
+
+    load = f", нагрузка {args.load} сообщений/с" if args.load else ""
+    print("=" * 72)
+    print(f"Открытие чата: диалог {args.messages} сообщений, страница {page}, {args.repeat} открытий{load}")
+    print("=" * 72)
+    print(f"{'способ':<16} {'страница мс':>12} {'p95':>7} {'с показом мс':>13} {'p95':>7}")
+    for title, (fetch, total) in (("холодный кэш", cold), ("теплый кэш", warm), ("база сервера", shared)):
+        print(f"{title:<16} {summary(fetch)[0]:>12.2f} {summary(fetch)[1]:>7.2f} "
+              f"{summary(total)[0]:>13.2f} {summary(total)[1]:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк открытия длинного диалога
+
+Создает диалог из N сообщений (по умолчанию 100 000) и измеряет время до
+первой отрисовки и прирост резидентной памяти:
+  "QTextEdit" - прежняя схема: вся история вставляется HTML-блоками,
+  "ChatView"  - модель/представление с последней страницей истории,
+затем прокрутку ChatView к началу (подгрузка страниц) до заданной глубины.
+
+Пример:
+    python benchmarks/bench_chat_view.py --messages 100000 --legacy-messages 10000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from PySide6.QtCore import QEvent, QObject
+from PySide6.QtWidgets import QApplication, QTextEdit
+
+from src.database.database import Database, conversation_key
+from src.ui.chat_view import ChatView
+
+
+def rss_kb() -> int:
+    """Резидентная память процесса, КБ (только Linux)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+class FirstPaint(QObject):
+    """Фиксация момента первой отрисовки виджета"""
+
+    def __init__(self, widget):
+        super().__init__()
+        self.painted_at = None
+        widget.installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and self.painted_at is None:
+            self.painted_at = time.perf_counter()
+        return super().eventFilter(obj, event)
+
+
+def fill_conversation(database, count):
+    """Диалог user1 <-> user2 из count сообщений"""
+    key = conversation_key("user1", "user2")
+    with database.connection() as conn:
+        conn.executemany(
+            "INSERT INTO messages (sender_id, receiver_id, message_text, conversation) VALUES (?, ?, ?, ?)",
+            ((("user1", "user2") if i % 2 else ("user2", "user1")) +
+             (f"Сообщение {i}: " + "текст " * (i % 20), key) for i in range(count)))
+
+
+def show_and_wait(app, widget, started):
+    """Показ виджета и обработка событий до первой отрисовки"""
+    probe = FirstPaint(widget.viewport())
+    widget.resize(700, 600)
+    widget.show()
+    while probe.painted_at is None:
+        app.processEvents()
+    return probe.painted_at - started
+
+
+def open_legacy(app, database, limit):
+    """Прежняя схема: HTML каждого сообщения добавляется в QTextEdit"""
+    memory_before = rss_kb()
+    started = time.perf_counter()
+    view = QTextEdit()
+    view.setReadOnly(True)
+    for message in database.get_messages("user1", "user2", limit=limit):
+        align = "right" if message['sender_id'] == "user1" else "left"
+        view.append(f'<div style="text-align: {align}; margin: 5px 0;">'
+                    f'<div style="display: inline-block; max-width: 70%; padding: 8px 12px; '
+                    f'border-radius: 15px;">{message["message_text"]}</div></div>')
+    view.ensureCursorVisible()
+    first_paint = show_and_wait(app, view, started)
+    memory = rss_kb() - memory_before
+    view.close()
+    return first_paint, memory
+
+
+def open_chat_view(app, database, page_size, depth):
+    """ChatView: последняя страница, затем прокрутка вверх до depth сообщений"""
+    memory_before = rss_kb()
+    started = time.perf_counter()
+    view = ChatView("user1", lambda before_id, limit: database.get_messages(
+        "user1", "user2", limit=limit, before_id=before_id), page_size)
+    view.set_history(database.get_messages("user1", "user2", limit=page_size))
+    first_paint = show_and_wait(app, view, started)
+    memory = rss_kb() - memory_before
+
+    # Прокрутка к началу: каждая достигнутая вершина подгружает страницу
+    pages = []
+    scrollbar = view.verticalScrollBar()
+    while view.has_more and view.messages_model.rowCount() < depth:
+        page_started = time.perf_counter()
+        scrollbar.setValue(scrollbar.minimum())
+        app.processEvents()
+        pages.append(time.perf_counter() - page_started)
+    loaded = view.messages_model.rowCount()
+    memory_scrolled = rss_kb() - memory_before
+    view.close()
+    return first_paint, memory, pages, loaded, memory_scrolled
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Открытие длинного диалога")
+    parser.add_argument('--messages', type=int, default=100000, help="сообщений в диалоге")
+    parser.add_argument('--legacy-messages', type=int, default=10000,
+                        help="сообщений для QTextEdit (вся история слишком долго)")
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--depth', type=int, default=5000, help="сообщений, подгружаемых прокруткой вверх")
+    args = parser.parse_args()
+
+    database = Database(os.path.join(tempfile.mkdtemp(), "bench_chat_view.db"))
+    fill_conversation(database, args.messages)
+    app = QApplication(sys.argv)
+    # Прогрев: первая отрисовка загружает шрифты и платформенный плагин
+    open_legacy(app, database, 10)
+    open_chat_view(app, database, args.page_size, 0)
+
+    print("=" * 70)
+    print(f"Диалог из {args.messages} сообщений")
+    print("=" * 70)
+
+    first_paint, memory, pages, loaded, memory_scrolled = open_chat_view(app, database, args.page_size, args.depth)
+    print(f"ChatView:  первая отрисовка {first_paint * 1000:8.1f} мс, память +{memory / 1024:.1f} МБ")
+    if pages:
+        pages.sort()
+        print(f"           подгрузка страницы p50 {pages[len(pages) // 2] * 1000:.1f} мс, "
+              f"max {pages[-1] * 1000:.1f} мс; загружено {loaded} сообщений, "
+              f"память +{memory_scrolled / 1024:.1f} МБ")
+
+    first_paint, memory = open_legacy(app, database, args.legacy_messages)
+    print(f"QTextEdit: первая отрисовка {first_paint * 1000:8.1f} мс, память +{memory / 1024:.1f} МБ "
+          f"({args.legacy_messages} последних сообщений)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк доставки пачки сообщений в поток интерфейса клиента
+
+Собеседник отправляет N сообщений подряд, сервер пересылает их клиенту.
+Сравниваются два способа передачи кадров из сетевого потока в Qt:
+  "по одному" - отдельный queued-сигнал и отдельная вставка в QTextEdit на кадр,
+  "пачками"   - ClientTransport + MessageBus, одна вставка на накопленную пачку.
+Выводит число вызовов обработчика, перерисовок области чата, время потока
+интерфейса в обработчиках и время до отображения последнего сообщения.
+
+Пример:
+    python benchmarks/bench_client_burst.py --messages 500
+"""
+
+import argparse
+import os
+import socket
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from PySide6.QtCore import QEvent, QObject, Qt, Signal, Slot
+from PySide6.QtWidgets import QApplication, QTextEdit
+
+from src.database.database import Database
+from src.network.client_transport import ClientTransport
+from src.network.network_manager import NetworkManager
+from src.network.protocol import encode_message
+from src.ui.message_bus import MessageBus
+
+
+class ChatArea(QTextEdit):
+    """Область чата: HTML-вставка как в ChatWidget и подсчет перерисовок"""
+
+    def __init__(self):
+        super().__init__()
+        self.setReadOnly(True)
+        self.paints = 0
+        self.calls = 0
+        self.shown = 0
+        self.busy = 0.0
+        self.viewport().installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint:
+            self.paints += 1
+        return super().eventFilter(obj, event)
+
+    def append_messages(self, messages):
+        started = time.perf_counter()
+        self.calls += 1
+        self.setUpdatesEnabled(False)
+        for message in messages:
+            self.append(f'<div style="text-align: left; margin: 5px 0;">{message["message_text"]}</div>')
+        self.setUpdatesEnabled(True)
+        self.ensureCursorVisible()
+        self.shown += len(messages)
+        self.busy += time.perf_counter() - started
+
+
+class PerMessageBridge(QObject):
+    """Прежняя схема: отдельный queued-сигнал на каждый кадр"""
+
+    received = Signal(dict)
+
+    def __init__(self, view):
+        super().__init__()
+        self.view = view
+        self.received.connect(self.deliver, Qt.QueuedConnection)
+
+    def publish(self, message):
+        self.received.emit(message)
+
+    @Slot(dict)
+    def deliver(self, message):
+        self.view.append_messages([message])
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def run_mode(app, port, database, count, batched, stall):
+    """Отправка пачки собеседником и ожидание ее отображения у клиента
+
+    stall - время, на которое поток интерфейса занят после отправки
+    (пачка успевает прийти целиком до обработки событий).
+    """
+    view = ChatArea()
+    view.resize(600, 400)
+    view.show()
+
+    client = NetworkManager(database)
+    if batched:
+        transport = ClientTransport(client)
+        bus = MessageBus("user1")
+        bus.attach(transport)
+        bus.subscribe_conversation("user2", view.append_messages)
+    else:
+        bridge = PerMessageBridge(view)
+        client.message_callback = bridge.publish
+    assert client.connect_to_server('127.0.0.1', port, "user1")
+
+    peer = NetworkManager(database)
+    assert peer.connect_to_server('127.0.0.1', port, "user2")
+    app.processEvents()
+    view.paints = 0
+
+    frames = b''.join(encode_message({'type': 'message', 'sender_id': "user2", 'receiver_id': "user1",
+                                      'message_text': f"Сообщение пачки {i}"}, peer.protocol_version)
+                      for i in range(count))
+    started = time.perf_counter()
+    peer.socket.sendall(frames)
+    time.sleep(stall)
+
+    deadline = time.time() + 60
+    while view.shown < count and time.time() < deadline:
+        app.processEvents()
+    elapsed = time.perf_counter() - started
+    # Отрисовка после последней вставки
+    app.processEvents()
+
+    peer.stop_server()
+    client.stop_server()
+    view.close()
+    return {'calls': view.calls, 'paints': view.paints, 'busy': view.busy,
+            'elapsed': elapsed, 'shown': view.shown}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Доставка пачки сообщений в поток интерфейса")
+    parser.add_argument('--messages', type=int, default=500, help="сообщений в пачке")
+    parser.add_argument('--rounds', type=int, default=5, help="повторов каждого режима")
+    parser.add_argument('--stall', type=float, default=0.5, help="занятость потока интерфейса во втором сценарии, с")
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    database = Database(os.path.join(tempfile.mkdtemp(), "bench_client_burst.db"))
+    port = free_port()
+    server = NetworkManager(database)
+
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        assert server.start_server('127.0.0.1', port, mode='asyncio')
+        results = {}
+        for stall in (0.0, args.stall):
+            for name, batched in [("по одному", False), ("пачками", True)]:
+                runs = [run_mode(app, port, database, args.messages, batched, stall) for _ in range(args.rounds)]
+                results[(stall, name)] = {key: sum(run[key] for run in runs) / len(runs) for key in runs[0]}
+    finally:
+        sys.stdout = stdout
+        server.stop_server()
+
+    print("=" * 78)
+    print(f"Пачка из {args.messages} сообщений, среднее по {args.rounds} повторам")
+    print("=" * 78)
+    print(f"{'Занят, с':<9} {'Режим':<10} {'вызовов':>8} {'перерисовок':>12} {'поток UI, мс':>13} "
+          f"{'до последнего, мс':>18}")
+    for (stall, name), result in results.items():
+        print(f"{stall:<9.1f} {name:<10} {result['calls']:>8.1f} {result['paints']:>12.1f} "
+              f"{result['busy'] * 1000:>13.1f} {result['elapsed'] * 1000:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
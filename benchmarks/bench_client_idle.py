@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк простаивающего клиента: пробуждения потока интерфейса
+
+Запускает сервер в отдельном процессе, открывает MainWindow (offscreen) с
+открытым чатом и в течение заданного времени ничего не делает. Выводит
+число срабатываний таймеров Qt, переключений контекста потока интерфейса,
+запросов к SQLite и процессорное время в секунду.
+
+Режим "опрос" воспроизводит прежний ChatWidget с QTimer на
+CHAT_UPDATE_INTERVAL, режим "шина" - доставку через MessageBus.
+
+Пример:
+    python benchmarks/bench_client_idle.py --duration 20
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PySide6.QtCore import QEvent, QObject, QTimer
+from PySide6.QtWidgets import QApplication
+
+from bench_server_load import run_server
+
+
+class TimerEventCounter(QObject):
+    """Фильтр событий приложения, считающий срабатывания таймеров"""
+
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Timer:
+            self.count += 1
+        return False
+
+
+def context_switches() -> int:
+    """Добровольные переключения контекста главного потока (только Linux)"""
+    try:
+        with open("/proc/thread-self/status") as f:
+            for line in f:
+                if line.startswith("voluntary_ctxt_switches"):
+                    return int(line.split(':')[1])
+    except OSError:
+        pass
+    return 0
+
+
+def measure(app, window, duration, polling):
+    """Замер одного режима простоя"""
+    poll_timer = None
+    if polling:
+        # Прежнее поведение: таймер в каждом открытом ChatWidget
+        from src.config import client_config
+        poll_timer = QTimer()
+        poll_timer.timeout.connect(window.current_chat.check_for_new_messages)
+        poll_timer.start(client_config.CHAT_UPDATE_INTERVAL)
+
+    queries = [0]
+    database = window.database
+    originals = {name: getattr(database, name) for name in ('get_messages', 'get_messages_since')}
+
+    def counted(method):
+        def wrapper(*args, **kwargs):
+            queries[0] += 1
+            return method(*args, **kwargs)
+        return wrapper
+
+    for name, method in originals.items():
+        setattr(database, name, counted(method))
+
+    counter = TimerEventCounter()
+    app.installEventFilter(counter)
+    switches_before = context_switches()
+    cpu_before = time.process_time()
+
+    QTimer.singleShot(int(duration * 1000), app.quit)
+    app.exec()
+
+    cpu = time.process_time() - cpu_before
+    switches = context_switches() - switches_before
+    app.removeEventFilter(counter)
+    for name, method in originals.items():
+        setattr(database, name, method)
+    if poll_timer:
+        poll_timer.stop()
+
+    # Таймер singleShot, завершающий замер, не считаем
+    return {
+        'timers': (counter.count - 1) / duration,
+        'switches': switches / duration,
+        'queries': queries[0] / duration,
+        'cpu_ms': cpu * 1000 / duration,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пробуждения простаивающего клиента")
+    parser.add_argument('--duration', type=float, default=10.0, help="длительность замера каждого режима, с")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=47996)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), "bench_client_idle.db")
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=run_server,
+                                     args=(args.host, args.port, 'asyncio', db_path, ready))
+    server.daemon = True
+    server.start()
+    ready.wait(timeout=30)
+
+    from src.config import client_config, server_config
+    client_config.SERVER_HOST = args.host
+    client_config.SERVER_PORT = args.port
+    server_config.DATABASE_PATH = db_path
+
+    app = QApplication(sys.argv)
+    # Вывод клиента при простое не нужен
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        from src.ui.main_window import MainWindow
+        window = MainWindow("user1")
+        window.open_chat.emit("user2")
+        app.processEvents()
+
+        results = {}
+        for name, polling in [("опрос", True), ("шина", False)]:
+            results[name] = measure(app, window, args.duration, polling)
+        window.close()
+    finally:
+        sys.stdout = stdout
+        server.terminate()
+        server.join()
+
+    print("=" * 70)
+    print(f"Простой клиента {args.duration:.0f} с, открыт один чат")
+    print("=" * 70)
+    print(f"{'Режим':<8} {'таймеры/с':>10} {'переключения/с':>15} {'запросы БД/с':>13} {'CPU мс/с':>9}")
+    for name, result in results.items():
+        print(f"{name:<8} {result['timers']:>10.2f} {result['switches']:>15.2f} "
+              f"{result['queries']:>13.2f} {result['cpu_ms']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
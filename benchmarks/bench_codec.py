@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк кодеков голосового звонка без сети и звуковых устройств
+
+WAV-файл (моно, 16 бит, частота AUDIO_SAMPLE_RATE) проходит тот же путь,
+что и в AudioManager: кадры устройства по AUDIO_CHUNK_SIZE отсчетов ->
+понижение частоты -> кодирование -> декодирование -> повышение частоты.
+Сравниваются:
+  "PCM 44.1 кГц" - прежний путь без сжатия,
+  "PCM 16 кГц"   - только передискретизация (ее вклад в искажения и время),
+  "µ-law 16 кГц" - G.711 µ-law после понижения частоты,
+  "Opus"         - если установлены opuslib и libopus.
+Выводит поток в сети (данные, заголовок пакета 12 байт, UDP и IPv4 - 28
+байт), процессорное время кодирования и декодирования кадра (вместе с
+передискретизацией) и отношение сигнал/шум восстановленного звука к
+исходному, задержанному на задержку фильтров: во всей полосе и в полосе,
+которую путь пропускает без ослабления (до 6 кГц при 16 кГц). Для Opus
+отношение сигнал/шум по форме волны занижает качество: кодек сохраняет
+звучание, а не форму.
+
+Без --wav используется синтетическая запись, похожая на речь (гармоники
+основного тона с формантами, слоги, паузы и шумовые согласные);
+--save-fixture сохраняет ее в WAV.
+
+Пример:
+    python benchmarks/bench_codec.py --duration 10
+    python benchmarks/bench_codec.py --wav call1.wav call2.wav
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from src.audio.codec import Codec, Resampler, available_codecs, create_codec
+from src.audio.jitter_buffer import MEDIA_HEADER
+from src.config import client_config as config
+
+UDP_IP_HEADERS = 28
+# Полоса без ослабления фильтром передискретизации, доля частоты Найквиста кодека
+FLAT_BAND = 0.75
+
+
+def speech_like(duration: float, rate: int, seed: int = 1) -> np.ndarray:
+    """Синтетическая «речь»: основной тон 100-220 Гц с формантами, слоги по ~200 мс, паузы"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * rate)) / rate
+    f0 = 150 + 50 * np.sin(2 * np.pi * 0.7 * t) + 20 * np.sin(2 * np.pi * 3.1 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / rate
+    formants = [(700, 130), (1200, 200), (2600, 300)]
+    voiced = np.zeros_like(t)
+    for harmonic in range(1, 30):
+        frequency = harmonic * f0
+        envelope = sum(np.exp(-((frequency - center) / width) ** 2) for center, width in formants)
+        voiced += (envelope + 0.02) / harmonic ** 0.5 * np.sin(harmonic * phase)
+    # Шумовые согласные: шум с максимумом спектра около 5 кГц
+    spectrum = np.fft.rfft(rng.standard_normal(len(t)))
+    frequencies = np.fft.rfftfreq(len(t), 1 / rate)
+    noise = np.fft.irfft(spectrum * np.exp(-((frequencies - 5000) / 2500) ** 2), len(t))
+    noise *= 0.5 / np.std(noise)
+    syllables = np.clip(np.sin(2 * np.pi * 2.5 * t) + rng.uniform(-0.3, 0.3), 0, None) ** 0.5
+    pauses = (np.sin(2 * np.pi * 0.23 * t) > -0.6).astype(float)
+    fricative = (np.sin(2 * np.pi * 2.5 * t + 2.0) > 0.85).astype(float)
+    signal = (voiced * syllables + noise * fricative) * pauses
+    return (signal / np.max(np.abs(signal)) * 12000).astype(np.int16)
+
+
+def write_wav(path: str, samples: np.ndarray, rate: int):
+    with wave.open(path, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(samples.tobytes())
+
+
+def read_wav(path: str) -> np.ndarray:
+    with wave.open(path, 'rb') as wf:
+        if wf.getnchannels() != 1 or wf.getsampwidth() != 2 or wf.getframerate() != config.AUDIO_SAMPLE_RATE:
+            raise ValueError(f"{path}: нужен WAV моно, 16 бит, {config.AUDIO_SAMPLE_RATE} Гц")
+        return np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+
+
+def snr(original: np.ndarray, decoded: np.ndarray, delay: float, band: float = 0.5) -> float:
+    """Отношение сигнал/шум (дБ) к исходному сигналу, задержанному на delay отсчетов (дробное)
+
+    Считается по спектрам всей записи на частотах ниже band (доля частоты дискретизации).
+    """
+    # Дополнение нулями: сдвиг по фазе не переносит конец записи в начало
+    size = len(original) + int(delay) + 1024
+    frequencies = np.fft.rfftfreq(size)
+    shifted = np.fft.rfft(original.astype(np.float64), size) * np.exp(-2j * np.pi * frequencies * delay)
+    # Конец исходной записи, сдвинутый за конец восстановленной, не сравнивается
+    reference = np.fft.rfft(np.fft.irfft(shifted, size)[:len(decoded)], size)
+    error = np.fft.rfft(decoded.astype(np.float64), size) - reference
+    selected = frequencies <= band
+    noise = np.sum(np.abs(error[selected]) ** 2)
+    signal = np.sum(np.abs(reference[selected]) ** 2)
+    return float('inf') if noise <= signal * 1e-20 else 10 * np.log10(signal / noise)
+
+
+def run(codec: Codec, samples: np.ndarray):
+    """Путь AudioManager для всей записи: байт данных на кадр, мкс кодирования и декодирования,
+    SNR во всей полосе и в полосе кодека"""
+    rate, chunk = config.AUDIO_SAMPLE_RATE, config.AUDIO_CHUNK_SIZE
+    downsampler = Resampler(rate, codec.sample_rate, chunk)
+    upsampler = Resampler(codec.sample_rate, rate, codec.frame_samples)
+    frames = [samples[i:i + chunk].tobytes() for i in range(0, len(samples) - chunk + 1, chunk)]
+
+    started = time.thread_time()
+    payloads = [codec.encode(downsampler.process(frame)) for frame in frames]
+    encoded = time.thread_time()
+    decoded = [upsampler.process(codec.decode(payload)) for payload in payloads]
+    finished = time.thread_time()
+
+    output = np.frombuffer(b''.join(decoded), dtype=np.int16)
+    delay = (downsampler.delay + upsampler.delay) * rate
+    band = FLAT_BAND * min(rate, codec.sample_rate) / 2 / rate
+    return (sum(map(len, payloads)) / len(payloads), (encoded - started) / len(frames) * 1e6,
+            (finished - encoded) / len(frames) * 1e6, snr(samples[:len(output)], output, delay),
+            snr(samples[:len(output)], output, delay, band))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Кодеки голосового звонка")
+    parser.add_argument('--wav', nargs='*', help="WAV-файлы (моно, 16 бит, AUDIO_SAMPLE_RATE)")
+    parser.add_argument('--duration', type=float, default=10.0, help="длительность синтетической записи, с")
+    parser.add_argument('--save-fixture', help="сохранить синтетическую запись в WAV")
+    args = parser.parse_args()
+
+    rate, chunk = config.AUDIO_SAMPLE_RATE, config.AUDIO_CHUNK_SIZE
+    paths = args.wav
+    if not paths:
+        path = args.save_fixture or os.path.join(tempfile.mkdtemp(), "speech_like.wav")
+        write_wav(path, speech_like(args.duration, rate), rate)
+        paths = [path]
+
+    frames_per_second = rate / chunk
+    codecs = [("PCM 44.1 кГц", create_codec('pcm', rate, chunk)),
+              ("PCM 16 кГц", Codec(config.AUDIO_CODEC_SAMPLE_RATE, chunk * config.AUDIO_CODEC_SAMPLE_RATE // rate))]
+    for name in available_codecs():
+        if name != 'pcm':
+            codec = create_codec(name, rate, chunk)
+            codecs.append((f"{name} {codec.sample_rate / 1000:g} кГц", codec))
+    if 'opus' not in available_codecs():
+        print("opuslib/libopus не установлены - Opus пропущен")
+
+    print("=" * 78)
+    print(f"Кадр {chunk / rate * 1000:.0f} мс ({chunk} отсчетов, {rate} Гц), {frames_per_second:.0f} пакетов/с")
+    print("=" * 78)
+    for path in paths:
+        samples = read_wav(path)
+        print(f"{os.path.basename(path)}: {len(samples) / rate:.1f} с")
+        print(f"  {'кодек':<16} {'байт/кадр':>9} {'кбит/с в сети':>13} {'кодир. мкс':>10} "
+              f"{'декод. мкс':>10} {'SNR дБ':>7} {'в полосе':>8}")
+        for title, codec in codecs:
+            payload, encode, decode, quality, in_band = run(codec, samples)
+            wire = (payload + MEDIA_HEADER.size + UDP_IP_HEADERS) * 8 * frames_per_second / 1000
+            print(f"  {title:<16} {payload:>9.0f} {wire:>13.1f} {encode:>10.1f} {decode:>10.1f} {quality:>7.1f} {in_band:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк списка контактов
+
+Для N контактов (по умолчанию 10 000) измеряет:
+  - построение списка до первой отрисовки и прирост резидентной памяти,
+  - 1000 изменений онлайн-статуса, пришедших пачками presence_delta по
+    --batch изменений (каждая пачка применяется и перерисовывается),
+  - повторную загрузку того же списка (load_contacts после добавления
+    контакта или таймера резервного режима) с одним новым контактом.
+Сравниваются:
+  "QListWidget"      - прежняя схема: виджет с кнопками и стилями на каждую
+                       строку, поиск контакта перебором строк, повторная
+                       загрузка пересоздает все виджеты,
+  "ContactListView"  - модель с индексом по contact_id и делегатом.
+
+Пример:
+    python benchmarks/bench_contact_list.py --contacts 10000 --changes 1000 --batch 1
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from PySide6.QtCore import QEvent, QObject
+from PySide6.QtWidgets import (QApplication, QHBoxLayout, QLabel, QListWidget, QListWidgetItem,
+                               QPushButton, QVBoxLayout, QWidget)
+
+from src.ui.contact_list import ContactListView
+
+
+def rss_kb() -> int:
+    """Резидентная память процесса, КБ (только Linux)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+class FirstPaint(QObject):
+    """Фиксация момента первой отрисовки виджета"""
+
+    def __init__(self, widget):
+        super().__init__()
+        self.painted_at = None
+        widget.installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and self.painted_at is None:
+            self.painted_at = time.perf_counter()
+        return super().eventFilter(obj, event)
+
+
+def show_and_wait(app, widget, started):
+    """Показ виджета и обработка событий до первой отрисовки"""
+    probe = FirstPaint(widget.viewport())
+    widget.resize(350, 700)
+    widget.show()
+    while probe.painted_at is None:
+        app.processEvents()
+    return probe.painted_at - started
+
+
+ONLINE_DOT = "QLabel { border-radius: 6px; background-color: #27ae60; }"
+OFFLINE_DOT = "QLabel { border-radius: 6px; background-color: #95a5a6; }"
+BUTTON_STYLE = """
+    QPushButton { background-color: %s; color: white; border: none; border-radius: 15px; font-size: 14px; }
+    QPushButton:hover { background-color: %s; }
+"""
+
+
+class LegacyContactItem(QWidget):
+    """Строка прежнего списка: метки, счетчик и две кнопки со стилями"""
+
+    def __init__(self, contact_data: dict):
+        super().__init__()
+        self.contact_data = contact_data
+        self.new_message_count = 0
+        layout = QHBoxLayout()
+        layout.setContentsMargins(10, 5, 10, 5)
+        self.status_indicator = QLabel()
+        self.status_indicator.setFixedSize(12, 12)
+        info = QVBoxLayout()
+        self.name_label = QLabel(contact_data['display_name'])
+        self.status_label = QLabel()
+        info.addWidget(self.name_label)
+        info.addWidget(self.status_label)
+        self.new_message_indicator = QLabel()
+        self.new_message_indicator.setFixedSize(20, 20)
+        self.new_message_indicator.setStyleSheet(
+            "QLabel { border-radius: 10px; background-color: #e74c3c; color: white; font-size: 10px; }")
+        self.new_message_indicator.hide()
+        self.call_button = QPushButton("📞")
+        self.call_button.setFixedSize(30, 30)
+        self.call_button.setStyleSheet(BUTTON_STYLE % ("#27ae60", "#229954"))
+        self.chat_button = QPushButton("💬")
+        self.chat_button.setFixedSize(30, 30)
+        self.chat_button.setStyleSheet(BUTTON_STYLE % ("#3498db", "#2980b9"))
+        layout.addWidget(self.status_indicator)
+        layout.addLayout(info)
+        layout.addStretch()
+        layout.addWidget(self.new_message_indicator)
+        layout.addWidget(self.call_button)
+        layout.addWidget(self.chat_button)
+        self.setLayout(layout)
+        self.update_status()
+
+    def update_status(self):
+        online = self.contact_data['is_online']
+        self.status_indicator.setStyleSheet(ONLINE_DOT if online else OFFLINE_DOT)
+        self.status_label.setText("Онлайн" if online else "Офлайн")
+        self.status_label.setStyleSheet("color: #27ae60; font-weight: bold;" if online else "color: #7f8c8d;")
+
+
+def legacy_load(view, contacts):
+    """Прежний load_contacts: очистка и новый виджет на каждый контакт"""
+    view.clear()
+    for contact in contacts:
+        widget = LegacyContactItem(dict(contact))
+        item = QListWidgetItem()
+        item.setSizeHint(widget.sizeHint())
+        view.addItem(item)
+        view.setItemWidget(item, widget)
+
+
+def legacy_apply(view, changes):
+    """Прежний apply_contact_statuses(partial=True): перебор всех строк"""
+    for i in range(view.count()):
+        widget = view.itemWidget(view.item(i))
+        contact_id = widget.contact_data['contact_id']
+        if contact_id in changes and widget.contact_data['is_online'] != changes[contact_id]:
+            widget.contact_data['is_online'] = changes[contact_id]
+            widget.update_status()
+
+
+def make_contacts(count):
+    return [{'contact_id': f"user{i:05d}", 'display_name': f"Пользователь {i:05d}", 'is_online': i % 3 == 0}
+            for i in range(count)]
+
+
+def make_batches(contacts, changes, batch, seed=1):
+    rng = random.Random(seed)
+    online = {contact['contact_id']: contact['is_online'] for contact in contacts}
+    batches = []
+    for start in range(0, changes, batch):
+        deltas = {}
+        for _ in range(min(batch, changes - start)):
+            contact_id = rng.choice(contacts)['contact_id']
+            online[contact_id] = not online[contact_id]
+            deltas[contact_id] = online[contact_id]
+        batches.append(deltas)
+    return batches
+
+
+def run(app, name, contacts, batches, reloaded):
+    memory_before = rss_kb()
+    started = time.perf_counter()
+    if name == "QListWidget":
+        view = QListWidget()
+        legacy_load(view, contacts)
+        load = lambda contacts: legacy_load(view, contacts)
+        apply = lambda changes: legacy_apply(view, changes)
+    else:
+        view = ContactListView()
+        view.contacts_model.set_contacts(contacts)
+        load = view.contacts_model.set_contacts
+        apply = lambda changes: view.contacts_model.apply_statuses(changes, partial=True)
+    first_paint = show_and_wait(app, view, started)
+    memory = rss_kb() - memory_before
+
+    timings = []
+    for changes in batches:
+        batch_started = time.perf_counter()
+        apply(changes)
+        app.processEvents()
+        timings.append(time.perf_counter() - batch_started)
+
+    reload_started = time.perf_counter()
+    load(reloaded)
+    app.processEvents()
+    reload_time = time.perf_counter() - reload_started
+    view.close()
+    view.deleteLater()
+    app.processEvents()
+    return first_paint, memory, timings, reload_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Построение и обновление списка контактов")
+    parser.add_argument('--contacts', type=int, default=10000, help="контактов в списке")
+    parser.add_argument('--changes', type=int, default=1000, help="изменений онлайн-статуса")
+    parser.add_argument('--batch', type=int, default=1, help="изменений в одной пачке presence_delta")
+    parser.add_argument('--skip-legacy', action='store_true', help="не измерять прежнюю схему")
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    contacts = make_contacts(args.contacts)
+    batches = make_batches(contacts, args.changes, args.batch)
+    reloaded = contacts + [{'contact_id': "user99999", 'display_name': "Пользователь 99999", 'is_online': True}]
+    # Прогрев: первая отрисовка загружает шрифты и платформенный плагин
+    for name in ("ContactListView", "QListWidget"):
+        run(app, name, contacts[:10], batches[:1], contacts[:11])
+
+    print("=" * 96)
+    print(f"Список из {args.contacts} контактов, {args.changes} изменений статуса пачками по {args.batch}")
+    print("=" * 96)
+    print(f"{'схема':<16} {'построение мс':>13} {'память МБ':>9} {'изменения всего мс':>18} "
+          f"{'пачка p50 мс':>12} {'p99 мс':>7} {'перезагрузка мс':>15}")
+    for name in ("ContactListView",) + (() if args.skip_legacy else ("QListWidget",)):
+        first_paint, memory, timings, reload_time = run(app, name, contacts, batches, reloaded)
+        total = sum(timings)
+        timings.sort()
+        print(f"{name:<16} {first_paint * 1000:>13.1f} {memory / 1024:>9.1f} {total * 1000:>18.1f} "
+              f"{timings[len(timings) // 2] * 1000:>12.3f} {timings[int(len(timings) * 0.99)] * 1000:>7.3f} "
+              f"{reload_time * 1000:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Микробенчмарк Database: add_message / get_messages в операциях в секунду
+
+Сравнивает прежний способ работы (новое соединение sqlite3.connect на каждый
+вызов, журнал по умолчанию) с пулом постоянных соединений в режиме WAL.
+
+Пример:
+    python benchmarks/bench_database.py --messages 2000 --reads 2000
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from src.database.database import Database
+
+
+class PerCallConnectionDatabase(Database):
+    """Database с прежним поведением: новое соединение на каждый вызов"""
+
+    @contextmanager
+    def connection(self):
+        with sqlite3.connect(self.db_path) as conn:
+            yield conn
+
+
+def measure(database, messages, reads):
+    started = time.perf_counter()
+    for i in range(messages):
+        database.add_message("user1", "user2", f"Сообщение {i}")
+    write_rate = messages / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for _ in range(reads):
+        database.get_messages("user1", "user2", limit=50)
+    read_rate = reads / (time.perf_counter() - started)
+    return write_rate, read_rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарк Database")
+    parser.add_argument('--messages', type=int, default=2000, help="число вызовов add_message")
+    parser.add_argument('--reads', type=int, default=2000, help="число вызовов get_messages")
+    parser.add_argument('--synchronous', default=None, help="уровень PRAGMA synchronous для пула")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    results = {}
+    for name, factory in [
+        ("Соединение на вызов", lambda path: PerCallConnectionDatabase(path)),
+        ("Пул соединений (WAL)", lambda path: Database(path, synchronous=args.synchronous)),
+    ]:
+        database = factory(os.path.join(directory, f"bench_{len(results)}.db"))
+        results[name] = measure(database, args.messages, args.reads)
+        database.close()
+
+    print("=" * 64)
+    print(f"{'Режим':<24}{'add_message, оп/с':>20}{'get_messages, оп/с':>20}")
+    print("-" * 64)
+    for name, (write_rate, read_rate) in results.items():
+        print(f"{name:<24}{write_rate:>20.0f}{read_rate:>20.0f}")
+
+    (old_write, old_read), (new_write, new_read) = results.values()
+    print("-" * 64)
+    print(f"Ускорение: add_message x{new_write / old_write:.1f}, get_messages x{new_read / old_read:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк рассылки одного сообщения нескольким получателям
+
+Одно сообщение отправляется N подключенным клиентам (2, 10, 100, 1000;
+половина - версия протокола 1, половина - 2):
+  "по одному" - send_message для каждого получателя: json.dumps и кадр на каждое соединение,
+  "fan-out"   - NetworkManager.fan_out: сериализация один раз, одни и те же bytes всем.
+Выводит время рассылки на получателя и число сериализаций на сообщение.
+
+Соединения имитируются объектами в памяти, измеряется работа сервера, а не сеть.
+
+Пример:
+    python benchmarks/bench_fanout.py --messages 200
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from src.database.database import Database
+from src.network import protocol
+from src.network.network_manager import NetworkManager
+from src.network.protocol import FrameDecoder, LEGACY_PROTOCOL_VERSION, FRAMED_PROTOCOL_VERSION
+
+
+class MemoryConnection:
+    """Соединение в памяти с интерфейсом сокета: отправленное отбрасывается"""
+
+    def __init__(self, address):
+        self.address = address
+        self.sent = 0
+
+    def sendall(self, data: bytes):
+        self.sent += len(data)
+
+    def fileno(self) -> int:
+        return 3
+
+
+class CountingJson:
+    """json с подсчетом вызовов dumps (подменяет модуль json в protocol)"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def dumps(self, obj, **kwargs):
+        self.calls += 1
+        return json.dumps(obj, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(json, name)
+
+
+def run_mode(server, connections, message, count, fan_out):
+    started = time.perf_counter()
+    for _ in range(count):
+        if fan_out:
+            server.fan_out(message, connections)
+        else:
+            for connection in connections:
+                server.send_message(connection, message)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Рассылка одного сообщения нескольким получателям")
+    parser.add_argument('--messages', type=int, default=200, help="сообщений на каждый размер рассылки")
+    parser.add_argument('--text', type=int, default=500, help="длина текста сообщения, символов")
+    parser.add_argument('--recipients', default="2,10,100,1000", help="размеры рассылки через запятую")
+    args = parser.parse_args()
+
+    database = Database(os.path.join(tempfile.mkdtemp(), "bench_fanout.db"))
+    server = NetworkManager(database)
+    message = {'type': 'message', 'id': 1, 'sender_id': 'user1', 'receiver_id': 'group',
+               'message_text': 'ж' * args.text, 'timestamp': time.time()}
+    counter = CountingJson()
+    protocol.json = counter
+
+    results = []
+    stdout = sys.stdout
+    # Обработчики сервера много пишут в stdout - в обоих режимах одинаково отправляем в никуда
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        for recipients in (int(n) for n in args.recipients.split(',')):
+            connections = []
+            for i in range(recipients):
+                connection = MemoryConnection(('127.0.0.1', 10000 + i))
+                server.decoders[connection] = FrameDecoder(
+                    FRAMED_PROTOCOL_VERSION if i % 2 else LEGACY_PROTOCOL_VERSION)
+                connections.append(connection)
+            row = [recipients]
+            for fan_out in (False, True):
+                counter.calls = 0
+                elapsed = run_mode(server, connections, message, args.messages, fan_out)
+                row.extend([elapsed / (args.messages * recipients) * 1e6, counter.calls / args.messages])
+            results.append(row)
+            for connection in connections:
+                del server.decoders[connection]
+    finally:
+        sys.stdout = stdout
+        protocol.json = json
+        database.close()
+
+    print("=" * 70)
+    print(f"{args.messages} сообщений по {len(json.dumps(message).encode('utf-8'))} байт на каждый размер рассылки")
+    print("=" * 70)
+    print(f"{'Получателей':>11} {'по одному, мкс':>16} {'dumps':>7} {'fan-out, мкс':>14} {'dumps':>7} {'ускорение':>10}")
+    for recipients, single, single_dumps, fanned, fanned_dumps in results:
+        print(f"{recipients:>11} {single:>16.2f} {single_dumps:>7.0f} {fanned:>14.2f} {fanned_dumps:>7.0f} "
+              f"{single / fanned:>9.1f}x")
+    print("Время - на одного получателя")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк группового чата: комната из 500 участников, 100 сообщений в секунду
+
+Группа из --members участников, из них --online подключены имитированными
+соединениями (половина - версия протокола 1, половина - 2). Сообщения
+идут через NetworkManager.process_message с частотой --rate:
+  "SQL"    - участники группы выбираются из БД на каждое сообщение, отправка
+             send_message каждому подключенному (кодирование на получателя),
+  "индекс" - handle_group_message: GroupIndex и fan_out.
+Выводит время обработки сообщения (медиана и 99-й процентиль) и долю
+процессорного времени, которую занимает поток при заданной частоте.
+
+Пример:
+    python benchmarks/bench_group_chat.py --members 500 --rate 100 --duration 10
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from src.database.database import Database, group_conversation
+from src.network.network_manager import NetworkManager
+from src.network.protocol import FrameDecoder, LEGACY_PROTOCOL_VERSION, FRAMED_PROTOCOL_VERSION
+
+
+class MemoryConnection:
+    """Соединение в памяти с интерфейсом сокета: отправленное отбрасывается"""
+
+    def __init__(self, address):
+        self.address = address
+        self.sent = 0
+
+    def sendall(self, data: bytes):
+        self.sent += len(data)
+
+    def fileno(self) -> int:
+        return 3
+
+
+def sql_group_message(server):
+    """Обработчик без индекса: состав группы из БД на каждое сообщение"""
+    def handle(message, client_socket, address):
+        group_id = int(message['group_id'])
+        members = server.database.get_group_members(group_id)
+        if message['sender_id'] not in members:
+            return
+        response = {
+            'type': 'group_message',
+            'group_id': group_id,
+            'sender_id': message['sender_id'],
+            'receiver_id': group_conversation(group_id),
+            'message_text': message['message_text'],
+            'timestamp': time.time()
+        }
+        server.message_writer.enqueue(response)
+        for member in members:
+            if member in server.connected_users:
+                server.send_message(server.connected_users[member][0], response)
+    return handle
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_mode(database, group_id, args, indexed):
+    server = NetworkManager(database)
+    server.start_server('127.0.0.1', 0, mode='threaded')  # очередь записи и проверки статусов
+    if not indexed:
+        server.message_handlers['group_message'] = sql_group_message(server)
+
+    connections = []
+    for i in range(args.online):
+        user_id = f"bench{i}"
+        connection = MemoryConnection(('127.0.0.1', 10000 + i))
+        server.decoders[connection] = FrameDecoder(FRAMED_PROTOCOL_VERSION if i % 2 else LEGACY_PROTOCOL_VERSION)
+        server.connected_users[user_id] = (connection, connection.address)
+        server.set_user_online(user_id, connection)
+        connections.append((user_id, connection))
+
+    timings = []
+    total = int(args.rate * args.duration)
+    started = time.perf_counter()
+    for n in range(total):
+        # Равномерный поток сообщений: ждем момента отправки очередного
+        delay = started + n / args.rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        user_id, connection = connections[n % len(connections)]
+        message = {'type': 'group_message', 'sender_id': user_id, 'group_id': group_id,
+                   'message_text': f"сообщение {n} " + "ж" * args.text}
+        handled = time.perf_counter()
+        server.process_message(message, connection, connection.address)
+        timings.append(time.perf_counter() - handled)
+    elapsed = time.perf_counter() - started
+    server.stop_server()
+    delivered = sum(connection.sent for _, connection in connections)
+    return timings, total / elapsed, delivered / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Групповой чат")
+    parser.add_argument('--members', type=int, default=500, help="участников группы")
+    parser.add_argument('--online', type=int, default=500, help="из них подключено")
+    parser.add_argument('--rate', type=float, default=100.0, help="сообщений в секунду")
+    parser.add_argument('--duration', type=float, default=10.0, help="длительность каждого режима, с")
+    parser.add_argument('--text', type=int, default=100, help="длина текста сообщения, символов")
+    args = parser.parse_args()
+    args.online = min(args.online, args.members)
+
+    database = Database(os.path.join(tempfile.mkdtemp(), "bench_group_chat.db"))
+    members = [f"bench{i}" for i in range(args.members)]
+    with database.connection() as conn:
+        conn.executemany("INSERT OR IGNORE INTO users (user_id, display_name) VALUES (?, ?)",
+                         ((user_id, user_id) for user_id in members))
+    group_id = database.create_group("Комната", members[0], members[1:])
+
+    results = {}
+    stdout = sys.stdout
+    # Обработчики сервера много пишут в stdout - в обоих режимах одинаково отправляем в никуда
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        for name, indexed in [("SQL", False), ("индекс", True)]:
+            results[name] = run_mode(database, group_id, args, indexed)
+    finally:
+        sys.stdout = stdout
+        database.close()
+
+    print("=" * 70)
+    print(f"Группа из {args.members} участников, подключено {args.online}, "
+          f"{args.rate:.0f} сообщений/с, {args.duration:.0f} с на режим")
+    print("=" * 70)
+    print(f"{'Режим':<8} {'сообщ./с':>9} {'медиана, мс':>12} {'p99, мс':>9} {'загрузка':>9} {'отправлено':>12}")
+    for name, (timings, rate, sent) in results.items():
+        busy = sum(timings) * rate / len(timings)
+        print(f"{name:<8} {rate:>9.1f} {percentile(timings, 0.5) * 1000:>12.2f} "
+              f"{percentile(timings, 0.99) * 1000:>9.2f} {busy * 100:>8.1f}% {sent / 1e6:>7.1f} МБ/с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк обработки heartbeat при большом числе подключенных клиентов
+
+Регистрирует N пользователей (по умолчанию 50 000) как подключенных и
+прогоняет их heartbeat через NetworkManager.process_message по кругу:
+  "SQLite"  - прежний обработчик: update_user_status (соединение и commit) на каждый heartbeat,
+  "память"  - PresenceTracker.touch и пакетная запись раз в PRESENCE_CHECKPOINT_INTERVAL.
+Выводит устойчивое число heartbeat в секунду и время записи всех
+накопленных статусов одной транзакцией.
+
+Соединения имитируются объектами в памяти: 50 000 сокетов в одном
+процессе упираются в лимит открытых файлов, а измеряется обработка
+на сервере, а не сеть.
+
+Пример:
+    python benchmarks/bench_heartbeat.py --clients 50000 --duration 10
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from src.config import server_config as config
+from src.database.database import Database
+from src.network.network_manager import NetworkManager
+
+
+class MemoryConnection:
+    """Соединение в памяти с интерфейсом сокета: отправленное отбрасывается"""
+
+    def __init__(self, address):
+        self.address = address
+        self.sent = 0
+
+    def sendall(self, data: bytes):
+        self.sent += len(data)
+
+    def send(self, data: bytes) -> int:
+        self.sent += len(data)
+        return len(data)
+
+    def fileno(self) -> int:
+        return 3
+
+    def close(self):
+        pass
+
+
+def legacy_heartbeat(server):
+    """Прежний обработчик heartbeat: запись статуса в SQLite на каждое сообщение"""
+    def handle(message, client_socket, address):
+        user_id = message.get('user_id')
+        if user_id:
+            server.database.update_user_status(user_id, True)
+            server.send_message(client_socket, {'type': 'heartbeat_ack', 'timestamp': time.time()})
+    return handle
+
+
+def run_mode(database, clients, duration, legacy):
+    server = NetworkManager(database)
+    if legacy:
+        server.message_handlers['heartbeat'] = legacy_heartbeat(server)
+
+    connections = []
+    for i in range(clients):
+        user_id = f"bench{i}"
+        connection = MemoryConnection(('127.0.0.1', 10000 + i))
+        server.connected_users[user_id] = (connection, connection.address)
+        server.presence.connect(user_id)
+        connections.append((user_id, connection))
+    server.presence.checkpoint()
+
+    processed = 0
+    started = time.perf_counter()
+    deadline = started + duration
+    while time.perf_counter() < deadline:
+        for user_id, connection in connections[processed % clients:processed % clients + 1000]:
+            server.process_message({'type': 'heartbeat', 'user_id': user_id}, connection, connection.address)
+            processed += 1
+    elapsed = time.perf_counter() - started
+
+    pending = server.presence.pending()
+    checkpoint_started = time.perf_counter()
+    server.presence.checkpoint()
+    checkpoint = time.perf_counter() - checkpoint_started
+    return processed / elapsed, pending, checkpoint
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Обработка heartbeat")
+    parser.add_argument('--clients', type=int, default=50000, help="подключенных клиентов")
+    parser.add_argument('--duration', type=float, default=10.0, help="длительность каждого режима, с")
+    args = parser.parse_args()
+
+    database = Database(os.path.join(tempfile.mkdtemp(), "bench_heartbeat.db"))
+    with database.connection() as conn:
+        conn.executemany("INSERT OR IGNORE INTO users (user_id, display_name) VALUES (?, ?)",
+                         ((f"bench{i}", f"Пользователь {i}") for i in range(args.clients)))
+
+    results = {}
+    stdout = sys.stdout
+    # Обработчики сервера много пишут в stdout - в обоих режимах одинаково отправляем в никуда
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        for name, legacy in [("SQLite", True), ("память", False)]:
+            results[name] = run_mode(database, args.clients, args.duration, legacy)
+    finally:
+        sys.stdout = stdout
+        database.close()
+
+    print("=" * 70)
+    print(f"{args.clients} подключенных клиентов, {args.duration:.0f} с на режим")
+    print("=" * 70)
+    print(f"{'Режим':<8} {'heartbeat/с':>12} {'обход всех, с':>14} {'запись статусов':>26}")
+    for name, (rate, pending, checkpoint) in results.items():
+        written = f"{pending:>8} польз. за {checkpoint * 1000:>7.1f} мс" if pending else f"{'-':>26}"
+        print(f"{name:<8} {rate:>12.0f} {args.clients / rate:>14.1f} {written}")
+    print(f"Нужно при HEARTBEAT_INTERVAL = {config.HEARTBEAT_INTERVAL} с: "
+          f"{args.clients / config.HEARTBEAT_INTERVAL:.0f} heartbeat/с")
+
+
+if __name__ == "__main__":
+    main()
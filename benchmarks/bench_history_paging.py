@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк выборки глубоких страниц истории диалога
+
+Диалог из N сообщений (по умолчанию 1 000 050); для страниц, отстоящих от
+конца на 1 000, 100 000 и 1 000 000 сообщений, измеряется время выборки:
+  "курсор id"    - get_messages_before(conversation, before_id, limit) по индексу,
+  "OFFSET"       - LIMIT/OFFSET по тому же индексу (пропуск offset строк),
+  "время"        - сравнение строк timestamp (без индекса по времени),
+  "весь хвост"   - прежний способ: get_messages(limit=offset + page) и срез,
+  "history_request" - запрос страницы по курсору через сервер (asyncio).
+
+Пример:
+    python benchmarks/bench_history_paging.py --offsets 1000 100000 1000000
+"""
+
+import argparse
+import datetime
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import time
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from src.database.database import Database, conversation_key
+from src.network.network_manager import NetworkManager
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def fill_conversation(database, count, noise):
+    """Диалог user1 <-> user2 из count сообщений и noise сообщений других диалогов"""
+    key = conversation_key("user1", "user2")
+    started = datetime.datetime(2024, 1, 1)
+
+    noise_key = conversation_key("user3", "user4")
+    step = max(1, count // noise) if noise else 0
+
+    def rows():
+        seconds = 0
+        for i in range(count):
+            seconds += 1
+            timestamp = (started + datetime.timedelta(seconds=seconds)).strftime("%Y-%m-%d %H:%M:%S")
+            sender, receiver = ("user1", "user2") if i % 2 else ("user2", "user1")
+            yield sender, receiver, f"Сообщение {i}", key, timestamp
+            # Сообщения других диалогов вперемешку с основным
+            if step and i % step == 0:
+                seconds += 1
+                timestamp = (started + datetime.timedelta(seconds=seconds)).strftime("%Y-%m-%d %H:%M:%S")
+                yield "user3", "user4", f"Шум {i}", noise_key, timestamp
+
+    with database.connection() as conn:
+        conn.executemany(
+            "INSERT INTO messages (sender_id, receiver_id, message_text, conversation, timestamp) "
+            "VALUES (?, ?, ?, ?, ?)", rows())
+    return key
+
+
+def cursor_at(database, key, offset):
+    """id и время сообщения, отстоящего от конца диалога на offset (курсор страницы)"""
+    with database.connection() as conn:
+        return conn.execute(
+            "SELECT id, timestamp FROM messages WHERE conversation = ? ORDER BY id DESC LIMIT 1 OFFSET ?",
+            (key, offset - 1)).fetchone()
+
+
+def measure(function, repeat):
+    """Медиана времени вызова (мс) и результат последнего вызова"""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000, result
+
+
+def offset_page(database, key, offset, page):
+    with database.connection() as conn:
+        return conn.execute(
+            "SELECT id, sender_id, receiver_id, message_text, timestamp, is_read FROM messages "
+            "WHERE conversation = ? ORDER BY id DESC LIMIT ? OFFSET ?", (key, page, offset)).fetchall()
+
+
+def timestamp_page(database, key, timestamp, page):
+    with database.connection() as conn:
+        return conn.execute(
+            "SELECT id, sender_id, receiver_id, message_text, timestamp, is_read FROM messages "
+            "WHERE conversation = ? AND timestamp < ? ORDER BY timestamp DESC LIMIT ?",
+            (key, timestamp, page)).fetchall()
+
+
+class HistoryClient:
+    """Клиент, ожидающий history_response на каждый запрос"""
+
+    def __init__(self, database, port):
+        self.received = []
+        self.client = NetworkManager(database)
+        self.client.message_callback = self.received.append
+        assert self.client.connect_to_server('127.0.0.1', port, "user1")
+
+    def page(self, before_id, limit):
+        self.received.clear()
+        self.client.request_history("user2", before_id=before_id, limit=limit)
+        deadline = time.time() + 30
+        while time.time() < deadline:
+            for message in list(self.received):
+                if message['type'] == 'history_response':
+                    return message['messages']
+            time.sleep(0.0005)
+        return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Выборка глубоких страниц истории")
+    parser.add_argument('--offsets', type=int, nargs='+', default=[1000, 100000, 1000000],
+                        help="отступ страницы от конца диалога, сообщений")
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--noise', type=int, default=100000, help="сообщений других диалогов")
+    parser.add_argument('--repeat', type=int, default=5, help="повторов каждого замера")
+    parser.add_argument('--tail-limit', type=int, default=1000000,
+                        help="не измерять \"весь хвост\" для отступов больше этого")
+    args = parser.parse_args()
+
+    database = Database(os.path.join(tempfile.mkdtemp(), "bench_history.db"))
+    count = max(args.offsets) + args.page_size
+    fill_started = time.perf_counter()
+    key = fill_conversation(database, count, args.noise)
+    print(f"Заполнение: {count} сообщений диалога + {args.noise} других за "
+          f"{time.perf_counter() - fill_started:.1f} с")
+
+    port = free_port()
+    server = NetworkManager(database)
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        assert server.start_server('127.0.0.1', port, mode='asyncio')
+        client = HistoryClient(database, port)
+        results = []
+        for offset in args.offsets:
+            before_id, timestamp = cursor_at(database, key, offset)
+            row = {'offset': offset}
+            row['keyset'], keyset = measure(
+                lambda: database.get_messages_before(key, before_id, args.page_size), args.repeat)
+            row['offset_sql'], by_offset = measure(
+                lambda: offset_page(database, key, offset, args.page_size), args.repeat)
+            row['timestamp'], by_time = measure(
+                lambda: timestamp_page(database, key, timestamp, args.page_size), args.repeat)
+            if offset <= args.tail_limit:
+                row['tail'], tail = measure(
+                    lambda: database.get_messages("user1", "user2", limit=offset + args.page_size)[:args.page_size],
+                    max(1, args.repeat // 2))
+                assert [m['id'] for m in tail] == [m['id'] for m in keyset]
+            row['wire'], wire = measure(lambda: client.page(before_id, args.page_size), args.repeat)
+            # Все способы возвращают одну и ту же страницу
+            assert [m['id'] for m in wire] == [m['id'] for m in keyset]
+            assert sorted(r[0] for r in by_offset) == sorted(r[0] for r in by_time) == [m['id'] for m in keyset]
+            results.append(row)
+        client.client.stop_server()
+    finally:
+        sys.stdout = stdout
+        server.stop_server()
+        database.close()
+
+    print("=" * 86)
+    print(f"Страница {args.page_size} сообщений, медиана {args.repeat} повторов, мс")
+    print("=" * 86)
+    print(f"{'Отступ':>9} {'курсор id':>11} {'OFFSET':>10} {'время':>10} {'весь хвост':>12} "
+          f"{'history_request':>16}")
+    for row in results:
+        tail = f"{row['tail']:>12.2f}" if 'tail' in row else f"{'-':>12}"
+        print(f"{row['offset']:>9} {row['keyset']:>11.3f} {row['offset_sql']:>10.2f} "
+              f"{row['timestamp']:>10.2f} {tail} {row['wire']:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Симулятор буфера воспроизведения голосовых пакетов
+
+Трасса звонка - номер пакета, время отправки и время прихода (пусто -
+пакет потерян) - воспроизводится без сети и звуковых устройств. Устройство
+вывода запрашивает кадр раз в длительность кадра; пакеты, пришедшие к
+этому моменту, ставятся в буфер. Сравниваются:
+  "список"   - прежняя схема AudioManager: список в порядке прихода,
+               обрезка до 10 кадров pop(0), без номеров пакетов,
+  "буфер"    - JitterBuffer: порядок по номерам, адаптивная задержка,
+               заполнение потерь.
+Выводит задержку от записи до воспроизведения (медиана, 95-й процентиль,
+максимум), долю заполненных кадров (для списка - пустых) и число кадров,
+сыгранных не по порядку.
+
+Без --trace прогоняются синтетические сценарии: задержка сети --base плюс
+экспоненциальный джиттер, редкие всплески задержки и потери пачками
+(модель Гилберта-Эллиотта). Формат трассы (--trace, --save-trace): CSV
+"sequence,send_time,arrival_time".
+
+Пример:
+    python benchmarks/bench_jitter_buffer.py --duration 60
+    python benchmarks/bench_jitter_buffer.py --trace call.csv
+"""
+
+import argparse
+import csv
+import os
+import random
+import struct
+import sys
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from src.audio.jitter_buffer import JitterBuffer, MediaPacket
+from src.config import client_config as config
+
+SCENARIOS = [
+    # название, джиттер (с), всплесков задержки в секунду, средняя потеря, средняя длина пачки потерь
+    ("чистая сеть", 0.002, 0.0, 0.0, 1),
+    ("джиттер 20 мс", 0.020, 0.0, 0.0, 1),
+    ("потери 5% пачками", 0.005, 0.0, 0.05, 3),
+    ("Wi-Fi", 0.015, 0.2, 0.02, 2),
+]
+
+
+def generate_trace(duration, frame, base, jitter, spikes, loss, burst, seed):
+    """Синтетическая трасса: (номер, время отправки, время прихода или None)"""
+    rng = random.Random(seed)
+    # Переходы Гилберта-Эллиотта: в "плохом" состоянии пакеты теряются
+    recover = 1 / burst
+    fail = loss * recover / (1 - loss) if loss < 1 else 1
+    bad = False
+    spike = 0.0
+    trace = []
+    for sequence in range(int(duration / frame)):
+        sent = sequence * frame
+        bad = rng.random() < (1 - recover if bad else fail)
+        if spikes and rng.random() < spikes * frame:
+            spike = rng.uniform(0.1, 0.3)
+        spike = max(0.0, spike - frame)  # очередь в сети рассасывается
+        delay = base + (rng.expovariate(1 / jitter) if jitter else 0) + spike
+        trace.append((sequence, sent, None if bad else sent + delay))
+    return trace
+
+
+def load_trace(path):
+    with open(path, newline='') as f:
+        return [(int(row['sequence']), float(row['send_time']),
+                 float(row['arrival_time']) if row['arrival_time'] else None)
+                for row in csv.DictReader(f)]
+
+
+def save_trace(path, trace):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['sequence', 'send_time', 'arrival_time'])
+        for sequence, sent, arrival in trace:
+            writer.writerow([sequence, f"{sent:.6f}", '' if arrival is None else f"{arrival:.6f}"])
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def replay(trace, frame, frame_samples, jitter_buffer):
+    """Воспроизведение трассы часами устройства; jitter_buffer=None - прежний список"""
+    frame_bytes = frame_samples * 2
+    sent_at = {sequence: sent for sequence, sent, _ in trace}
+    arrivals = sorted((arrival, sequence) for sequence, _, arrival in trace if arrival is not None)
+    # Кадр узнается по объекту данных, который вернул буфер
+    payloads = {sequence: struct.pack('!I', sequence) + bytes(frame_bytes - 4) for sequence in sent_at}
+    by_id = {id(payload): sequence for sequence, payload in payloads.items()}
+
+    queue = []
+    latencies = []
+    filled = total = out_of_order = 0
+    last_played = -1
+    started = False
+    position = 0
+    tick = frame * 0.37  # фаза устройства относительно отправителя произвольна
+    end = max(arrival for arrival, _ in arrivals) + 1.0 if arrivals else 0.0
+    while tick < end:
+        while position < len(arrivals) and arrivals[position][0] <= tick:
+            arrival, sequence = arrivals[position]
+            position += 1
+            if jitter_buffer:
+                jitter_buffer.push(MediaPacket(sequence % 65536, sequence * frame_samples, payloads[sequence]),
+                                   arrival)
+            else:
+                queue.append(payloads[sequence])
+                if len(queue) > 10:
+                    queue.pop(0)
+
+        if jitter_buffer:
+            frame_data = jitter_buffer.pop(tick)
+        else:
+            frame_data = queue.pop(0) if queue else None
+        sequence = by_id.get(id(frame_data))
+        if sequence is not None:
+            started = True
+            latencies.append(tick - sent_at[sequence] + frame)
+            out_of_order += sequence < last_played
+            last_played = max(last_played, sequence)
+        elif started and position < len(arrivals):
+            filled += 1
+        total += started and position < len(arrivals)
+        tick += frame
+    return latencies, filled / max(1, total), out_of_order
+
+
+def report(title, trace, args):
+    frame = config.AUDIO_CHUNK_SIZE / config.AUDIO_SAMPLE_RATE
+    lost = sum(arrival is None for _, _, arrival in trace)
+    print(f"{title}: {len(trace)} пакетов, потеряно в сети {lost / len(trace) * 100:.1f}%")
+    for name in ("список", "буфер"):
+        jitter_buffer = JitterBuffer() if name == "буфер" else None
+        latencies, filled, out_of_order = replay(trace, frame, config.AUDIO_CHUNK_SIZE, jitter_buffer)
+        print(f"  {name:<8} {percentile(latencies, 0.5) * 1000:>7.0f} {percentile(latencies, 0.95) * 1000:>7.0f} "
+              f"{max(latencies, default=0) * 1000:>7.0f} {filled * 100:>8.1f}% {out_of_order:>8}")
+        if jitter_buffer:
+            stats = jitter_buffer.snapshot()
+            print(f"  {'':<8} опоздало {stats['late']}, пропущено для сокращения задержки {stats['dropped']}, "
+                  f"целевая задержка {stats['delay'] * 1000:.0f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Буфер воспроизведения голосовых пакетов")
+    parser.add_argument('--duration', type=float, default=60.0, help="длительность звонка, с")
+    parser.add_argument('--base', type=float, default=0.04, help="задержка сети без джиттера, с")
+    parser.add_argument('--seed', type=int, default=1, help="зерно генератора трасс")
+    parser.add_argument('--trace', help="файл трассы для воспроизведения")
+    parser.add_argument('--save-trace', help="сохранить синтетические трассы (префикс имени файла)")
+    args = parser.parse_args()
+
+    frame = config.AUDIO_CHUNK_SIZE / config.AUDIO_SAMPLE_RATE
+    print("=" * 70)
+    print(f"Кадр {frame * 1000:.1f} мс ({config.AUDIO_CHUNK_SIZE} отсчетов, {config.AUDIO_SAMPLE_RATE} Гц), "
+          f"задержка в мс: медиана, p95, максимум")
+    print("=" * 70)
+    print(f"  {'':<8} {'медиана':>7} {'p95':>7} {'макс.':>7} {'заполн.':>9} {'не по пор.':>8}")
+    if args.trace:
+        report(os.path.basename(args.trace), load_trace(args.trace), args)
+        return
+    for number, (title, jitter, spikes, loss, burst) in enumerate(SCENARIOS):
+        trace = generate_trace(args.duration, frame, args.base, jitter, spikes, loss, burst, args.seed + number)
+        if args.save_trace:
+            save_trace(f"{args.save_trace}{number}.csv", trace)
+        report(title, trace, args)
+
+
+if __name__ == "__main__":
+    main()
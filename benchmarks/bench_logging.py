@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк логирования на пути обработки сообщений
+
+Сообщения между двумя имитированными соединениями идут через
+NetworkManager.process_message, вывод логов пишется в файл. Режимы:
+  "DEBUG/сразу"   - каждая запись форматируется и пишется в потоке
+                    обработчика (как прежние print на каждое сообщение),
+  "DEBUG/очередь" - все записи через очередь логирования (setup_logging),
+  "INFO/очередь"  - рабочий уровень: подробные записи отсекаются до
+                    форматирования.
+Выводит пропускную способность в сообщениях в секунду.
+
+Пример:
+    python benchmarks/bench_logging.py --messages 20000
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from src.database.database import Database
+from src.network.network_manager import NetworkManager
+from src.network.protocol import FrameDecoder, FRAMED_PROTOCOL_VERSION
+from src.utils.logger import ROOT_LOGGER, setup_logging, shutdown_logging
+
+
+class MemoryConnection:
+    """Соединение в памяти с интерфейсом сокета: отправленное отбрасывается"""
+
+    def __init__(self, address):
+        self.address = address
+        self.sent = 0
+
+    def sendall(self, data: bytes):
+        self.sent += len(data)
+
+    def fileno(self) -> int:
+        return 3
+
+
+def direct_logging(stream):
+    """Синхронный вывод всех записей в потоке обработчика"""
+    shutdown_logging()
+    root = logging.getLogger(ROOT_LOGGER)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    root.addHandler(handler)
+    root.setLevel(logging.DEBUG)
+    root.propagate = False
+
+
+def run_mode(database, args, configure):
+    log = open(os.path.join(tempfile.mkdtemp(), "bench_logging.log"), 'w', encoding='utf-8')
+    configure(log)
+    server = NetworkManager(database)
+    server.start_server('127.0.0.1', 0, mode='threaded')  # очередь записи сообщений
+
+    connections = {}
+    for user_id in ("user1", "user2"):
+        connection = MemoryConnection(('127.0.0.1', 10000 + len(connections)))
+        server.decoders[connection] = FrameDecoder(FRAMED_PROTOCOL_VERSION)
+        server.connected_users[user_id] = (connection, connection.address)
+        server.set_user_online(user_id, connection)
+        connections[user_id] = connection
+
+    sender = connections["user1"]
+    started = time.perf_counter()
+    for n in range(args.messages):
+        message = {'type': 'message', 'sender_id': 'user1', 'receiver_id': 'user2',
+                   'message_text': f"сообщение {n} " + "ж" * args.text}
+        server.process_message(message, sender, sender.address)
+    elapsed = time.perf_counter() - started
+    server.stop_server()
+    shutdown_logging()
+    log.close()
+    return args.messages / elapsed, os.path.getsize(log.name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Логирование на пути сообщений")
+    parser.add_argument('--messages', type=int, default=20000, help="сообщений в каждом режиме")
+    parser.add_argument('--text', type=int, default=100, help="длина текста сообщения, символов")
+    args = parser.parse_args()
+
+    database = Database(os.path.join(tempfile.mkdtemp(), "bench_logging.db"))
+    modes = [
+        ("DEBUG/сразу", direct_logging),
+        ("DEBUG/очередь", lambda log: setup_logging('DEBUG', stream=log, log_file='')),
+        ("INFO/очередь", lambda log: setup_logging('INFO', stream=log, log_file='')),
+    ]
+    results = {}
+    stdout = sys.stdout
+    # Остальной вывод сервера (статистика, баннеры) в измерение не входит
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        for name, configure in modes:
+            results[name] = run_mode(database, args, configure)
+    finally:
+        sys.stdout = stdout
+        database.close()
+
+    print("=" * 50)
+    print(f"{args.messages} сообщений, текст {args.text} символов")
+    print("=" * 50)
+    print(f"{'Режим':<15} {'сообщ./с':>10} {'лог, КБ':>10}")
+    for name, (rate, size) in results.items():
+        print(f"{name:<15} {rate:>10.0f} {size / 1024:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Нагрузочный тест ретранслятора звонков (MediaRelay) на localhost
+
+Ретранслятор запускается в отдельном процессе и выделяет N звонков.
+Генератор нагрузки в этом процессе - один цикл selectors на 2N UDP-сокетов
+участников: каждый отправляет пакеты размера голосового кадра с частотой
+кадров звонка (50 пакетов/с при 20 мс) и меткой времени отправки внутри.
+Для каждого N выводит пересланные пакеты в секунду, потери, задержку
+пересылки (p50/p99, мс), загрузку ядра процессом ретранслятора и
+процессорное время на пакет. Генератор и ретранслятор делят процессор:
+на одноядерной машине загрузка ретранслятора - его доля, а не весь
+предел.
+
+Пример:
+    python benchmarks/bench_media_relay.py --calls 100 200 400 --duration 10
+"""
+
+import argparse
+import json
+import os
+import selectors
+import socket
+import struct
+import subprocess
+import sys
+import time
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from src.network.media_relay import MediaRelay
+
+# Номер отправителя, номер пакета, время отправки (perf_counter)
+PROBE = struct.Struct('!IId')
+
+
+def serve(calls: int):
+    """Процесс ретранслятора: порты звонков в stdout, по строке stdin - процессорное время и счетчики"""
+    relay = MediaRelay('127.0.0.1', 0, 0, idle_timeout=3600, check_host=True)
+    relay.start()
+    ports = [relay.allocate(f"caller{i}", f"receiver{i}", '127.0.0.1', '127.0.0.1').ports for i in range(calls)]
+    print(json.dumps(ports), flush=True)
+    for _ in sys.stdin:
+        print(json.dumps({'cpu': time.process_time(), **relay.stats()}), flush=True)
+    relay.stop()
+
+
+def query(process) -> dict:
+    process.stdin.write("\n")
+    process.stdin.flush()
+    return json.loads(process.stdout.readline())
+
+
+def percentile(values, fraction: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def run(calls: int, duration: float, rate: int, payload: int):
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', str(calls)],
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        ports = json.loads(process.stdout.readline())
+        selector = selectors.DefaultSelector()
+        endpoints = []  # (сокет, адрес его порта на ретрансляторе)
+        for caller_port, receiver_port in ports:
+            for port in (caller_port, receiver_port):
+                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                sock.bind(('127.0.0.1', 0))
+                sock.setblocking(False)
+                selector.register(sock, selectors.EVENT_READ)
+                endpoints.append((sock, ('127.0.0.1', port)))
+
+        # Первый пакет каждого участника - для запоминания адреса, до замера
+        for sock, address in endpoints:
+            sock.sendto(b'hello', address)
+        time.sleep(0.5)
+
+        padding = bytes(payload - PROBE.size)
+        interval = 1.0 / rate
+        latencies = []
+        sent = received = 0
+        buffer = bytearray(2048)
+        before = query(process)
+        started = time.perf_counter()
+        # Отправители равномерно распределены внутри интервала кадра
+        next_send = [started + interval * i / len(endpoints) for i in range(len(endpoints))]
+        cursor = 0
+        end = started + duration
+        while True:
+            now = time.perf_counter()
+            if now >= end:
+                break
+            while next_send[cursor] <= now:
+                sock, address = endpoints[cursor]
+                try:
+                    sock.sendto(PROBE.pack(cursor, sent, now) + padding, address)
+                    sent += 1
+                except BlockingIOError:
+                    pass
+                next_send[cursor] += interval
+                cursor = (cursor + 1) % len(endpoints)
+            for key, _ in selector.select(max(0.0, min(next_send[cursor], end) - time.perf_counter())):
+                while True:
+                    try:
+                        size = key.fileobj.recv_into(buffer)
+                    except BlockingIOError:
+                        break
+                    if size >= PROBE.size:
+                        latencies.append(time.perf_counter() - PROBE.unpack_from(buffer)[2])
+                        received += 1
+        # Пакеты, уже отправленные ретранслятором, дочитываются
+        drain_end = time.perf_counter() + 0.5
+        while time.perf_counter() < drain_end:
+            for key, _ in selector.select(0.05):
+                while True:
+                    try:
+                        size = key.fileobj.recv_into(buffer)
+                    except BlockingIOError:
+                        break
+                    if size >= PROBE.size:
+                        received += 1
+        elapsed = time.perf_counter() - started
+        after = query(process)
+        for sock, _ in endpoints:
+            selector.unregister(sock)
+            sock.close()
+        selector.close()
+    finally:
+        process.stdin.close()
+        process.wait(5)
+
+    relayed = after['relayed_packets'] - before['relayed_packets']
+    cpu = after['cpu'] - before['cpu']
+    latencies.sort()
+    return (sent / duration, relayed / duration, 100.0 * (sent - received) / max(sent, 1),
+            percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000,
+            100.0 * cpu / elapsed, cpu / max(relayed, 1) * 1e6)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест ретранслятора звонков")
+    parser.add_argument('--calls', type=int, nargs='+', default=[100, 200, 400], help="одновременных звонков")
+    parser.add_argument('--duration', type=float, default=10.0, help="длительность замера, с")
+    parser.add_argument('--rate', type=int, default=50, help="пакетов в секунду от участника")
+    parser.add_argument('--payload', type=int, default=332, help="байт в пакете (µ-law 20 мс с заголовком - 332)")
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve)
+        return
+
+    print("=" * 86)
+    print(f"Ретранслятор звонков: {args.rate} пакетов/с по {args.payload} байт от каждого участника, "
+          f"{args.duration:g} с")
+    print("=" * 86)
+    print(f"{'звонков':>7} {'отправлено/с':>12} {'переслано/с':>11} {'потери %':>8} "
+          f"{'p50 мс':>7} {'p99 мс':>7} {'ЦП ретранслятора %':>18} {'мкс/пакет':>9}")
+    for calls in args.calls:
+        offered, relayed, loss, p50, p99, cpu, per_packet = run(calls, args.duration, args.rate, args.payload)
+        print(f"{calls:>7} {offered:>12.0f} {relayed:>11.0f} {loss:>8.2f} "
+              f"{p50:>7.2f} {p99:>7.2f} {cpu:>18.1f} {per_packet:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
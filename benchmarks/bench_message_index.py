@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк выборки истории диалога по мере роста таблицы messages
+
+Генерирует базу до 10 млн сообщений (по шагам) и на каждом шаге измеряет
+задержку get_messages по индексу (conversation, id) и прежнего запроса
+с условием (sender_id=? AND receiver_id=?) OR (...) и ORDER BY timestamp.
+
+Пример:
+    python benchmarks/bench_message_index.py --sizes 100000 1000000 10000000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from src.database.database import Database, conversation_key
+
+LEGACY_QUERY = '''
+    SELECT sender_id, receiver_id, message_text, timestamp, is_read
+    FROM messages
+    WHERE (sender_id = ? AND receiver_id = ?)
+       OR (sender_id = ? AND receiver_id = ?)
+    ORDER BY timestamp DESC
+    LIMIT ?
+'''
+
+
+def fill(database, pairs, count, rng, batch=50000):
+    """Добавление count сообщений между случайными парами пользователей"""
+    with database.connection() as conn:
+        while count > 0:
+            size = min(batch, count)
+            rows = []
+            for _ in range(size):
+                sender, receiver = rng.choice(pairs)
+                if rng.random() < 0.5:
+                    sender, receiver = receiver, sender
+                rows.append((sender, receiver, "Сообщение для нагрузочного теста",
+                             conversation_key(sender, receiver)))
+            conn.executemany('''
+                INSERT INTO messages (sender_id, receiver_id, message_text, conversation)
+                VALUES (?, ?, ?, ?)
+            ''', rows)
+            conn.commit()
+            count -= size
+
+
+def latency(call, samples):
+    timings = []
+    for args in samples:
+        started = time.perf_counter()
+        call(*args)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000, timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк индекса сообщений")
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10000, 100000, 1000000, 10000000], help="размеры таблицы messages")
+    parser.add_argument('--users', type=int, default=2000, help="число пользователей")
+    parser.add_argument('--queries', type=int, default=200, help="запросов по индексу на шаг")
+    parser.add_argument('--legacy-queries', type=int, default=5, help="запросов старого вида на шаг (0 - пропустить)")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    database = Database(os.path.join(tempfile.mkdtemp(), "bench_index.db"))
+    users = [f"user{i}" for i in range(args.users)]
+    pairs = [tuple(rng.sample(users, 2)) for _ in range(args.users * 5)]
+
+    # Контрольные диалоги: в каждом заранее больше 100 сообщений, поэтому на всех шагах
+    # запрос возвращает одинаковый объем данных и меняется только размер таблицы
+    probes, pairs = pairs[:50], pairs[50:]
+    fill(database, probes, len(probes) * 200, rng)
+    current = len(probes) * 200
+
+    print("=" * 76)
+    print(f"{'Сообщений':>12}{'индекс p50, мс':>16}{'индекс p99, мс':>16}{'старый p50, мс':>16}{'заполнение, с':>16}")
+    print("-" * 76)
+
+    for size in sorted(args.sizes):
+        started = time.perf_counter()
+        fill(database, pairs, max(0, size - current), rng)
+        fill_time = time.perf_counter() - started
+        current = max(current, size)
+
+        samples = [(a, b, 100) for a, b in (rng.choice(probes) for _ in range(args.queries))]
+        p50, p99 = latency(database.get_messages, samples)
+
+        legacy = "-"
+        if args.legacy_queries:
+            def legacy_query(a, b, limit):
+                with database.connection() as conn:
+                    return conn.execute(LEGACY_QUERY, (a, b, b, a, limit)).fetchall()
+            legacy_p50, _ = latency(legacy_query, samples[:args.legacy_queries])
+            legacy = f"{legacy_p50:.2f}"
+
+        print(f"{size:>12}{p50:>16.3f}{p99:>16.3f}{legacy:>16}{fill_time:>16.1f}")
+
+    database.close()
+
+
+if __name__ == "__main__":
+    main()
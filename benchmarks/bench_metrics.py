@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк накладных расходов метрик на пути обработки сообщений
+
+Разница в единицы процентов между прогонами с метриками и без них тонет
+в шуме общей машины, поэтому учет сообщения (замеры времени, гистограмма
+обработчика, счетчик отправленных) измеряется отдельно и делится на
+процессорное время обработки сообщения при максимальной нагрузке:
+  "в памяти"  - кадры версии 2 порциями по --batch разбираются FrameDecoder
+                и обрабатываются process_message, как в data_received, но
+                без системных вызовов (верхняя оценка доли метрик),
+  "сокеты"    - asyncio-сервер, сообщения от отдельного процесса через TCP.
+Выводит время обработки сообщения и долю, которую занимают метрики.
+
+Пример:
+    python benchmarks/bench_metrics.py --messages 2000 --rounds 20
+"""
+
+import argparse
+import itertools
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from src.database.database import Database
+from src.network.network_manager import NetworkManager
+from src.network.protocol import (FrameDecoder, FRAMED_PROTOCOL_VERSION, LEGACY_PROTOCOL_VERSION,
+                                  encode_message)
+
+
+class MemoryConnection:
+    """Соединение в памяти с интерфейсом сокета: отправленное отбрасывается"""
+
+    def __init__(self, address):
+        self.address = address
+        self.sent = 0
+
+    def sendall(self, data: bytes):
+        self.sent += len(data)
+
+    def fileno(self) -> int:
+        return 3
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def setup_server(database):
+    server = NetworkManager(database)
+    server.start_server('127.0.0.1', 0, mode='threaded')  # очередь записи сообщений
+    connections = {}
+    for user_id in ("user1", "user2"):
+        connection = MemoryConnection(('127.0.0.1', 10000 + len(connections)))
+        server.decoders[connection] = FrameDecoder(FRAMED_PROTOCOL_VERSION)
+        server.connected_users[user_id] = (connection, connection.address)
+        server.set_user_online(user_id, connection)
+        connections[user_id] = connection
+    return server, connections["user1"]
+
+
+def instrumentation_cost(server, repeat: int = 7, number: int = 100000) -> float:
+    """Время учета одного сообщения 'message': два замера времени, гистограмма обработчика
+    и счетчик отправленных (fan_out отправителю и получателю), секунд"""
+    perf_counter = time.perf_counter
+    observe = server.handler_seconds.observe
+    inc = server.messages_sent.inc
+    best = None
+    for _ in range(repeat):
+        started = perf_counter()
+        for _ in range(number):
+            handled = perf_counter()
+            inc('message', amount=2)
+            observe(perf_counter() - handled, 'message')
+        elapsed = (perf_counter() - started) / number
+        best = elapsed if best is None else min(best, elapsed)
+    # Пустой цикл той же длины
+    started = perf_counter()
+    for _ in range(number):
+        pass
+    return best - (perf_counter() - started) / number
+
+
+def memory_round(server, sender, chunks) -> float:
+    """Разбор и обработка пачек кадров как в ClientProtocol.data_received, без системных вызовов
+
+    Возвращает процессорное время потока на сообщение.
+    """
+    decoder = server.decoders[sender]
+    count = 0
+    started = time.thread_time()
+    for chunk in chunks:
+        decoder.feed(chunk)
+        for message in decoder.messages():
+            server.process_message(message, sender, sender.address)
+            count += 1
+    elapsed = time.thread_time() - started
+    server.message_writer.flush()
+    return elapsed / count
+
+
+def drain(sock: socket.socket):
+    """Чтение и отбрасывание всего, что приходит в сокет"""
+    try:
+        while sock.recv(262144):
+            pass
+    except OSError:
+        pass
+
+
+def flood(port: int, count: int, text: int):
+    """Процесс-нагрузка: user1 отправляет count сообщений user2 кадрами версии 2"""
+    sockets = []
+    for user_id in ("user2", "user1"):
+        sock = socket.create_connection(('127.0.0.1', port))
+        sock.sendall(encode_message({'type': 'auth_request', 'user_id': user_id,
+                                     'protocol_version': FRAMED_PROTOCOL_VERSION}, LEGACY_PROTOCOL_VERSION))
+        sock.recv(65536)  # auth_response: дальше сервер ждет кадры
+        threading.Thread(target=drain, args=(sock,), daemon=True).start()
+        sockets.append(sock)
+    sockets[1].sendall(b''.join(
+        encode_message({'type': 'message', 'sender_id': 'user1', 'receiver_id': 'user2',
+                        'message_text': f"сообщение {n} " + "ж" * text}, FRAMED_PROTOCOL_VERSION)
+        for n in range(count)))
+    sys.stdin.read()  # соединения закрываются по команде основного процесса
+
+
+def socket_round(server, port, handled, args) -> float:
+    """Прогон через asyncio-сервер и настоящие сокеты; процессорное время процесса сервера на сообщение"""
+    target = next(handled) + args.messages
+    started = time.process_time()
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--flood', str(port),
+                                '--messages', str(args.messages), '--text', str(args.text)],
+                               stdin=subprocess.PIPE)
+    while next(handled) < target:
+        time.sleep(0.005)
+    elapsed = time.process_time() - started
+    process.communicate(b'')
+    server.message_writer.flush()
+    return elapsed / args.messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Накладные расходы метрик")
+    parser.add_argument('--messages', type=int, default=2000, help="сообщений в одном прогоне")
+    parser.add_argument('--rounds', type=int, default=20, help="прогонов в памяти")
+    parser.add_argument('--batch', type=int, default=16, help="кадров в одной порции данных сокета")
+    parser.add_argument('--text', type=int, default=100, help="длина текста сообщения, символов")
+    parser.add_argument('--socket-rounds', type=int, default=5, help="прогонов через сокеты")
+    parser.add_argument('--flood', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.flood:
+        flood(args.flood, args.messages, args.text)
+        return
+
+    database = Database(os.path.join(tempfile.mkdtemp(), "bench_metrics.db"))
+    frames = [encode_message({'type': 'message', 'sender_id': 'user1', 'receiver_id': 'user2',
+                              'message_text': f"сообщение {n} " + "ж" * args.text}, FRAMED_PROTOCOL_VERSION)
+              for n in range(args.messages)]
+    chunks = [b''.join(frames[i:i + args.batch]) for i in range(0, len(frames), args.batch)]
+    stdout = sys.stdout
+    # Вывод сервера (запуск, остановка) в измерение не входит
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        server, sender = setup_server(database)
+        cost = instrumentation_cost(server)
+        memory = statistics.median(memory_round(server, sender, chunks) for _ in range(args.rounds))
+        server.stop_server()
+
+        # Тот же поток сообщений через asyncio-сервер и сокеты от отдельного процесса
+        server = NetworkManager(database)
+        port = free_port()
+        server.start_server('127.0.0.1', port, mode='asyncio')
+        handled = itertools.count()
+        handle_text_message = server.message_handlers['message']
+
+        def counted(message, client_socket, address):
+            next(handled)
+            handle_text_message(message, client_socket, address)
+        server.message_handlers['message'] = counted
+        sockets = statistics.median(socket_round(server, port, handled, args) for _ in range(args.socket_rounds))
+        server.stop_server()
+    finally:
+        sys.stdout = stdout
+        database.close()
+
+    print("=" * 60)
+    print(f"Учет сообщения в метриках: {cost * 1e9:.0f} нс")
+    print("=" * 60)
+    print(f"{'Путь сообщения':<28} {'мкс/сообщ.':>11} {'сообщ./с':>10} {'метрики':>8}")
+    for name, path in ((f"в памяти, по {args.batch} кадров", memory), ("сокеты, asyncio", sockets)):
+        print(f"{name:<28} {path * 1e6:>11.2f} {1 / path:>10.0f} {cost / path * 100:>7.1f}%")
+
+
+if __name__ == "__main__":
+    main()
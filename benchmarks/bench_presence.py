@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк рассылки онлайн-статусов
+
+Справочник из N пользователей (по умолчанию 10 000), у каждого --contacts
+случайных контактов; все пользователи подключены имитированными клиентами.
+Во время замера --churn пользователей в секунду уходят из сети и
+возвращаются. Сравниваются:
+  "опрос"  - прежний клиент: user_list_request раз в CONTACTS_UPDATE_INTERVAL,
+             ответ - вся таблица пользователей,
+  "push"   - снимок при подключении и presence_delta только наблюдателям.
+Выводит байт/с, полученных клиентами, и процессорное время сервера.
+
+Пример:
+    python benchmarks/bench_presence.py --users 10000 --duration 20
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_server_load import process_memory, raise_fd_limit, run_server
+from src.database.database import Database
+
+
+def server_cpu(pid) -> float:
+    """Процессорное время процесса (user + system), секунды (только Linux)"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    except (OSError, IndexError, ValueError):
+        return 0.0
+
+
+def create_directory(db_path, users, contacts):
+    """Справочник пользователей и случайные списки контактов"""
+    database = Database(db_path)
+    rng = random.Random(20240601)
+    with database.connection() as conn:
+        conn.executemany("INSERT OR IGNORE INTO users (user_id, display_name) VALUES (?, ?)",
+                         ((f"bench{i}", f"Пользователь {i}") for i in range(users)))
+        conn.executemany("INSERT OR IGNORE INTO contacts (user_id, contact_id) VALUES (?, ?)",
+                         ((f"bench{i}", f"bench{j}") for i in range(users)
+                          for j in rng.sample(range(users), contacts) if j != i))
+    database.close()
+
+
+class PresenceClient:
+    """Имитированный клиент: считает полученные байты"""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.reader = None
+        self.writer = None
+        self.received = 0
+        self.first_data = asyncio.Event()
+
+    async def connect(self, host, port):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        asyncio.ensure_future(self.read_loop())
+
+    def send(self, message):
+        self.writer.write(json.dumps(message).encode('utf-8'))
+
+    async def read_loop(self):
+        while True:
+            try:
+                data = await self.reader.read(262144)
+            except ConnectionError:
+                return
+            if not data:
+                return
+            self.received += len(data)
+            self.first_data.set()
+
+
+async def run_clients(args, polling, pid):
+    clients = [PresenceClient(f"bench{i}") for i in range(args.users)]
+    connect_limit = asyncio.Semaphore(500)
+
+    async def setup(client):
+        async with connect_limit:
+            await client.connect(args.host, args.port)
+            client.send({'type': 'status_update', 'user_id': client.user_id, 'is_online': True})
+            # Первое, что присылает сервер после status_update, - снимок статусов
+            await asyncio.wait_for(client.first_data.wait(), timeout=args.setup_timeout)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(setup(c) for c in clients), return_exceptions=True)
+    live = [c for c, r in zip(clients, results) if not isinstance(r, Exception)]
+    print(f"Подключено клиентов: {len(live)}/{args.users} за {time.perf_counter() - started:.1f} с")
+    await asyncio.sleep(1)
+
+    rng = random.Random(1)
+    deadline = time.perf_counter() + args.duration
+
+    async def poll_loop(client):
+        # Прежний клиент: полный список пользователей раз в интервал, старт вразброс
+        await asyncio.sleep(rng.uniform(0, args.poll_interval))
+        while time.perf_counter() < deadline:
+            client.send({'type': 'user_list_request', 'user_id': client.user_id})
+            await asyncio.sleep(args.poll_interval)
+
+    async def churn_loop():
+        # Пользователи уходят из сети и через 0.5 с возвращаются
+        while time.perf_counter() < deadline:
+            for client in rng.sample(live, min(args.churn, len(live))):
+                client.send({'type': 'status_update', 'user_id': client.user_id, 'is_online': False})
+                asyncio.get_running_loop().call_later(0.5, client.send, {
+                    'type': 'status_update', 'user_id': client.user_id, 'is_online': True})
+            await asyncio.sleep(1)
+
+    received_before = sum(c.received for c in live)
+    cpu_before = server_cpu(pid)
+    started = time.perf_counter()
+    tasks = [churn_loop()]
+    if polling:
+        tasks.extend(poll_loop(c) for c in live)
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    received = sum(c.received for c in live) - received_before
+    cpu = server_cpu(pid) - cpu_before
+
+    for client in live:
+        client.writer.close()
+    return {'bytes': received / elapsed, 'cpu': cpu / elapsed}
+
+
+def run_mode(args, db_path, polling):
+    """Сервер в отдельном процессе и нагрузка одного режима"""
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=run_server,
+                                     args=(args.host, args.port, 'asyncio', db_path, ready))
+    server.daemon = True
+    server.start()
+    ready.wait(timeout=30)
+    try:
+        result = asyncio.run(run_clients(args, polling, server.pid))
+        result['rss'], _ = process_memory(server.pid)
+        return result
+    finally:
+        server.terminate()
+        server.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Рассылка онлайн-статусов")
+    parser.add_argument('--users', type=int, default=10000, help="пользователей (все подключены)")
+    parser.add_argument('--contacts', type=int, default=20, help="контактов у каждого пользователя")
+    parser.add_argument('--churn', type=int, default=20, help="смен статуса в секунду")
+    parser.add_argument('--duration', type=float, default=20.0, help="длительность замера, с")
+    parser.add_argument('--poll-interval', type=float, default=5.0,
+                        help="интервал user_list_request в режиме опроса, с (CONTACTS_UPDATE_INTERVAL)")
+    parser.add_argument('--setup-timeout', type=float, default=300.0)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=47996)
+    args = parser.parse_args()
+
+    limit = raise_fd_limit()
+    db_path = os.path.join(tempfile.mkdtemp(), "bench_presence.db")
+    create_directory(db_path, args.users, args.contacts)
+
+    print("=" * 70)
+    print(f"{args.users} пользователей по {args.contacts} контактов, {args.churn} смен статуса/с, "
+          f"лимит файлов {limit}")
+    print("=" * 70)
+    results = {}
+    for name, polling in [("опрос", True), ("push", False)]:
+        print(f"Режим: {name}")
+        results[name] = run_mode(args, db_path, polling)
+
+    print("=" * 70)
+    print(f"{'Режим':<8} {'получено клиентами':>22} {'CPU сервера':>14} {'память сервера':>16}")
+    for name, result in results.items():
+        print(f"{name:<8} {result['bytes'] / 1024:>16.1f} КБ/с {result['cpu'] * 100:>12.1f} % "
+              f"{result['rss']:>16}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк счетчиков непрочитанных (таблица read_state)
+
+Диалог user1 <-> user2 из N сообщений (по умолчанию 1 000 000). Измеряется:
+  - отметка прочтения после прихода --new новых сообщений:
+      "курсор"  - mark_conversation_read: флаг is_read только между прежним
+                  и новым курсором, счетчик - по индексу после курсора,
+      "прежняя" - UPDATE всех сообщений диалога от собеседника;
+  - первая отметка, когда непрочитана вся история (перенос старой базы);
+  - счетчики при подключении: get_unread_counts против подсчета по messages;
+  - стоимость счетчика при вставке (add_messages пакетами) для пакетов с
+    немногими и со всеми разными парами отправитель-получатель.
+
+Пример:
+    python benchmarks/bench_read_state.py --messages 1000000 --new 10 --repeat 50
+"""
+
+import argparse
+import contextlib
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from src.database.database import Database, conversation_key
+
+
+LEGACY_MARK_READ = '''
+    UPDATE messages
+    SET is_read = TRUE
+    WHERE conversation = ? AND sender_id = ? AND receiver_id = ?
+'''
+
+LEGACY_UNREAD_COUNTS = '''
+    SELECT sender_id, COUNT(*) FROM messages
+    WHERE receiver_id = ? AND is_read = FALSE
+    GROUP BY sender_id
+'''
+
+
+def open_database(path):
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        return Database(path)
+
+
+def fill_conversation(database, count, batch=50000):
+    """Диалог user1 <-> user2 из count сообщений (мимо счетчика - как перенос старой базы)"""
+    key = conversation_key("user1", "user2")
+    first = database.allocate_message_ids(count)
+    for start in range(0, count, batch):
+        with database.connection() as conn:
+            conn.executemany(
+                "INSERT INTO messages (id, sender_id, receiver_id, message_text, conversation) VALUES (?, ?, ?, ?, ?)",
+                ((first + i,) + (("user1", "user2") if i % 2 else ("user2", "user1")) + (f"Сообщение {i}", key)
+                 for i in range(start, min(start + batch, count))))
+
+
+def incoming(database, count):
+    database.add_messages([{'sender_id': "user2", 'receiver_id': "user1", 'message_text': "новое"}
+                           for _ in range(count)])
+
+
+def timed(function):
+    started = time.perf_counter()
+    result = function()
+    return time.perf_counter() - started, result
+
+
+def summary(timings):
+    timings = sorted(timings)
+    return statistics.median(timings) * 1000, timings[int(len(timings) * 0.95)] * 1000
+
+
+def insert_rate(directory, count, batch, pairs, counters):
+    """Сообщений в секунду через add_messages пакетами по batch (pairs разных получателей в пакете)"""
+    database = open_database(os.path.join(directory, f"insert_{pairs}_{counters}.db"))
+    if not counters:
+        database._count_unread = lambda conn, messages: None
+    messages = [{'sender_id': "user2", 'receiver_id': f"user{i % pairs}", 'message_text': f"Сообщение {i}"}
+                for i in range(batch)]
+    started = time.perf_counter()
+    for _ in range(count // batch):
+        database.add_messages(messages)
+    elapsed = time.perf_counter() - started
+    database.close()
+    return count // batch * batch / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Отметка прочтения и счетчики непрочитанных")
+    parser.add_argument('--messages', type=int, default=1000000, help="сообщений в диалоге")
+    parser.add_argument('--new', type=int, default=10, help="новых сообщений перед каждой отметкой")
+    parser.add_argument('--repeat', type=int, default=50, help="отметок на каждый способ")
+    parser.add_argument('--insert', type=int, default=100000, help="сообщений для замера вставки")
+    parser.add_argument('--batch', type=int, default=500, help="размер пакета add_messages")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    database = open_database(os.path.join(directory, "bench_read_state.db"))
+    fill_time, _ = timed(lambda: fill_conversation(database, args.messages))
+    size = os.path.getsize(database.db_path) / 1024 / 1024
+
+    # Перенос: вся история непрочитана, первая отметка проставляет флаг всем сообщениям
+    first_mark, state = timed(lambda: database.mark_conversation_read("user1", "user2"))
+    assert state['unread'] == 0
+
+    cursor_timings, legacy_timings = [], []
+    for _ in range(args.repeat):
+        incoming(database, args.new)
+        cursor_timings.append(timed(lambda: database.mark_conversation_read("user1", "user2"))[0])
+        incoming(database, args.new)
+
+        def legacy():
+            with database.connection() as conn:
+                conn.execute(LEGACY_MARK_READ, (conversation_key("user1", "user2"), "user2", "user1"))
+        legacy_timings.append(timed(legacy)[0])
+
+    # Прежний UPDATE не ведет счетчик - пересчет перед замером подключения
+    database.mark_conversation_read("user1", "user2")
+    incoming(database, args.new)
+
+    def legacy_counts():
+        with database.connection() as conn:
+            return conn.execute(LEGACY_UNREAD_COUNTS, ("user1",)).fetchall()
+    login_timings = [timed(lambda: database.get_unread_counts("user1"))[0] for _ in range(args.repeat)]
+    legacy_login = [timed(legacy_counts)[0] for _ in range(5)]
+    assert database.get_unread_counts("user1")[0]['unread'] == args.new == legacy_counts()[0][1]
+    database.close()
+
+    rates = [(pairs, insert_rate(directory, args.insert, args.batch, pairs, True),
+              insert_rate(directory, args.insert, args.batch, pairs, False)) for pairs in (2, args.batch)]
+
+    print("=" * 72)
+    print(f"Диалог {args.messages} сообщений ({size:.0f} МБ, заполнение {fill_time:.1f} с), "
+          f"{args.new} новых перед отметкой")
+    print("=" * 72)
+    print(f"{'операция':<40} {'p50 мс':>10} {'p95 мс':>10}")
+    print(f"{'отметка прочтения: курсор':<40} {summary(cursor_timings)[0]:>10.3f} {summary(cursor_timings)[1]:>10.3f}")
+    print(f"{'отметка прочтения: прежняя':<40} {summary(legacy_timings)[0]:>10.1f} {summary(legacy_timings)[1]:>10.1f}")
+    print(f"{'первая отметка всей истории':<40} {first_mark * 1000:>10.1f}")
+    print(f"{'счетчики при подключении: read_state':<40} {summary(login_timings)[0]:>10.3f} "
+          f"{summary(login_timings)[1]:>10.3f}")
+    print(f"{'счетчики при подключении: по messages':<40} {summary(legacy_login)[0]:>10.1f} "
+          f"{summary(legacy_login)[1]:>10.1f}")
+    for pairs, with_counters, without_counters in rates:
+        print(f"Вставка по {args.batch}, {pairs} пар в пакете: {with_counters:,.0f} сообщений/с со счетчиком, "
+              f"{without_counters:,.0f} без него (+{100 * (without_counters / with_counters - 1):.1f}% времени)")
+
+
+if __name__ == "__main__":
+    main()
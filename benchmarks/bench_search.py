@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк полнотекстового поиска по сообщениям (индекс messages_fts)
+
+Корпус из N сообщений (по умолчанию 2 000 000): --users пользователей, у
+каждого --contacts собеседников, и группы по --group-size участников; слова
+сообщений выбираются из словаря по закону Ципфа (частые слова встречаются в
+сотнях тысяч сообщений, редкие - в единицах). Измеряется:
+  - построение индекса по уже заполненной базе (миграция) и его размер,
+  - первая страница поиска (search_messages, --limit результатов) по всем
+    диалогам пользователя и в одном диалоге для редких, средних и частых
+    слов и запросов из двух слов; следующая страница по курсору,
+  - для сравнения - поиск без индекса (LIKE по messages диалогов пользователя),
+  - стоимость индекса при вставке (add_messages пакетами с индексом и без).
+
+Пример:
+    python benchmarks/bench_search.py --messages 2000000 --queries 200
+"""
+
+import argparse
+import contextlib
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from src.database.database import Database, conversation_key, group_conversation
+
+LIKE_SEARCH = '''
+    SELECT id FROM messages
+    WHERE ? IN (sender_id, receiver_id) AND message_text LIKE ?
+    ORDER BY id DESC
+    LIMIT ?
+'''
+
+SEARCH_TRIGGERS = ("messages_fts_delete", "messages_fts_update")
+SYLLABLES = ["ба", "ве", "ги", "до", "жу", "за", "ки", "ло", "ми", "но", "пу", "ра", "си", "ту", "фе",
+             "ха", "це", "чи", "ша", "ны", "ль", "ск", "ст", "пр", "тр"]
+
+
+def open_database(path):
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        return Database(path)
+
+
+def make_words(count):
+    """Словарь из count различных слов (2-4 слога)"""
+    rng = random.Random(1)
+    words = set()
+    while len(words) < count:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    words = sorted(words)
+    rng.shuffle(words)
+    return words
+
+
+def drop_search_index(database):
+    """База без индекса: как до миграции"""
+    with database.connection() as conn:
+        for name in SEARCH_TRIGGERS:
+            conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        conn.execute("DROP TABLE IF EXISTS messages_fts")
+
+
+def fill_corpus(database, args, words):
+    """Сообщения личных диалогов и групп мимо индекса; возвращает (пользователи, их собеседники)"""
+    rng = random.Random(2)
+    users = [f"u{i:05d}" for i in range(args.users)]
+    contacts = {user: rng.sample(users, args.contacts) for user in users}
+    groups = {}
+    with database.connection() as conn:
+        for g in range(args.users // args.group_size):
+            conn.execute("INSERT INTO groups (name, owner_id) VALUES (?, ?)", (f"Группа {g}", users[0]))
+            group_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            members = rng.sample(users, args.group_size)
+            conn.executemany("INSERT INTO group_members (group_id, user_id) VALUES (?, ?)",
+                             [(group_id, member) for member in members])
+            groups[group_conversation(group_id)] = members
+        conn.commit()
+    group_keys = list(groups)
+
+    cum_weights, total = [], 0.0
+    for rank in range(1, len(words) + 1):
+        total += 1.0 / rank
+        cum_weights.append(total)
+
+    def rows(count):
+        for _ in range(count):
+            text = ' '.join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(3, 15)))
+            if group_keys and rng.random() < 0.1:
+                receiver = rng.choice(group_keys)
+                yield rng.choice(groups[receiver]), receiver, text, receiver
+            else:
+                sender = rng.choice(users)
+                receiver = rng.choice(contacts[sender])
+                yield sender, receiver, text, conversation_key(sender, receiver)
+
+    batch = 100000
+    for start in range(0, args.messages, batch):
+        with database.connection() as conn:
+            conn.executemany("INSERT INTO messages (sender_id, receiver_id, message_text, conversation) "
+                             "VALUES (?, ?, ?, ?)", rows(min(batch, args.messages - start)))
+            conn.commit()
+    return users, contacts
+
+
+def index_size(database):
+    """Размер таблиц индекса messages_fts, МБ"""
+    with database.connection() as conn:
+        return conn.execute("SELECT SUM(pgsize) FROM dbstat WHERE name LIKE 'messages_fts%'").fetchone()[0] / 2 ** 20
+
+
+def percentiles(timings):
+    timings = sorted(timings)
+    return [timings[min(len(timings) - 1, int(len(timings) * p))] * 1000 for p in (0.5, 0.95, 0.99)]
+
+
+def insert_rate(directory, count, batch, indexed):
+    """Сообщений в секунду через add_messages пакетами по batch"""
+    database = open_database(os.path.join(directory, f"insert_{indexed}.db"))
+    if not indexed:
+        database._index_messages = lambda conn, messages: None
+    rng = random.Random(3)
+    words = make_words(5000)
+    messages = [{'sender_id': "user2", 'receiver_id': f"user{i % 3 + 1}",
+                 'message_text': ' '.join(rng.choices(words, k=rng.randint(3, 15)))} for i in range(batch)]
+    started = time.perf_counter()
+    for _ in range(count // batch):
+        database.add_messages(messages)
+    elapsed = time.perf_counter() - started
+    database.close()
+    return count // batch * batch / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Полнотекстовый поиск по сообщениям")
+    parser.add_argument('--messages', type=int, default=2000000, help="сообщений в корпусе")
+    parser.add_argument('--users', type=int, default=1000, help="пользователей")
+    parser.add_argument('--contacts', type=int, default=20, help="собеседников у пользователя")
+    parser.add_argument('--group-size', type=int, default=50, help="участников группы")
+    parser.add_argument('--words', type=int, default=50000, help="размер словаря")
+    parser.add_argument('--queries', type=int, default=200, help="запросов на каждый вид")
+    parser.add_argument('--limit', type=int, default=20, help="результатов на странице")
+    parser.add_argument('--insert', type=int, default=100000, help="сообщений для замера вставки")
+    parser.add_argument('--batch', type=int, default=500, help="размер пакета add_messages")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    database = open_database(os.path.join(directory, "bench_search.db"))
+    drop_search_index(database)
+    words = make_words(args.words)
+    started = time.perf_counter()
+    users, contacts = fill_corpus(database, args, words)
+    fill_time = time.perf_counter() - started
+
+    with database.connection() as conn:
+        started = time.perf_counter()
+        database._migrate_search(conn)
+        conn.commit()
+        build_time = time.perf_counter() - started
+    size = index_size(database)
+    database_size = os.path.getsize(database.db_path) / 2 ** 20
+
+    rng = random.Random(4)
+    bands = [("редкое слово", 5000, len(words)), ("среднее слово", 200, 2000), ("частое слово", 1, 50)]
+    queries = [(name, lambda low=low, high=high: words[rng.randrange(low, high)]) for name, low, high in bands]
+    queries.append(("два средних слова", lambda: f"{words[rng.randrange(20, 500)]} {words[rng.randrange(20, 500)]}"))
+
+    results = []
+    for name, make_query in queries:
+        for scope in ("все диалоги", "один диалог"):
+            timings, next_timings, found = [], [], 0
+            for _ in range(args.queries):
+                user = rng.choice(users)
+                conversation = rng.choice(contacts[user]) if scope == "один диалог" else None
+                query = make_query()
+                started = time.perf_counter()
+                page = database.search_messages(user, query, conversation, args.limit)
+                timings.append(time.perf_counter() - started)
+                found += len(page['messages'])
+                if page['cursor']:
+                    started = time.perf_counter()
+                    database.search_messages(user, query, conversation, args.limit, page['cursor'])
+                    next_timings.append(time.perf_counter() - started)
+            results.append((f"{name}, {scope}", percentiles(timings),
+                            percentiles(next_timings)[2] if next_timings else None, found / args.queries))
+
+    like_timings = []
+    for _ in range(5):
+        with database.connection() as conn:
+            started = time.perf_counter()
+            conn.execute(LIKE_SEARCH, (rng.choice(users), f"%{words[rng.randrange(200, 2000)]}%", args.limit)).fetchall()
+            like_timings.append(time.perf_counter() - started)
+    database.close()
+
+    rates = [insert_rate(directory, args.insert, args.batch, indexed) for indexed in (True, False)]
+
+    print("=" * 96)
+    print(f"Корпус {args.messages} сообщений, {args.users} пользователей, словарь {args.words} слов "
+          f"(заполнение {fill_time:.0f} с)")
+    print(f"Построение индекса {build_time:.1f} с, размер индекса {size:.0f} МБ "
+          f"(база с индексом {database_size:.0f} МБ)")
+    print("=" * 96)
+    print(f"{'запрос':<40} {'p50 мс':>8} {'p95 мс':>8} {'p99 мс':>8} {'след. стр. p99':>15} {'найдено':>8}")
+    for name, (p50, p95, p99), next_p99, found in results:
+        next_text = f"{next_p99:.2f}" if next_p99 is not None else "-"
+        print(f"{name:<40} {p50:>8.2f} {p95:>8.2f} {p99:>8.2f} {next_text:>15} {found:>8.1f}")
+    print(f"{'LIKE без индекса (среднее слово)':<40} {percentiles(like_timings)[0]:>8.0f}")
+    print(f"Вставка по {args.batch}: {rates[0]:,.0f} сообщений/с с индексом, {rates[1]:,.0f} без него "
+          f"(+{100 * (rates[1] / rates[0] - 1):.0f}% времени)")
+
+
+if __name__ == "__main__":
+    main()
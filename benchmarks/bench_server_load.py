@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Нагрузочный тест сервера Aleph Messenger
+
+Открывает N имитированных клиентов к серверу на localhost и выводит:
+количество удерживаемых подключений, сообщений в секунду и задержку доставки (p50/p99).
+
+Примеры:
+    python benchmarks/bench_server_load.py --clients 10000 --mode asyncio
+    python benchmarks/bench_server_load.py --clients 1000 --mode threaded
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+
+def raise_fd_limit():
+    """Увеличение лимита открытых файлов до максимального"""
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        return hard
+    except (ImportError, ValueError, OSError):
+        return None
+
+
+def run_server(host, port, mode, db_path, ready, overrides=None):
+    """Запуск сервера в отдельном процессе (overrides - замена настроек server_config)"""
+    raise_fd_limit()
+    # Сервер много пишет в stdout - отправляем вывод в никуда
+    sys.stdout = open(os.devnull, 'w')
+
+    from src.config import server_config
+    from src.database.database import Database
+    from src.network.network_manager import NetworkManager
+
+    for name, value in (overrides or {}).items():
+        setattr(server_config, name, value)
+
+    network_manager = NetworkManager(Database(db_path))
+    if not network_manager.start_server(host, port, mode=mode):
+        ready.set()
+        return
+    ready.set()
+    while network_manager.is_running:
+        time.sleep(1)
+
+
+def process_memory(pid):
+    """Резидентная память и число потоков процесса (только Linux)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+        return fields['VmRSS'].strip(), fields['Threads'].strip()
+    except (OSError, KeyError):
+        return "н/д", "н/д"
+
+
+class BenchClient:
+    """Имитированный клиент с потоковым разбором JSON"""
+
+    decoder = json.JSONDecoder()
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.reader = None
+        self.writer = None
+        self.buffer = ""
+        self.ack = asyncio.Event()
+        self.echo = asyncio.Event()
+        self.latencies = None
+        self.closed = False
+
+    async def connect(self, host, port):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+
+    def send(self, message):
+        self.writer.write(json.dumps(message).encode('utf-8'))
+
+    async def read_loop(self):
+        while True:
+            data = await self.reader.read(65536)
+            if not data:
+                self.closed = True
+                return
+            self.buffer += data.decode('utf-8')
+            while self.buffer:
+                try:
+                    message, end = self.decoder.raw_decode(self.buffer)
+                except json.JSONDecodeError:
+                    break
+                self.buffer = self.buffer[end:].lstrip()
+                self.on_message(message)
+
+    def on_message(self, message):
+        message_type = message.get('type')
+        if message_type == 'user_list_response':
+            self.ack.set()
+        elif message_type == 'message':
+            if message['sender_id'] == self.user_id:
+                self.echo.set()
+            elif self.latencies is not None:
+                sent_at = float(message['message_text'].split()[1])
+                self.latencies.append(time.perf_counter() - sent_at)
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def run_clients(args):
+    clients = [BenchClient(f"bench{i}") for i in range(args.clients)]
+    connect_limit = asyncio.Semaphore(500)
+
+    async def setup(client):
+        async with connect_limit:
+            await client.connect(args.host, args.port)
+            asyncio.ensure_future(client.read_loop())
+            client.send({'type': 'status_update', 'user_id': client.user_id, 'is_online': True})
+            await client.writer.drain()
+            # Ответ на user_list_request подтверждает, что status_update обработан сервером
+            await asyncio.sleep(0.05)
+            client.send({'type': 'user_list_request', 'user_id': client.user_id})
+            await asyncio.wait_for(client.ack.wait(), timeout=args.setup_timeout)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(setup(c) for c in clients), return_exceptions=True)
+    failed = sum(1 for r in results if isinstance(r, Exception))
+    print(f"Подключено клиентов: {args.clients - failed}/{args.clients} "
+          f"за {time.perf_counter() - started:.1f} с")
+
+    await asyncio.sleep(args.hold)
+    held = sum(1 for c, r in zip(clients, results) if not isinstance(r, Exception) and not c.closed)
+    print(f"Удерживается подключений через {args.hold} с: {held}")
+
+    # Фаза обмена сообщениями: отправители пишут получателям из второй половины
+    live = [c for c, r in zip(clients, results) if not isinstance(r, Exception)]
+    half = len(live) // 2
+    senders = live[:min(args.senders, half)]
+    receivers = live[half:half + len(senders)]
+    latencies = []
+    for receiver in receivers:
+        receiver.latencies = latencies
+
+    deadline = time.perf_counter() + args.duration
+    sent = 0
+
+    async def send_loop(sender, receiver):
+        nonlocal sent
+        while time.perf_counter() < deadline:
+            sender.echo.clear()
+            sender.send({
+                'type': 'message',
+                'sender_id': sender.user_id,
+                'receiver_id': receiver.user_id,
+                'message_text': f"bench {time.perf_counter():.9f}"
+            })
+            sent += 1
+            try:
+                await asyncio.wait_for(sender.echo.wait(), timeout=10)
+            except asyncio.TimeoutError:
+                return
+
+    started = time.perf_counter()
+    await asyncio.gather(*(send_loop(s, r) for s, r in zip(senders, receivers)))
+    await asyncio.sleep(0.5)
+    elapsed = time.perf_counter() - started
+
+    print(f"Отправителей: {len(senders)}, отправлено: {sent}, доставлено: {len(latencies)}")
+    print(f"Сообщений в секунду: {len(latencies) / elapsed:.0f}")
+    print(f"Задержка доставки p50: {percentile(latencies, 0.50) * 1000:.2f} мс, "
+          f"p99: {percentile(latencies, 0.99) * 1000:.2f} мс")
+
+    for client in live:
+        client.writer.close()
+
+    return {
+        'held': held,
+        'rate': len(latencies) / elapsed,
+        'p50': percentile(latencies, 0.50),
+        'p99': percentile(latencies, 0.99),
+    }
+
+
+def run_benchmark(args, overrides=None):
+    """Запуск сервера в отдельном процессе и нагрузки на него"""
+    db_path = os.path.join(tempfile.mkdtemp(), "bench_server.db")
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=run_server,
+                                     args=(args.host, args.port, args.mode, db_path, ready, overrides))
+    server.daemon = True
+    server.start()
+    ready.wait(timeout=30)
+
+    try:
+        results = asyncio.run(run_clients(args))
+        rss, threads = process_memory(server.pid)
+        print(f"Память сервера: {rss}, потоков: {threads}")
+        return results
+    finally:
+        server.terminate()
+        server.join()
+
+
+def build_parser(description="Нагрузочный тест сервера"):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--clients', type=int, default=1000, help="число имитированных клиентов")
+    parser.add_argument('--senders', type=int, default=100, help="число одновременно пишущих клиентов")
+    parser.add_argument('--duration', type=float, default=10.0, help="длительность фазы сообщений, с")
+    parser.add_argument('--hold', type=float, default=2.0, help="время удержания простаивающих подключений, с")
+    parser.add_argument('--setup-timeout', type=float, default=300.0, help="ожидание регистрации клиента, с")
+    parser.add_argument('--mode', choices=['asyncio', 'threaded'], default='asyncio')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=47995)
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+
+    limit = raise_fd_limit()
+    print("=" * 50)
+    print(f"Нагрузочный тест: {args.clients} клиентов, режим {args.mode}, лимит файлов {limit}")
+    print("=" * 50)
+
+    run_benchmark(args)
+
+
+if __name__ == "__main__":
+    main()
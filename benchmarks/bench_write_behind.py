@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк отложенной записи сообщений (write-behind)
+
+1. Пропускная способность вставки: несколько потоков-отправителей пишут
+   сообщения синхронно (add_message) или через MessageWriteQueue.
+2. Задержка доставки p99 под нагрузкой на сервер с очередью и без нее.
+
+Пример:
+    python benchmarks/bench_write_behind.py --messages 20000 --clients 200
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.database.database import Database
+from src.database.write_behind import MessageWriteQueue
+from bench_server_load import build_parser, raise_fd_limit, run_benchmark
+
+
+def insert_throughput(total, threads, write_behind):
+    """Сообщений в секунду до их полной записи в SQLite"""
+    database = Database(os.path.join(tempfile.mkdtemp(), "bench_write_behind.db"))
+    writer = MessageWriteQueue(database) if write_behind else None
+    if writer:
+        writer.start()
+
+    def sender(n):
+        for i in range(total // threads):
+            message = {'sender_id': f"user{n}", 'receiver_id': "user1",
+                       'message_text': f"Сообщение {i}", 'timestamp': time.time()}
+            if writer:
+                writer.enqueue(message)
+            else:
+                database.add_message(message['sender_id'], message['receiver_id'], message['message_text'])
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=sender, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    if writer:
+        writer.stop()
+    elapsed = time.perf_counter() - started
+
+    database.close()
+    return (total // threads) * threads / elapsed
+
+
+def main():
+    parser = build_parser("Бенчмарк отложенной записи сообщений")
+    parser.add_argument('--messages', type=int, default=20000, help="сообщений в тесте вставки")
+    parser.add_argument('--threads', type=int, default=8, help="потоков-отправителей в тесте вставки")
+    args = parser.parse_args()
+    raise_fd_limit()
+
+    print("=" * 60)
+    print("Вставка сообщений в SQLite")
+    print("=" * 60)
+    sync_rate = insert_throughput(args.messages, args.threads, write_behind=False)
+    queued_rate = insert_throughput(args.messages, args.threads, write_behind=True)
+    print(f"Синхронно (add_message): {sync_rate:>10.0f} сообщений/с")
+    print(f"Очередь write-behind:    {queued_rate:>10.0f} сообщений/с")
+
+    results = {}
+    for name, enabled in [("без очереди", False), ("с очередью", True)]:
+        print("=" * 60)
+        print(f"Доставка через сервер ({name}), клиентов: {args.clients}")
+        print("=" * 60)
+        results[name] = run_benchmark(args, {'MESSAGE_WRITE_BEHIND': enabled})
+
+    print("=" * 60)
+    for name, result in results.items():
+        print(f"{name:<12} {result['rate']:>8.0f} сообщений/с, "
+              f"p99 доставки {result['p99'] * 1000:.2f} мс")
+
+
+if __name__ == "__main__":
+    main()
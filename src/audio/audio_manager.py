@@ -1,7 +1,7 @@
 import pyaudio
+import random
 import socket
 import threading
-import time
 import wave
 import numpy as np
 from typing import Optional, Callable
@@ -17,6 +17,11 @@ except ImportError:
         from src.config import server_config as config
     except ImportError:
         from src.config import config
+from src.audio.codec import Resampler, available_codecs, create_codec
+from src.audio.jitter_buffer import JitterBuffer, MediaPacket, pack_packet, unpack_packet
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
 
 class AudioManager:
     def __init__(self):
@@ -24,7 +29,6 @@ class AudioManager:
         self.is_recording = False
         self.is_playing = False
         self.recording_thread = None
-        self.playing_thread = None
         self.udp_socket = None
         self.callback_function = None
         
@@ -38,24 +42,58 @@ class AudioManager:
         self.input_stream = None
         self.output_stream = None
         
-        # Буферы для аудио
-        self.audio_buffer = []
-        self.buffer_lock = threading.Lock()
+        # Кодек звонка, передискретизация и буфер воспроизведения принятых пакетов
+        self.set_codec('pcm')
+        self.sequence = 0  # Номер следующего отправляемого пакета
+        self.timestamp = 0  # Отметка времени следующего пакета (отсчеты)
+        self.ssrc = random.getrandbits(32)  # Идентификатор потока звонка
+    
+    def set_codec(self, name: str):
+        """Кодек звонка: кадры устройства переводятся в частоту кодека и обратно"""
+        self.codec = create_codec(name, self.sample_rate, self.chunk_size)
+        self.downsampler = Resampler(self.sample_rate, self.codec.sample_rate, self.chunk_size)
+        self.upsampler = Resampler(self.codec.sample_rate, self.sample_rate, self.codec.frame_samples)
+        # Буфер хранит декодированные кадры частоты кодека; отметки времени - в ее отсчетах
+        self.jitter_buffer = JitterBuffer(self.codec.sample_rate, self.codec.frame_samples, self.channels)
+    
+    def offered_codecs(self):
+        """Кодеки для поля codecs запроса на звонок (в порядке предпочтения)"""
+        return available_codecs()
     
-    def start_audio_call(self, remote_host: str, remote_port: int, is_caller: bool = True):
-        """Начало голосового звонка"""
+    def start_audio_call(self, remote_host: str, remote_port: int, is_caller: bool = True,
+                         codec: str = None):
+        """Начало голосового звонка
+        
+        codec - согласованный в call_response; без него - pcm, который есть у
+        любого собеседника, в том числе у клиентов без согласования кодеков.
+        """
         try:
+            self.set_codec(codec or 'pcm')
+            logger.info("Кодек звонка: %s, %.0f кбит/с", self.codec.name, self.codec.bitrate / 1000)
+            # Новый поток пакетов: случайные начальные номер и отметка времени, как в RTP
+            self.sequence = random.getrandbits(16)
+            self.timestamp = random.getrandbits(32)
+            self.ssrc = random.getrandbits(32)
+            
             # Создание UDP сокета для аудио
             self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
             
             if is_caller:
-                # Звонящий отправляет аудио на указанный адрес
+                # Звонящий отправляет аудио на указанный адрес (порт ретранслятора сервера)
                 self.remote_address = (remote_host, remote_port)
+                self.udp_socket.bind(('', 0))
             else:
                 # Получающий привязывает сокет к локальному порту
                 self.udp_socket.bind(('', remote_port))
                 self.remote_address = None
             
+            # Пакеты собеседника приходят на тот же сокет: ретранслятор отвечает на адрес,
+            # с которого пришли наши пакеты, - так проходит NAT
+            self.call_receiver_thread = threading.Thread(target=self._call_receiver_loop,
+                                                         args=(self.udp_socket,))
+            self.call_receiver_thread.daemon = True
+            self.call_receiver_thread.start()
+            
             # Запуск записи и воспроизведения
             self.start_recording()
             self.start_playing()
@@ -98,16 +136,19 @@ class AudioManager:
                 # Чтение аудио данных
                 audio_data = self.input_stream.read(self.chunk_size, exception_on_overflow=False)
                 
-                # Отправка аудио данных через UDP
-                if self.udp_socket and self.remote_address:
-                    self.udp_socket.sendto(audio_data, self.remote_address)
+                # Понижение частоты и сжатие кадра
+                payload = self.codec.encode(self.downsampler.process(audio_data))
+                packet = pack_packet(MediaPacket(self.sequence, self.timestamp, payload,
+                                                 self.codec.payload_type, self.ssrc))
+                self.sequence = (self.sequence + 1) % 65536
+                self.timestamp += self.codec.frame_samples
                 
-                # Сохранение в буфер для локального воспроизведения (эхо)
-                with self.buffer_lock:
-                    self.audio_buffer.append(audio_data)
-                    # Ограничение размера буфера
-                    if len(self.audio_buffer) > 10:
-                        self.audio_buffer.pop(0)
+                if self.udp_socket and self.remote_address:
+                    # Отправка аудио данных через UDP
+                    self.udp_socket.sendto(packet, self.remote_address)
+                else:
+                    # Собеседника нет - локальное воспроизведение (эхо) тем же путем, что и принятые
+                    self.receive_audio_data(packet)
                 
             except Exception as e:
                 print(f"Ошибка записи аудио: {e}")
@@ -124,62 +165,54 @@ class AudioManager:
             return
         
         try:
+            # Часы воспроизведения - устройство вывода: оно само запрашивает
+            # очередной кадр (stream_callback), когда доиграло предыдущий
             self.output_stream = self.audio.open(
                 format=self.format,
                 channels=self.channels,
                 rate=self.sample_rate,
                 output=True,
-                frames_per_buffer=self.chunk_size
+                frames_per_buffer=self.chunk_size,
+                stream_callback=self._playout_callback,
+                start=False
             )
             
             self.is_playing = True
-            self.playing_thread = threading.Thread(target=self._playing_loop)
-            self.playing_thread.daemon = True
-            self.playing_thread.start()
+            self.output_stream.start_stream()
             
             print("Воспроизведение аудио запущено")
             
         except Exception as e:
             print(f"Ошибка запуска воспроизведения: {e}")
     
-    def _playing_loop(self):
-        """Цикл воспроизведения аудио"""
-        while self.is_playing:
-            try:
-                # Получение аудио данных из буфера
-                audio_data = None
-                with self.buffer_lock:
-                    if self.audio_buffer:
-                        audio_data = self.audio_buffer.pop(0)
-                
-                if audio_data:
-                    # Воспроизведение аудио
-                    self.output_stream.write(audio_data)
-                else:
-                    # Небольшая задержка если нет данных
-                    time.sleep(0.01)
-                
-            except Exception as e:
-                print(f"Ошибка воспроизведения аудио: {e}")
-                break
-        
-        # Очистка
-        if self.output_stream:
-            self.output_stream.close()
-            self.output_stream = None
+    def _playout_callback(self, in_data, frame_count, time_info, status):
+        """Кадр для устройства вывода (вызывается PortAudio раз в длительность кадра)"""
+        if not self.is_playing:
+            return bytes(frame_count * self.channels * 2), pyaudio.paComplete
+        return self.upsampler.process(self.jitter_buffer.pop()), pyaudio.paContinue
     
     def receive_audio_data(self, audio_data: bytes):
         """Получение аудио данных от удаленного пользователя"""
         try:
-            # Добавление в буфер для воспроизведения
-            with self.buffer_lock:
-                self.audio_buffer.append(audio_data)
-                # Ограничение размера буфера
-                if len(self.audio_buffer) > 10:
-                    self.audio_buffer.pop(0)
+            packet = unpack_packet(audio_data)
+            if packet.payload_type != self.codec.payload_type:
+                raise ValueError(f"тип данных {packet.payload_type}, ожидается {self.codec.name}")
+            # В буфер попадает декодированный кадр: потери заполняются уже в PCM
+            self.jitter_buffer.push(packet._replace(payload=self.codec.decode(packet.payload)))
+        except ValueError as e:
+            logger.debug("Пропущен голосовой пакет: %s", e)
         except Exception as e:
             print(f"Ошибка получения аудио данных: {e}")
     
+    def _call_receiver_loop(self, udp_socket: socket.socket):
+        """Прием голосовых пакетов звонка до закрытия его сокета"""
+        while udp_socket is self.udp_socket:
+            try:
+                audio_data, address = udp_socket.recvfrom(65536)
+            except OSError:
+                break  # Сокет закрыт в stop_audio_call
+            self.receive_audio_data(audio_data)
+    
     def start_audio_receiver(self, local_port: int):
         """Запуск приемника аудио данных"""
         try:
@@ -204,7 +237,7 @@ class AudioManager:
         while hasattr(self, 'receiver_socket') and self.receiver_socket:
             try:
                 # Получение аудио данных
-                audio_data, address = self.receiver_socket.recvfrom(self.chunk_size * 2)
+                audio_data, address = self.receiver_socket.recvfrom(65536)
                 
                 # Обработка полученных данных
                 self.receive_audio_data(audio_data)
@@ -222,8 +255,6 @@ class AudioManager:
             # Остановка потоков
             if self.recording_thread:
                 self.recording_thread.join(timeout=1)
-            if self.playing_thread:
-                self.playing_thread.join(timeout=1)
             
             # Закрытие потоков аудио
             if self.input_stream:
@@ -231,6 +262,7 @@ class AudioManager:
                 self.input_stream = None
             
             if self.output_stream:
+                self.output_stream.stop_stream()
                 self.output_stream.close()
                 self.output_stream = None
             
@@ -239,9 +271,9 @@ class AudioManager:
                 self.udp_socket.close()
                 self.udp_socket = None
             
-            # Очистка буфера
-            with self.buffer_lock:
-                self.audio_buffer.clear()
+            # Статистика звонка и очистка буфера
+            logger.info("Буфер воспроизведения звонка: %s", self.jitter_buffer.snapshot())
+            self.jitter_buffer.reset()
             
             print("Голосовой звонок остановлен")
             
@@ -395,7 +427,9 @@ class AudioManager:
                     rate=self.sample_rate,
                     output=True,
                     output_device_index=device_index,
-                    frames_per_buffer=self.chunk_size
+                    frames_per_buffer=self.chunk_size,
+                    stream_callback=self._playout_callback,
+                    start=self.is_playing
                 )
                 print(f"Устройство вывода установлено: {device_info['name']}")
                 
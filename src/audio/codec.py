@@ -0,0 +1,225 @@
+from typing import List, Optional, Sequence
+import numpy as np
+import sys
+import os
+# Добавляем путь к src в PYTHONPATH
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+try:
+    from src.config import client_config as config
+except ImportError:
+    try:
+        from src.config import server_config as config
+    except ImportError:
+        from src.config import config
+from src.audio.jitter_buffer import PAYLOAD_PCM16
+
+try:
+    import opuslib
+except Exception:  # Нет пакета opuslib или системной библиотеки libopus
+    opuslib = None
+
+PAYLOAD_PCMU = 1  # G.711 µ-law, 8 бит на отсчет
+PAYLOAD_OPUS = 2
+
+# Фильтр передискретизации: пересечений нуля sinc с каждой стороны и полоса пропускания
+# (доля частоты Найквиста меньшей из частот)
+RESAMPLE_ZEROS = 24
+RESAMPLE_PASSBAND = 0.9
+
+MULAW_BIAS = 0x84
+MULAW_CLIP = 32635
+
+
+class Resampler:
+    """Передискретизация моно-потока кадрами фиксированной длины
+
+    Кадр from_rate длиной frame_in переводится в кадр to_rate длиной
+    frame_out = frame_in * to_rate / from_rate (должно быть целым - для
+    этого кадры звонка по 20 мс). Позиции выходных отсчетов повторяются от
+    кадра к кадру, поэтому веса фильтра (sinc с окном Блэкмана, полоса ниже
+    частоты Найквиста меньшей из частот) для каждого выходного отсчета
+    считаются один раз, и кадр обрабатывается одним матричным произведением.
+    Хвост предыдущего кадра сохраняется - на стыках кадров нет щелчков.
+    """
+
+    def __init__(self, from_rate: int, to_rate: int, frame_in: int):
+        if frame_in * to_rate % from_rate:
+            raise ValueError(f"Кадр {frame_in} отсчетов при {from_rate} Гц не делится на {to_rate} Гц")
+        self.from_rate = from_rate
+        self.to_rate = to_rate
+        self.frame_in = frame_in
+        self.frame_out = frame_in * to_rate // from_rate
+        self.passthrough = from_rate == to_rate
+        if self.passthrough:
+            return
+        # Частота среза в долях частоты входа и полуширина фильтра в отсчетах входа
+        cutoff = RESAMPLE_PASSBAND * min(from_rate, to_rate) / from_rate
+        self.half = int(np.ceil(RESAMPLE_ZEROS / cutoff))
+        # Выходной отсчет k - в позиции positions[k] кадра, задержанной на half отсчетов
+        positions = np.arange(self.frame_out) * (frame_in / self.frame_out) + self.half
+        first = np.floor(positions).astype(np.int64) - self.half + 1
+        self.indices = first[:, None] + np.arange(2 * self.half)
+        offsets = self.indices - positions[:, None]
+        weights = np.sinc(cutoff * offsets) * (0.42 + 0.5 * np.cos(np.pi * offsets / self.half)
+                                               + 0.08 * np.cos(2 * np.pi * offsets / self.half))
+        self.weights = weights / weights.sum(axis=1, keepdims=True)
+        self.reset()
+
+    @property
+    def delay(self) -> float:
+        """Задержка, вносимая фильтром (секунды)"""
+        return 0.0 if self.passthrough else self.half / self.from_rate
+
+    def reset(self):
+        if not self.passthrough:
+            self._history = np.zeros(2 * self.half)
+
+    def process(self, pcm: bytes) -> bytes:
+        if self.passthrough:
+            return pcm
+        samples = np.concatenate((self._history, np.frombuffer(pcm, dtype=np.int16)))
+        self._history = samples[-2 * self.half:]
+        result = np.einsum('ij,ij->i', samples[self.indices], self.weights)
+        return np.clip(np.rint(result), -32768, 32767).astype(np.int16).tobytes()
+
+
+class Codec:
+    """Кодек голосовых кадров: кадр PCM16 частоты sample_rate <-> данные пакета
+
+    Каждый пакет кодируется независимо или с состоянием, которое кодек
+    переносит сам (Opus), поэтому потерянный пакет не портит следующие.
+    """
+
+    name = 'pcm'
+    payload_type = PAYLOAD_PCM16
+
+    def __init__(self, sample_rate: int, frame_samples: int):
+        self.sample_rate = sample_rate
+        self.frame_samples = frame_samples
+
+    @property
+    def bitrate(self) -> float:
+        """Поток данных кадров без заголовков (бит/с); для кодеков с переменным потоком - оценка"""
+        return 16 * self.sample_rate
+
+    def encode(self, pcm: bytes) -> bytes:
+        return pcm
+
+    def decode(self, payload: bytes) -> bytes:
+        if len(payload) != self.frame_samples * 2:
+            raise ValueError(f"Кадр PCM {len(payload)} байт вместо {self.frame_samples * 2}")
+        return payload
+
+
+def _mulaw_tables():
+    # Таблица кодирования по всем 65536 значениям отсчета и таблица декодирования по 256 кодам
+    samples = np.arange(-32768, 32768, dtype=np.int32)
+    sign = np.where(samples < 0, 0x80, 0)
+    # Отсчет усекается до 14 бит, как в эталонной реализации G.711 (g711.c)
+    magnitude = np.minimum(np.abs(samples >> 2) << 2, MULAW_CLIP) + MULAW_BIAS
+    exponent = np.floor(np.log2(magnitude)).astype(np.int32) - 7
+    mantissa = (magnitude >> (exponent + 3)) & 0x0F
+    encode = (~(sign | (exponent << 4) | mantissa) & 0xFF).astype(np.uint8)
+    # Индекс таблицы - отсчет как беззнаковое число (представление int16 в uint16)
+    encode = np.roll(encode, -32768)
+
+    codes = ~np.arange(256, dtype=np.int32) & 0xFF
+    exponent = (codes >> 4) & 0x07
+    magnitude = (((codes & 0x0F) << 3) + MULAW_BIAS << exponent) - MULAW_BIAS
+    decode = np.where(codes & 0x80, -magnitude, magnitude).astype(np.int16)
+    return encode, decode
+
+
+class MuLawCodec(Codec):
+    """G.711 µ-law: 8 бит на отсчет, кодирование и декодирование - выборка из таблиц"""
+
+    name = 'pcmu'
+    payload_type = PAYLOAD_PCMU
+    _encode_table, _decode_table = _mulaw_tables()
+
+    @property
+    def bitrate(self) -> float:
+        return 8 * self.sample_rate
+
+    def encode(self, pcm: bytes) -> bytes:
+        return self._encode_table[np.frombuffer(pcm, dtype=np.uint16)].tobytes()
+
+    def decode(self, payload: bytes) -> bytes:
+        if len(payload) != self.frame_samples:
+            raise ValueError(f"Кадр µ-law {len(payload)} байт вместо {self.frame_samples}")
+        return self._decode_table[np.frombuffer(payload, dtype=np.uint8)].tobytes()
+
+
+class OpusCodec(Codec):
+    """Opus (пакет opuslib и библиотека libopus), режим VoIP с заданным потоком"""
+
+    name = 'opus'
+    payload_type = PAYLOAD_OPUS
+
+    def __init__(self, sample_rate: int, frame_samples: int):
+        super().__init__(sample_rate, frame_samples)
+        self.encoder = opuslib.Encoder(sample_rate, 1, opuslib.APPLICATION_VOIP)
+        self.encoder.bitrate = config.AUDIO_OPUS_BITRATE
+        self.decoder = opuslib.Decoder(sample_rate, 1)
+
+    @property
+    def bitrate(self) -> float:
+        return config.AUDIO_OPUS_BITRATE
+
+    def encode(self, pcm: bytes) -> bytes:
+        return self.encoder.encode(pcm, self.frame_samples)
+
+    def decode(self, payload: bytes) -> bytes:
+        try:
+            return self.decoder.decode(payload, self.frame_samples)
+        except opuslib.OpusError as e:
+            raise ValueError(f"Ошибка декодирования Opus: {e}")
+
+
+CODECS = {
+    'opus': OpusCodec,
+    'pcmu': MuLawCodec,
+    'pcm': Codec,
+}
+
+
+def available_codecs() -> List[str]:
+    """Кодеки, доступные на этой машине, в порядке предпочтения (AUDIO_CODECS)"""
+    names = []
+    for name in config.AUDIO_CODECS:
+        if name not in CODECS or (name == 'opus' and opuslib is None):
+            continue
+        # Сжатие и передискретизация - только для моно
+        if name != 'pcm' and config.AUDIO_CHANNELS != 1:
+            continue
+        names.append(name)
+    if 'pcm' not in names:
+        names.append('pcm')  # Несжатый поток понимают все версии клиента
+    return names
+
+
+def negotiate_codec(offered: Optional[Sequence[str]]) -> str:
+    """Кодек для ответа на call_request: первый из предложенных, доступный здесь
+
+    Запрос без списка кодеков - от клиента без сжатия, ему отвечаем 'pcm'.
+    """
+    supported = available_codecs()
+    for name in offered or ():
+        if name in supported:
+            return name
+    return 'pcm'
+
+
+def create_codec(name: str, device_rate: int = None, frame_samples: int = None) -> Codec:
+    """Кодек для кадров устройства (device_rate, frame_samples); 'pcm' - без передискретизации"""
+    device_rate = device_rate or config.AUDIO_SAMPLE_RATE
+    frame_samples = frame_samples or config.AUDIO_CHUNK_SIZE
+    codec_class = CODECS.get(name)
+    if codec_class is None:
+        raise ValueError(f"Неизвестный кодек: {name}")
+    if codec_class is Codec:
+        return Codec(device_rate, frame_samples)
+    rate = config.AUDIO_CODEC_SAMPLE_RATE
+    return codec_class(rate, frame_samples * rate // device_rate)
+
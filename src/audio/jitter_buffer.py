@@ -0,0 +1,255 @@
+import math
+import struct
+import threading
+import time
+from typing import Dict, NamedTuple, Optional
+import numpy as np
+import sys
+import os
+# Добавляем путь к src в PYTHONPATH
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+try:
+    from src.config import client_config as config
+except ImportError:
+    try:
+        from src.config import server_config as config
+    except ImportError:
+        from src.config import config
+
+# Заголовок голосового пакета по образцу RTP (12 байт): версия, тип данных,
+# номер пакета, отметка времени в отсчетах, идентификатор источника
+MEDIA_HEADER = struct.Struct('!BBHII')
+MEDIA_VERSION = 2  # Два старших бита первого байта, как в RTP
+PAYLOAD_PCM16 = 0  # 16-битный PCM без сжатия
+
+SEQUENCE_MODULO = 1 << 16
+TIMESTAMP_MODULO = 1 << 32
+
+# Затухание повторяемого кадра при каждой следующей потере подряд
+PLC_FADE = 0.6
+# Сглаживание оценки джиттера (RFC 3550) и запас задержки в оценках джиттера
+JITTER_GAIN = 1 / 16
+JITTER_MARGIN = 4
+
+
+class MediaPacket(NamedTuple):
+    """Голосовой пакет: номер, отметка времени (отсчеты) и данные кадра"""
+    sequence: int
+    timestamp: int
+    payload: bytes
+    payload_type: int = PAYLOAD_PCM16
+    ssrc: int = 0
+
+
+def pack_packet(packet: MediaPacket) -> bytes:
+    """Пакет для отправки по UDP: заголовок и данные"""
+    return MEDIA_HEADER.pack(MEDIA_VERSION << 6, packet.payload_type, packet.sequence % SEQUENCE_MODULO,
+                             packet.timestamp % TIMESTAMP_MODULO, packet.ssrc) + packet.payload
+
+
+def unpack_packet(data: bytes) -> MediaPacket:
+    """Разбор принятой датаграммы (ValueError - не голосовой пакет)"""
+    if len(data) < MEDIA_HEADER.size:
+        raise ValueError(f"Пакет короче заголовка: {len(data)} байт")
+    flags, payload_type, sequence, timestamp, ssrc = MEDIA_HEADER.unpack_from(data)
+    if flags >> 6 != MEDIA_VERSION:
+        raise ValueError(f"Неизвестная версия пакета: {flags >> 6}")
+    return MediaPacket(sequence, timestamp, bytes(data[MEDIA_HEADER.size:]), payload_type, ssrc)
+
+
+def unwrap_sequence(sequence: int, reference: int) -> int:
+    """Расширенный номер пакета, ближайший к reference (с учетом перехода через 65535)"""
+    delta = (sequence - reference) % SEQUENCE_MODULO
+    if delta >= SEQUENCE_MODULO // 2:
+        delta -= SEQUENCE_MODULO
+    return reference + delta
+
+
+def conceal(previous: Optional[bytes], lost: int, frame_bytes: int) -> bytes:
+    """Кадр вместо потерянного: повтор последнего с затуханием, после AUDIO_PLC_MAX_FRAMES - тишина"""
+    if previous is None or lost > config.AUDIO_PLC_MAX_FRAMES:
+        return bytes(frame_bytes)
+    samples = np.frombuffer(previous, dtype=np.int16)
+    return (samples * PLC_FADE ** lost).astype(np.int16).tobytes()
+
+
+class JitterBuffer:
+    """Адаптивный буфер воспроизведения голосовых пакетов
+
+    Пакеты хранятся в кольцевом буфере фиксированного размера: пакет с
+    расширенным номером n лежит в ячейке n % capacity, поэтому вставка
+    пакета, пришедшего не по порядку, и выдача очередного кадра не
+    сдвигают остальные. pop() вызывается часами воспроизведения (устройством
+    вывода) один раз на кадр и всегда возвращает кадр: очередной пакет,
+    заполнение потерянного (conceal) или тишину до начала воспроизведения.
+
+    Целевая задержка следует за оценкой джиттера (RFC 3550). Недостающий
+    пакет считается потерянным, если по времени с прихода последнего пакета
+    уже должны были прийти пакеты на целевую задержку вперед: кадр
+    заполняется, и воспроизведение идет дальше. Иначе поток отстает (джиттер
+    вырос) - кадр заполняется без продвижения, и задержка растет на кадр.
+    Когда в буфере накопилось заметно больше цели, кадр пропускается.
+    Опоздавшие пакеты (номер уже воспроизведен) отбрасываются.
+    """
+
+    def __init__(self, sample_rate: int = None, frame_samples: int = None, channels: int = None,
+                 capacity: int = None, min_delay: float = None, max_delay: float = None):
+        self.sample_rate = sample_rate or config.AUDIO_SAMPLE_RATE
+        frame_samples = frame_samples or config.AUDIO_CHUNK_SIZE
+        self.frame_duration = frame_samples / self.sample_rate
+        self.frame_bytes = frame_samples * (channels or config.AUDIO_CHANNELS) * 2
+        self.capacity = capacity or config.AUDIO_JITTER_CAPACITY
+        self.min_frames = max(1, math.ceil((min_delay or config.AUDIO_JITTER_MIN_DELAY) / self.frame_duration))
+        self.max_frames = max(self.min_frames, min(self.capacity - 1, math.ceil(
+            (max_delay or config.AUDIO_JITTER_MAX_DELAY) / self.frame_duration)))
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Очистка буфера (новый звонок или перезапуск потока у отправителя)"""
+        with self._lock:
+            self._reset()
+            self.stats = {
+                'received': 0,     # принято пакетов
+                'played': 0,       # воспроизведено пакетов
+                'concealed': 0,    # заполнено потерянных кадров
+                'late': 0,         # отброшено опоздавших
+                'duplicate': 0,    # отброшено повторов
+                'dropped': 0,      # пропущено кадров для сокращения задержки
+                'underruns': 0,    # кадров без данных при пустом буфере
+                'resets': 0        # перезапусков потока
+            }
+
+    def _reset(self):
+        self._slots = [None] * self.capacity  # (расширенный номер, данные)
+        self._next = None  # Номер следующего кадра воспроизведения
+        self._highest = None  # Наибольший принятый номер
+        self._highest_arrival = 0.0  # Время его прихода
+        self._playing = False
+        self._last_frame = None
+        self._lost_run = 0
+        self._late_run = 0
+        self._previous = None  # (отметка времени, время прихода) предыдущего пакета
+        self.jitter = 0.0
+        self.target = self.min_frames
+
+    @property
+    def depth(self) -> int:
+        """Кадров от очередного до последнего принятого"""
+        if self._next is None:
+            return 0
+        return max(0, self._highest - self._next + 1)
+
+    @property
+    def delay(self) -> float:
+        """Текущая целевая задержка буфера (секунды)"""
+        return self.target * self.frame_duration
+
+    def push(self, packet: MediaPacket, arrival: float = None) -> bool:
+        """Постановка принятого пакета; False - пакет отброшен (опоздал или повтор)"""
+        if arrival is None:
+            arrival = time.monotonic()
+        with self._lock:
+            if self._next is None:
+                number = self._next = self._highest = packet.sequence
+                self._highest_arrival = arrival
+            else:
+                number = unwrap_sequence(packet.sequence, self._highest)
+            self._estimate_jitter(packet.timestamp, arrival)
+
+            if number < self._next:
+                self.stats['late'] += 1
+                self._late_run += 1
+                if self._late_run <= self.capacity:
+                    return False
+                # Все пакеты "из прошлого" - отправитель начал поток заново
+                number = self._restart(packet.sequence, arrival)
+            elif number >= self._next + self.capacity:
+                # Разрыв длиннее буфера - продолжаем с нового места
+                number = self._restart(packet.sequence, arrival)
+            self._late_run = 0
+
+            slot = number % self.capacity
+            entry = self._slots[slot]
+            if entry is not None and entry[0] == number:
+                self.stats['duplicate'] += 1
+                return False
+            self._slots[slot] = (number, packet.payload)
+            if number >= self._highest:
+                self._highest, self._highest_arrival = number, arrival
+            self.stats['received'] += 1
+            return True
+
+    def _restart(self, sequence: int, arrival: float) -> int:
+        stats, jitter, previous = self.stats, self.jitter, self._previous
+        self._reset()
+        self.stats, self.jitter, self._previous = stats, jitter, previous
+        self.stats['resets'] += 1
+        self._next = self._highest = sequence
+        self._highest_arrival = arrival
+        return sequence
+
+    def _estimate_jitter(self, timestamp: int, arrival: float):
+        if self._previous is not None:
+            previous_timestamp, previous_arrival = self._previous
+            sent = ((timestamp - previous_timestamp + TIMESTAMP_MODULO // 2) % TIMESTAMP_MODULO
+                    - TIMESTAMP_MODULO // 2) / self.sample_rate
+            deviation = abs((arrival - previous_arrival) - sent)
+            self.jitter += (deviation - self.jitter) * JITTER_GAIN
+            frames = math.ceil(JITTER_MARGIN * self.jitter / self.frame_duration)
+            self.target = min(self.max_frames, max(self.min_frames, frames))
+        self._previous = (timestamp, arrival)
+
+    def pop(self, now: float = None) -> bytes:
+        """Очередной кадр для устройства вывода (вызывается раз в длительность кадра)"""
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            if self._next is None:
+                return bytes(self.frame_bytes)
+            if not self._playing:
+                if self.depth < self.target:
+                    return bytes(self.frame_bytes)
+                # Начало воспроизведения с целевой задержкой, лишнее накопленное пропускается
+                self._skip_to(self._highest - self.target + 1)
+                self._playing = True
+
+            if self.depth > self.target + max(2, self.target // 2):
+                # Накопилось больше цели (джиттер спал) - пропуск кадра сокращает задержку
+                self._skip_to(self._next + 1)
+                self.stats['dropped'] += 1
+
+            slot = self._next % self.capacity
+            entry = self._slots[slot]
+            if entry is not None and entry[0] == self._next:
+                self._slots[slot] = None
+                self._next += 1
+                self._last_frame = entry[1]
+                self._lost_run = 0
+                self.stats['played'] += 1
+                return entry[1]
+
+            self._lost_run += 1
+            self.stats['concealed'] += 1
+            # Сколько кадров уже должно было прийти после очередного к этому моменту
+            expected = self._highest + (now - self._highest_arrival) / self.frame_duration
+            if expected - self._next + 1 < self.target:
+                # Поток отстает: кадр заполняется без продвижения - задержка растет на кадр
+                self.stats['underruns'] += 1
+            else:
+                self._next += 1
+            return conceal(self._last_frame, self._lost_run, self.frame_bytes)
+
+    def _skip_to(self, number: int):
+        while self._next < number:
+            slot = self._next % self.capacity
+            entry = self._slots[slot]
+            if entry is not None and entry[0] == self._next:
+                self._slots[slot] = None
+            self._next += 1
+
+    def snapshot(self) -> Dict:
+        """Счетчики и текущее состояние буфера"""
+        with self._lock:
+            return dict(self.stats, depth=self.depth, jitter=self.jitter, delay=self.delay)
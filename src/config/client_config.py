@@ -4,6 +4,7 @@
 # Настройки сервера
 SERVER_HOST = "127.0.0.1"  # IP-адрес сервера (localhost для локального подключения)
 SERVER_PORT = 47991         # Порт сервера (по умолчанию 47991)
+HANDSHAKE_TIMEOUT = 10      # Ожидание ответа на auth_request (секунды)
 
 # Настройки приложения
 APP_NAME = "Aleph Messenger"
@@ -14,13 +15,32 @@ ENABLE_SOUND_NOTIFICATIONS = True
 ENABLE_VISUAL_NOTIFICATIONS = True
 
 # Настройки автоматического обновления
-CHAT_UPDATE_INTERVAL = 1000  # миллисекунды (1 секунда)
-CONTACTS_UPDATE_INTERVAL = 5000  # миллисекунды (5 секунд)
+RECONNECT_INTERVAL = 3000  # миллисекунды между попытками переподключения
+CHAT_PAGE_SIZE = 50  # Сообщений истории, подгружаемых за раз при прокрутке вверх
+SEARCH_PAGE_SIZE = 20  # Результатов поиска по сообщениям за один запрос
+
+# Локальный кэш сообщений (файл на пользователя, не база сервера)
+MESSAGE_CACHE_DIR = "cache"
+MESSAGE_CACHE_BATCH_SIZE = 500  # Максимум сообщений в одной транзакции записи в кэш
+MESSAGE_CACHE_FLUSH_INTERVAL = 0.2  # Максимальная задержка записи в кэш (секунды)
+MESSAGE_CACHE_MAX_PENDING = 10000  # Предел незаписанных сообщений
+
+# Логирование
+LOG_LEVEL = "INFO"  # DEBUG - каждое сообщение и содержимое пакетов
+LOG_LEVELS = {}  # Уровни отдельных модулей, например {"src.ui.main_window": "DEBUG"}
+LOG_FILE = None  # Файл журнала (None - только консоль)
 
 # Настройки аудио
 AUDIO_SAMPLE_RATE = 44100
-AUDIO_CHUNK_SIZE = 1024
+AUDIO_CHUNK_SIZE = 882  # 20 мс при 44100 Гц: кадр переводится в целое число отсчетов кодека
 AUDIO_CHANNELS = 1
+AUDIO_JITTER_MIN_DELAY = 0.04  # Минимальная задержка буфера воспроизведения (секунды)
+AUDIO_JITTER_MAX_DELAY = 0.4  # Предел задержки, до которого буфер растет при сильном джиттере
+AUDIO_JITTER_CAPACITY = 64  # Ячеек кольцевого буфера пакетов (кадров)
+AUDIO_PLC_MAX_FRAMES = 5  # Потерянных подряд кадров, заменяемых затухающим повтором; дальше тишина
+AUDIO_CODECS = ["opus", "pcmu", "pcm"]  # Предлагаемые в call_request кодеки в порядке предпочтения
+AUDIO_CODEC_SAMPLE_RATE = 16000  # Частота, до которой понижается звук перед сжатием
+AUDIO_OPUS_BITRATE = 24000  # Поток Opus (бит/с), если установлен opuslib
 
 # Пути к файлам
 ASSETS_DIR = "assets"
@@ -6,6 +6,40 @@ APP_VERSION = "1.0.0"
 
 # Настройки базы данных
 DATABASE_PATH = "messenger.db"
+DATABASE_POOL_SIZE = 4  # Максимум одновременно открытых соединений
+DATABASE_SYNCHRONOUS = "NORMAL"  # FULL - fsync на каждую транзакцию, NORMAL - только при контрольной точке WAL
+DATABASE_BUSY_TIMEOUT = 5.0  # Ожидание блокировки базы (секунды)
+DATABASE_STATEMENT_CACHE = 256  # Кэш подготовленных выражений на соединение
+MESSAGE_WRITE_BEHIND = True  # Запись сообщений в БД пакетами после доставки (False - синхронно до доставки)
+MESSAGE_BATCH_SIZE = 500  # Максимум сообщений в одной транзакции
+MESSAGE_FLUSH_INTERVAL = 0.05  # Максимальная задержка записи сообщения (секунды)
+MESSAGE_QUEUE_MAX_PENDING = 10000  # Предел незаписанных сообщений; сверх него сообщения отклоняются
+MESSAGE_WRITE_RETRIES = 5  # Повторных попыток записи пакета, после них пакет отбрасывается
+HISTORY_PAGE_SIZE = 50  # Сообщений в ответе history_request по умолчанию
+HISTORY_PAGE_MAX = 500  # Предел limit в history_request
+SEARCH_PAGE_SIZE = 20  # Результатов в ответе search_request по умолчанию
+SEARCH_PAGE_MAX = 100  # Предел limit в search_request
+GROUP_MAX_MEMBERS = 1000  # Предел участников группы
+OUTBOUND_QUEUE_MAX_BYTES = 1024 * 1024  # Предел неотправленных данных одного соединения
+OUTBOUND_OVERFLOW_POLICY = "coalesce"  # При переполнении: "disconnect", "drop_oldest" или "coalesce" (замена статусов, иначе disconnect)
+
+# Логирование
+LOG_LEVEL = "INFO"  # DEBUG - каждое сообщение и содержимое пакетов
+LOG_LEVELS = {}  # Уровни отдельных модулей, например {"src.network.network_manager": "DEBUG"}
+LOG_FILE = None  # Файл журнала (None - только консоль)
+
+# Метрики (формат Prometheus, GET http://METRICS_HOST:METRICS_PORT/metrics)
+METRICS_HOST = "127.0.0.1"  # Только локально: метрики не предназначены для внешней сети
+METRICS_PORT = 47992  # None - сервер метрик не запускается
+STATS_INTERVAL = 30  # Вывод статистики в консоль сервера (секунды)
+
+# Ретранслятор голосовых пакетов (UDP): по порту на участника звонка
+MEDIA_RELAY_ENABLED = True
+MEDIA_RELAY_HOST = "0.0.0.0"
+MEDIA_RELAY_PORT_MIN = 48000  # Диапазон портов (два на звонок); открыть в брандмауэре
+MEDIA_RELAY_PORT_MAX = 48999
+MEDIA_RELAY_IDLE_TIMEOUT = 30  # Звонок без пакетов дольше (секунды) завершается
+MEDIA_RELAY_CHECK_HOST = True  # Пакеты участника - только с IP его TCP-соединения с сервером
 
 # Настройки сети
 SERVER_HOST = "127.0.0.1"  # IP-адрес сервера для подключения клиентов
@@ -13,20 +47,40 @@ SERVER_PORT = 47990         # Порт сервера (TCP)
 HOST = "0.0.0.0"           # Слушаем на всех интерфейсах для внешних подключений (только для сервера)
 PORT = 47990                # Порт сервера (дублирует SERVER_PORT для совместимости)
 HEARTBEAT_INTERVAL = 30     # секунды
-ONLINE_TIMEOUT = 60         # секунды
+ONLINE_TIMEOUT = 60         # секунды без активности до закрытия соединения
+CONNECTION_TIMEOUT = 300    # то же для старых клиентов (формат версии 1)
+TIMER_WHEEL_TICK = 0.1      # шаг колеса таймеров keepalive (секунды)
+TIMER_WHEEL_SLOTS = 512     # ячеек колеса таймеров
+SERVER_MODE = "asyncio"     # "asyncio" или "threaded"
+SERVER_BACKLOG = 1024       # Очередь ожидающих подключений (listen backlog)
+HANDSHAKE_TIMEOUT = 10      # секунды ожидания auth_response
+PRESENCE_CHECKPOINT_INTERVAL = 10  # секунды между записью статусов в БД (сервер)
 
 # Настройки аудио
 AUDIO_SAMPLE_RATE = 44100
-AUDIO_CHUNK_SIZE = 1024
+AUDIO_CHUNK_SIZE = 882  # 20 мс при 44100 Гц: кадр переводится в целое число отсчетов кодека
 AUDIO_CHANNELS = 1
+AUDIO_JITTER_MIN_DELAY = 0.04  # Минимальная задержка буфера воспроизведения (секунды)
+AUDIO_JITTER_MAX_DELAY = 0.4  # Предел задержки, до которого буфер растет при сильном джиттере
+AUDIO_JITTER_CAPACITY = 64  # Ячеек кольцевого буфера пакетов (кадров)
+AUDIO_PLC_MAX_FRAMES = 5  # Потерянных подряд кадров, заменяемых затухающим повтором; дальше тишина
+AUDIO_CODECS = ["opus", "pcmu", "pcm"]  # Предлагаемые в call_request кодеки в порядке предпочтения
+AUDIO_CODEC_SAMPLE_RATE = 16000  # Частота, до которой понижается звук перед сжатием
+AUDIO_OPUS_BITRATE = 24000  # Поток Opus (бит/с), если установлен opuslib
 
 # Настройки уведомлений
 ENABLE_SOUND_NOTIFICATIONS = True
 ENABLE_VISUAL_NOTIFICATIONS = True
 
 # Настройки автоматического обновления
-CHAT_UPDATE_INTERVAL = 1000  # миллисекунды (1 секунда)
-CONTACTS_UPDATE_INTERVAL = 5000  # миллисекунды (5 секунд)
+RECONNECT_INTERVAL = 3000  # миллисекунды между попытками переподключения
+CHAT_PAGE_SIZE = 50  # Сообщений истории, подгружаемых за раз при прокрутке вверх
+
+# Локальный кэш сообщений (файл на пользователя, не база сервера)
+MESSAGE_CACHE_DIR = "cache"
+MESSAGE_CACHE_BATCH_SIZE = 500  # Максимум сообщений в одной транзакции записи в кэш
+MESSAGE_CACHE_FLUSH_INTERVAL = 0.2  # Максимальная задержка записи в кэш (секунды)
+MESSAGE_CACHE_MAX_PENDING = 10000  # Предел незаписанных сообщений
 
 # Тестовые пользователи по умолчанию
 DEFAULT_USERS = ["user1", "user2", "user3", "admin", "test"]
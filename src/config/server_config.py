@@ -6,12 +6,52 @@ APP_VERSION = "1.0.0"
 
 # Настройки базы данных
 DATABASE_PATH = "messenger.db"
+DATABASE_POOL_SIZE = 4  # Максимум одновременно открытых соединений
+DATABASE_SYNCHRONOUS = "NORMAL"  # FULL - fsync на каждую транзакцию, NORMAL - только при контрольной точке WAL
+DATABASE_BUSY_TIMEOUT = 5.0  # Ожидание блокировки базы (секунды)
+DATABASE_STATEMENT_CACHE = 256  # Кэш подготовленных выражений на соединение
+MESSAGE_WRITE_BEHIND = True  # Запись сообщений в БД пакетами после доставки (False - синхронно до доставки)
+MESSAGE_BATCH_SIZE = 500  # Максимум сообщений в одной транзакции
+MESSAGE_FLUSH_INTERVAL = 0.05  # Максимальная задержка записи сообщения (секунды)
+MESSAGE_QUEUE_MAX_PENDING = 10000  # Предел незаписанных сообщений; сверх него сообщения отклоняются
+MESSAGE_WRITE_RETRIES = 5  # Повторных попыток записи пакета, после них пакет отбрасывается
+HISTORY_PAGE_SIZE = 50  # Сообщений в ответе history_request по умолчанию
+HISTORY_PAGE_MAX = 500  # Предел limit в history_request
+SEARCH_PAGE_SIZE = 20  # Результатов в ответе search_request по умолчанию
+SEARCH_PAGE_MAX = 100  # Предел limit в search_request
+GROUP_MAX_MEMBERS = 1000  # Предел участников группы
+OUTBOUND_QUEUE_MAX_BYTES = 1024 * 1024  # Предел неотправленных данных одного соединения
+OUTBOUND_OVERFLOW_POLICY = "coalesce"  # При переполнении: "disconnect", "drop_oldest" или "coalesce" (замена статусов, иначе disconnect)
+
+# Логирование
+LOG_LEVEL = "INFO"  # DEBUG - каждое сообщение и содержимое пакетов
+LOG_LEVELS = {}  # Уровни отдельных модулей, например {"src.network.network_manager": "DEBUG"}
+LOG_FILE = None  # Файл журнала (None - только консоль)
+
+# Метрики (формат Prometheus, GET http://METRICS_HOST:METRICS_PORT/metrics)
+METRICS_HOST = "127.0.0.1"  # Только локально: метрики не предназначены для внешней сети
+METRICS_PORT = 47992  # None - сервер метрик не запускается
+STATS_INTERVAL = 30  # Вывод статистики в консоль сервера (секунды)
+
+# Ретранслятор голосовых пакетов (UDP): по порту на участника звонка
+MEDIA_RELAY_ENABLED = True
+MEDIA_RELAY_HOST = "0.0.0.0"
+MEDIA_RELAY_PORT_MIN = 48000  # Диапазон портов (два на звонок); открыть в брандмауэре
+MEDIA_RELAY_PORT_MAX = 48999
+MEDIA_RELAY_IDLE_TIMEOUT = 30  # Звонок без пакетов дольше (секунды) завершается
+MEDIA_RELAY_CHECK_HOST = True  # Пакеты участника - только с IP его TCP-соединения с сервером
 
 # Настройки сети для сервера
 HOST = "0.0.0.0"  # Слушаем на всех интерфейсах для внешних подключений
 PORT = 47991       # Порт сервера
 HEARTBEAT_INTERVAL = 30  # секунды
-ONLINE_TIMEOUT = 60  # секунды
+ONLINE_TIMEOUT = 60  # Без активности дольше - соединение закрывается (клиенты, отвечающие на heartbeat)
+TIMER_WHEEL_TICK = 0.1  # Шаг колеса таймеров keepalive (секунды)
+TIMER_WHEEL_SLOTS = 512  # Ячеек колеса; оборот (TICK * SLOTS) не короче HEARTBEAT_INTERVAL
+SERVER_MODE = "asyncio"  # "asyncio" - один цикл событий на все подключения, "threaded" - поток на клиента
+SERVER_BACKLOG = 1024  # Очередь ожидающих подключений (listen backlog)
+HANDSHAKE_TIMEOUT = 10  # Ожидание auth_response при подключении (секунды)
+PRESENCE_CHECKPOINT_INTERVAL = 10  # Запись онлайн-статусов и last_seen в БД одним пакетом (секунды)
 
 # Внешний IP (для информации)
 EXTERNAL_IP = "95.165.156.43"
@@ -37,4 +77,4 @@ for directory in [ASSETS_DIR, ICONS_DIR, SOUNDS_DIR]:
 
 # Настройки безопасности
 MAX_CONNECTIONS = 100  # Максимальное количество одновременных подключений
-CONNECTION_TIMEOUT = 300  # Таймаут неактивного подключения (5 минут)
+CONNECTION_TIMEOUT = 300  # Таймаут неактивного подключения старых клиентов без ответа на heartbeat (5 минут)
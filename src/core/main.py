@@ -23,7 +23,7 @@ except ImportError:
         from src.config import config
 from src.ui.auth_window import AuthWindow
 from src.ui.main_window import MainWindow
-from src.database.database import Database
+from src.utils.logger import setup_logging
 
 def signal_handler(signum, frame):
     """Обработчик сигналов для корректного завершения"""
@@ -55,18 +55,9 @@ def check_dependencies():
     
     return True
 
-def create_database():
-    """Создание и инициализация базы данных"""
-    try:
-        db = Database()
-        print("✓ База данных инициализирована")
-        return db
-    except Exception as e:
-        print(f"✗ Ошибка инициализации БД: {e}")
-        return None
-
 def main():
     """Главная функция приложения"""
+    setup_logging(config.LOG_LEVEL, config.LOG_LEVELS, config.LOG_FILE)
     print("=" * 50)
     print(f"Запуск {config.APP_NAME} v{config.APP_VERSION}")
     print("=" * 50)
@@ -80,12 +71,6 @@ def main():
         print("Ошибка: Не все зависимости установлены")
         return 1
     
-    # Создание базы данных
-    db = create_database()
-    if not db:
-        print("Ошибка: Не удалось создать базу данных")
-        return 1
-    
     # Создание Qt приложения
     app = QApplication(sys.argv)
     app.setApplicationName(config.APP_NAME)
@@ -18,6 +18,8 @@ sys.path.insert(0, project_root)
 from src.database.database import Database
 from src.network.network_manager import NetworkManager
 from src.config import server_config as config
+from src.utils.logger import setup_logging
+from src.utils.metrics import MetricsServer
 
 def signal_handler(signum, frame):
     """Обработчик сигналов для корректного завершения"""
@@ -26,6 +28,7 @@ def signal_handler(signum, frame):
 
 def main():
     """Главная функция сервера"""
+    setup_logging()
     print("=" * 50)
     print(f"Запуск {config.APP_NAME} Server v{config.APP_VERSION}")
     print("=" * 50)
@@ -54,18 +57,28 @@ def main():
             print("✓ Сервер успешно запущен")
             print(f"Локальный адрес: {config.HOST}:{config.PORT}")
             print(f"Внешний адрес: {config.EXTERNAL_IP}:{config.EXTERNAL_PORT}")
+            if config.METRICS_PORT:
+                metrics_server = MetricsServer(network_manager.metrics, config.METRICS_HOST, config.METRICS_PORT)
+                if metrics_server.start():
+                    print(f"Метрики: http://{config.METRICS_HOST}:{metrics_server.port}/metrics")
             print("Ожидание подключений...")
             print("\nДля остановки сервера нажмите Ctrl+C")
             
             # Основной цикл сервера
             try:
+                next_stats = time.monotonic() + config.STATS_INTERVAL
                 while network_manager.is_running:
                     time.sleep(1)
                     
-                    # Вывод статистики каждые 30 секунд
-                    if int(time.time()) % 30 == 0:
+                    # Вывод статистики каждые STATS_INTERVAL секунд
+                    if time.monotonic() >= next_stats:
+                        next_stats += config.STATS_INTERVAL
                         connected_users = len(network_manager.connected_users)
                         print(f"Подключенных пользователей: {connected_users}")
+                        outbound = network_manager.outbound_stats()
+                        print(f"Очереди отправки: {outbound['queued_bytes']} байт, "
+                              f"максимум на соединение {outbound['max_depth']} байт, "
+                              f"закрыто при переполнении: {outbound['overflow_disconnects']}")
                         
             except KeyboardInterrupt:
                 print("\nПолучен сигнал остановки...")
@@ -80,6 +93,8 @@ def main():
     
     finally:
         # Остановка сервера
+        if 'metrics_server' in locals():
+            metrics_server.stop()
         if 'network_manager' in locals():
             print("Остановка сервера...")
             network_manager.stop_server()
@@ -0,0 +1,92 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List
+
+
+class ConnectionPool:
+    """Пул постоянных соединений SQLite
+
+    Соединения открываются один раз и переиспользуются, поэтому запросы не
+    платят за открытие файла и разбор схемы, а скомпилированные выражения
+    остаются в кэше соединения (cached_statements). Все соединения работают
+    в режиме WAL с настраиваемым уровнем synchronous.
+
+    Повторный захват соединения в том же потоке возвращает уже выданное
+    соединение, поэтому вложенные вызовы методов Database не блокируются.
+    """
+
+    def __init__(self, db_path: str, size: int = 4, synchronous: str = "NORMAL",
+                 busy_timeout: float = 5.0, statement_cache: int = 256):
+        self.db_path = db_path
+        # Каждое соединение с ':memory:' - отдельная база, поэтому пул из одного соединения
+        self.size = 1 if db_path == ':memory:' else max(1, size)
+        self.synchronous = synchronous
+        self.busy_timeout = busy_timeout
+        self.statement_cache = statement_cache
+
+        self._idle: List[sqlite3.Connection] = []
+        self._all: List[sqlite3.Connection] = []
+        self._condition = threading.Condition()
+        self._local = threading.local()
+        self._closed = False
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout,
+            check_same_thread=False,
+            cached_statements=self.statement_cache
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise sqlite3.ProgrammingError("Пул соединений закрыт")
+                if self._idle:
+                    return self._idle.pop()
+                if len(self._all) < self.size:
+                    conn = self._open()
+                    self._all.append(conn)
+                    return conn
+                self._condition.wait()
+
+    def _release(self, conn: sqlite3.Connection):
+        with self._condition:
+            if self._closed:
+                conn.close()
+                return
+            self._idle.append(conn)
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Выдача соединения на время блока with с фиксацией транзакции при выходе"""
+        held = getattr(self._local, 'connection', None)
+        if held is not None:
+            # Вложенный вызов в том же потоке - транзакцией управляет внешний блок
+            yield held
+            return
+
+        conn = self._acquire()
+        self._local.connection = conn
+        try:
+            with conn:
+                yield conn
+        finally:
+            self._local.connection = None
+            self._release(conn)
+
+    def close(self):
+        """Закрытие всех соединений пула"""
+        with self._condition:
+            self._closed = True
+            for conn in self._idle:
+                conn.close()
+            self._idle.clear()
+            self._all.clear()
+            self._condition.notify_all()
@@ -1,5 +1,9 @@
+import functools
 import sqlite3
 import datetime
+import re
+import threading
+import time
 from typing import List, Dict, Optional
 import sys
 import os
@@ -14,15 +18,94 @@ except ImportError:
     except ImportError:
         from src.config import config
 
+from src.database.connection_pool import ConnectionPool
+from src.utils.metrics import Histogram
+
+# Разделитель пользователей в ключе диалога
+CONVERSATION_SEPARATOR = '|'
+
+# Префикс получателя и ключа диалога групповых сообщений: "group:<id группы>"
+GROUP_PREFIX = 'group:'
+
+def group_conversation(group_id: int) -> str:
+    """Ключ диалога (и receiver_id сообщений) группы"""
+    return f"{GROUP_PREFIX}{group_id}"
+
+def conversation_key(user1_id: str, user2_id: str) -> str:
+    """Нормализованный ключ личного диалога: упорядоченная пара пользователей"""
+    first, second = sorted((user1_id, user2_id))
+    return f"{first}{CONVERSATION_SEPARATOR}{second}"
+
+# То же вычисление на SQL (сравнение TEXT в SQLite совпадает с порядком строк Python)
+CONVERSATION_KEY_SQL = """
+    CASE WHEN {sender} <= {receiver}
+         THEN {sender} || '|' || {receiver}
+         ELSE {receiver} || '|' || {sender}
+    END
+"""
+
+def message_conversation(sender_id: str, receiver_id: str) -> str:
+    """Ключ диалога сообщения для записи: группа-получатель или пара пользователей
+    
+    Ключ группы из receiver_id допустим только для уже проверенных сообщений:
+    членство отправителя проверяет сервер (group_message).
+    """
+    if receiver_id.startswith(GROUP_PREFIX):
+        return receiver_id
+    return conversation_key(sender_id, receiver_id)
+
+def search_scope(conversation: str) -> str:
+    """Ключ диалога в индексе messages_fts: ключ группы - одно слово ("group5"), личный - два"""
+    return conversation.replace(':', '')
+
+# То же вычисление на SQL
+SEARCH_SCOPE_SQL = "replace({conversation}, ':', '')"
+
+def fts_phrase(text: str) -> str:
+    """Строка как фраза запроса FTS5: операторы и кавычки в ней не действуют"""
+    return '"' + text.replace('"', '""') + '"'
+
+def timed(method):
+    """Учет времени вызова метода Database в гистограмме query_seconds (метка - имя метода)"""
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.query_seconds.observe(time.perf_counter() - started, name)
+    return wrapper
+
 class Database:
-    def __init__(self, db_path: str = None):
+    def __init__(self, db_path: str = None, synchronous: str = None):
         self.db_path = db_path or config.DATABASE_PATH
+        self.query_seconds = Histogram('aleph_db_query_seconds', "Время выполнения методов Database",
+                                       ('method',))
+        self.pool = ConnectionPool(
+            self.db_path,
+            size=config.DATABASE_POOL_SIZE,
+            synchronous=synchronous or config.DATABASE_SYNCHRONOUS,
+            busy_timeout=config.DATABASE_BUSY_TIMEOUT,
+            statement_cache=config.DATABASE_STATEMENT_CACHE
+        )
+        self._message_id_lock = threading.Lock()
+        self._next_message_id = 1  # Следующий id сообщения (читается из БД в init_database)
         self.init_database()
         self.create_default_users()
     
+    def connection(self):
+        """Соединение из пула (контекстный менеджер с фиксацией транзакции)"""
+        return self.pool.connection()
+    
+    def close(self):
+        """Закрытие всех соединений с базой данных"""
+        self.pool.close()
+    
     def init_database(self):
         """Инициализация базы данных и создание таблиц"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connection() as conn:
             cursor = conn.cursor()
             
             # Таблица пользователей
@@ -64,17 +147,169 @@ class Database:
                 )
             ''')
             
+            self.migrate(conn)
             conn.commit()
+            
+            # Счетчик id сообщений - один раз при открытии: выдача id не берет соединение из пула
+            # AUTOINCREMENT не выдает повторно id удаленных сообщений - как и здесь
+            last_id = conn.execute("SELECT MAX(id) FROM messages").fetchone()[0] or 0
+            sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'messages'").fetchone()
+            self._next_message_id = max(last_id, sequence[0] if sequence else 0) + 1
+    
+    def migrate(self, conn: sqlite3.Connection):
+        """Применение миграций схемы (номер версии хранится в PRAGMA user_version)"""
+        migrations = [
+            self._migrate_conversation_key,
+            self._migrate_groups,
+            self._migrate_read_state,
+            self._migrate_search,
+        ]
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for target, migration in enumerate(migrations[version:], start=version + 1):
+            print(f"Миграция базы данных до версии {target}: {migration.__doc__}")
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {target}")
+    
+    def _migrate_conversation_key(self, conn: sqlite3.Connection):
+        """ключ диалога и индекс (conversation, id) для таблицы messages"""
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(messages)")]
+        if 'conversation' not in columns:
+            conn.execute("ALTER TABLE messages ADD COLUMN conversation TEXT")
+        
+        # Заполнение ключа для уже существующих сообщений
+        conn.execute(f'''
+            UPDATE messages
+            SET conversation = {CONVERSATION_KEY_SQL.format(sender='sender_id', receiver='receiver_id')}
+            WHERE conversation IS NULL
+        ''')
+        
+        # Строки, вставленные без ключа (старые версии клиента с общим файлом БД)
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS messages_conversation_key
+            AFTER INSERT ON messages
+            WHEN NEW.conversation IS NULL
+            BEGIN
+                UPDATE messages
+                SET conversation = {CONVERSATION_KEY_SQL.format(sender='NEW.sender_id', receiver='NEW.receiver_id')}
+                WHERE id = NEW.id;
+            END
+        ''')
+        
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_messages_conversation
+            ON messages (conversation, id)
+        ''')
+    
+    def _migrate_groups(self, conn: sqlite3.Connection):
+        """таблицы групп (groups) и их участников (group_members)"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS groups (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                owner_id TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (owner_id) REFERENCES users (user_id)
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS group_members (
+                group_id INTEGER NOT NULL,
+                user_id TEXT NOT NULL,
+                joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (group_id, user_id),
+                FOREIGN KEY (group_id) REFERENCES groups (id),
+                FOREIGN KEY (user_id) REFERENCES users (user_id)
+            )
+        ''')
+        # Группы пользователя (при подключении)
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_group_members_user
+            ON group_members (user_id, group_id)
+        ''')
+    
+    def _migrate_read_state(self, conn: sqlite3.Connection):
+        """курсор прочтения и счетчик непрочитанных по диалогам (read_state)"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS read_state (
+                user_id TEXT NOT NULL,
+                contact_id TEXT NOT NULL,
+                last_read_id INTEGER NOT NULL DEFAULT 0,
+                unread INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, contact_id)
+            ) WITHOUT ROWID
+        ''')
+        
+        # Состояние по уже существующим сообщениям (флаг is_read)
+        conn.execute(f'''
+            INSERT OR IGNORE INTO read_state (user_id, contact_id, last_read_id, unread)
+            SELECT receiver_id, sender_id, COALESCE(MAX(CASE WHEN is_read THEN id END), 0),
+                   SUM(CASE WHEN is_read THEN 0 ELSE 1 END)
+            FROM messages
+            WHERE receiver_id NOT LIKE '{GROUP_PREFIX}%'
+            GROUP BY receiver_id, sender_id
+        ''')
+    
+    def _migrate_search(self, conn: sqlite3.Connection):
+        """полнотекстовый индекс сообщений (messages_fts, FTS5)"""
+        # Индекс без копии текста (content=''): строки сообщений берутся из messages по rowid.
+        # Столбец conversation - ключ диалога (search_scope) для отбора диалогов пользователя
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                message_text, conversation,
+                content = '',
+                tokenize = 'unicode61 remove_diacritics 2'
+            )
+        ''')
+        # Релевантность - только по тексту сообщения
+        conn.execute("INSERT INTO messages_fts (messages_fts, rank) VALUES ('rank', 'bm25(1.0, 0.0)')")
+        
+        # Новые сообщения индексирует add_message(s) в транзакции вставки (_index_messages):
+        # триггер на вставку сбрасывал бы в индекс отдельный сегмент на каждую строку.
+        # Строки без ключа диалога (старые клиенты) попадают в индекс, когда ключ
+        # проставит триггер messages_conversation_key
+        old_scope = SEARCH_SCOPE_SQL.format(conversation='OLD.conversation')
+        new_scope = SEARCH_SCOPE_SQL.format(conversation='NEW.conversation')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS messages_fts_delete
+            AFTER DELETE ON messages
+            WHEN OLD.conversation IS NOT NULL
+            BEGIN
+                INSERT INTO messages_fts (messages_fts, rowid, message_text, conversation)
+                VALUES ('delete', OLD.id, OLD.message_text, {old_scope});
+            END
+        ''')
+        # Отметки прочтения (is_read) индекс не затрагивают
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS messages_fts_update
+            AFTER UPDATE OF message_text, conversation ON messages
+            BEGIN
+                INSERT INTO messages_fts (messages_fts, rowid, message_text, conversation)
+                SELECT 'delete', OLD.id, OLD.message_text, {old_scope}
+                WHERE OLD.conversation IS NOT NULL;
+                INSERT INTO messages_fts (rowid, message_text, conversation)
+                SELECT NEW.id, NEW.message_text, {new_scope}
+                WHERE NEW.conversation IS NOT NULL;
+            END
+        ''')
+        
+        # Индексация уже существующих сообщений
+        conn.execute(f'''
+            INSERT INTO messages_fts (rowid, message_text, conversation)
+            SELECT id, message_text, {SEARCH_SCOPE_SQL.format(conversation='conversation')}
+            FROM messages
+            WHERE conversation IS NOT NULL
+        ''')
     
     def create_default_users(self):
         """Создание тестовых пользователей по умолчанию"""
         for user_id in config.DEFAULT_USERS:
             self.add_user(user_id)
     
+    @timed
     def add_user(self, user_id: str, display_name: str = None) -> bool:
         """Добавление нового пользователя"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     INSERT OR IGNORE INTO users (user_id, display_name)
@@ -86,10 +321,11 @@ class Database:
             print(f"Ошибка добавления пользователя: {e}")
             return False
     
+    @timed
     def get_user(self, user_id: str) -> Optional[Dict]:
         """Получение информации о пользователе"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     SELECT user_id, display_name, is_online, last_seen, created_at
@@ -109,10 +345,11 @@ class Database:
             print(f"Ошибка получения пользователя: {e}")
             return None
     
+    @timed
     def get_all_users(self) -> List[Dict]:
         """Получение списка всех пользователей"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     SELECT user_id, display_name, is_online, last_seen, created_at
@@ -130,10 +367,11 @@ class Database:
             print(f"Ошибка получения пользователей: {e}")
             return []
     
+    @timed
     def update_user_status(self, user_id: str, is_online: bool):
         """Обновление онлайн-статуса пользователя"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     UPDATE users 
@@ -144,90 +382,365 @@ class Database:
         except Exception as e:
             print(f"Ошибка обновления статуса: {e}")
     
+    @timed
+    def update_user_statuses(self, statuses: List[tuple]) -> bool:
+        """Пакетное обновление статусов одной транзакцией
+        
+        statuses - кортежи (user_id, is_online, last_seen), last_seen - время
+        в секундах от эпохи (записывается в UTC, как CURRENT_TIMESTAMP).
+        """
+        if not statuses:
+            return True
+        try:
+            with self.connection() as conn:
+                conn.executemany('''
+                    UPDATE users 
+                    SET is_online = ?, last_seen = ?
+                    WHERE user_id = ?
+                ''', ((is_online,
+                       datetime.datetime.fromtimestamp(last_seen, datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+                       user_id) for user_id, is_online, last_seen in statuses))
+                conn.commit()
+                return True
+        except Exception as e:
+            print(f"Ошибка пакетного обновления статусов: {e}")
+            return False
+    
+    def allocate_message_ids(self, count: int = 1) -> int:
+        """Первый из count подряд идущих id сообщений
+        
+        id выдаются до записи в БД (сообщение доставляется с id раньше, чем
+        его запишет очередь write-behind) и растут монотонно. Все сообщения
+        этой базы должны добавляться через один объект Database: вставка
+        мимо него может занять уже выданный id.
+        """
+        with self._message_id_lock:
+            first = self._next_message_id
+            self._next_message_id += count
+            return first
+    
+    def last_message_id(self) -> int:
+        """id последнего выданного сообщения (0 - сообщений нет), включая еще не записанные"""
+        return self.allocate_message_ids(0) - 1
+    
+    @timed
     def add_message(self, sender_id: str, receiver_id: str, message_text: str) -> bool:
         """Добавление нового сообщения"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
+                message_id = self.allocate_message_ids()
                 cursor.execute('''
-                    INSERT INTO messages (sender_id, receiver_id, message_text)
-                    VALUES (?, ?, ?)
-                ''', (sender_id, receiver_id, message_text))
+                    INSERT INTO messages (id, sender_id, receiver_id, message_text, conversation)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (message_id, sender_id, receiver_id, message_text,
+                      message_conversation(sender_id, receiver_id)))
+                self._count_unread(conn, [(message_id, sender_id, receiver_id)])
+                self._index_messages(conn, [(message_id, message_text, message_conversation(sender_id, receiver_id))])
                 conn.commit()
                 return True
         except Exception as e:
             print(f"Ошибка добавления сообщения: {e}")
             return False
     
-    def get_messages(self, user1_id: str, user2_id: str, limit: int = 100) -> List[Dict]:
-        """Получение истории сообщений между двумя пользователями"""
+    @timed
+    def add_messages(self, messages: List[Dict]) -> bool:
+        """Пакетное добавление сообщений одной транзакцией
+        
+        Каждое сообщение - словарь с sender_id, receiver_id, message_text и
+        необязательными id (выданным allocate_message_ids) и timestamp
+        (Unix-время отправки). Сообщениям без id они выдаются здесь.
+        """
+        try:
+            rows = []
+            missing = sum(1 for message in messages if message.get('id') is None)
+            next_id = self.allocate_message_ids(missing) if missing else None
+            for message in messages:
+                message_id = message.get('id')
+                if message_id is None:
+                    message_id = next_id
+                    next_id += 1
+                sender_id = message['sender_id']
+                receiver_id = message['receiver_id']
+                timestamp = message.get('timestamp')
+                if timestamp is not None:
+                    timestamp = datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+                rows.append((message_id, sender_id, receiver_id, message['message_text'],
+                             message_conversation(sender_id, receiver_id), timestamp))
+            
+            with self.connection() as conn:
+                conn.executemany('''
+                    INSERT INTO messages (id, sender_id, receiver_id, message_text, conversation, timestamp)
+                    VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+                ''', rows)
+                self._count_unread(conn, [row[:3] for row in rows])
+                self._index_messages(conn, [(row[0], row[3], row[4]) for row in rows])
+                conn.commit()
+                return True
+        except Exception as e:
+            print(f"Ошибка пакетного добавления сообщений: {e}")
+            return False
+    
+    @staticmethod
+    def _count_unread(conn: sqlite3.Connection, messages: List[tuple]):
+        """Увеличение счетчиков непрочитанных в транзакции вставки сообщений (id, sender_id, receiver_id)
+        
+        Счетчик пары получатель-отправитель растет на число ее сообщений в
+        пакете одной записью, если курсор прочтения меньше их id - обычный
+        случай. Пары, курсор которых уже дошел до сообщений пакета (отметка
+        прочтения пришла раньше записи из очереди write-behind), пересчитываются
+        отдельно: покрытые курсором сообщения не считаются и сразу прочитаны.
+        """
+        by_pair = {}
+        for message_id, sender_id, receiver_id in messages:
+            if not receiver_id.startswith(GROUP_PREFIX):
+                by_pair.setdefault((receiver_id, sender_id), []).append(message_id)
+        if not by_pair:
+            return
+        
+        changes = conn.total_changes
+        conn.executemany('''
+            INSERT INTO read_state (user_id, contact_id, unread) VALUES (?, ?, ?)
+            ON CONFLICT (user_id, contact_id) DO UPDATE SET unread = unread + excluded.unread
+            WHERE last_read_id < ?
+        ''', [pair + (len(message_ids), min(message_ids)) for pair, message_ids in by_pair.items()])
+        if conn.total_changes - changes == len(by_pair):
+            return
+        
+        for (receiver_id, sender_id), message_ids in by_pair.items():
+            last_read_id = conn.execute("SELECT last_read_id FROM read_state WHERE user_id = ? AND contact_id = ?",
+                                        (receiver_id, sender_id)).fetchone()[0]
+            if last_read_id < min(message_ids):
+                continue
+            conn.executemany("UPDATE messages SET is_read = TRUE WHERE id = ?",
+                             [(message_id,) for message_id in message_ids if message_id <= last_read_id])
+            conn.execute("UPDATE read_state SET unread = unread + ? WHERE user_id = ? AND contact_id = ?",
+                         (sum(1 for message_id in message_ids if message_id > last_read_id), receiver_id, sender_id))
+    
+    @staticmethod
+    def _index_messages(conn: sqlite3.Connection, messages: List[tuple]):
+        """Добавление сообщений (id, message_text, conversation) в полнотекстовый индекс"""
+        conn.executemany("INSERT INTO messages_fts (rowid, message_text, conversation) VALUES (?, ?, ?)",
+                         [(message_id, text, search_scope(conversation)) for message_id, text, conversation in messages])
+    
+    @staticmethod
+    def _message_rows(rows) -> List[Dict]:
+        """Словари сообщений из строк выборки (id, sender_id, receiver_id, message_text, timestamp, is_read)"""
+        return [{
+            'id': row[0],
+            'sender_id': row[1],
+            'receiver_id': row[2],
+            'message_text': row[3],
+            'timestamp': row[4],
+            'is_read': bool(row[5])
+        } for row in rows]
+    
+    @timed
+    def get_messages_before(self, conversation: str, before_id: Optional[int] = None,
+                            limit: int = 100) -> List[Dict]:
+        """Страница истории диалога: limit сообщений с id меньше before_id
+        
+        Без before_id - последние сообщения. Выборка идет по индексу
+        (conversation, id), поэтому стоимость не зависит от глубины страницы.
+        Сообщения возвращаются в хронологическом порядке.
+        """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
-                    SELECT sender_id, receiver_id, message_text, timestamp, is_read
+                    SELECT id, sender_id, receiver_id, message_text, timestamp, is_read
                     FROM messages 
-                    WHERE (sender_id = ? AND receiver_id = ?) 
-                       OR (sender_id = ? AND receiver_id = ?)
-                    ORDER BY timestamp DESC
+                    WHERE conversation = ? AND id < ?
+                    ORDER BY id DESC
                     LIMIT ?
-                ''', (user1_id, user2_id, user2_id, user1_id, limit))
-                rows = cursor.fetchall()
-                return [{
-                    'sender_id': row[0],
-                    'receiver_id': row[1],
-                    'message_text': row[2],
-                    'timestamp': row[3],
-                    'is_read': bool(row[4])
-                } for row in reversed(rows)]  # Возвращаем в хронологическом порядке
+                ''', (conversation, before_id if before_id is not None else sys.maxsize, limit))
+                return self._message_rows(reversed(cursor.fetchall()))
         except Exception as e:
             print(f"Ошибка получения сообщений: {e}")
             return []
     
-    def get_messages_since(self, user1_id: str, user2_id: str, since_timestamp: str, limit: int = 100) -> List[Dict]:
-        """Получение новых сообщений между двумя пользователями с определенного времени"""
+    @timed
+    def get_messages_after(self, conversation: str, after_id: Optional[int] = None,
+                           limit: int = 100) -> List[Dict]:
+        """Страница истории диалога: первые limit сообщений с id больше after_id"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
-                    SELECT sender_id, receiver_id, message_text, timestamp, is_read
+                    SELECT id, sender_id, receiver_id, message_text, timestamp, is_read
                     FROM messages 
-                    WHERE ((sender_id = ? AND receiver_id = ?) 
-                        OR (sender_id = ? AND receiver_id = ?))
-                       AND timestamp > ?
-                    ORDER BY timestamp ASC
+                    WHERE conversation = ? AND id > ?
+                    ORDER BY id ASC
                     LIMIT ?
-                ''', (user1_id, user2_id, user2_id, user1_id, since_timestamp, limit))
-                rows = cursor.fetchall()
-                return [{
-                    'sender_id': row[0],
-                    'receiver_id': row[1],
-                    'message_text': row[2],
-                    'timestamp': row[3],
-                    'is_read': bool(row[4])
-                } for row in rows]  # Возвращаем в хронологическом порядке
+                ''', (conversation, after_id or 0, limit))
+                return self._message_rows(cursor.fetchall())
         except Exception as e:
             print(f"Ошибка получения новых сообщений: {e}")
             return []
     
-    def mark_messages_as_read(self, sender_id: str, receiver_id: str):
-        """Отметка сообщений как прочитанные"""
+    @timed
+    def get_messages(self, user1_id: str, user2_id: str, limit: int = 100,
+                     before_id: Optional[int] = None) -> List[Dict]:
+        """Получение истории сообщений между двумя пользователями
+        
+        Возвращает последние limit сообщений, а с before_id - страницу сообщений
+        старше указанного (см. get_messages_before).
+        """
+        return self.get_messages_before(conversation_key(user1_id, user2_id), before_id, limit)
+    
+    @timed
+    def get_messages_since(self, user1_id: str, user2_id: str, since_timestamp: str, limit: int = 100) -> List[Dict]:
+        """Получение новых сообщений между двумя пользователями с определенного времени
+        
+        Сравнение строк времени не использует индекс; для новых сообщений
+        предпочтительнее get_messages_after по id последнего полученного.
+        """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
-                    UPDATE messages 
-                    SET is_read = TRUE
-                    WHERE sender_id = ? AND receiver_id = ?
-                ''', (sender_id, receiver_id))
+                    SELECT id, sender_id, receiver_id, message_text, timestamp, is_read
+                    FROM messages 
+                    WHERE conversation = ?
+                      AND timestamp > ?
+                    ORDER BY id ASC
+                    LIMIT ?
+                ''', (conversation_key(user1_id, user2_id), since_timestamp, limit))
+                return self._message_rows(cursor.fetchall())
+        except Exception as e:
+            print(f"Ошибка получения новых сообщений: {e}")
+            return []
+    
+    @timed
+    def search_messages(self, user_id: str, query: str, conversation: Optional[str] = None,
+                        limit: int = 20, cursor: Optional[str] = None) -> Dict:
+        """Полнотекстовый поиск по сообщениям пользователя (индекс messages_fts)
+        
+        Ищутся сообщения, содержащие все слова запроса (без учета регистра);
+        синтаксис FTS5 в запросе не действует. conversation - собеседник или
+        группа ("group:<id>"), без него поиск идет по всем диалогам и группам
+        пользователя. Результаты упорядочены по релевантности (bm25), при равной -
+        новые раньше. Возвращает {'messages': [...], 'cursor': ...}, где cursor -
+        непрозрачная строка для следующей страницы (None на последней).
+        """
+        result = {'messages': [], 'cursor': None}
+        words = re.findall(r'\w+', query)
+        if not words:
+            return result
+        match = '{message_text}: (' + ' '.join(fts_phrase(word) for word in words) + ')'
+        
+        try:
+            with self.connection() as conn:
+                groups = [group_conversation(row[0]) for row in conn.execute(
+                    "SELECT group_id FROM group_members WHERE user_id = ?", (user_id,))]
+                if conversation is not None:
+                    conversation = message_conversation(user_id, conversation)
+                    if conversation.startswith(GROUP_PREFIX) and conversation not in groups:
+                        return result
+                    scope, params = "m.conversation = ?", [conversation]
+                    match += ' AND {conversation}: ' + fts_phrase(search_scope(conversation))
+                else:
+                    # Индекс отбирает диалоги по словам ключа, точная проверка - по messages
+                    scope = f"(m.receiver_id NOT LIKE '{GROUP_PREFIX}%' AND ? IN (m.sender_id, m.receiver_id))"
+                    params = [user_id]
+                    if groups:
+                        scope = f"(m.conversation IN ({', '.join('?' * len(groups))}) OR {scope})"
+                        params = groups + params
+                    match += ' AND {conversation}: (' + ' OR '.join(
+                        fts_phrase(search_scope(key)) for key in [user_id] + groups) + ')'
+                
+                page = ''
+                if cursor:
+                    rank, message_id = cursor.rsplit(':', 1)
+                    page = "AND (f.rank > ? OR (f.rank = ? AND m.id < ?))"
+                    params += [float(rank), float(rank), int(message_id)]
+                rows = conn.execute(f'''
+                    SELECT m.id, m.sender_id, m.receiver_id, m.message_text, m.timestamp, m.is_read, f.rank
+                    FROM messages_fts f
+                    JOIN messages m ON m.id = f.rowid
+                    WHERE messages_fts MATCH ? AND {scope} {page}
+                    ORDER BY f.rank, m.id DESC
+                    LIMIT ?
+                ''', [match] + params + [limit + 1]).fetchall()
+        except Exception as e:
+            print(f"Ошибка поиска сообщений: {e}")
+            return result
+        
+        if len(rows) > limit:
+            rows = rows[:limit]
+            result['cursor'] = f"{rows[-1][6]!r}:{rows[-1][0]}"
+        result['messages'] = self._message_rows(row[:6] for row in rows)
+        return result
+    
+    @timed
+    def mark_conversation_read(self, user_id: str, contact_id: str,
+                               last_read_id: Optional[int] = None) -> Optional[Dict]:
+        """Отметка сообщений контакта пользователю как прочитанных до last_read_id включительно
+        
+        Без last_read_id - до последнего сообщения диалога. Курсор только
+        растет; флаг is_read ставится лишь сообщениям между прежним и новым
+        курсором, а оставшиеся непрочитанными пересчитываются после курсора
+        (это же исправляет счетчик, если сообщения вставлялись мимо Database).
+        Оба запроса идут по индексу (conversation, id), поэтому стоимость не
+        зависит от длины диалога. Возвращает состояние диалога
+        {'contact_id', 'last_read_id', 'unread'} или None при ошибке.
+        """
+        conversation = conversation_key(user_id, contact_id)
+        try:
+            with self.connection() as conn:
+                # Первая запись захватывает блокировку: вставки других соединений
+                # не изменят счетчик между подсчетом и его сохранением
+                conn.execute("INSERT OR IGNORE INTO read_state (user_id, contact_id) VALUES (?, ?)",
+                             (user_id, contact_id))
+                previous = conn.execute(
+                    "SELECT last_read_id FROM read_state WHERE user_id = ? AND contact_id = ?",
+                    (user_id, contact_id)).fetchone()[0]
+                if last_read_id is None:
+                    last_read_id = conn.execute("SELECT MAX(id) FROM messages WHERE conversation = ?",
+                                                (conversation,)).fetchone()[0] or 0
+                cursor = max(previous, last_read_id)
+                if cursor > previous:
+                    conn.execute('''
+                        UPDATE messages
+                        SET is_read = TRUE
+                        WHERE conversation = ? AND id > ? AND id <= ? AND receiver_id = ? AND sender_id = ?
+                    ''', (conversation, previous, cursor, user_id, contact_id))
+                unread = conn.execute('''
+                    SELECT COUNT(*) FROM messages
+                    WHERE conversation = ? AND id > ? AND receiver_id = ? AND sender_id = ?
+                ''', (conversation, cursor, user_id, contact_id)).fetchone()[0]
+                conn.execute("UPDATE read_state SET last_read_id = ?, unread = ? WHERE user_id = ? AND contact_id = ?",
+                             (cursor, unread, user_id, contact_id))
                 conn.commit()
+                return {'contact_id': contact_id, 'last_read_id': cursor, 'unread': unread}
         except Exception as e:
             print(f"Ошибка отметки сообщений: {e}")
+            return None
     
+    def mark_messages_as_read(self, sender_id: str, receiver_id: str):
+        """Отметка сообщений как прочитанные"""
+        self.mark_conversation_read(receiver_id, sender_id)
+    
+    @timed
+    def get_unread_counts(self, user_id: str) -> List[Dict]:
+        """Диалоги пользователя с непрочитанными сообщениями (один запрос по первичному ключу)"""
+        try:
+            with self.connection() as conn:
+                rows = conn.execute('''
+                    SELECT contact_id, last_read_id, unread
+                    FROM read_state
+                    WHERE user_id = ? AND unread > 0
+                ''', (user_id,)).fetchall()
+                return [{'contact_id': row[0], 'last_read_id': row[1], 'unread': row[2]} for row in rows]
+        except Exception as e:
+            print(f"Ошибка получения непрочитанных сообщений: {e}")
+            return []
+    
+    @timed
     def add_contact(self, user_id: str, contact_id: str) -> bool:
         """Добавление контакта"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     INSERT OR IGNORE INTO contacts (user_id, contact_id)
@@ -239,10 +752,116 @@ class Database:
             print(f"Ошибка добавления контакта: {e}")
             return False
     
+    @timed
+    def create_group(self, name: str, owner_id: str, members: List[str] = None) -> Optional[int]:
+        """Создание группы; владелец становится участником. Возвращает id группы"""
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO groups (name, owner_id) VALUES (?, ?)
+                ''', (name, owner_id))
+                group_id = cursor.lastrowid
+                conn.executemany('''
+                    INSERT OR IGNORE INTO group_members (group_id, user_id) VALUES (?, ?)
+                ''', [(group_id, user_id) for user_id in dict.fromkeys([owner_id] + list(members or []))])
+                conn.commit()
+                return group_id
+        except Exception as e:
+            print(f"Ошибка создания группы: {e}")
+            return None
+    
+    @timed
+    def get_group(self, group_id: int) -> Optional[Dict]:
+        """Получение группы по id"""
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT id, name, owner_id, created_at FROM groups WHERE id = ?
+                ''', (group_id,))
+                row = cursor.fetchone()
+                if row:
+                    return {
+                        'group_id': row[0],
+                        'name': row[1],
+                        'owner_id': row[2],
+                        'created_at': row[3]
+                    }
+                return None
+        except Exception as e:
+            print(f"Ошибка получения группы: {e}")
+            return None
+    
+    @timed
+    def add_group_members(self, group_id: int, user_ids: List[str]) -> bool:
+        """Добавление участников в группу"""
+        try:
+            with self.connection() as conn:
+                conn.executemany('''
+                    INSERT OR IGNORE INTO group_members (group_id, user_id) VALUES (?, ?)
+                ''', [(group_id, user_id) for user_id in user_ids])
+                conn.commit()
+                return True
+        except Exception as e:
+            print(f"Ошибка добавления участников группы: {e}")
+            return False
+    
+    @timed
+    def remove_group_member(self, group_id: int, user_id: str) -> bool:
+        """Удаление участника из группы"""
+        try:
+            with self.connection() as conn:
+                conn.execute('''
+                    DELETE FROM group_members WHERE group_id = ? AND user_id = ?
+                ''', (group_id, user_id))
+                conn.commit()
+                return True
+        except Exception as e:
+            print(f"Ошибка удаления участника группы: {e}")
+            return False
+    
+    @timed
+    def get_group_members(self, group_id: int) -> List[str]:
+        """Участники группы"""
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT user_id FROM group_members WHERE group_id = ?
+                ''', (group_id,))
+                return [row[0] for row in cursor.fetchall()]
+        except Exception as e:
+            print(f"Ошибка получения участников группы: {e}")
+            return []
+    
+    @timed
+    def get_user_groups(self, user_id: str) -> List[Dict]:
+        """Группы, в которых состоит пользователь"""
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT g.id, g.name, g.owner_id
+                    FROM group_members m
+                    JOIN groups g ON g.id = m.group_id
+                    WHERE m.user_id = ?
+                    ORDER BY g.name
+                ''', (user_id,))
+                return [{
+                    'group_id': row[0],
+                    'name': row[1],
+                    'owner_id': row[2]
+                } for row in cursor.fetchall()]
+        except Exception as e:
+            print(f"Ошибка получения групп пользователя: {e}")
+            return []
+    
+    @timed
     def get_contacts(self, user_id: str) -> List[Dict]:
         """Получение списка контактов пользователя"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     SELECT c.contact_id, u.display_name, u.is_online, u.last_seen
@@ -0,0 +1,275 @@
+import os
+import re
+import threading
+from typing import Dict, List, Optional
+import sys
+# Добавляем путь к src в PYTHONPATH
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+try:
+    from src.config import client_config as config
+except ImportError:
+    from src.config import config
+from src.database.connection_pool import ConnectionPool
+from src.database.database import conversation_key, message_conversation
+from src.database.write_behind import MessageWriteQueue
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def cache_path(user_id: str) -> str:
+    """Файл кэша пользователя в MESSAGE_CACHE_DIR (символы вне [\\w.-] заменяются на '_')"""
+    return os.path.join(config.MESSAGE_CACHE_DIR, re.sub(r'[^\w.-]', '_', user_id) + ".db")
+
+
+class MessageCache:
+    """Локальный кэш сообщений клиента
+
+    Отдельный файл SQLite на пользователя со своей схемой: клиент не пишет
+    в базу сервера. Ключ сообщения - его id на сервере, поэтому сообщения,
+    полученные повторно (догрузка после переподключения, страницы истории),
+    не дублируются; сообщения без id не кэшируются и попадают в кэш с
+    ближайшей догрузкой истории. Запись идет пакетами в потоке
+    MessageWriteQueue, чтение страниц - по индексу (conversation, id).
+    Сообщения, еще не записанные потоком, хранятся в памяти и добавляются
+    к результату чтения: поток интерфейса не ждет записи.
+
+    Диалог помечается полным, когда в кэше есть его первое сообщение: тогда
+    более старые страницы у сервера не запрашиваются. Отметка сохраняется
+    только после всех сообщений, полученных до нее: сразу, если очередь
+    записи пуста, иначе вместе с пакетом, который ее опустошает. Последний список
+    контактов от сервера хранится здесь же и показывается до подключения.
+    """
+
+    def __init__(self, user_id: str, path: str = None, batch_size: int = None,
+                 flush_interval: float = None):
+        self.user_id = user_id
+        self.path = path or cache_path(user_id)
+        directory = os.path.dirname(self.path)
+        if self.path != ':memory:' and directory:
+            os.makedirs(directory, exist_ok=True)
+        self.pool = ConnectionPool(self.path, size=2)
+        self._unwritten: Dict[str, Dict[int, Dict]] = {}  # диалог -> id -> сообщение, еще не записанное
+        self._lock = threading.Lock()
+        self.init_cache()
+        self._complete = self._load_complete()
+        self._unsaved_complete = set()  # Отметки полноты, еще не записанные в файл
+        self.writer = MessageWriteQueue(
+            self,
+            batch_size=batch_size or config.MESSAGE_CACHE_BATCH_SIZE,
+            flush_interval=flush_interval if flush_interval is not None else config.MESSAGE_CACHE_FLUSH_INTERVAL,
+            max_pending=config.MESSAGE_CACHE_MAX_PENDING
+        )
+        self.writer.start()
+
+    def init_cache(self):
+        """Создание таблиц кэша"""
+        with self.pool.connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY,
+                    conversation TEXT NOT NULL,
+                    sender_id TEXT NOT NULL,
+                    receiver_id TEXT NOT NULL,
+                    message_text TEXT NOT NULL,
+                    timestamp,
+                    is_read BOOLEAN DEFAULT FALSE
+                )
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_cache_conversation
+                ON messages (conversation, id)
+            ''')
+            # Диалоги, история которых есть в кэше с первого сообщения
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS complete_conversations (
+                    conversation TEXT PRIMARY KEY
+                )
+            ''')
+            # Список контактов в порядке сервера (статусы не хранятся)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS contacts (
+                    position INTEGER PRIMARY KEY,
+                    contact_id TEXT NOT NULL,
+                    display_name TEXT
+                )
+            ''')
+
+    def _load_complete(self) -> set:
+        with self.pool.connection() as conn:
+            return {row[0] for row in conn.execute("SELECT conversation FROM complete_conversations")}
+
+    def close(self):
+        """Запись оставшихся сообщений и отметок и закрытие файла кэша"""
+        self.writer.stop()
+        self._save_complete()
+        self.pool.close()
+
+    def store(self, messages: List[Dict]):
+        """Постановка сообщений с id сервера в очередь записи (не блокирует поток интерфейса)"""
+        rejected = []
+        for message in messages:
+            if message.get('id') is None:
+                continue
+            # В памяти до постановки в очередь: поток записи убирает сообщение после записи
+            with self._lock:
+                self._unwritten.setdefault(self._conversation(message), {})[message['id']] = message
+            if not self.writer.enqueue(message):
+                rejected.append(message)
+        if rejected:
+            self._forget(rejected)
+            logger.warning("Очередь записи кэша заполнена, не сохранено сообщений: %d", len(rejected))
+
+    def mark_complete(self, contact_id: str):
+        """Первое сообщение диалога получено: старые страницы больше не запрашиваются"""
+        conversation = conversation_key(self.user_id, contact_id)
+        if conversation in self._complete:
+            return
+        self._complete.add(conversation)
+        with self._lock:
+            self._unsaved_complete.add(conversation)
+        # Незаписанные сообщения запишет пакет, который сохранит и отметку
+        if not self.writer.pending():
+            self._save_complete()
+
+    def _save_complete(self):
+        """Запись накопленных отметок полноты отдельной транзакцией"""
+        try:
+            with self.pool.connection() as conn:
+                complete = self._insert_complete(conn)
+        except Exception as e:
+            logger.error("Ошибка записи отметок полноты в кэш: %s", e)
+            return
+        self._saved_complete(complete)
+
+    def _insert_complete(self, conn) -> List[str]:
+        with self._lock:
+            complete = list(self._unsaved_complete)
+        conn.executemany("INSERT OR IGNORE INTO complete_conversations (conversation) VALUES (?)",
+                         [(conversation,) for conversation in complete])
+        return complete
+
+    def _saved_complete(self, complete: List[str]):
+        # Только после фиксации транзакции: при ошибке отметки запишутся следующей
+        with self._lock:
+            self._unsaved_complete.difference_update(complete)
+
+    def is_complete(self, contact_id: str) -> bool:
+        return conversation_key(self.user_id, contact_id) in self._complete
+
+    def add_messages(self, messages: List[Dict]) -> bool:
+        """Запись пакета одной транзакцией (вызывается потоком MessageWriteQueue)"""
+        try:
+            rows = [(message['id'], self._conversation(message), message['sender_id'], message['receiver_id'],
+                     message['message_text'], message.get('timestamp'), bool(message.get('is_read')))
+                    for message in messages]
+            with self.pool.connection() as conn:
+                conn.executemany('''
+                    INSERT INTO messages (id, conversation, sender_id, receiver_id, message_text, timestamp, is_read)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (id) DO NOTHING
+                ''', rows)
+                # Пакет - все незаписанное: отметки полноты больше не опережают свои сообщения
+                complete = self._insert_complete(conn) if self.writer.pending() == len(messages) else []
+            self._forget(messages)
+            self._saved_complete(complete)
+            return True
+        except Exception as e:
+            logger.error("Ошибка записи в кэш сообщений: %s", e)
+            return False
+
+    def store_contacts(self, contacts: List[Dict]) -> bool:
+        """Замена сохраненного списка контактов списком от сервера"""
+        try:
+            with self.pool.connection() as conn:
+                conn.execute("DELETE FROM contacts")
+                conn.executemany("INSERT INTO contacts (contact_id, display_name) VALUES (?, ?)",
+                                 [(contact['contact_id'], contact.get('display_name')) for contact in contacts])
+            return True
+        except Exception as e:
+            logger.error("Ошибка записи контактов в кэш: %s", e)
+            return False
+
+    def get_contacts(self) -> List[Dict]:
+        """Последний полученный от сервера список контактов (все не в сети)"""
+        try:
+            with self.pool.connection() as conn:
+                rows = conn.execute("SELECT contact_id, display_name FROM contacts ORDER BY position").fetchall()
+        except Exception as e:
+            logger.error("Ошибка чтения контактов из кэша: %s", e)
+            return []
+        return [{'contact_id': row[0], 'display_name': row[1], 'is_online': False} for row in rows]
+
+    def flush(self, timeout: float = None) -> bool:
+        """Ожидание записи всего, что поставлено в очередь"""
+        return self.writer.flush(timeout)
+
+    @staticmethod
+    def _conversation(message: Dict) -> str:
+        return message_conversation(message['sender_id'], message['receiver_id'])
+
+    def _forget(self, messages: List[Dict]):
+        """Сообщения записаны (или не приняты очередью): больше не хранятся в памяти"""
+        with self._lock:
+            for message in messages:
+                conversation = self._conversation(message)
+                unwritten = self._unwritten.get(conversation)
+                if unwritten is not None:
+                    unwritten.pop(message['id'], None)
+                    if not unwritten:
+                        del self._unwritten[conversation]
+
+    def _unwritten_of(self, conversation: str) -> List[Dict]:
+        # Снимок берется до чтения из БД: записанное между ними найдется в выборке
+        with self._lock:
+            return list(self._unwritten.get(conversation, {}).values())
+
+    def get_messages(self, contact_id: str, limit: int = 50, before_id: Optional[int] = None) -> List[Dict]:
+        """Последние limit сообщений диалога (с before_id - старше него) в хронологическом порядке"""
+        conversation = conversation_key(self.user_id, contact_id)
+        before_id = before_id if before_id is not None else sys.maxsize
+        unwritten = self._unwritten_of(conversation)
+        try:
+            with self.pool.connection() as conn:
+                rows = conn.execute('''
+                    SELECT id, sender_id, receiver_id, message_text, timestamp, is_read
+                    FROM messages
+                    WHERE conversation = ? AND id < ?
+                    ORDER BY id DESC
+                    LIMIT ?
+                ''', (conversation, before_id, limit)).fetchall()
+        except Exception as e:
+            logger.error("Ошибка чтения кэша сообщений: %s", e)
+            rows = []
+        messages = {message['id']: {
+            'id': message['id'],
+            'sender_id': message['sender_id'],
+            'receiver_id': message['receiver_id'],
+            'message_text': message['message_text'],
+            'timestamp': message.get('timestamp'),
+            'is_read': bool(message.get('is_read'))
+        } for message in unwritten if message['id'] < before_id}
+        for row in rows:
+            messages[row[0]] = {
+                'id': row[0],
+                'sender_id': row[1],
+                'receiver_id': row[2],
+                'message_text': row[3],
+                'timestamp': row[4],
+                'is_read': bool(row[5])
+            }
+        return [messages[message_id] for message_id in sorted(messages)[-limit:]]
+
+    def newest_id(self, contact_id: str) -> Optional[int]:
+        """id последнего сообщения диалога в кэше (курсор after_id для догрузки с сервера)"""
+        conversation = conversation_key(self.user_id, contact_id)
+        unwritten = max((message['id'] for message in self._unwritten_of(conversation)), default=None)
+        try:
+            with self.pool.connection() as conn:
+                row = conn.execute("SELECT MAX(id) FROM messages WHERE conversation = ?",
+                                   (conversation,)).fetchone()
+        except Exception as e:
+            logger.error("Ошибка чтения кэша сообщений: %s", e)
+            return unwritten
+        return max((value for value in (row[0], unwritten) if value is not None), default=None)
@@ -0,0 +1,173 @@
+import queue
+import threading
+import time
+from typing import Dict, List
+import sys
+import os
+# Добавляем путь к src в PYTHONPATH
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+try:
+    from src.config import server_config as config
+except ImportError:
+    from src.config import config
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class MessageWriteQueue:
+    """Очередь отложенной записи сообщений (write-behind)
+
+    Сообщение доставляется получателям сразу, а в SQLite попадает пакетом
+    через executemany в одной транзакции. Пакет записывается, когда набрано
+    batch_size сообщений или прошло flush_interval секунд с момента
+    постановки первого из них.
+
+    Гарантии сохранности: при аварийном завершении процесса теряются только
+    еще не записанные сообщения - в обычном режиме это не более flush_interval
+    секунд трафика, а если база не успевает, не более max_pending сообщений.
+    Заполненная очередь не блокирует отправителя (в том числе цикл событий
+    сервера): enqueue() отклоняет сообщение и возвращает False (счетчик
+    rejected). stop() дожидается записи всего, что было поставлено в очередь.
+
+    Пакет, который не удалось записать за max_retries повторных попыток,
+    отбрасывается с записью в лог (счетчик dropped), чтобы одна ошибочная
+    запись не останавливала очередь; flush() возвращается после каждой попытки.
+    """
+
+    def __init__(self, database, batch_size: int = None, flush_interval: float = None,
+                 max_pending: int = None, max_retries: int = None):
+        self.database = database
+        self.batch_size = batch_size or config.MESSAGE_BATCH_SIZE
+        self.flush_interval = flush_interval if flush_interval is not None else config.MESSAGE_FLUSH_INTERVAL
+        self._queue = queue.Queue(maxsize=max_pending or config.MESSAGE_QUEUE_MAX_PENDING)
+        self.max_retries = max_retries if max_retries is not None else config.MESSAGE_WRITE_RETRIES
+        self._thread = None
+        self._running = False
+        self._unwritten = 0  # Поставлено в очередь, но еще не записано (включая собираемый пакет)
+        self._lock = threading.Lock()
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.rejected = 0  # Не принято: очередь заполнена
+
+    def start(self):
+        """Запуск потока записи"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._writer_loop, name="message-writer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def enqueue(self, message: Dict) -> bool:
+        """Постановка сообщения в очередь записи без ожидания; False - очередь заполнена"""
+        with self._lock:
+            self._unwritten += 1
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            with self._lock:
+                self._unwritten -= 1
+            self.rejected += 1
+            return False
+        return True
+
+    def pending(self) -> int:
+        """Количество сообщений, ожидающих записи (в очереди и в собираемом пакете)"""
+        return self._unwritten
+
+    def flush(self, timeout: float = None) -> bool:
+        """Ожидание записи всех сообщений, поставленных до вызова"""
+        done = threading.Event()
+        started = time.monotonic()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(None if timeout is None else max(0.0, timeout - (time.monotonic() - started)))
+
+    def stop(self, timeout: float = None):
+        """Остановка с записью всех оставшихся сообщений"""
+        if not self._running:
+            return
+        self._running = False
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _writer_loop(self):
+        batch: List[Dict] = []
+        waiters = []
+        stopping = False
+        failures = 0
+
+        while not stopping or batch:
+            # Ждем первое сообщение пакета, затем добираем до batch_size в пределах flush_interval;
+            # неудачный пакет повторяется без новых сообщений
+            deadline = None if not batch else time.monotonic() + self.flush_interval
+            while not stopping and not failures and len(batch) < self.batch_size:
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+
+                if item is None:
+                    stopping = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                    break
+                else:
+                    batch.append(item)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+
+            if stopping:
+                # Забираем все, что успели поставить до остановки
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if isinstance(item, threading.Event):
+                        waiters.append(item)
+                    elif item is not None:
+                        batch.append(item)
+
+            if batch:
+                if self._write(batch):
+                    with self._lock:
+                        self._unwritten -= len(batch)
+                    self.written += len(batch)
+                    self.batches += 1
+                    batch = []
+                    failures = 0
+                else:
+                    failures += 1
+                    if failures > self.max_retries:
+                        logger.error("Пакет из %d сообщений не записан за %d попыток и отброшен",
+                                     len(batch), failures)
+                        with self._lock:
+                            self._unwritten -= len(batch)
+                        self.dropped += len(batch)
+                        batch = []
+                        failures = 0
+
+            for waiter in waiters:
+                waiter.set()
+            waiters = []
+
+            if batch:
+                # База недоступна - пакет остается в памяти до следующей попытки
+                time.sleep(self.flush_interval)
+
+    def _write(self, batch: List[Dict]) -> bool:
+        """Одна попытка записи пакета; исключение считается неудачной попыткой"""
+        try:
+            return bool(self.database.add_messages(batch))
+        except Exception as e:
+            logger.exception("Ошибка записи пакета сообщений: %s", e)
+            return False
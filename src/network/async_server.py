@@ -0,0 +1,224 @@
+import asyncio
+import threading
+from typing import Optional
+import sys
+import os
+# Добавляем путь к src в PYTHONPATH
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+try:
+    from src.config import server_config as config
+except ImportError:
+    from src.config import config
+from src.network.outbound import OutboundQueue, WRITE_BATCH
+from src.network.protocol import FrameDecoder, ProtocolError
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class AsyncConnection:
+    """Клиентское подключение asyncio с интерфейсом сокета
+
+    Обработчики NetworkManager работают с объектом соединения как с обычным
+    сокетом (send, fileno, close), поэтому таблица message_handlers
+    используется без изменений в обоих режимах сервера.
+
+    Исходящие данные проходят через ограниченную очередь (OutboundQueue):
+    пока буфер транспорта ниже верхней границы, очередь сразу переносится
+    в транспорт, а когда получатель не успевает читать (pause_writing),
+    кадры копятся в очереди до resume_writing или ее переполнения.
+    """
+
+    def __init__(self, server: 'AsyncServer', transport: asyncio.Transport, address: tuple):
+        self.server = server
+        self.transport = transport
+        self.address = address
+        self.queue = OutboundQueue(on_ready=self._schedule_drain)
+        self._fileno = transport.get_extra_info('socket').fileno()
+        self._closed = False
+        self._paused = False  # Транспорт попросил приостановить запись
+        self._drain_scheduled = False
+
+    def send(self, data: bytes) -> int:
+        """Постановка данных в очередь отправки (не блокирует)"""
+        if self._closed:
+            raise OSError(f"Соединение {self.address} закрыто")
+        if not self.queue.push(data):
+            raise OSError(f"Очередь отправки {self.address} переполнена")
+        return len(data)
+
+    def sendall(self, data: bytes):
+        """Отправка всех данных"""
+        self.send(data)
+
+    def pause_writing(self):
+        self._paused = True
+
+    def resume_writing(self):
+        self._paused = False
+        self._drain()
+
+    def _schedule_drain(self):
+        if self.server.in_loop_thread():
+            self._drain()
+        elif not self._drain_scheduled:
+            # Вызов из другого потока (например, heartbeat) - разбор очереди в цикле событий
+            self._drain_scheduled = True
+            self.server.loop.call_soon_threadsafe(self._drain)
+
+    def _drain(self):
+        self._drain_scheduled = False
+        while not self._paused and not self._closed:
+            frames = self.queue.take_nowait(WRITE_BATCH)
+            if not frames:
+                break
+            self.transport.writelines(frames)
+
+    def fileno(self) -> int:
+        return -1 if self._closed else self._fileno
+
+    def shutdown(self, how: int = None):
+        """Разрыв соединения (как shutdown сокета): неотправленные данные отбрасываются
+
+        В отличие от close не ждет, пока получатель дочитает буфер транспорта,
+        поэтому подходит для зависших и неактивных соединений.
+        """
+        self.close(abort=True)
+
+    def close(self, abort: bool = False):
+        """Закрытие соединения (abort - без дописывания буфера транспорта)"""
+        if self._closed:
+            return
+        self._closed = True
+        self.queue.close()
+        close = self.transport.abort if abort else self.transport.close
+        if self.server.in_loop_thread():
+            close()
+        else:
+            self.server.loop.call_soon_threadsafe(close)
+
+    def __repr__(self):
+        return f"<AsyncConnection {self.address} closed={self._closed}>"
+
+
+class ClientProtocol(asyncio.Protocol):
+    """Протокол обработки одного клиентского подключения"""
+
+    def __init__(self, server: 'AsyncServer'):
+        self.server = server
+        self.connection = None
+        self.decoder = FrameDecoder()
+
+    def connection_made(self, transport: asyncio.Transport):
+        address = transport.get_extra_info('peername')
+        self.connection = AsyncConnection(self.server, transport, address)
+        self.server.connections.add(self.connection)
+        self.server.network_manager.decoders[self.connection] = self.decoder
+        self.server.network_manager.outbound[self.connection] = self.connection.queue
+        self.server.network_manager.track_connection(self.connection)
+
+    def pause_writing(self):
+        self.connection.pause_writing()
+
+    def resume_writing(self):
+        self.connection.resume_writing()
+
+    def data_received(self, data: bytes):
+        network_manager = self.server.network_manager
+        address = self.connection.address
+
+        self.decoder.feed(data)
+        try:
+            for message in self.decoder.messages():
+                network_manager.process_message(message, self.connection, address)
+        except ProtocolError as e:
+            logger.warning("Нарушение протокола клиентом %s: %s", address, e)
+            self.connection.close()
+        except Exception as e:
+            logger.exception("Ошибка обработки сообщения от %s: %s", address, e)
+
+    def connection_lost(self, exc: Optional[Exception]):
+        self.connection._closed = True
+        self.connection.queue.close()
+        self.server.connections.discard(self.connection)
+        try:
+            self.server.network_manager.handle_disconnect(self.connection)
+        except Exception as e:
+            logger.error("Ошибка обработки отключения %s: %s", self.connection.address, e)
+
+
+class AsyncServer:
+    """Сервер на одном цикле событий asyncio
+
+    Вместо потока на каждого клиента все подключения обслуживаются одним
+    циклом событий в отдельном потоке, поэтому тысячи простаивающих
+    соединений не расходуют память под стеки потоков.
+    """
+
+    def __init__(self, network_manager):
+        self.network_manager = network_manager
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.connections = set()
+        self._loop_thread_id = None
+
+    def in_loop_thread(self) -> bool:
+        """Выполняется ли код в потоке цикла событий"""
+        return threading.get_ident() == self._loop_thread_id
+
+    def start(self, host: str, port: int) -> bool:
+        """Запуск цикла событий и прослушивающего сокета"""
+        started = threading.Event()
+        errors = []
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            self._loop_thread_id = threading.get_ident()
+            try:
+                self.server = self.loop.run_until_complete(self.loop.create_server(
+                    lambda: ClientProtocol(self),
+                    host, port,
+                    backlog=config.SERVER_BACKLOG,
+                    reuse_address=True
+                ))
+            except Exception as e:
+                errors.append(e)
+                started.set()
+                self.loop.close()
+                return
+
+            started.set()
+            try:
+                self.loop.run_forever()
+            finally:
+                self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+                self.loop.close()
+
+        self.thread = threading.Thread(target=run, name="asyncio-server")
+        self.thread.daemon = True
+        self.thread.start()
+        started.wait()
+
+        if errors:
+            logger.error("Ошибка запуска asyncio-сервера: %s", errors[0])
+            return False
+        return True
+
+    def stop(self):
+        """Остановка сервера и закрытие всех подключений"""
+        if not self.loop or self.loop.is_closed():
+            return
+
+        def shutdown():
+            if self.server:
+                self.server.close()
+            for connection in list(self.connections):
+                connection.transport.close()
+            self.loop.stop()
+
+        self.loop.call_soon_threadsafe(shutdown)
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=5)
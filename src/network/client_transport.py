@@ -0,0 +1,66 @@
+import threading
+from typing import Dict, List
+from PySide6.QtCore import QObject, Qt, Signal, Slot
+
+
+class ClientTransport(QObject):
+    """Мост между потоком приема NetworkManager и потоком интерфейса Qt
+
+    Кадры декодируются в сетевом потоке и складываются в общий список.
+    Сигнал в поток интерфейса отправляется только когда список был пуст,
+    поэтому пачка сообщений, пришедшая быстрее, чем поток интерфейса успевает
+    ее забрать, доставляется одним вызовом messages_received со всем списком:
+    500 сообщений подряд - одна обработка и одна перерисовка, а не 500.
+    """
+
+    # Пачка входящих кадров (испускается в потоке интерфейса)
+    messages_received = Signal(list)
+    # Изменение состояния соединения с сервером (True - подключены)
+    connection_changed = Signal(bool)
+    # Внутренний сигнал из сетевого потока: в списке появились кадры
+    _pending_ready = Signal()
+
+    def __init__(self, network_manager, parent=None):
+        super().__init__(parent)
+        self.network_manager = network_manager
+        self._pending: List[Dict] = []
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.delivered = 0
+
+        self._pending_ready.connect(self._deliver, Qt.QueuedConnection)
+        network_manager.batch_callback = self.enqueue
+        network_manager.disconnect_callback = lambda: self.connection_changed.emit(False)
+
+    def enqueue(self, messages: List[Dict]):
+        """Добавление декодированных кадров (вызывается из сетевого потока)"""
+        if not messages:
+            return
+        with self._lock:
+            wake = not self._pending
+            self._pending.extend(messages)
+        if wake:
+            self._pending_ready.emit()
+
+    def pending(self) -> int:
+        """Количество кадров, ожидающих доставки в поток интерфейса"""
+        with self._lock:
+            return len(self._pending)
+
+    def set_connected(self, connected: bool):
+        """Уведомление подписчиков о восстановлении или потере соединения"""
+        self.connection_changed.emit(connected)
+
+    def send(self, message: Dict) -> bool:
+        """Отправка сообщения на сервер"""
+        return self.network_manager.send_client_message(message)
+
+    @Slot()
+    def _deliver(self):
+        """Передача накопленной пачки подписчикам (в потоке интерфейса)"""
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if batch:
+            self.batches += 1
+            self.delivered += len(batch)
+            self.messages_received.emit(batch)
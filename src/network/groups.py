@@ -0,0 +1,118 @@
+import threading
+from typing import Dict, List, Optional, Set
+import sys
+import os
+# Добавляем путь к src в PYTHONPATH
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+try:
+    from src.config import server_config as config
+except ImportError:
+    from src.config import config
+from src.database.database import Database
+
+
+class GroupIndex:
+    """Кэш участников групп и их подключенных участников
+
+    Состав группы читается из БД один раз при первом обращении и дальше
+    меняется вместе с таблицей group_members через методы индекса. При
+    подключении пользователя его группы загружаются одним запросом, и он
+    добавляется в набор подключенных участников каждой из них, поэтому
+    рассылка группового сообщения стоит O(подключенных участников) без
+    обращений к БД.
+    """
+
+    def __init__(self, database: Database):
+        self.database = database
+        self._members: Dict[int, Set[str]] = {}  # группа -> участники (загруженные группы)
+        self._online: Dict[int, Set[str]] = {}  # группа -> подключенные участники
+        self._user_groups: Dict[str, Set[int]] = {}  # подключенный пользователь -> его группы
+        self._lock = threading.Lock()
+
+    def connect(self, user_id: str):
+        """Пользователь подключился: он получает сообщения своих групп"""
+        groups = {group['group_id'] for group in self.database.get_user_groups(user_id)}
+        with self._lock:
+            self._user_groups[user_id] = groups
+            for group_id in groups:
+                self._online.setdefault(group_id, set()).add(user_id)
+
+    def disconnect(self, user_id: str):
+        """Пользователь отключился"""
+        with self._lock:
+            for group_id in self._user_groups.pop(user_id, ()):
+                self._discard_online(group_id, user_id)
+
+    def create(self, name: str, owner_id: str, members: List[str]) -> Optional[int]:
+        """Создание группы (владелец - участник); возвращает id группы"""
+        group_id = self.database.create_group(name, owner_id, members)
+        if group_id is None:
+            return None
+        with self._lock:
+            self._members[group_id] = {owner_id, *members}
+            for user_id in self._members[group_id]:
+                self._joined(group_id, user_id)
+        return group_id
+
+    def add_members(self, group_id: int, user_ids: List[str]) -> bool:
+        """Добавление участников в группу"""
+        members = self.members(group_id)
+        if len(members | set(user_ids)) > config.GROUP_MAX_MEMBERS:
+            return False
+        if not self.database.add_group_members(group_id, user_ids):
+            return False
+        with self._lock:
+            for user_id in user_ids:
+                self._members.setdefault(group_id, set()).add(user_id)
+                self._joined(group_id, user_id)
+        return True
+
+    def remove_member(self, group_id: int, user_id: str) -> bool:
+        """Удаление участника из группы"""
+        if not self.database.remove_group_member(group_id, user_id):
+            return False
+        with self._lock:
+            self._members.get(group_id, set()).discard(user_id)
+            groups = self._user_groups.get(user_id)
+            if groups is not None:
+                groups.discard(group_id)
+            self._discard_online(group_id, user_id)
+        return True
+
+    def members(self, group_id: int) -> Set[str]:
+        """Все участники группы (копия)"""
+        with self._lock:
+            members = self._members.get(group_id)
+            if members is not None:
+                return set(members)
+        loaded = set(self.database.get_group_members(group_id))
+        with self._lock:
+            # Пока шла выборка, участника могли добавить через индекс
+            members = self._members.setdefault(group_id, loaded)
+            return set(members)
+
+    def is_member(self, group_id: int, user_id: str) -> bool:
+        """Состоит ли пользователь в группе (для подключенных - без обращения к БД)"""
+        groups = self._user_groups.get(user_id)
+        if groups is not None:
+            return group_id in groups
+        return user_id in self.members(group_id)
+
+    def online_members(self, group_id: int) -> List[str]:
+        """Подключенные участники группы"""
+        with self._lock:
+            return list(self._online.get(group_id, ()))
+
+    def _joined(self, group_id: int, user_id: str):
+        groups = self._user_groups.get(user_id)
+        if groups is not None:
+            groups.add(group_id)
+            self._online.setdefault(group_id, set()).add(user_id)
+
+    def _discard_online(self, group_id: int, user_id: str):
+        online = self._online.get(group_id)
+        if online is not None:
+            online.discard(user_id)
+            if not online:
+                del self._online[group_id]
@@ -0,0 +1,300 @@
+import itertools
+import queue
+import selectors
+import socket
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+import sys
+import os
+# Добавляем путь к src в PYTHONPATH
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+try:
+    from src.config import server_config as config
+except ImportError:
+    try:
+        from src.config import client_config as config
+    except ImportError:
+        from src.config import config
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Наибольшая голосовая датаграмма; длиннее - обрезается и не пересылается
+MAX_DATAGRAM = 2048
+# Датаграмм, читаемых из одного сокета за одно пробуждение (остальные - на следующем круге)
+DRAIN_LIMIT = 64
+# Буфер приема сокета: всплеск пакетов, пока поток ретранслятора занят другими звонками
+SOCKET_BUFFER = 256 * 1024
+
+
+class RelayCall:
+    """Звонок через ретранслятор: по UDP-порту на каждого участника
+
+    Участник отправляет голосовые пакеты на свой порт и получает пакеты
+    собеседника с этого же порта - для клиента за NAT это ответы на его
+    собственные исходящие датаграммы. Адрес участника запоминается по
+    первому пакету с его IP (IP TCP-соединения с сервером).
+    """
+
+    __slots__ = ('call_id', 'users', 'hosts', 'sockets', 'peers', 'created', 'last_packet',
+                 'packets', 'bytes')
+
+    def __init__(self, call_id: int, users: Tuple[str, str], hosts: Tuple[Optional[str], Optional[str]],
+                 sockets: Tuple[socket.socket, socket.socket]):
+        self.call_id = call_id
+        self.users = users
+        self.hosts = hosts
+        self.sockets = sockets
+        self.peers: List[Optional[tuple]] = [None, None]
+        self.created = self.last_packet = time.monotonic()
+        self.packets = 0
+        self.bytes = 0
+
+    @property
+    def ports(self) -> Tuple[int, int]:
+        return self.sockets[0].getsockname()[1], self.sockets[1].getsockname()[1]
+
+
+class MediaRelay:
+    """UDP-ретранслятор голосовых пакетов в процессе сервера
+
+    Все сокеты звонков обслуживает один поток на selectors (epoll на
+    Linux): за пробуждение из каждого готового сокета читается до
+    DRAIN_LIMIT датаграмм в заранее выделенный буфер (recvfrom_into) и
+    сразу отправляется собеседнику срезом memoryview - без выделения памяти
+    и копирования на пакет. allocate() и release() вызываются из потоков
+    обработчиков сообщений: сокеты создаются и привязываются сразу (порты
+    нужны для ответа клиентам), а регистрация в селекторе и закрытие
+    выполняются потоком ретранслятора по очереди команд.
+    """
+
+    def __init__(self, host: str = None, port_min: int = None, port_max: int = None,
+                 idle_timeout: float = None, check_host: bool = None,
+                 on_expire: Optional[Callable[[RelayCall], None]] = None):
+        self.host = host or config.MEDIA_RELAY_HOST
+        self.port_min = config.MEDIA_RELAY_PORT_MIN if port_min is None else port_min
+        self.port_max = config.MEDIA_RELAY_PORT_MAX if port_max is None else port_max
+        self.idle_timeout = idle_timeout or config.MEDIA_RELAY_IDLE_TIMEOUT
+        self.check_host = config.MEDIA_RELAY_CHECK_HOST if check_host is None else check_host
+        self.on_expire = on_expire  # Вызывается потоком ретранслятора для звонка, завершенного по неактивности
+        self.calls: Dict[int, RelayCall] = {}
+        self.user_calls: Dict[str, int] = {}  # user_id -> call_id текущего звонка
+        self._call_ids = itertools.count(1)
+        self._next_port = self.port_min
+        self._lock = threading.Lock()
+        self._commands = queue.SimpleQueue()
+        self._selector = None
+        self._wake_reader = self._wake_writer = None
+        self.thread = None
+        self.is_running = False
+        self.relayed_packets = 0
+        self.relayed_bytes = 0
+        self.dropped_packets = 0  # С чужих адресов, без собеседника или слишком длинные
+        self.expired_calls = 0
+
+    def start(self) -> bool:
+        try:
+            self._selector = selectors.DefaultSelector()
+            self._wake_reader, self._wake_writer = socket.socketpair()
+            self._wake_reader.setblocking(False)
+            self._wake_writer.setblocking(False)
+            self._selector.register(self._wake_reader, selectors.EVENT_READ, None)
+        except OSError as e:
+            logger.error("Не удалось запустить ретранслятор звонков: %s", e)
+            return False
+        self.is_running = True
+        self.thread = threading.Thread(target=self._run, name="media-relay")
+        self.thread.daemon = True
+        self.thread.start()
+        logger.info("Ретранслятор звонков запущен на %s, порты %s-%s", self.host, self.port_min, self.port_max)
+        return True
+
+    def stop(self, timeout: float = 1.0):
+        if not self.is_running:
+            return
+        self.is_running = False
+        self._wake()
+        if self.thread:
+            self.thread.join(timeout)
+        for call in list(self.calls.values()):
+            self._close(call)
+        self.calls.clear()
+        self.user_calls.clear()
+        self._selector.close()
+        self._wake_reader.close()
+        self._wake_writer.close()
+
+    def allocate(self, caller_id: str, receiver_id: str, caller_host: str = None,
+                 receiver_host: str = None) -> Optional[RelayCall]:
+        """Порты для звонка caller_id -> receiver_id; None - нет свободных портов
+
+        Прежние звонки участников завершаются: у пользователя один звонок.
+        """
+        self.release_user(caller_id)
+        self.release_user(receiver_id)
+        sockets = []
+        with self._lock:
+            for _ in range(2):
+                sock = self._bind()
+                if sock is None:
+                    for opened in sockets:
+                        opened.close()
+                    logger.warning("Нет свободных портов для звонка %s -> %s", caller_id, receiver_id)
+                    return None
+                sockets.append(sock)
+            call = RelayCall(next(self._call_ids), (caller_id, receiver_id),
+                             (caller_host, receiver_host) if self.check_host else (None, None), tuple(sockets))
+            self.calls[call.call_id] = call
+            self.user_calls[caller_id] = self.user_calls[receiver_id] = call.call_id
+        self._commands.put(('register', call))
+        self._wake()
+        logger.info("Звонок %s: %s <-> %s через порты %s", call.call_id, caller_id, receiver_id, call.ports)
+        return call
+
+    def release(self, call_id: int) -> bool:
+        """Завершение звонка: порты освобождаются потоком ретранслятора"""
+        with self._lock:
+            call = self.calls.pop(call_id, None)
+            if call is None:
+                return False
+            for user_id in call.users:
+                if self.user_calls.get(user_id) == call_id:
+                    del self.user_calls[user_id]
+        self._commands.put(('close', call))
+        self._wake()
+        logger.info("Звонок %s завершен: %s пакетов, %s байт", call_id, call.packets, call.bytes)
+        return True
+
+    def release_user(self, user_id: str) -> bool:
+        """Завершение звонка пользователя (call_end, отключение)"""
+        call_id = self.user_calls.get(user_id)
+        return call_id is not None and self.release(call_id)
+
+    def call_of(self, user_id: str) -> Optional[RelayCall]:
+        call_id = self.user_calls.get(user_id)
+        return self.calls.get(call_id) if call_id is not None else None
+
+    def _bind(self) -> Optional[socket.socket]:
+        # Порты выдаются по кругу: только что освобожденный порт не достается сразу следующему звонку
+        for _ in range(self.port_max - self.port_min + 1 if self.port_min else 1):
+            port = self._next_port if self.port_min else 0
+            if self.port_min:
+                self._next_port = port + 1 if port < self.port_max else self.port_min
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            try:
+                sock.bind((self.host, port))
+            except OSError:
+                sock.close()
+                continue
+            sock.setblocking(False)
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER)
+            except OSError:
+                pass
+            return sock
+        return None
+
+    def _wake(self):
+        try:
+            self._wake_writer.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass  # Поток уже разбужен (буфер полон) или остановлен
+
+    def _close(self, call: RelayCall):
+        for sock in call.sockets:
+            try:
+                self._selector.unregister(sock)
+            except (KeyError, ValueError):
+                pass
+            sock.close()
+
+    def _run(self):
+        buffer = bytearray(MAX_DATAGRAM)
+        view = memoryview(buffer)
+        next_expiry = time.monotonic() + 1.0
+        while self.is_running:
+            for key, _ in self._selector.select(1.0):
+                if key.data is None:
+                    self._run_commands()
+                else:
+                    self._forward(key.fileobj, key.data[0], key.data[1], buffer, view)
+            now = time.monotonic()
+            if now >= next_expiry:
+                next_expiry = now + 1.0
+                self._expire(now)
+
+    def _run_commands(self):
+        try:
+            while self._wake_reader.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        while True:
+            try:
+                command, call = self._commands.get_nowait()
+            except queue.Empty:
+                return
+            if command == 'register':
+                if call.call_id in self.calls:
+                    for side, sock in enumerate(call.sockets):
+                        self._selector.register(sock, selectors.EVENT_READ, (call, side))
+                else:
+                    self._close(call)  # Завершен до регистрации
+            else:
+                self._close(call)
+
+    def _forward(self, sock: socket.socket, call: RelayCall, side: int, buffer: bytearray, view: memoryview):
+        """Пересылка датаграмм, накопившихся в сокете участника side, его собеседнику"""
+        peers = call.peers
+        out = call.sockets[1 - side]
+        for _ in range(DRAIN_LIMIT):
+            try:
+                size, address = sock.recvfrom_into(buffer)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return  # Сокет закрыт при завершении звонка или ICMP-ошибка от клиента
+            if address != peers[side]:
+                host = call.hosts[side]
+                if peers[side] is None and (host is None or address[0] == host):
+                    peers[side] = address
+                else:
+                    self.dropped_packets += 1
+                    continue
+            target = peers[1 - side]
+            if target is None or size >= MAX_DATAGRAM:
+                self.dropped_packets += 1
+                continue
+            try:
+                out.sendto(view[:size], target)
+            except OSError:
+                self.dropped_packets += 1
+                continue
+            call.packets += 1
+            call.bytes += size
+            call.last_packet = time.monotonic()
+            self.relayed_packets += 1
+            self.relayed_bytes += size
+
+    def _expire(self, now: float):
+        """Звонки без пакетов дольше idle_timeout (клиент пропал без call_end)"""
+        for call in [call for call in list(self.calls.values()) if now - call.last_packet > self.idle_timeout]:
+            if self.release(call.call_id):
+                self.expired_calls += 1
+                logger.info("Звонок %s завершен по неактивности", call.call_id)
+                if self.on_expire:
+                    try:
+                        self.on_expire(call)
+                    except Exception as e:
+                        logger.error("Ошибка уведомления о завершении звонка %s: %s", call.call_id, e)
+
+    def stats(self) -> Dict:
+        return {
+            'calls': len(self.calls),
+            'relayed_packets': self.relayed_packets,
+            'relayed_bytes': self.relayed_bytes,
+            'dropped_packets': self.dropped_packets,
+            'expired_calls': self.expired_calls
+        }
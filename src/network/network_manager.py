@@ -1,8 +1,8 @@
+import random
 import socket
-import json
 import threading
 import time
-from typing import Dict, List, Callable, Optional
+from typing import Dict, List, Optional
 import sys
 import os
 # Добавляем путь к src в PYTHONPATH
@@ -15,21 +15,51 @@ except ImportError:
         from src.config import client_config as config
     except ImportError:
         from src.config import config
-from src.database.database import Database
+from src.database.database import GROUP_PREFIX, Database, conversation_key, group_conversation
+from src.database.write_behind import MessageWriteQueue
+from src.network.groups import GroupIndex
+from src.network.media_relay import MediaRelay
+from src.network.outbound import OutboundQueue, SocketWriter
+from src.network.presence import PresenceTracker
+from src.network.timer_wheel import TimerWheel
+from src.network.protocol import (EncodedMessage, FrameDecoder, ProtocolError, encode_message,
+                                  negotiate_version, PROTOCOL_VERSION, LEGACY_PROTOCOL_VERSION)
+from src.utils.logger import get_logger
+from src.utils.metrics import Registry
+
+logger = get_logger(__name__)
 
 class NetworkManager:
-    def __init__(self, database: Database):
-        self.database = database
+    def __init__(self, database: Database = None):
+        self.database = database  # База сервера (у клиента - None)
         self.socket = None
         self.is_running = False
         self.connected_users = {}  # user_id -> (socket, address)
         self.message_handlers = {}
         self.heartbeat_thread = None
+        self.async_server = None
+        self.message_writer = None  # Очередь отложенной записи сообщений (сервер)
+        self.message_lock = threading.Lock()  # Выдача id и постановка кадра в очереди отправки (сервер)
+        self.presence = PresenceTracker(database)  # Онлайн-статусы и их наблюдатели (сервер)
+        self.groups = GroupIndex(database)  # Участники групп и подключенные участники (сервер)
+        self.keepalive = TimerWheel(config.TIMER_WHEEL_TICK, config.TIMER_WHEEL_SLOTS)  # heartbeat соединений (сервер)
+        self.last_activity = {}  # socket -> время последнего входящего сообщения (time.monotonic)
+        self.reaped_connections = 0  # Закрыто соединений по неактивности
+        self.decoders = {}  # socket -> FrameDecoder (сервер)
+        self.outbound = {}  # socket -> OutboundQueue исходящих кадров (сервер)
+        self.overflow_disconnects = 0  # Закрыто соединений из-за переполнения очереди отправки
+        self.media_relay = None  # UDP-ретранслятор голосовых пакетов звонков (сервер)
+        self.client_decoder = None  # FrameDecoder соединения с сервером (клиент)
+        self.client_send_lock = threading.Lock()  # Кадр целиком: шлют поток интерфейса и поток приема (клиент)
+        self.protocol_version = LEGACY_PROTOCOL_VERSION
         self.current_user_id = None
         self.message_callback = None  # Callback для обработки сообщений на клиенте
+        self.batch_callback = None  # Callback для пачки сообщений одного чтения (заменяет message_callback)
+        self.disconnect_callback = None  # Callback при потере соединения с сервером (клиент)
         
         # Регистрация обработчиков сообщений
         self.register_message_handlers()
+        self.register_metrics()
     
     def register_message_handlers(self):
         """Регистрация обработчиков различных типов сообщений"""
@@ -38,62 +68,155 @@ class NetworkManager:
             'message': self.handle_text_message,
             'status_update': self.handle_status_update,
             'heartbeat': self.handle_heartbeat,
+            'heartbeat_ack': self.handle_heartbeat_ack,
             'call_request': self.handle_call_request,
             'call_response': self.handle_call_response,
             'call_end': self.handle_call_end,
             'user_list_request': self.handle_user_list_request,
-            'user_list_response': self.handle_user_list_response
+            'user_list_response': self.handle_user_list_response,
+            'history_request': self.handle_history_request,
+            'read_receipt': self.handle_read_receipt,
+            'search_request': self.handle_search_request,
+            'contact_add': self.handle_contact_add,
+            'contact_list_request': self.handle_contact_list_request,
+            'group_create': self.handle_group_create,
+            'group_add_members': self.handle_group_add_members,
+            'group_leave': self.handle_group_leave,
+            'group_message': self.handle_group_message
         }
     
-    def start_server(self, host: str = None, port: int = None):
-        """Запуск сервера"""
+    def register_metrics(self):
+        """Метрики сервера (self.metrics, формат Prometheus)
+        
+        На пути сообщения только увеличиваются счетчики и гистограммы;
+        размеры очередей, подключения и счетчики закрытий читаются из
+        состояния сервера в момент запроса метрик.
+        """
+        self.metrics = Registry()
+        self.handler_seconds = self.metrics.histogram(
+            'aleph_handler_seconds', "Время обработки входящего сообщения по типам", ('type',))
+        self.unknown_messages = self.metrics.counter(
+            'aleph_messages_unknown_total', "Входящие сообщения неизвестного типа")
+        # Число обработанных сообщений уже есть в гистограмме - отдельный счетчик на пути сообщения не нужен
+        self.messages_received = self.metrics.counter(
+            'aleph_messages_received_total', "Входящие сообщения по типам", ('type',),
+            callback=self.handler_seconds.counts)
+        self.messages_sent = self.metrics.counter(
+            'aleph_messages_sent_total', "Исходящие сообщения по типам (по соединениям-получателям)", ('type',))
+        self.connections_accepted = self.metrics.counter(
+            'aleph_connections_accepted_total', "Принято подключений")
+        self.metrics.gauge('aleph_connections', "Открытые подключения",
+                           callback=lambda: len(self.last_activity))
+        self.metrics.gauge('aleph_users_online', "Подключенные пользователи",
+                           callback=lambda: len(self.connected_users))
+        self.metrics.counter('aleph_connections_reaped_total', "Закрыто соединений по неактивности",
+                             callback=lambda: self.reaped_connections)
+        self.metrics.counter('aleph_outbound_overflow_disconnects_total',
+                             "Закрыто соединений из-за переполнения очереди отправки",
+                             callback=lambda: self.overflow_disconnects)
+        self.metrics.gauge('aleph_outbound_queued_bytes', "Неотправленные данные во всех очередях",
+                           callback=lambda: self.outbound_stats()['queued_bytes'])
+        self.metrics.gauge('aleph_outbound_max_depth_bytes', "Наибольшая очередь отправки соединения",
+                           callback=lambda: self.outbound_stats()['max_depth'])
+        self.metrics.gauge('aleph_message_write_pending', "Сообщения, еще не записанные в БД",
+                           callback=lambda: self.message_writer.pending() if self.message_writer else 0)
+        self.metrics.counter('aleph_messages_rejected_total',
+                             "Сообщения, отклоненные из-за заполненной очереди записи",
+                             callback=lambda: self.message_writer.rejected if self.message_writer else 0)
+        if self.database:
+            self.metrics.register(self.database.query_seconds)
+        self.metrics.gauge('aleph_media_calls', "Звонки через ретранслятор",
+                           callback=lambda: self.media_relay.stats()['calls'] if self.media_relay else 0)
+        self.metrics.counter('aleph_media_packets_relayed_total', "Переслано голосовых пакетов",
+                             callback=lambda: self.media_relay.relayed_packets if self.media_relay else 0)
+        self.metrics.counter('aleph_media_packets_dropped_total',
+                             "Отброшено голосовых пакетов (чужой адрес, нет собеседника)",
+                             callback=lambda: self.media_relay.dropped_packets if self.media_relay else 0)
+    
+    def start_server(self, host: str = None, port: int = None, mode: str = None):
+        """Запуск сервера
+        
+        mode: 'asyncio' - все подключения обслуживаются одним циклом событий,
+              'threaded' - отдельный поток на каждого клиента
+        """
         host = host or config.HOST
         port = port or config.PORT
+        mode = mode or config.SERVER_MODE
+        
+        logger.info("Попытка запуска сервера на %s:%s (режим: %s)", host, port, mode)
+        
+        if config.MESSAGE_WRITE_BEHIND:
+            self.message_writer = MessageWriteQueue(self.database)
+            self.message_writer.start()
+        
+        # Статусы пользователей пишутся в БД пакетами раз в PRESENCE_CHECKPOINT_INTERVAL
+        self.presence.start()
         
-        print(f"Попытка запуска сервера на {host}:{port}")
+        # Голос звонков идет через сервер: клиенты за NAT не могут принять UDP друг от друга
+        if config.MEDIA_RELAY_ENABLED:
+            relay = MediaRelay(on_expire=self.end_expired_call)
+            if relay.start():
+                self.media_relay = relay
+        
+        if mode == 'asyncio':
+            return self.start_async_server(host, port)
         
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            print(f"Сокет создан, привязка к {host}:{port}")
+            logger.debug("Сокет создан, привязка к %s:%s", host, port)
             self.socket.bind((host, port))
-            print("Сокет привязан, настройка прослушивания")
-            self.socket.listen(5)
+            logger.debug("Сокет привязан, настройка прослушивания")
+            self.socket.listen(config.SERVER_BACKLOG)
             self.is_running = True
             
-            print(f"✓ Сервер запущен на {host}:{port}")
+            logger.info("✓ Сервер запущен на %s:%s", host, port)
             
             # Запуск потока для принятия подключений
-            print("Запуск потока принятия подключений...")
             accept_thread = threading.Thread(target=self.accept_connections)
             accept_thread.daemon = True
             accept_thread.start()
-            print("✓ Поток принятия подключений запущен")
+            logger.debug("✓ Поток принятия подключений запущен")
             
             # Запуск потока для heartbeat
-            print("Запуск потока heartbeat...")
             self.heartbeat_thread = threading.Thread(target=self.heartbeat_loop)
             self.heartbeat_thread.daemon = True
             self.heartbeat_thread.start()
-            print("✓ Поток heartbeat запущен")
+            logger.debug("✓ Поток heartbeat запущен")
             
             return True
         except Exception as e:
-            print(f"✗ Ошибка запуска сервера: {e}")
+            logger.error("✗ Ошибка запуска сервера: %s", e)
             return False
     
+    def start_async_server(self, host: str, port: int):
+        """Запуск сервера на цикле событий asyncio"""
+        from src.network.async_server import AsyncServer
+        
+        self.async_server = AsyncServer(self)
+        if not self.async_server.start(host, port):
+            self.async_server = None
+            return False
+        
+        self.is_running = True
+        logger.info("✓ Сервер запущен на %s:%s", host, port)
+        
+        # Heartbeat работает в отдельном потоке, отправка в asyncio-соединения потокобезопасна
+        self.heartbeat_thread = threading.Thread(target=self.heartbeat_loop)
+        self.heartbeat_thread.daemon = True
+        self.heartbeat_thread.start()
+        logger.debug("✓ Поток heartbeat запущен")
+        
+        return True
+    
     def accept_connections(self):
         """Принятие входящих подключений"""
-        print("Поток принятия подключений запущен")
-        print(f"Сокет сервера: {self.socket}")
-        print(f"is_running: {self.is_running}")
+        logger.debug("Поток принятия подключений запущен: %s", self.socket)
         
         while self.is_running:
             try:
-                print("Ожидание нового подключения...")
                 client_socket, address = self.socket.accept()
-                print(f"✓ Новое подключение от {address}")
-                print(f"Клиентский сокет: {client_socket}")
+                logger.info("✓ Новое подключение от %s", address)
                 
                 # Запуск потока для обработки клиента
                 client_thread = threading.Thread(
@@ -102,78 +225,83 @@ class NetworkManager:
                 )
                 client_thread.daemon = True
                 client_thread.start()
-                print(f"✓ Поток обработки клиента {address} запущен")
+                logger.debug("✓ Поток обработки клиента %s запущен", address)
                 
             except Exception as e:
                 if self.is_running:
-                    print(f"✗ Ошибка принятия подключения: {e}")
-                    import traceback
-                    traceback.print_exc()
+                    logger.exception("✗ Ошибка принятия подключения: %s", e)
     
     def handle_client(self, client_socket: socket.socket, address: tuple):
         """Обработка клиентского подключения"""
-        print(f"Начало обработки клиента {address}")
-        print(f"Клиентский сокет: {client_socket}")
-        print(f"is_running: {self.is_running}")
+        logger.debug("Начало обработки клиента %s", address)
+        
+        decoder = FrameDecoder()
+        self.decoders[client_socket] = decoder
+        # Запись в сокет - отдельным потоком: медленный получатель не блокирует отправителей
+        self.outbound[client_socket] = OutboundQueue()
+        SocketWriter(client_socket, self.outbound[client_socket]).start()
+        self.track_connection(client_socket)
         
         try:
             while self.is_running:
-                print(f"Ожидание данных от клиента {address}...")
-                print(f"Сокет активен: {client_socket.fileno() != -1}")
-                
-                data = client_socket.recv(4096)
-                print(f"Получены данные от {address}: {data}")
-                print(f"Размер данных: {len(data) if data else 0} байт")
+                received = decoder.recv_from(client_socket)
+                logger.debug("Размер данных от %s: %s байт", address, received)
                 
-                if not data:
-                    print(f"Клиент {address} закрыл соединение (пустые данные)")
+                if not received:
+                    logger.info("Клиент %s закрыл соединение", address)
                     break
                 
-                try:
-                    message = json.loads(data.decode('utf-8'))
-                    print(f"JSON декодирован успешно: {message}")
+                for message in decoder.messages():
                     self.process_message(message, client_socket, address)
-                except json.JSONDecodeError as e:
-                    print(f"Ошибка декодирования JSON от {address}: {e}")
-                    print(f"Полученные данные: {data}")
-                    print(f"Декодированная строка: {data.decode('utf-8', errors='ignore')}")
                     
+        except ProtocolError as e:
+            logger.warning("Нарушение протокола клиентом %s: %s", address, e)
         except Exception as e:
-            print(f"Ошибка обработки клиента {address}: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Ошибка обработки клиента %s: %s", address, e)
         finally:
-            print(f"Завершение обработки клиента {address}")
-            # Удаление пользователя из списка подключенных
-            for user_id, (sock, addr) in list(self.connected_users.items()):
-                if sock == client_socket:
-                    del self.connected_users[user_id]
-                    self.database.update_user_status(user_id, False)
-                    print(f"Пользователь {user_id} отключился")
-                    break
-            
+            logger.debug("Завершение обработки клиента %s", address)
+            self.handle_disconnect(client_socket)
             client_socket.close()
     
+    def handle_disconnect(self, client_socket):
+        """Удаление пользователя закрытого соединения из списка подключенных"""
+        self.decoders.pop(client_socket, None)
+        queue = self.outbound.pop(client_socket, None)
+        if queue:
+            queue.close()
+        self.keepalive.cancel(client_socket)
+        self.last_activity.pop(client_socket, None)
+        for user_id, (sock, addr) in list(self.connected_users.items()):
+            if sock == client_socket:
+                del self.connected_users[user_id]
+                self.set_user_offline(user_id)
+                if self.media_relay:
+                    self.media_relay.release_user(user_id)
+                logger.info("Пользователь %s отключился", user_id)
+                break
+    
     def process_message(self, message: Dict, client_socket: socket.socket, address: tuple):
         """Обработка входящего сообщения"""
         message_type = message.get('type')
-        print(f"Сервер получил сообщение типа: {message_type} от {address}")
-        print(f"Содержимое сообщения: {message}")
+        if client_socket in self.last_activity:
+            self.last_activity[client_socket] = time.monotonic()
+        logger.debug("Сервер получил сообщение типа %s от %s", message_type, address)
+        logger.debug("Содержимое сообщения: %s", message)
         
         handler = self.message_handlers.get(message_type)
         
         if handler:
-            print(f"Вызываем обработчик для {message_type}")
+            started = time.perf_counter()
             handler(message, client_socket, address)
+            self.handler_seconds.observe(time.perf_counter() - started, message_type)
         else:
-            print(f"Неизвестный тип сообщения: {message_type}")
+            self.unknown_messages.inc()
+            logger.warning("Неизвестный тип сообщения: %s", message_type)
     
     def handle_auth_request(self, message: Dict, client_socket: socket.socket, address: tuple):
         """Обработка запроса аутентификации"""
         user_id = message.get('user_id')
-        print(f"Обработка запроса аутентификации для пользователя: {user_id}")
-        print(f"Клиентский сокет: {client_socket}")
-        print(f"Адрес клиента: {address}")
+        logger.debug("Обработка запроса аутентификации для пользователя %s (%s)", user_id, address)
         
         if user_id:
             # Проверяем, разрешен ли пользователь
@@ -186,41 +314,38 @@ class NetworkManager:
                     'success': False,
                     'message': f'Пользователь {user_id} не разрешен. Разрешенные пользователи: {", ".join(allowed_users)}'
                 }
-                print(f"Отправляем ошибку клиенту {address}: {response}")
+                logger.warning("Пользователь %s не разрешен (%s)", user_id, address)
                 self.send_message(client_socket, response)
                 return
             
-            # Проверяем, существует ли пользователь, если нет - создаем
-            user = self.database.get_user(user_id)
-            if not user:
-                # Создаем нового пользователя
-                self.database.add_user(user_id)
-                print(f"Создан новый пользователь: {user_id}")
-            else:
-                print(f"Пользователь {user_id} уже существует")
-            
-            # Добавляем пользователя в список подключенных
-            self.connected_users[user_id] = (client_socket, address)
-            print(f"Пользователь {user_id} добавлен в список подключенных")
-            
-            # Обновляем статус в БД
-            self.database.update_user_status(user_id, True)
-            print(f"Статус пользователя {user_id} обновлен в БД")
+            # Согласование версии протокола: клиенты без protocol_version остаются на версии 1
+            protocol_version = negotiate_version(message.get('protocol_version'))
             
-            # Отправляем подтверждение аутентификации
+            # Отправляем подтверждение аутентификации (еще в прежнем формате)
             response = {
                 'type': 'auth_response',
                 'success': True,
                 'user_id': user_id,
+                'protocol_version': protocol_version,
                 'message': 'Аутентификация успешна'
             }
-            print(f"Подготовлен ответ: {response}")
-            print(f"Отправляем ответ клиенту {address}...")
+            logger.debug("Подготовлен ответ: %s", response)
             self.send_message(client_socket, response)
-            print(f"Ответ отправлен клиенту {address}")
             
-            print(f"Пользователь {user_id} успешно аутентифицирован")
-            print(f"Подключенные пользователи: {list(self.connected_users.keys())}")
+            # Все последующие сообщения соединения - в согласованном формате
+            decoder = self.decoders.get(client_socket)
+            if decoder:
+                decoder.version = protocol_version
+            
+            # Добавляем пользователя в список подключенных только после смены формата,
+            # чтобы пересылаемые ему сообщения не ушли в старом формате
+            self.connected_users[user_id] = (client_socket, address)
+            
+            # Запись пользователя в БД, статус в памяти (в БД - при очередной записи), снимок
+            # статусов контактов пользователю и уведомление его наблюдателей - вне цикла событий
+            self.run_blocking(self.complete_auth, user_id, client_socket)
+            
+            logger.info("Пользователь %s аутентифицирован (%s), подключено: %d", user_id, address, len(self.connected_users))
         else:
             # Отправляем ошибку аутентификации
             response = {
@@ -228,23 +353,32 @@ class NetworkManager:
                 'success': False,
                 'message': 'Не указан ID пользователя'
             }
-            print(f"Отправляем ошибку клиенту {address}: {response}")
+            logger.warning("Не указан ID пользователя в запросе аутентификации от %s", address)
             self.send_message(client_socket, response)
     
+    def complete_auth(self, user_id: str, client_socket):
+        """Создание пользователя при первом входе и переход в сеть (блокирующая часть аутентификации)"""
+        if not self.database.get_user(user_id):
+            self.database.add_user(user_id)
+            logger.info("Создан новый пользователь: %s", user_id)
+        else:
+            logger.debug("Пользователь %s уже существует", user_id)
+        self.set_user_online(user_id, client_socket)
+    
     def handle_text_message(self, message: Dict, client_socket: socket.socket, address: tuple):
         """Обработка текстового сообщения"""
         sender_id = message.get('sender_id')
         receiver_id = message.get('receiver_id')
         message_text = message.get('message_text')
         
-        print(f"Сервер получил сообщение: {sender_id} -> {receiver_id}: {message_text}")
-        print(f"Подключенные пользователи: {list(self.connected_users.keys())}")
+        logger.debug("Сообщение %s -> %s: %s", sender_id, receiver_id, message_text)
+        
+        # В группу пишут только через group_message (проверка членства)
+        if self.is_group_key(sender_id) or self.is_group_key(receiver_id):
+            logger.warning("Личное сообщение с ключом группы от %s: %s -> %s", address, sender_id, receiver_id)
+            return
         
         if sender_id and receiver_id and message_text:
-            # Сохранение сообщения в БД
-            self.database.add_message(sender_id, receiver_id, message_text)
-            print(f"Сообщение сохранено в БД")
-            
             # Подготовка ответа
             response = {
                 'type': 'message',
@@ -254,21 +388,14 @@ class NetworkManager:
                 'timestamp': time.time()
             }
             
-            # Отправка сообщения отправителю (для отображения в его чате)
-            if sender_id in self.connected_users:
-                sender_socket, _ = self.connected_users[sender_id]
-                self.send_message(sender_socket, response)
-                print(f"Сообщение отправлено отправителю {sender_id}")
-            else:
-                print(f"Отправитель {sender_id} не найден в подключенных пользователях")
-            
-            # Пересылка сообщения получателю
-            if receiver_id in self.connected_users and receiver_id != sender_id:
-                receiver_socket, _ = self.connected_users[receiver_id]
-                self.send_message(receiver_socket, response)
-                print(f"Сообщение переслано получателю {receiver_id}")
-            elif receiver_id != sender_id:
-                print(f"Получатель {receiver_id} не найден в подключенных пользователях")
+            # Отправитель (для отображения в его чате) и получатель получают один закодированный кадр
+            recipients = [sender_id] if receiver_id == sender_id else [sender_id, receiver_id]
+            sockets = [self.connected_users[user_id][0] for user_id in recipients
+                       if user_id in self.connected_users]
+            self.store_and_fan_out(response, sockets, client_socket)
+            for user_id in recipients:
+                if user_id not in self.connected_users:
+                    logger.debug("Пользователь %s не найден в подключенных пользователях", user_id)
     
     def handle_status_update(self, message: Dict, client_socket: socket.socket, address: tuple):
         """Обработка обновления статуса пользователя"""
@@ -276,25 +403,23 @@ class NetworkManager:
         is_online = message.get('is_online', True)
         
         if user_id:
-            # Обновление статуса в БД
-            self.database.update_user_status(user_id, is_online)
-            
             # Добавление в список подключенных пользователей
             if is_online:
                 self.connected_users[user_id] = (client_socket, address)
-                print(f"Пользователь {user_id} подключился. Всего подключено: {len(self.connected_users)}")
-                print(f"Подключенные пользователи: {list(self.connected_users.keys())}")
+                self.run_blocking(self.set_user_online, user_id, client_socket, False)
+                logger.info("Пользователь %s подключился. Всего подключено: %d", user_id, len(self.connected_users))
             else:
                 if user_id in self.connected_users:
                     del self.connected_users[user_id]
-                    print(f"Пользователь {user_id} отключился. Всего подключено: {len(self.connected_users)}")
+                    logger.info("Пользователь %s отключился. Всего подключено: %d", user_id, len(self.connected_users))
+                self.set_user_offline(user_id)
     
     def handle_heartbeat(self, message: Dict, client_socket: socket.socket, address: tuple):
         """Обработка heartbeat сообщения"""
         user_id = message.get('user_id')
         if user_id:
-            # Обновление времени последней активности
-            self.database.update_user_status(user_id, True)
+            # Обновление времени последней активности (в памяти, в БД - пакетом)
+            self.presence.touch(user_id)
             
             # Отправка подтверждения
             response = {
@@ -303,6 +428,12 @@ class NetworkManager:
             }
             self.send_message(client_socket, response)
     
+    def handle_heartbeat_ack(self, message: Dict, client_socket: socket.socket, address: tuple):
+        """Ответ клиента на heartbeat сервера (активность соединения уже отмечена)"""
+        user_id = message.get('user_id')
+        if user_id:
+            self.presence.touch(user_id)
+    
     def handle_call_request(self, message: Dict, client_socket: socket.socket, address: tuple):
         """Обработка запроса на звонок"""
         caller_id = message.get('caller_id')
@@ -317,7 +448,19 @@ class NetworkManager:
                 'caller_id': caller_id,
                 'timestamp': time.time()
             }
+            if 'codecs' in message:
+                # Кодеки звонящего в порядке предпочтения; получатель выбирает один в call_response
+                call_request['codecs'] = message['codecs']
             self.send_message(receiver_socket, call_request)
+        elif caller_id and receiver_id and self.is_connected_as(caller_id, client_socket):
+            # Получатель не в сети - звонящий не ждет ответа
+            self.send_message(client_socket, {
+                'type': 'call_response',
+                'receiver_id': receiver_id,
+                'accepted': False,
+                'reason': 'offline',
+                'timestamp': time.time()
+            })
     
     def handle_call_response(self, message: Dict, client_socket: socket.socket, address: tuple):
         """Обработка ответа на звонок"""
@@ -335,108 +478,750 @@ class NetworkManager:
                 'accepted': accepted,
                 'timestamp': time.time()
             }
+            if 'codec' in message:
+                call_response['codec'] = message['codec']
             self.send_message(caller_socket, call_response)
+            
+            # Порты ретранслятора - только если ответ пришел от самого получателя
+            if accepted and self.is_connected_as(receiver_id, client_socket):
+                self.start_relayed_call(caller_id, receiver_id, message.get('codec'))
+    
+    def start_relayed_call(self, caller_id: str, receiver_id: str, codec: str = None):
+        """Выделение портов ретранслятора и сообщение call_media обоим участникам
+        
+        Голос идет только через ретранслятор: если он выключен, портов нет или
+        участник отключился, оба получают call_end с причиной и не ждут call_media.
+        """
+        if not self.media_relay:
+            self.send_call_end((caller_id, receiver_id), 'no_media_relay')
+            return
+        caller, receiver = self.connected_users.get(caller_id), self.connected_users.get(receiver_id)
+        if not caller or not receiver:
+            self.send_call_end((caller_id, receiver_id), 'offline')
+            return
+        (caller_socket, caller_address), (receiver_socket, receiver_address) = caller, receiver
+        call = self.media_relay.allocate(caller_id, receiver_id, caller_address[0], receiver_address[0])
+        if call is None:
+            self.send_call_end((caller_id, receiver_id), 'no_media_ports')
+            return
+        for client_socket, peer_id, port in ((caller_socket, receiver_id, call.ports[0]),
+                                             (receiver_socket, caller_id, call.ports[1])):
+            call_media = {
+                'type': 'call_media',
+                'call_id': call.call_id,
+                'peer_id': peer_id,
+                'media_port': port,
+                'timestamp': time.time()
+            }
+            if codec:
+                call_media['codec'] = codec
+            self.send_message(client_socket, call_media)
     
     def handle_call_end(self, message: Dict, client_socket: socket.socket, address: tuple):
         """Обработка завершения звонка"""
         caller_id = message.get('caller_id')
         receiver_id = message.get('receiver_id')
         
+        # Порты ретранслятора освобождаются по call_end любого из участников
+        if self.media_relay:
+            for user_id in (caller_id, receiver_id):
+                if user_id and self.is_connected_as(user_id, client_socket):
+                    self.media_relay.release_user(user_id)
+        
         # Уведомление обеих сторон о завершении звонка
-        for user_id in [caller_id, receiver_id]:
-            if user_id and user_id in self.connected_users:
-                user_socket, _ = self.connected_users[user_id]
-                call_end = {
-                    'type': 'call_end',
-                    'timestamp': time.time()
-                }
-                self.send_message(user_socket, call_end)
+        self.send_call_end((caller_id, receiver_id))
+    
+    def end_expired_call(self, call):
+        """Звонок завершен ретранслятором по неактивности (вызывается его потоком)"""
+        self.send_call_end(call.users, 'media_timeout')
+    
+    def send_call_end(self, user_ids, reason: str = None):
+        """call_end подключенным участникам звонка; reason - причина завершения сервером"""
+        call_end = {
+            'type': 'call_end',
+            'timestamp': time.time()
+        }
+        if reason:
+            call_end['reason'] = reason
+        connections = [self.connected_users.get(user_id) for user_id in user_ids if user_id]
+        self.fan_out(call_end, [connection[0] for connection in connections if connection])
     
     def handle_user_list_request(self, message: Dict, client_socket: socket.socket, address: tuple):
         """Обработка запроса списка пользователей"""
         user_id = message.get('user_id')
         if user_id:
-            # Получение списка всех пользователей
-            users = self.database.get_all_users()
-            
-            response = {
-                'type': 'user_list_response',
-                'users': users,
-                'timestamp': time.time()
-            }
-            self.send_message(client_socket, response)
+            self.run_blocking(self.send_user_list, client_socket)
+    
+    def send_user_list(self, client_socket):
+        """Выборка пользователей и ответ user_list_response (блокирующая часть запроса)"""
+        # Получение списка всех пользователей; онлайн-статус - из памяти,
+        # в БД он записывается с задержкой до PRESENCE_CHECKPOINT_INTERVAL
+        users = self.database.get_all_users()
+        for user in users:
+            user['is_online'] = self.presence.is_online(user['user_id'])
+        
+        response = {
+            'type': 'user_list_response',
+            'users': users,
+            'timestamp': time.time()
+        }
+        self.send_message(client_socket, response)
     
     def handle_user_list_response(self, message: Dict, client_socket: socket.socket, address: tuple):
         """Обработка ответа со списком пользователей"""
         # Этот обработчик может использоваться для логирования
         pass
     
+    def handle_contact_add(self, message: Dict, client_socket: socket.socket, address: tuple):
+        """Добавление контакта: пользователь начинает получать изменения его статуса"""
+        user_id = message.get('user_id')
+        contact_id = message.get('contact_id')
+        if not user_id or not contact_id or not self.is_connected_as(user_id, client_socket):
+            return
+        self.run_blocking(self.send_contact_add_result, client_socket, user_id, contact_id)
+    
+    def send_contact_add_result(self, client_socket, user_id: str, contact_id: str):
+        """Запись контакта и ответ contact_add_response (блокирующая часть добавления)"""
+        success = bool(self.database.get_user(contact_id)) and self.database.add_contact(user_id, contact_id)
+        self.send_message(client_socket, {
+            'type': 'contact_add_response',
+            'contact_id': contact_id,
+            'success': success,
+            'timestamp': time.time()
+        })
+        if not success:
+            return
+        self.presence.add_contact(user_id, contact_id)
+        
+        # Текущий статус нового контакта
+        self.send_message(client_socket, {
+            'type': 'presence_delta',
+            'user_id': contact_id,
+            'is_online': self.presence.is_online(contact_id),
+            'timestamp': time.time()
+        })
+    
+    def handle_contact_list_request(self, message: Dict, client_socket: socket.socket, address: tuple):
+        """Список контактов пользователя с онлайн-статусами (ответ contact_list_response)"""
+        user_id = message.get('user_id')
+        if not user_id or not self.is_connected_as(user_id, client_socket):
+            return
+        self.run_blocking(self.send_contact_list, client_socket, user_id)
+    
+    def send_contact_list(self, client_socket, user_id: str):
+        """Выборка контактов и ответ contact_list_response (блокирующая часть запроса)
+        
+        Пока контактов нет, список - все пользователи, кроме самого пользователя:
+        так же сервер выбирает, чьи изменения статуса присылать.
+        """
+        contacts = self.database.get_contacts(user_id)
+        if not contacts:
+            contacts = [dict(user, contact_id=user['user_id']) for user in self.database.get_all_users()
+                        if user['user_id'] != user_id]
+        for contact in contacts:
+            contact['is_online'] = self.presence.is_online(contact['contact_id'])
+        self.send_message(client_socket, {
+            'type': 'contact_list_response',
+            'contacts': contacts,
+            'timestamp': time.time()
+        })
+    
+    def handle_history_request(self, message: Dict, client_socket: socket.socket, address: tuple):
+        """Обработка запроса страницы истории диалога
+        
+        Курсор - id сообщения: before_id - страница старше него (прокрутка вверх),
+        after_id - сообщения новее (догрузка после переподключения). Без курсора
+        возвращаются последние сообщения.
+        """
+        user_id = message.get('user_id')
+        contact_id = message.get('contact_id')
+        group_id = self.parse_group_id(message)
+        if not user_id or (not contact_id and group_id is None):
+            return
+        
+        # История выдается только участнику диалога (группы), подключенному с этого сокета;
+        # группа - только по group_id, не по ключу в contact_id
+        if not self.is_connected_as(user_id, client_socket) or self.is_group_key(contact_id) or (
+                group_id is not None and not self.groups.is_member(group_id, user_id)):
+            logger.warning("Запрос истории от неаутентифицированного соединения %s: %s", address, user_id)
+            self.send_message(client_socket, {
+                'type': 'history_response',
+                'success': False,
+                'contact_id': contact_id,
+                'group_id': group_id,
+                'messages': [],
+                'has_more': False,
+                'timestamp': time.time()
+            })
+            return
+        
+        try:
+            limit = int(message.get('limit') or config.HISTORY_PAGE_SIZE)
+            before_id = message.get('before_id')
+            after_id = message.get('after_id')
+            before_id = int(before_id) if before_id is not None else None
+            after_id = int(after_id) if after_id is not None else None
+        except (TypeError, ValueError):
+            logger.warning("Некорректный запрос истории: %s", message)
+            return
+        limit = max(1, min(limit, config.HISTORY_PAGE_MAX))
+        
+        conversation = group_conversation(group_id) if group_id is not None else conversation_key(user_id, contact_id)
+        self.run_blocking(self.send_history_page, client_socket, conversation, contact_id, group_id,
+                          before_id, after_id, limit)
+    
+    def send_history_page(self, client_socket, conversation: str, contact_id: Optional[str],
+                          group_id: Optional[int], before_id: Optional[int], after_id: Optional[int], limit: int):
+        """Выборка страницы истории и ответ history_response (блокирующая часть запроса)"""
+        # Сообщения из очереди отложенной записи должны попасть в выборку
+        self.flush_pending_messages()
+        if after_id is not None:
+            messages = self.database.get_messages_after(conversation, after_id, limit)
+        else:
+            messages = self.database.get_messages_before(conversation, before_id, limit)
+        
+        response = {
+            'type': 'history_response',
+            'success': True,
+            'contact_id': contact_id,
+            'group_id': group_id,
+            'before_id': before_id,
+            'after_id': after_id,
+            'messages': messages,
+            'has_more': len(messages) == limit,
+            'timestamp': time.time()
+        }
+        self.send_message(client_socket, response)
+    
+    def handle_read_receipt(self, message: Dict, client_socket: socket.socket, address: tuple):
+        """Отметка диалога прочитанным до last_read_id (без него - до последнего сообщения)
+        
+        В ответ пользователь получает read_receipt с новым курсором и числом
+        оставшихся непрочитанных сообщений диалога.
+        """
+        user_id = message.get('user_id')
+        contact_id = message.get('contact_id')
+        if not user_id or not contact_id or self.is_group_key(contact_id) or \
+                not self.is_connected_as(user_id, client_socket):
+            return
+        try:
+            last_read_id = message.get('last_read_id')
+            last_read_id = int(last_read_id) if last_read_id is not None else None
+        except (TypeError, ValueError):
+            logger.warning("Некорректная отметка прочтения: %s", message)
+            return
+        
+        # Без last_read_id прочитано все уже доставленное, в том числе сообщения в очереди
+        # write-behind: курсор - последний выданный id, при записи они сразу прочитаны
+        if last_read_id is None:
+            last_read_id = self.database.last_message_id()
+        self.run_blocking(self.send_read_state, client_socket, user_id, contact_id, last_read_id)
+    
+    def send_read_state(self, client_socket, user_id: str, contact_id: str, last_read_id: int):
+        """Сдвиг курсора прочтения и ответ read_receipt (блокирующая часть отметки)"""
+        state = self.database.mark_conversation_read(user_id, contact_id, last_read_id)
+        if state is not None:
+            self.send_message(client_socket, {
+                'type': 'read_receipt',
+                'conversations': [state],
+                'timestamp': time.time()
+            })
+    
+    def handle_search_request(self, message: Dict, client_socket: socket.socket, address: tuple):
+        """Поиск по сообщениям пользователя: в диалоге (contact_id), группе (group_id) или везде
+        
+        Ответ search_response содержит страницу результатов по релевантности и
+        cursor для следующей страницы (None - результатов больше нет).
+        """
+        user_id = message.get('user_id')
+        contact_id = message.get('contact_id')
+        group_id = self.parse_group_id(message)
+        query = message.get('query')
+        if not user_id or not isinstance(query, str):
+            return
+        
+        response = {
+            'type': 'search_response',
+            'success': False,
+            'query': query,
+            'contact_id': contact_id,
+            'group_id': group_id,
+            'messages': [],
+            'cursor': None,
+            'timestamp': time.time()
+        }
+        if not self.is_connected_as(user_id, client_socket) or self.is_group_key(contact_id) or (
+                group_id is not None and not self.groups.is_member(group_id, user_id)):
+            logger.warning("Запрос поиска от неаутентифицированного соединения %s: %s", address, user_id)
+            self.send_message(client_socket, response)
+            return
+        
+        try:
+            limit = int(message.get('limit') or config.SEARCH_PAGE_SIZE)
+            cursor = message.get('cursor')
+            cursor = str(cursor) if cursor is not None else None
+        except (TypeError, ValueError):
+            logger.warning("Некорректный запрос поиска: %s", message)
+            return
+        limit = max(1, min(limit, config.SEARCH_PAGE_MAX))
+        
+        conversation = group_conversation(group_id) if group_id is not None else contact_id
+        self.run_blocking(self.send_search_results, client_socket, response, user_id, conversation, limit, cursor)
+    
+    def send_search_results(self, client_socket, response: Dict, user_id: str, conversation: Optional[str],
+                            limit: int, cursor: Optional[str]):
+        """Поиск и ответ search_response (блокирующая часть запроса)"""
+        # Сообщения из очереди отложенной записи должны попасть в выборку
+        self.flush_pending_messages()
+        response.update(self.database.search_messages(user_id, response['query'], conversation, limit, cursor))
+        response['success'] = True
+        self.send_message(client_socket, response)
+    
+    def send_unread_counts(self, user_id: str, client_socket):
+        """Снимок непрочитанных при подключении: диалоги, не перечисленные в нем, прочитаны"""
+        self.flush_pending_messages()
+        self.send_message(client_socket, {
+            'type': 'read_receipt',
+            'snapshot': True,
+            'conversations': self.database.get_unread_counts(user_id),
+            'timestamp': time.time()
+        })
+    
+    def handle_group_create(self, message: Dict, client_socket: socket.socket, address: tuple):
+        """Создание группы: состав группы получают все подключенные участники (group_update)"""
+        user_id = message.get('user_id')
+        name = (message.get('name') or '').strip()
+        if not user_id or not name or not self.is_connected_as(user_id, client_socket):
+            return
+        self.run_blocking(self.create_group_and_notify, user_id, name, message.get('members') or [])
+    
+    def create_group_and_notify(self, user_id: str, name: str, members: List[str]):
+        """Проверка участников, запись группы и group_update (блокирующая часть создания)"""
+        members = [member for member in dict.fromkeys(members)
+                   if member != user_id and self.database.get_user(member)]
+        if len(members) + 1 > config.GROUP_MAX_MEMBERS:
+            logger.warning("Группа %s превышает %d участников", name, config.GROUP_MAX_MEMBERS)
+            return
+        group_id = self.groups.create(name, user_id, members)
+        if group_id is not None:
+            logger.info("Создана группа %s (%s), участников: %d", group_id, name, len(members) + 1)
+            self.send_group_update(group_id)
+    
+    def handle_group_add_members(self, message: Dict, client_socket: socket.socket, address: tuple):
+        """Добавление участников группы (любым ее участником)"""
+        user_id = message.get('user_id')
+        group_id = self.parse_group_id(message)
+        if (group_id is None or not self.is_connected_as(user_id, client_socket)
+                or not self.groups.is_member(group_id, user_id)):
+            return
+        self.run_blocking(self.add_group_members_and_notify, group_id, message.get('members') or [])
+    
+    def add_group_members_and_notify(self, group_id: int, members: List[str]):
+        """Запись новых участников и group_update (блокирующая часть добавления)"""
+        members = [member for member in dict.fromkeys(members) if self.database.get_user(member)]
+        if members and self.groups.add_members(group_id, members):
+            self.send_group_update(group_id)
+    
+    def handle_group_leave(self, message: Dict, client_socket: socket.socket, address: tuple):
+        """Выход пользователя из группы"""
+        user_id = message.get('user_id')
+        group_id = self.parse_group_id(message)
+        if (group_id is None or not self.is_connected_as(user_id, client_socket)
+                or not self.groups.is_member(group_id, user_id)):
+            return
+        
+        self.run_blocking(self.leave_group_and_notify, group_id, user_id, client_socket)
+    
+    def leave_group_and_notify(self, group_id: int, user_id: str, client_socket):
+        """Удаление участника и group_update, включая вышедшего (блокирующая часть выхода)"""
+        if self.groups.remove_member(group_id, user_id):
+            self.send_group_update(group_id, extra=[client_socket])
+    
+    def handle_group_message(self, message: Dict, client_socket: socket.socket, address: tuple):
+        """Сообщение в группу
+        
+        Сохраняется один раз (receiver_id - ключ группы) и рассылается
+        подключенным участникам, включая отправителя. Состав группы и ее
+        подключенные участники берутся из GroupIndex без обращений к БД.
+        """
+        sender_id = message.get('sender_id')
+        group_id = self.parse_group_id(message)
+        message_text = message.get('message_text')
+        if not sender_id or group_id is None or not message_text:
+            return
+        if not self.is_connected_as(sender_id, client_socket) or not self.groups.is_member(group_id, sender_id):
+            logger.warning("Сообщение в группу %s не от ее участника: %s", group_id, sender_id)
+            return
+        
+        response = {
+            'type': 'group_message',
+            'group_id': group_id,
+            'sender_id': sender_id,
+            'receiver_id': group_conversation(group_id),
+            'message_text': message_text,
+            'timestamp': time.time()
+        }
+        self.store_and_fan_out(response, [self.connected_users[member][0]
+                                          for member in self.groups.online_members(group_id)
+                                          if member in self.connected_users], client_socket)
+    
+    def store_and_fan_out(self, response: Dict, sockets: List, sender_socket=None):
+        """Сохранение сообщения с id сервера и рассылка кадра с этим id
+        
+        id выдается и кадр ставится в очереди отправки под одной блокировкой:
+        каждый клиент получает сообщения диалога в порядке возрастания id,
+        даже если их обрабатывают разные потоки (режим threaded). Если очередь
+        write-behind заполнена, сообщение не рассылается, а отправитель
+        получает message_error.
+        """
+        if not self.message_writer:
+            # Без write-behind запись в БД до доставки - вне цикла событий
+            self.run_blocking(self.store_then_fan_out, response, sockets)
+            return
+        with self.message_lock:
+            response['id'] = self.database.allocate_message_ids()
+            # Сохранение сообщения в БД: при write-behind - в очередь, запись после доставки
+            if self.message_writer.enqueue(response):
+                self.fan_out(response, sockets)
+                return
+        logger.warning("Очередь записи сообщений заполнена, сообщение %s -> %s отклонено",
+                       response['sender_id'], response['receiver_id'])
+        if sender_socket is not None:
+            self.send_message(sender_socket, {
+                'type': 'message_error',
+                'reason': 'server_busy',
+                'message_type': response['type'],
+                'receiver_id': response['receiver_id'],
+                'group_id': response.get('group_id'),
+                'message_text': response['message_text'],
+                'timestamp': time.time()
+            })
+    
+    def store_then_fan_out(self, response: Dict, sockets: List):
+        """Синхронная запись сообщения и рассылка (MESSAGE_WRITE_BEHIND = False)"""
+        with self.message_lock:
+            response['id'] = self.database.allocate_message_ids()
+            self.database.add_messages([response])
+            self.fan_out(response, sockets)
+    
+    def send_group_update(self, group_id: int, extra: List = None):
+        """Рассылка состава группы подключенным участникам (и дополнительным соединениям)"""
+        group = self.database.get_group(group_id)
+        if not group:
+            return
+        update = {
+            'type': 'group_update',
+            'group_id': group_id,
+            'name': group['name'],
+            'owner_id': group['owner_id'],
+            'members': sorted(self.groups.members(group_id)),
+            'timestamp': time.time()
+        }
+        sockets = [self.connected_users[member][0] for member in self.groups.online_members(group_id)
+                   if member in self.connected_users]
+        self.fan_out(update, sockets + [sock for sock in extra or [] if sock not in sockets])
+    
+    def run_blocking(self, function, *args):
+        """Выполнение обработчика, который ждет БД (запись очереди, выборку), вне цикла событий
+        
+        В asyncio-режиме function выполняется в пуле потоков цикла и сама
+        отправляет ответ (отправка в asyncio-соединения потокобезопасна), в
+        потоковом режиме - сразу в потоке клиента. Любое обращение к БД из
+        обработчика сообщения идет через этот метод.
+        """
+        if not (self.async_server and self.async_server.in_loop_thread()):
+            function(*args)
+            return
+        
+        def run():
+            try:
+                function(*args)
+            except Exception as e:
+                logger.exception("Ошибка обработчика %s: %s", function.__name__, e)
+        self.async_server.loop.run_in_executor(None, run)
+    
+    def flush_pending_messages(self):
+        """Запись очереди write-behind перед выборкой (не вызывать в потоке цикла событий)"""
+        if self.message_writer and self.message_writer.pending():
+            self.message_writer.flush(config.MESSAGE_FLUSH_INTERVAL * 10)
+    
+    @staticmethod
+    def is_group_key(user_id) -> bool:
+        """Ключ группы вместо пользователя: группы доступны только по group_id с проверкой членства"""
+        return isinstance(user_id, str) and user_id.startswith(GROUP_PREFIX)
+    
+    @staticmethod
+    def parse_group_id(message: Dict) -> Optional[int]:
+        """id группы из сообщения (None - не указан или некорректен)"""
+        try:
+            group_id = message.get('group_id')
+            return int(group_id) if group_id is not None else None
+        except (TypeError, ValueError):
+            return None
+    
+    def is_connected_as(self, user_id: str, client_socket) -> bool:
+        """Зарегистрирован ли user_id на этом соединении"""
+        connection = self.connected_users.get(user_id)
+        return connection is not None and connection[0] is client_socket
+    
+    def set_user_online(self, user_id: str, client_socket, new_connection: bool = True):
+        """Пользователь в сети: снимки статусов и непрочитанных ему, изменение его наблюдателям
+        
+        Полный снимок отправляется только при подключении (auth_request или
+        первый status_update соединения без аутентификации), дальше клиент
+        получает presence_delta по своим контактам. Читает контакты и группы
+        из БД - вызывается через run_blocking.
+        """
+        if not self.is_connected_as(user_id, client_socket):
+            return  # Соединение закрыто, пока вызов ждал своей очереди
+        recipients = self.presence.connect(user_id)
+        if recipients is not None or new_connection:
+            self.groups.connect(user_id)
+            self.send_message(client_socket, {
+                'type': 'presence_snapshot',
+                'online': self.presence.snapshot(user_id),
+                'timestamp': time.time()
+            })
+            self.send_unread_counts(user_id, client_socket)
+        if recipients:
+            self.broadcast_presence(user_id, True, recipients)
+    
+    def set_user_offline(self, user_id: str):
+        """Пользователь не в сети: уведомление его наблюдателей"""
+        self.groups.disconnect(user_id)
+        recipients = self.presence.disconnect(user_id)
+        if recipients:
+            self.broadcast_presence(user_id, False, recipients)
+    
+    def broadcast_presence(self, user_id: str, is_online: bool, recipients: List[str]):
+        """Отправка presence_delta подключенным наблюдателям пользователя"""
+        delta = {
+            'type': 'presence_delta',
+            'user_id': user_id,
+            'is_online': is_online,
+            'timestamp': time.time()
+        }
+        self.fan_out(delta, [self.connected_users[recipient][0] for recipient in recipients
+                             if recipient in self.connected_users], coalesce_key=('presence', user_id))
+    
     def send_message(self, client_socket: socket.socket, message: Dict):
         """Отправка сообщения клиенту"""
         try:
-            print(f"Подготовка к отправке сообщения: {message}")
-            data = json.dumps(message).encode('utf-8')
-            print(f"Закодированные данные: {data}")
-            print(f"Размер данных: {len(data)} байт")
-            print(f"Клиентский сокет: {client_socket}")
-            print(f"Сокет закрыт: {client_socket.fileno() == -1}")
+            decoder = self.decoders.get(client_socket)
+            version = decoder.version if decoder else LEGACY_PROTOCOL_VERSION
+            data = encode_message(message, version)
             
-            bytes_sent = client_socket.send(data)
-            print(f"Отправлено байт: {bytes_sent}")
-            print(f"Сервер отправил сообщение: {message}")
+            self.write(client_socket, data)
+            self.messages_sent.inc(message.get('type'))
+            logger.debug("Сервер отправил %s (%d байт) в %s", message.get('type'), len(data), client_socket)
         except Exception as e:
-            print(f"Ошибка отправки сообщения: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.warning("Ошибка отправки %s в %s: %s", message.get('type'), client_socket, e)
+    
+    def write(self, client_socket, data: bytes, coalesce_key=None):
+        """Постановка кадра в очередь отправки соединения
+        
+        Не ждет получателя: очередь разбирает писатель соединения. При
+        переполнении очереди (OUTBOUND_QUEUE_MAX_BYTES, действие -
+        OUTBOUND_OVERFLOW_POLICY) соединение закрывается и возбуждается
+        OSError. Соединения без очереди (клиент) пишутся напрямую.
+        """
+        queue = self.outbound.get(client_socket)
+        if queue is None:
+            client_socket.sendall(data)
+            return
+        if queue.push(data, coalesce_key):
+            return
+        if queue.closed:
+            raise OSError(f"Соединение {client_socket} закрыто")
+        
+        self.overflow_disconnects += 1
+        logger.warning("Очередь отправки %s переполнена (%d байт), соединение закрывается", client_socket, queue.depth)
+        queue.close()
+        try:
+            client_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        raise OSError(f"Очередь отправки {client_socket} переполнена")
+    
+    def outbound_stats(self) -> Dict:
+        """Состояние очередей отправки подключенных соединений"""
+        queues = list(self.outbound.values())
+        return {
+            'connections': len(queues),
+            'queued_bytes': sum(queue.depth for queue in queues),
+            'queued_frames': sum(len(queue) for queue in queues),
+            'max_depth': max((queue.depth for queue in queues), default=0),
+            'peak_depth': max((queue.peak_bytes for queue in queues), default=0),
+            'dropped_frames': sum(queue.dropped for queue in queues),
+            'coalesced_frames': sum(queue.coalesced for queue in queues),
+            'overflow_disconnects': self.overflow_disconnects
+        }
+    
+    def fan_out(self, message: Dict, sockets: List, coalesce_key=None) -> int:
+        """Рассылка одного сообщения нескольким соединениям
+        
+        Сообщение сериализуется один раз (EncodedMessage), каждому соединению
+        пишутся одни и те же bytes его версии формата. Возвращает число
+        соединений, в которые данные переданы. Подходит для пересылки
+        отправителю и получателю, рассылки статусов, групповых чатов и
+        нескольких устройств одного пользователя. coalesce_key - ключ
+        замены неотправленного кадра (см. OutboundQueue.push).
+        """
+        if not sockets:
+            return 0
+        encoded = EncodedMessage(message)
+        delivered = 0
+        for client_socket in sockets:
+            decoder = self.decoders.get(client_socket)
+            try:
+                self.write(client_socket, encoded.for_version(decoder.version if decoder else LEGACY_PROTOCOL_VERSION),
+                           coalesce_key)
+                delivered += 1
+            except Exception as e:
+                logger.warning("Ошибка отправки %s в %s: %s", message.get('type'), client_socket, e)
+        self.messages_sent.inc(message.get('type'), amount=delivered)
+        logger.debug("Сервер разослал %s (%d байт): %d из %d соединений",
+                     message.get('type'), len(encoded.payload), delivered, len(sockets))
+        return delivered
     
     def heartbeat_loop(self):
-        """Цикл отправки heartbeat сообщений"""
+        """Цикл колеса таймеров: heartbeat соединениям вразброс и закрытие неактивных"""
         while self.is_running:
-            time.sleep(config.HEARTBEAT_INTERVAL)
+            time.sleep(config.TIMER_WHEEL_TICK)
+            self.process_keepalive()
+    
+    def track_connection(self, client_socket, now: float = None):
+        """Новое соединение: отметка активности и первый heartbeat в случайной фазе интервала
+        
+        Случайная фаза распределяет heartbeat равномерно по HEARTBEAT_INTERVAL
+        вместо одновременной отправки всем соединениям.
+        """
+        self.connections_accepted.inc()
+        self.last_activity[client_socket] = time.monotonic() if now is None else now
+        self.keepalive.schedule(client_socket, random.uniform(0, config.HEARTBEAT_INTERVAL))
+    
+    def idle_timeout(self, client_socket) -> float:
+        """Допустимое время без активности: клиенты с кадрами отвечают на heartbeat"""
+        decoder = self.decoders.get(client_socket)
+        if decoder and decoder.version > LEGACY_PROTOCOL_VERSION:
+            return config.ONLINE_TIMEOUT
+        return config.CONNECTION_TIMEOUT
+    
+    def process_keepalive(self, now: float = None) -> int:
+        """Соединения, чей heartbeat пришелся на текущий тик колеса
+        
+        Неактивные дольше idle_timeout закрываются, остальным отправляется
+        heartbeat и ставится следующий через HEARTBEAT_INTERVAL. Возвращает
+        число отправленных heartbeat.
+        """
+        if now is None:
+            now = time.monotonic()
+        sent = 0
+        for client_socket in self.keepalive.advance(now):
+            idle = now - self.last_activity.get(client_socket, now)
+            if idle > self.idle_timeout(client_socket):
+                self.reap_connection(client_socket, idle)
+                continue
             
-            # Проверка активности пользователей
-            current_time = time.time()
-            for user_id, (socket, address) in list(self.connected_users.items()):
-                try:
-                    # Отправка heartbeat
-                    heartbeat = {
-                        'type': 'heartbeat',
-                        'user_id': user_id,
-                        'timestamp': current_time
-                    }
-                    self.send_message(socket, heartbeat)
-                except Exception as e:
-                    print(f"Ошибка heartbeat для {user_id}: {e}")
-                    # Удаление неактивного пользователя
-                    del self.connected_users[user_id]
-                    self.database.update_user_status(user_id, False)
+            heartbeat = {
+                'type': 'heartbeat',
+                'timestamp': time.time()
+            }
+            self.send_message(client_socket, heartbeat)
+            self.keepalive.schedule(client_socket, config.HEARTBEAT_INTERVAL)
+            sent += 1
+        return sent
+    
+    def reap_connection(self, client_socket, idle: float):
+        """Закрытие соединения без активности
+        
+        Соединения asyncio-сервера закрываются в цикле событий: handle_disconnect
+        меняет то же состояние, что и обработчики сообщений. В режиме потоков
+        вызов выполняется сразу в потоке heartbeat.
+        """
+        if self.async_server and self.async_server.loop and not self.async_server.in_loop_thread():
+            self.async_server.loop.call_soon_threadsafe(self.reap_connection, client_socket, idle)
+            return
+        self.reaped_connections += 1
+        logger.info("Соединение %s неактивно %.0f с - закрывается (всего закрыто: %d)",
+                    client_socket, idle, self.reaped_connections)
+        self.handle_disconnect(client_socket)
+        try:
+            # Поток handle_client, ожидающий в recv, просыпается только после shutdown
+            client_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            client_socket.close()
+        except OSError:
+            pass
     
     def stop_server(self):
         """Остановка сервера"""
         self.is_running = False
         
         # Закрытие всех клиентских подключений
-        for user_id, (socket, address) in list(self.connected_users.items()):
+        for user_id, (client_socket, address) in list(self.connected_users.items()):
             try:
-                socket.close()
+                client_socket.close()
             except:
                 pass
-            self.database.update_user_status(user_id, False)
+            # Клиенты тоже отключаются - изменения не рассылаются
+            self.presence.disconnect(user_id)
+        # Потоки записи соединений завершаются вместе с очередями
+        for queue in list(self.outbound.values()):
+            queue.close()
         
-        # Закрытие серверного сокета
+        # Закрытие серверного сокета (или соединения клиента)
         if self.socket:
+            try:
+                if self.client_decoder:
+                    # Поток приема, ожидающий в recv, иначе удерживает соединение открытым
+                    self.socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
             try:
                 self.socket.close()
             except:
                 pass
         
-        print("Сервер остановлен")
+        if self.media_relay:
+            self.media_relay.stop()
+            self.media_relay = None
+        
+        # Остановка цикла событий asyncio
+        if self.async_server:
+            self.async_server.stop()
+            self.async_server = None
+        
+        # Запись всех сообщений, оставшихся в очереди
+        if self.message_writer:
+            pending = self.message_writer.pending()
+            self.message_writer.stop()
+            self.message_writer = None
+            logger.info("Очередь записи сообщений сохранена (%d ожидало записи)", pending)
+        
+        # Запись статусов и last_seen, накопленных с последней записи
+        self.presence.stop()
+        
+        logger.info("Сервер остановлен")
     
-    def connect_to_server(self, host: str, port: int) -> bool:
-        """Подключение к серверу как клиент"""
+    def connect_to_server(self, host: str, port: int, user_id: str = None) -> bool:
+        """Подключение к серверу как клиент
+        
+        Если указан user_id, соединение проходит auth_request с согласованием
+        версии протокола; иначе используется устаревший формат без кадров.
+        """
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.socket.connect((host, port))
+            self.client_decoder = FrameDecoder()
+            
+            if user_id and not self.authenticate(user_id):
+                self.socket.close()
+                self.socket = None
+                return False
+            
             self.is_running = True
             
             # Запуск потока для приема сообщений
@@ -446,46 +1231,192 @@ class NetworkManager:
             
             return True
         except Exception as e:
-            print(f"Ошибка подключения к серверу: {e}")
+            logger.error("Ошибка подключения к серверу: %s", e)
+            return False
+    
+    def authenticate(self, user_id: str) -> bool:
+        """Аутентификация соединения и согласование версии протокола"""
+        request = {
+            'type': 'auth_request',
+            'user_id': user_id,
+            'protocol_version': PROTOCOL_VERSION
+        }
+        self.socket.sendall(encode_message(request, LEGACY_PROTOCOL_VERSION))
+        self.socket.settimeout(config.HANDSHAKE_TIMEOUT)
+        
+        try:
+            while True:
+                if not self.client_decoder.recv_from(self.socket):
+                    logger.warning("Сервер закрыл соединение во время аутентификации")
+                    return False
+                
+                for message in self.client_decoder.messages():
+                    if message.get('type') != 'auth_response':
+                        # Сообщения до ответа обрабатываются в обычном порядке
+                        self.process_client_messages([message])
+                        continue
+                    
+                    if not message.get('success'):
+                        logger.warning("Ошибка аутентификации: %s", message.get('message'))
+                        return False
+                    
+                    # Сервер переключается на согласованный формат сразу после ответа
+                    self.client_decoder.version = negotiate_version(message.get('protocol_version'))
+                    self.protocol_version = self.client_decoder.version
+                    self.current_user_id = user_id
+                    return True
+        except (socket.timeout, ProtocolError) as e:
+            logger.warning("Ошибка аутентификации: %s", e)
             return False
+        finally:
+            self.socket.settimeout(None)
     
     def receive_messages(self):
         """Прием сообщений от сервера"""
+        # Кадры, пришедшие в одном чтении с auth_response (например, presence_snapshot)
+        if self.client_decoder and self.client_decoder.pending():
+            self.process_client_messages(list(self.client_decoder.messages()))
+        
         while self.is_running:
             try:
-                data = self.socket.recv(4096)
-                if not data:
+                if not self.client_decoder.recv_from(self.socket):
                     break
                 
-                try:
-                    message = json.loads(data.decode('utf-8'))
-                    self.process_client_message(message)
-                except json.JSONDecodeError:
-                    print("Ошибка декодирования JSON")
+                self.process_client_messages(list(self.client_decoder.messages()))
                     
+            except ProtocolError as e:
+                logger.warning("Ошибка декодирования сообщения от сервера: %s", e)
+                break
             except Exception as e:
                 if self.is_running:
-                    print(f"Ошибка приема сообщений: {e}")
+                    logger.error("Ошибка приема сообщений: %s", e)
                 break
         
+        # is_running сбрасывается в stop_server - иначе соединение потеряно
+        lost = self.is_running
         self.is_running = False
+        if lost:
+            try:
+                self.socket.close()
+            except:
+                pass
+            if self.disconnect_callback:
+                self.disconnect_callback()
+    
+    def process_client_messages(self, messages: List[Dict]):
+        """Обработка всех сообщений, декодированных за одно чтение из сокета"""
+        if not messages:
+            return
+        # Ответ на heartbeat сервера: без активности соединение закрывается через ONLINE_TIMEOUT
+        if any(message.get('type') == 'heartbeat' for message in messages):
+            self.send_client_message({
+                'type': 'heartbeat_ack',
+                'user_id': self.current_user_id,
+                'timestamp': time.time()
+            })
+        if self.batch_callback:
+            logger.debug("Получено сообщений: %d", len(messages))
+            self.batch_callback(messages)
+            return
+        for message in messages:
+            self.process_client_message(message)
     
     def process_client_message(self, message: Dict):
         """Обработка сообщения на стороне клиента"""
-        print(f"Получено сообщение: {message}")
+        logger.debug("Получено сообщение: %s", message)
         
         # Вызов callback для обработки сообщения в главном окне
         if self.message_callback:
             self.message_callback(message)
     
+    def request_contacts(self) -> bool:
+        """Запрос списка контактов с сервера (ответ - contact_list_response)"""
+        return self.send_client_message({
+            'type': 'contact_list_request',
+            'user_id': self.current_user_id
+        })
+    
+    def add_contact(self, contact_id: str) -> bool:
+        """Добавление контакта на сервере (ответ - contact_add_response, затем presence_delta)"""
+        return self.send_client_message({
+            'type': 'contact_add',
+            'user_id': self.current_user_id,
+            'contact_id': contact_id
+        })
+    
+    def request_history(self, contact_id: str = None, before_id: int = None, after_id: int = None,
+                        limit: int = None, group_id: int = None) -> bool:
+        """Запрос страницы истории диалога или группы с сервера (ответ - history_response)"""
+        request = {
+            'type': 'history_request',
+            'user_id': self.current_user_id,
+            'contact_id': contact_id,
+            'limit': limit or config.HISTORY_PAGE_SIZE
+        }
+        if group_id is not None:
+            request['group_id'] = group_id
+        if before_id is not None:
+            request['before_id'] = before_id
+        if after_id is not None:
+            request['after_id'] = after_id
+        return self.send_client_message(request)
+    
+    def send_read_receipt(self, contact_id: str, last_read_id: int = None) -> bool:
+        """Отметка диалога прочитанным до last_read_id (ответ - read_receipt с числом непрочитанных)"""
+        receipt = {
+            'type': 'read_receipt',
+            'user_id': self.current_user_id,
+            'contact_id': contact_id
+        }
+        if last_read_id is not None:
+            receipt['last_read_id'] = last_read_id
+        return self.send_client_message(receipt)
+    
+    def search_messages(self, query: str, contact_id: str = None, group_id: int = None,
+                        cursor: str = None, limit: int = None) -> bool:
+        """Поиск по сообщениям на сервере (ответ - search_response, cursor - следующая страница)"""
+        request = {
+            'type': 'search_request',
+            'user_id': self.current_user_id,
+            'query': query,
+            'limit': limit or config.SEARCH_PAGE_SIZE
+        }
+        if contact_id is not None:
+            request['contact_id'] = contact_id
+        if group_id is not None:
+            request['group_id'] = group_id
+        if cursor is not None:
+            request['cursor'] = cursor
+        return self.send_client_message(request)
+    
+    def create_group(self, name: str, members: List[str]) -> bool:
+        """Создание группы (ответ - group_update всем подключенным участникам)"""
+        return self.send_client_message({
+            'type': 'group_create',
+            'user_id': self.current_user_id,
+            'name': name,
+            'members': members
+        })
+    
+    def send_group_message(self, group_id: int, message_text: str) -> bool:
+        """Отправка сообщения в группу"""
+        return self.send_client_message({
+            'type': 'group_message',
+            'sender_id': self.current_user_id,
+            'group_id': group_id,
+            'message_text': message_text
+        })
+    
     def send_client_message(self, message: Dict):
-        """Отправка сообщения на сервер"""
+        """Отправка сообщения на сервер (из любого потока)"""
         if self.socket and self.is_running:
             try:
-                data = json.dumps(message).encode('utf-8')
-                self.socket.send(data)
+                data = encode_message(message, self.protocol_version)
+                # sendall может отправить кадр частями: без блокировки части разных кадров перемешаются
+                with self.client_send_lock:
+                    self.socket.sendall(data)
                 return True
             except Exception as e:
-                print(f"Ошибка отправки сообщения: {e}")
+                logger.error("Ошибка отправки сообщения: %s", e)
                 return False
         return False
@@ -0,0 +1,184 @@
+import collections
+import socket
+import threading
+from typing import Callable, Dict, Hashable, List, Optional
+import sys
+import os
+# Добавляем путь к src в PYTHONPATH
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+try:
+    from src.config import server_config as config
+except ImportError:
+    from src.config import config
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Действие при переполнении очереди
+OVERFLOW_DISCONNECT = "disconnect"  # закрыть соединение
+OVERFLOW_DROP_OLDEST = "drop_oldest"  # отбросить самые старые кадры
+OVERFLOW_COALESCE = "coalesce"  # заменять устаревшие кадры с тем же ключом (статусы), иначе закрыть
+OVERFLOW_POLICIES = (OVERFLOW_DISCONNECT, OVERFLOW_DROP_OLDEST, OVERFLOW_COALESCE)
+
+# Кадров в одном вызове sendmsg/writelines (не больше IOV_MAX)
+WRITE_BATCH = 64
+
+
+class OutboundQueue:
+    """Ограниченная очередь исходящих кадров одного соединения
+
+    Отправитель только ставит готовые bytes в очередь и не ждет получателя;
+    очередь разбирает писатель соединения (SocketWriter в режиме потоков,
+    AsyncConnection в режиме asyncio). Объем ограничен max_bytes, при
+    переполнении действует policy (OVERFLOW_*). Кадры отбрасываются только
+    целиком, поэтому граница сообщений в потоке не нарушается. Пустая
+    очередь принимает кадр любого размера.
+    """
+
+    def __init__(self, max_bytes: int = None, policy: str = None,
+                 on_ready: Optional[Callable[[], None]] = None):
+        self.max_bytes = max_bytes or config.OUTBOUND_QUEUE_MAX_BYTES
+        self.policy = policy or config.OUTBOUND_OVERFLOW_POLICY
+        if self.policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Неизвестное действие при переполнении: {self.policy}")
+        self.on_ready = on_ready  # Вызывается после постановки кадра (запуск писателя)
+        self._frames = collections.deque()  # [ключ, bytes]
+        self._keyed: Dict[Hashable, list] = {}  # ключ -> кадр в очереди (для coalesce)
+        self._bytes = 0
+        self._closed = False
+        self._ready = threading.Condition(threading.Lock())
+        self.peak_bytes = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    @property
+    def depth(self) -> int:
+        """Байт в очереди"""
+        return self._bytes
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def push(self, data: bytes, key: Hashable = None) -> bool:
+        """Постановка кадра; False - очередь переполнена и соединение нужно закрыть
+
+        key помечает кадры, которые можно заменить более новым (например,
+        статус одного пользователя): при policy coalesce кадр с тем же
+        ключом, еще не отправленный, заменяется на месте.
+        """
+        with self._ready:
+            if self._closed:
+                return False
+            if key is not None and self.policy == OVERFLOW_COALESCE and key in self._keyed:
+                entry = self._keyed[key]
+                self._bytes += len(data) - len(entry[1])
+                entry[1] = data
+                self.coalesced += 1
+            else:
+                if self._frames and self._bytes + len(data) > self.max_bytes:
+                    if self.policy != OVERFLOW_DROP_OLDEST:
+                        return False
+                    while self._frames and self._bytes + len(data) > self.max_bytes:
+                        self._pop()
+                        self.dropped += 1
+                entry = [key, data]
+                self._frames.append(entry)
+                if key is not None:
+                    self._keyed[key] = entry
+                self._bytes += len(data)
+            self.peak_bytes = max(self.peak_bytes, self._bytes)
+            self._ready.notify()
+        if self.on_ready:
+            self.on_ready()
+        return True
+
+    def take(self, max_frames: int = WRITE_BATCH, timeout: float = None) -> List[bytes]:
+        """Ожидание и извлечение кадров (пустой список - очередь закрыта или истек timeout)"""
+        with self._ready:
+            if not self._frames and not self._closed:
+                self._ready.wait(timeout)
+            return self._take(max_frames)
+
+    def take_nowait(self, max_frames: int = WRITE_BATCH) -> List[bytes]:
+        """Извлечение кадров без ожидания"""
+        with self._ready:
+            return self._take(max_frames)
+
+    def close(self):
+        """Закрытие очереди: неотправленные кадры отбрасываются, писатель завершается"""
+        with self._ready:
+            self._closed = True
+            self._frames.clear()
+            self._keyed.clear()
+            self._bytes = 0
+            self._ready.notify_all()
+
+    def _take(self, max_frames: int) -> List[bytes]:
+        if self._closed:
+            return []
+        return [self._pop() for _ in range(min(max_frames, len(self._frames)))]
+
+    def _pop(self) -> bytes:
+        entry = self._frames.popleft()
+        key, data = entry
+        if key is not None and self._keyed.get(key) is entry:
+            del self._keyed[key]
+        self._bytes -= len(data)
+        return data
+
+
+def send_frames(sock: socket.socket, frames: List[bytes]):
+    """Запись кадров в блокирующий сокет одним sendmsg (с учетом частичной записи)"""
+    if not hasattr(sock, 'sendmsg'):
+        sock.sendall(b''.join(frames))
+        return
+    views = [memoryview(frame) for frame in frames]
+    while views:
+        sent = sock.sendmsg(views)
+        while sent:
+            if sent >= len(views[0]):
+                sent -= len(views.pop(0))
+            else:
+                views[0] = views[0][sent:]
+                sent = 0
+
+
+class SocketWriter:
+    """Поток записи очереди соединения в блокирующий сокет (сервер в режиме потоков)
+
+    Медленный получатель блокирует только свой поток записи; при ошибке
+    записи соединение закрывается для чтения, и поток обработки клиента
+    завершает его обычным путем.
+    """
+
+    def __init__(self, sock: socket.socket, queue: OutboundQueue):
+        self.sock = sock
+        self.queue = queue
+        self.thread = threading.Thread(target=self._run, name=f"writer-{sock.fileno()}")
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            frames = self.queue.take()
+            if not frames:
+                if self.queue.closed:
+                    return
+                continue
+            try:
+                send_frames(self.sock, frames)
+            except OSError as e:
+                logger.warning("Ошибка записи в соединение %s: %s", self.sock, e)
+                self.queue.close()
+                try:
+                    self.sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                return
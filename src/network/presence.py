@@ -0,0 +1,171 @@
+import threading
+import time
+from typing import Dict, List, Optional, Set
+import sys
+import os
+# Добавляем путь к src в PYTHONPATH
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+try:
+    from src.config import server_config as config
+except ImportError:
+    from src.config import config
+from src.database.database import Database
+
+
+class PresenceTracker:
+    """Онлайн-статусы пользователей сервера и получатели их изменений
+
+    Статусы хранятся в памяти. Для каждого подключенного пользователя
+    загружается его список контактов, и он становится наблюдателем этих
+    контактов: при подключении или отключении пользователя изменение
+    (presence_delta) получают только подключенные наблюдатели, а не все
+    клиенты. Пользователи без записей в таблице contacts (клиент показывает
+    всех пользователей) наблюдают за всеми.
+
+    Статус и время последней активности (last_seen) пишутся в таблицу users
+    не на каждое событие, а периодически: измененные пользователи копятся
+    в наборе и записываются одной транзакцией раз в checkpoint_interval
+    секунд и при остановке. heartbeat обходится обновлением словаря.
+    """
+
+    def __init__(self, database: Database, checkpoint_interval: float = None):
+        self.database = database
+        self.checkpoint_interval = (checkpoint_interval if checkpoint_interval is not None
+                                    else config.PRESENCE_CHECKPOINT_INTERVAL)
+        self._online: Set[str] = set()
+        self._contacts: Dict[str, Set[str]] = {}  # наблюдатель -> его контакты
+        self._watchers: Dict[str, Set[str]] = {}  # пользователь -> подключенные наблюдатели
+        self._watch_all: Set[str] = set()  # подключенные пользователи без списка контактов
+        self._last_seen: Dict[str, float] = {}
+        self._dirty: Set[str] = set()  # Изменения, еще не записанные в БД
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.checkpoints = 0
+
+    def start(self):
+        """Запуск периодической записи статусов в БД"""
+        if self._thread:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._checkpoint_loop, name="presence-checkpoint")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout: float = None):
+        """Остановка с записью всех накопленных изменений"""
+        if self._thread:
+            self._stopped.set()
+            self._thread.join(timeout)
+            self._thread = None
+        self.checkpoint()
+
+    def is_online(self, user_id: str) -> bool:
+        """Подключен ли пользователь"""
+        return user_id in self._online
+
+    def last_seen(self, user_id: str) -> Optional[float]:
+        """Время последней активности пользователя с момента запуска сервера"""
+        return self._last_seen.get(user_id)
+
+    def touch(self, user_id: str):
+        """Активность пользователя (heartbeat): только обновление last_seen в памяти"""
+        with self._lock:
+            self._last_seen[user_id] = time.time()
+            self._dirty.add(user_id)
+
+    def connect(self, user_id: str) -> Optional[List[str]]:
+        """Пользователь подключился
+
+        Возвращает подключенных наблюдателей, которым нужно отправить
+        изменение, или None, если пользователь уже был в сети. Контакты
+        читаются из БД только при переходе в сеть.
+        """
+        with self._lock:
+            self._last_seen[user_id] = time.time()
+            self._dirty.add(user_id)
+            if user_id in self._online:
+                return None
+        contacts = {contact['contact_id'] for contact in self.database.get_contacts(user_id)}
+        with self._lock:
+            if user_id in self._online:
+                return None  # Подключился из другого потока, пока шла выборка
+            self._online.add(user_id)
+            self._watch(user_id, contacts)
+            return self._recipients(user_id)
+
+    def disconnect(self, user_id: str) -> Optional[List[str]]:
+        """Пользователь отключился; возвращает наблюдателей для уведомления (None - не был в сети)"""
+        with self._lock:
+            if user_id not in self._online:
+                return None
+            self._online.discard(user_id)
+            self._last_seen[user_id] = time.time()
+            self._dirty.add(user_id)
+            self._unwatch(user_id)
+            return self._recipients(user_id)
+
+    def add_contact(self, user_id: str, contact_id: str):
+        """Пользователь добавил контакт: он начинает получать его изменения"""
+        with self._lock:
+            if user_id not in self._online:
+                return
+            contacts = set(self._contacts.get(user_id, ()))
+            contacts.add(contact_id)
+            self._unwatch(user_id)
+            self._watch(user_id, contacts)
+
+    def snapshot(self, user_id: str) -> List[str]:
+        """Подключенные контакты пользователя (полный снимок при подключении)"""
+        with self._lock:
+            if user_id in self._watch_all or user_id not in self._contacts:
+                return [other for other in self._online if other != user_id]
+            return [contact for contact in self._contacts[user_id] if contact in self._online]
+
+    def pending(self) -> int:
+        """Количество пользователей с незаписанными изменениями"""
+        return len(self._dirty)
+
+    def checkpoint(self) -> int:
+        """Запись накопленных изменений в БД одной транзакцией"""
+        with self._lock:
+            if not self._dirty:
+                return 0
+            dirty, self._dirty = self._dirty, set()
+            statuses = [(user_id, user_id in self._online, self._last_seen[user_id]) for user_id in dirty]
+
+        if not self.database.update_user_statuses(statuses):
+            # Не записалось - повторим при следующей записи
+            with self._lock:
+                self._dirty.update(dirty)
+            return 0
+        self.checkpoints += 1
+        return len(statuses)
+
+    def _checkpoint_loop(self):
+        while not self._stopped.wait(self.checkpoint_interval):
+            self.checkpoint()
+
+    def _watch(self, user_id: str, contacts: Set[str]):
+        if contacts:
+            self._contacts[user_id] = contacts
+            for contact in contacts:
+                self._watchers.setdefault(contact, set()).add(user_id)
+        else:
+            self._watch_all.add(user_id)
+
+    def _unwatch(self, user_id: str):
+        self._watch_all.discard(user_id)
+        for contact in self._contacts.pop(user_id, ()):
+            watchers = self._watchers.get(contact)
+            if watchers is not None:
+                watchers.discard(user_id)
+                if not watchers:
+                    del self._watchers[contact]
+
+    def _recipients(self, user_id: str) -> List[str]:
+        recipients = set(self._watchers.get(user_id, ()))
+        recipients.update(self._watch_all)
+        recipients.discard(user_id)
+        return list(recipients)
@@ -0,0 +1,204 @@
+import json
+import re
+import socket
+import struct
+from typing import Dict, Iterator
+
+# Версии протокола:
+#   1 - устаревший формат: один JSON-объект без разделителей (клиенты до 2-й версии)
+#   2 - кадры: 4 байта длины (big-endian) + JSON в UTF-8
+LEGACY_PROTOCOL_VERSION = 1
+FRAMED_PROTOCOL_VERSION = 2
+PROTOCOL_VERSION = FRAMED_PROTOCOL_VERSION
+
+FRAME_HEADER = struct.Struct('!I')
+MAX_FRAME_SIZE = 16 * 1024 * 1024  # Максимальный размер одного сообщения (16 МБ)
+RECV_BUFFER_SIZE = 64 * 1024       # Размер буфера приема одного соединения
+
+
+class ProtocolError(ValueError):
+    """Нарушение формата потока сообщений"""
+
+
+# Начала значений JSON, которые может оборвать конец буфера (устаревший формат без длины)
+PARTIAL_LITERALS = ('true', 'false', 'null', 'NaN', 'Infinity', '-Infinity')
+NUMBER_TAIL = re.compile(r'(?:\.\d*)?(?:[eE][-+]?\d*)?')
+ESCAPE_TAIL = re.compile(r'u[0-9a-fA-F]{0,4}')
+
+
+def truncated_json(text: str, error: json.JSONDecodeError) -> bool:
+    """Ошибка разбора вызвана только концом данных: объект еще не получен целиком"""
+    rest = text[error.pos:]
+    if not rest.strip() or error.msg.startswith('Unterminated string'):
+        return True
+    if error.msg.startswith('Invalid \\uXXXX escape'):
+        return ESCAPE_TAIL.fullmatch(rest) is not None
+    if error.msg.startswith('Expecting value'):
+        return any(literal != rest and literal.startswith(rest) for literal in PARTIAL_LITERALS)
+    if error.msg.startswith("Expecting ',' delimiter"):
+        # Число, оборванное после точки или экспоненты ("1." или "1e-")
+        return text[error.pos - 1].isdigit() and NUMBER_TAIL.fullmatch(rest) is not None
+    return False
+
+
+def checked_object(message) -> Dict:
+    """Сообщение протокола - только JSON-объект"""
+    if not isinstance(message, dict):
+        raise ProtocolError(f"Ожидался JSON-объект, получен {type(message).__name__}")
+    return message
+
+
+def negotiate_version(requested) -> int:
+    """Выбор версии протокола по запросу клиента (auth_request.protocol_version)"""
+    try:
+        requested = int(requested)
+    except (TypeError, ValueError):
+        return LEGACY_PROTOCOL_VERSION
+    return max(LEGACY_PROTOCOL_VERSION, min(requested, PROTOCOL_VERSION))
+
+
+def encode_message(message: Dict, version: int = PROTOCOL_VERSION) -> bytes:
+    """Кодирование сообщения для отправки в соединение указанной версии"""
+    payload = json.dumps(message).encode('utf-8')
+    if version >= FRAMED_PROTOCOL_VERSION:
+        if len(payload) > MAX_FRAME_SIZE:
+            raise ProtocolError(f"Сообщение слишком большое: {len(payload)} байт")
+        return FRAME_HEADER.pack(len(payload)) + payload
+    return payload
+
+
+class EncodedMessage:
+    """Сообщение, сериализованное один раз для рассылки нескольким получателям
+
+    JSON кодируется при создании, кадр версии 2 собирается при первом
+    запросе. Все соединения одной версии получают один и тот же объект bytes
+    (неизменяемый, поэтому его можно передавать в сокеты и цикл событий без копий).
+    """
+
+    __slots__ = ('payload', '_framed')
+
+    def __init__(self, message: Dict):
+        self.payload = json.dumps(message).encode('utf-8')
+        self._framed = None
+
+    def for_version(self, version: int) -> bytes:
+        """Данные для соединения указанной версии"""
+        if version < FRAMED_PROTOCOL_VERSION:
+            return self.payload
+        if self._framed is None:
+            if len(self.payload) > MAX_FRAME_SIZE:
+                raise ProtocolError(f"Сообщение слишком большое: {len(self.payload)} байт")
+            self._framed = FRAME_HEADER.pack(len(self.payload)) + self.payload
+        return self._framed
+
+
+class FrameDecoder:
+    """Потоковый декодер сообщений одного соединения
+
+    Данные из сокета читаются в один переиспользуемый буфер (recv_into) и
+    накапливаются до получения полного сообщения, поэтому склеенные и
+    разрезанные TCP-сегменты разбираются корректно. Версию можно сменить
+    между сообщениями - это делается после согласования в auth_request.
+    """
+
+    def __init__(self, version: int = LEGACY_PROTOCOL_VERSION, max_frame_size: int = MAX_FRAME_SIZE):
+        self.version = version
+        self.max_frame_size = max_frame_size
+        self.buffer = bytearray()
+        self._offset = 0
+        self._recv_buffer = bytearray(RECV_BUFFER_SIZE)
+        self._recv_view = memoryview(self._recv_buffer)
+        self._json_decoder = json.JSONDecoder()
+
+    def recv_from(self, sock: socket.socket) -> int:
+        """Чтение порции данных из сокета, возвращает число байт (0 - соединение закрыто)"""
+        received = sock.recv_into(self._recv_view)
+        if received:
+            self.buffer += self._recv_view[:received]
+        return received
+
+    def feed(self, data: bytes):
+        """Добавление принятых данных"""
+        self.buffer += data
+
+    def pending(self) -> int:
+        """Количество принятых, но еще не разобранных байт"""
+        return len(self.buffer) - self._offset
+
+    def messages(self) -> Iterator[Dict]:
+        """Извлечение всех полных сообщений из буфера"""
+        try:
+            while self.pending():
+                if self.version >= FRAMED_PROTOCOL_VERSION:
+                    message = self._next_frame()
+                else:
+                    message = self._next_legacy()
+                if message is None:
+                    break
+                yield message
+        finally:
+            self._compact()
+
+    def _compact(self):
+        if self._offset:
+            del self.buffer[:self._offset]
+            self._offset = 0
+
+    def _next_frame(self):
+        if self.pending() < FRAME_HEADER.size:
+            return None
+
+        (length,) = FRAME_HEADER.unpack_from(self.buffer, self._offset)
+        if length > self.max_frame_size:
+            raise ProtocolError(f"Размер кадра {length} превышает допустимый {self.max_frame_size}")
+
+        start = self._offset + FRAME_HEADER.size
+        end = start + length
+        if len(self.buffer) < end:
+            return None
+
+        payload = self.buffer[start:end]
+        self._offset = end
+        try:
+            message = json.loads(payload)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise ProtocolError(f"Некорректный JSON в кадре: {e}")
+        return checked_object(message)
+
+    def _next_legacy(self):
+        data = self.buffer[self._offset:]
+        invalid = None
+        try:
+            text = data.decode('utf-8')
+        except UnicodeDecodeError as e:
+            # Многобайтовый символ разрезан на границе сегмента - ждем продолжения.
+            # Иначе байты после полного объекта могут быть кадром следующей версии
+            # (ответ на auth_request и первые кадры пришли одним чтением)
+            if e.reason != 'unexpected end of data':
+                invalid = e
+            text = data[:e.start].decode('utf-8')
+
+        stripped = text.lstrip()
+        if not stripped:
+            if invalid is not None:
+                raise ProtocolError(f"Некорректная кодировка: {invalid}")
+            self._offset += len(text.encode('utf-8'))
+            return None
+        if stripped[0] != '{':
+            raise ProtocolError("Ожидался JSON-объект")
+
+        try:
+            message, end = self._json_decoder.raw_decode(stripped)
+        except json.JSONDecodeError as e:
+            if invalid is not None:
+                raise ProtocolError(f"Некорректная кодировка: {invalid}")
+            if not truncated_json(stripped, e):
+                raise ProtocolError(f"Некорректный JSON: {e}")
+            # Объект еще не получен целиком
+            if len(data) > self.max_frame_size:
+                raise ProtocolError("Сообщение превышает допустимый размер")
+            return None
+
+        skipped = len(text) - len(stripped)
+        self._offset += len(text[:skipped + end].encode('utf-8'))
+        return checked_object(message)
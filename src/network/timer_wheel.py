@@ -0,0 +1,68 @@
+import math
+import threading
+import time
+from typing import Dict, Hashable, List
+
+
+class TimerWheel:
+    """Хэшированное колесо таймеров
+
+    Время делится на тики длиной tick секунд; таймер попадает в ячейку
+    (номер тика срабатывания) % slots. Постановка и отмена - O(1), за тик
+    просматривается только одна ячейка. Таймеры дальше одного оборота
+    колеса (slots * tick секунд) остаются в ячейке до своего оборота,
+    поэтому оборот выбирается не короче обычной задержки.
+    """
+
+    def __init__(self, tick: float, slots: int, origin: float = None):
+        self.tick = tick
+        self._slots: List[Dict[Hashable, int]] = [{} for _ in range(slots)]
+        self._positions: Dict[Hashable, int] = {}  # ключ -> ячейка
+        self._origin = time.monotonic() if origin is None else origin
+        self._current = 0  # Последний обработанный тик
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, key) -> bool:
+        return key in self._positions
+
+    def schedule(self, key: Hashable, delay: float):
+        """Постановка (или перестановка) таймера key через delay секунд"""
+        with self._lock:
+            self._remove(key)
+            deadline = self._current + max(1, math.ceil(delay / self.tick))
+            slot = deadline % len(self._slots)
+            self._slots[slot][key] = deadline
+            self._positions[key] = slot
+
+    def cancel(self, key: Hashable):
+        """Отмена таймера"""
+        with self._lock:
+            self._remove(key)
+
+    def advance(self, now: float = None) -> List[Hashable]:
+        """Переход к текущему моменту; возвращает ключи сработавших таймеров"""
+        if now is None:
+            now = time.monotonic()
+        target = int((now - self._origin) / self.tick)
+        expired = []
+        with self._lock:
+            if target <= self._current:
+                return expired
+            # После долгой паузы достаточно одного оборота: каждая ячейка просматривается один раз
+            for tick in range(self._current + 1, self._current + 1 + min(target - self._current, len(self._slots))):
+                bucket = self._slots[tick % len(self._slots)]
+                due = [key for key, deadline in bucket.items() if deadline <= target]
+                for key in due:
+                    del bucket[key]
+                    del self._positions[key]
+                expired.extend(due)
+            self._current = target
+        return expired
+
+    def _remove(self, key: Hashable):
+        slot = self._positions.pop(key, None)
+        if slot is not None:
+            self._slots[slot].pop(key, None)
@@ -1,6 +1,5 @@
 import sys
 import os
-import json
 import socket
 from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
                              QLineEdit, QPushButton, QMessageBox, QFrame)
@@ -17,6 +16,7 @@ try:
 except ImportError:
     # Если client_config не найден, используем встроенный config
     from src.config import config
+from src.network.protocol import FrameDecoder, encode_message, PROTOCOL_VERSION, LEGACY_PROTOCOL_VERSION
 
 class AuthWindow(QWidget):
     """Окно аутентификации пользователя"""
@@ -27,6 +27,7 @@ class AuthWindow(QWidget):
     def __init__(self):
         super().__init__()
         self.socket = None
+        self.decoder = None
         self.init_ui()
         
     def init_ui(self):
@@ -206,7 +207,8 @@ class AuthWindow(QWidget):
             # Отправка запроса аутентификации
             auth_request = {
                 'type': 'auth_request',
-                'user_id': user_id
+                'user_id': user_id,
+                'protocol_version': PROTOCOL_VERSION
             }
             
             try:
@@ -237,6 +239,7 @@ class AuthWindow(QWidget):
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.socket.settimeout(10)  # 10 секунд таймаут
             self.socket.connect((config.SERVER_HOST, config.SERVER_PORT))
+            self.decoder = FrameDecoder()
             print("✓ Подключение к серверу установлено")
             return True
         except Exception as e:
@@ -256,8 +259,8 @@ class AuthWindow(QWidget):
         """Отправка сообщения на сервер"""
         if self.socket:
             try:
-                data = json.dumps(message).encode('utf-8')
-                self.socket.send(data)
+                data = encode_message(message, self.decoder.version)
+                self.socket.sendall(data)
                 print(f"Отправлено на сервер: {message}")
             except Exception as e:
                 print(f"Ошибка отправки сообщения: {e}")
@@ -268,14 +271,15 @@ class AuthWindow(QWidget):
         if self.socket:
             try:
                 print("Ожидание ответа от сервера...")
-                data = self.socket.recv(4096)
-                if data:
-                    response = json.loads(data.decode('utf-8'))
-                    print(f"Получен ответ от сервера: {response}")
-                    return response
-                else:
-                    print("Сервер закрыл соединение")
-                    return None
+                # Ответ может прийти несколькими сегментами - читаем до полного сообщения
+                while self.decoder.recv_from(self.socket):
+                    for response in self.decoder.messages():
+                        print(f"Получен ответ от сервера: {response}")
+                        if response.get('type') == 'auth_response' and response.get('success'):
+                            self.decoder.version = response.get('protocol_version', LEGACY_PROTOCOL_VERSION)
+                        return response
+                print("Сервер закрыл соединение")
+                return None
             except socket.timeout:
                 print("Таймаут ожидания ответа от сервера")
                 return None
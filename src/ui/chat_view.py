@@ -0,0 +1,331 @@
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from PySide6.QtWidgets import QListView, QStyledItemDelegate, QAbstractItemView
+from PySide6.QtCore import Qt, QAbstractListModel, QModelIndex, QRect, QSize, Signal
+from PySide6.QtGui import QColor, QFont, QFontMetrics, QPainter
+
+
+# Роль с полной строкой сообщения (словарь) для делегата
+MessageRole = Qt.UserRole + 1
+
+
+def format_time(timestamp) -> str:
+    """Время сообщения для подписи под пузырем (ЧЧ:ММ)"""
+    try:
+        if isinstance(timestamp, str):
+            dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+        else:
+            dt = datetime.fromtimestamp(timestamp)
+        return dt.strftime("%H:%M")
+    except:
+        return str(timestamp)
+
+
+class MessageListModel(QAbstractListModel):
+    """Модель сообщений открытого диалога
+
+    Хранит только загруженные страницы истории в порядке id сервера. Вместо
+    множества показанных сообщений модель помнит границы загруженного
+    диапазона: сообщение новее последнего добавляется в конец, старше
+    первого - в начало, каждое за O(1). Сообщение внутри диапазона (догрузка
+    истории, пересекающаяся с уже пришедшими кадрами) ищется двоичным
+    поиском и вставляется на свое место, если его еще нет. Сообщения без
+    id (от сервера старой версии) добавляются в конец, повторы среди них
+    пропускаются по отправителю, тексту и времени.
+    """
+
+    def __init__(self, current_user_id: str, parent=None):
+        super().__init__(parent)
+        self.current_user_id = str(current_user_id).strip()
+        self._rows: List[Dict] = []
+        # id строк, неубывающие: строка без id повторяет id предыдущей (0 в начале)
+        self._row_ids: List[int] = []
+        self._oldest_id: Optional[int] = None
+        self._newest_id: Optional[int] = None
+        self._legacy_keys = set()
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self._rows[index.row()]
+        if role == Qt.DisplayRole:
+            return row['message_text']
+        if role == MessageRole:
+            return row
+        return None
+
+    def row_at(self, row: int) -> Dict:
+        """Строка модели без преобразования через QVariant (для делегата)"""
+        return self._rows[row]
+
+    def _row(self, message: Dict) -> Dict:
+        message_id = message.get('id')
+        return {
+            # Ключ кэша размеров пузыря
+            'key': message_id if message_id is not None else (message['sender_id'], message['message_text'],
+                                                              message['timestamp']),
+            'id': message_id,
+            'sender_id': message['sender_id'],
+            'receiver_id': message['receiver_id'],
+            'message_text': message['message_text'],
+            'timestamp': message['timestamp'],
+            'time': format_time(message['timestamp']),
+            'own': str(message['sender_id']).strip() == self.current_user_id
+        }
+
+    def add_messages(self, messages: List[Dict]) -> int:
+        """Добавление сообщений на свои места по id (уже показанные пропускаются)"""
+        head, tail, inner = [], [], []
+        for message in messages:
+            message_id = message.get('id')
+            if message_id is None:
+                key = (message['sender_id'], message['message_text'], message['timestamp'])
+                if key not in self._legacy_keys:
+                    self._legacy_keys.add(key)
+                    tail.append((None, message))
+            elif self._newest_id is None or message_id > self._newest_id:
+                tail.append((message_id, message))
+                self._newest_id = message_id
+                if self._oldest_id is None:
+                    self._oldest_id = message_id
+            elif message_id < self._oldest_id:
+                head.append((message_id, message))
+            else:
+                inner.append((message_id, message))
+
+        added = 0
+        if head:
+            # Страница старше загруженных: в начало одним блоком
+            head = list({message_id: message for message_id, message in sorted(head, key=lambda item: item[0])}.items())
+            self._oldest_id = head[0][0]
+            self.beginInsertRows(QModelIndex(), 0, len(head) - 1)
+            self._rows[:0] = [self._row(message) for _, message in head]
+            self._row_ids[:0] = [message_id for message_id, _ in head]
+            # Строки без id в начале списка повторяют id предыдущей строки
+            for index in range(len(head), len(self._rows)):
+                if self._rows[index]['id'] is not None:
+                    break
+                self._row_ids[index] = head[-1][0]
+            self.endInsertRows()
+            added += len(head)
+        if tail:
+            first = len(self._rows)
+            last_id = self._row_ids[-1] if self._row_ids else 0
+            self.beginInsertRows(QModelIndex(), first, first + len(tail) - 1)
+            for message_id, message in tail:
+                last_id = message_id if message_id is not None else last_id
+                self._rows.append(self._row(message))
+                self._row_ids.append(last_id)
+            self.endInsertRows()
+            added += len(tail)
+        for message_id, message in inner:
+            position = bisect_left(self._row_ids, message_id)
+            if position < len(self._rows) and self._rows[position]['id'] == message_id:
+                continue
+            self.beginInsertRows(QModelIndex(), position, position)
+            self._rows.insert(position, self._row(message))
+            self._row_ids.insert(position, message_id)
+            self.endInsertRows()
+            added += 1
+        return added
+
+    def append_messages(self, messages: List[Dict]) -> int:
+        """Добавление новых сообщений (пришедших от сервера или из кэша)"""
+        return self.add_messages(messages)
+
+    def prepend_messages(self, messages: List[Dict]) -> int:
+        """Добавление страницы более старых сообщений"""
+        return self.add_messages(messages)
+
+    def clear(self):
+        """Удаление всех сообщений"""
+        self.beginResetModel()
+        self._rows = []
+        self._row_ids = []
+        self._oldest_id = self._newest_id = None
+        self._legacy_keys = set()
+        self.endResetModel()
+
+    def oldest_id(self) -> Optional[int]:
+        """id самого старого загруженного сообщения"""
+        return self._oldest_id
+
+    def newest_id(self) -> Optional[int]:
+        """id самого нового загруженного сообщения (верхняя граница диалога)"""
+        return self._newest_id
+
+
+class MessageBubbleDelegate(QStyledItemDelegate):
+    """Отрисовка сообщения пузырем: свои справа, собеседника слева
+
+    Размер пузыря зависит от текста и ширины списка, поэтому результат
+    разметки кэшируется по ключу сообщения и сбрасывается при изменении
+    ширины. Рисуются только видимые строки.
+    """
+
+    CACHE_SIZE = 5000
+    MAX_WIDTH = 0.7  # Доля ширины списка под пузырь
+    PADDING_X = 12
+    PADDING_Y = 8
+    MARGIN = 5
+    RADIUS = 15
+
+    OWN_BACKGROUND = QColor("#3498db")
+    OWN_TEXT = QColor("white")
+    OTHER_BACKGROUND = QColor("#ecf0f1")
+    OTHER_TEXT = QColor("#2c3e50")
+    TIME_TEXT = QColor("#7f8c8d")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.font = QFont("Arial", 10)
+        self.time_font = QFont("Arial", 8)
+        self._metrics = QFontMetrics(self.font)
+        self._time_metrics = QFontMetrics(self.time_font)
+        self._cache: OrderedDict = OrderedDict()
+        self._width = None
+
+    def _layout(self, row: Dict, width: int) -> QRect:
+        """Прямоугольник текста пузыря (из кэша, если ширина не менялась)"""
+        if width != self._width:
+            self._cache.clear()
+            self._width = width
+
+        text_rect = self._cache.get(row['key'])
+        if text_rect is not None:
+            self._cache.move_to_end(row['key'])
+            return text_rect
+
+        max_text_width = max(50, int(width * self.MAX_WIDTH) - 2 * self.PADDING_X)
+        text_rect = self._metrics.boundingRect(QRect(0, 0, max_text_width, 100000),
+                                               Qt.TextWordWrap, row['message_text'])
+        self._cache[row['key']] = text_rect
+        if len(self._cache) > self.CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return text_rect
+
+    def sizeHint(self, option, index) -> QSize:
+        row = self.parent().messages_model.row_at(index.row())
+        width = self.parent().viewport().width()
+        text_rect = self._layout(row, width)
+        height = (text_rect.height() + 2 * self.PADDING_Y + self._time_metrics.height()
+                  + 2 * self.MARGIN)
+        return QSize(width, height)
+
+    def paint(self, painter: QPainter, option, index):
+        row = self.parent().messages_model.row_at(index.row())
+        rect = option.rect
+        text_rect = self._layout(row, self.parent().viewport().width())
+
+        bubble_width = text_rect.width() + 2 * self.PADDING_X
+        bubble_height = text_rect.height() + 2 * self.PADDING_Y
+        x = rect.right() - bubble_width - self.MARGIN if row['own'] else rect.left() + self.MARGIN
+        bubble = QRect(x, rect.top() + self.MARGIN, bubble_width, bubble_height)
+
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(self.OWN_BACKGROUND if row['own'] else self.OTHER_BACKGROUND)
+        painter.drawRoundedRect(bubble, self.RADIUS, self.RADIUS)
+
+        painter.setFont(self.font)
+        painter.setPen(self.OWN_TEXT if row['own'] else self.OTHER_TEXT)
+        painter.drawText(bubble.adjusted(self.PADDING_X, self.PADDING_Y, -self.PADDING_X, -self.PADDING_Y),
+                         Qt.TextWordWrap, row['message_text'])
+
+        painter.setFont(self.time_font)
+        painter.setPen(self.TIME_TEXT)
+        time_rect = QRect(bubble.left(), bubble.bottom() + 2, bubble.width(), self._time_metrics.height())
+        painter.drawText(time_rect, Qt.AlignRight if row['own'] else Qt.AlignLeft, row['time'])
+        painter.restore()
+
+
+class ChatView(QListView):
+    """Список сообщений диалога с постраничной подгрузкой истории
+
+    При прокрутке к началу списка вызывается load_older(before_id, limit),
+    страница более старых сообщений вставляется сверху без сдвига видимой
+    области. Если пользователь находится внизу списка, новые сообщения
+    прокручивают его к последнему.
+    """
+
+    # Загружена страница более старых сообщений (число добавленных строк)
+    older_loaded = Signal(int)
+
+    def __init__(self, current_user_id: str, load_older: Callable = None, page_size: int = 50, parent=None):
+        super().__init__(parent)
+        self.messages_model = MessageListModel(current_user_id, self)
+        self.delegate = MessageBubbleDelegate(self)
+        self.load_older = load_older
+        self.page_size = page_size
+        self.has_more = load_older is not None
+        self._loading = False
+
+        self.setModel(self.messages_model)
+        self.setItemDelegate(self.delegate)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setSelectionMode(QAbstractItemView.NoSelection)
+        self.setResizeMode(QListView.Adjust)
+        self.setFocusPolicy(Qt.NoFocus)
+        self.verticalScrollBar().valueChanged.connect(self._on_scroll)
+
+    def set_history(self, messages: List[Dict]):
+        """Начальная страница истории (последние сообщения)"""
+        self.messages_model.clear()
+        self.messages_model.append_messages(messages)
+        self.has_more = self.load_older is not None and len(messages) >= self.page_size
+        self.scrollToBottom()
+
+    def append_messages(self, messages: List[Dict]) -> int:
+        """Добавление новых сообщений с прокруткой, если список был внизу"""
+        scrollbar = self.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum() - 4
+        added = self.messages_model.append_messages(messages)
+        if added and at_bottom:
+            self.scrollToBottom()
+        return added
+
+    def clear(self):
+        """Очистка списка"""
+        self.messages_model.clear()
+        self.has_more = self.load_older is not None
+
+    def fetch_older(self) -> int:
+        """Загрузка страницы более старых сообщений"""
+        if self._loading or not self.has_more:
+            return 0
+        before_id = self.messages_model.oldest_id()
+        if before_id is None:
+            self.has_more = False
+            return 0
+
+        self._loading = True
+        try:
+            messages = self.load_older(before_id, self.page_size)
+            return self.add_older(messages, len(messages) >= self.page_size)
+        finally:
+            self._loading = False
+
+    def add_older(self, messages: List[Dict], has_more: bool) -> int:
+        """Вставка страницы более старых сообщений (в том числе пришедшей от сервера позже)"""
+        self.has_more = self.load_older is not None and has_more
+
+        # Сохраняем расстояние до конца списка, чтобы видимая область не сдвинулась
+        scrollbar = self.verticalScrollBar()
+        from_bottom = scrollbar.maximum() - scrollbar.value()
+        added = self.messages_model.prepend_messages(messages)
+        if added:
+            self.doItemsLayout()
+            scrollbar.setValue(scrollbar.maximum() - from_bottom)
+        self.older_loaded.emit(added)
+        return added
+
+    def _on_scroll(self, value: int):
+        if value == self.verticalScrollBar().minimum() and self.messages_model.rowCount():
+            self.fetch_older()
@@ -0,0 +1,355 @@
+from typing import Dict, Iterable, List, Optional
+from PySide6.QtWidgets import QListView, QStyledItemDelegate, QStyle, QAbstractItemView
+from PySide6.QtCore import Qt, QAbstractListModel, QModelIndex, QRect, QSize, Signal
+from PySide6.QtGui import QColor, QFont, QFontMetrics, QPainter
+
+
+# Роль с полной строкой контакта (словарь) для делегата
+ContactRole = Qt.UserRole + 1
+
+
+class ContactListModel(QAbstractListModel):
+    """Модель списка контактов
+
+    Строки хранятся в порядке, в котором их отдает база, и индексируются по
+    contact_id: статус или счетчик новых сообщений одного контакта меняется
+    за O(1) и перерисовывает только его строку. set_contacts сравнивает
+    новый список с текущим и применяет разницу: удаляет пропавшие строки,
+    вставляет новые и обновляет изменившиеся, не пересоздавая остальные.
+    Счетчики новых сообщений при этом сохраняются.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows: List[Dict] = []
+        self._index: Dict[str, int] = {}
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self._rows[index.row()]
+        if role == Qt.DisplayRole:
+            return row['display_name']
+        if role == ContactRole:
+            return row
+        return None
+
+    def row_at(self, row: int) -> Dict:
+        """Строка модели без преобразования через QVariant (для делегата)"""
+        return self._rows[row]
+
+    def row_of(self, contact_id: str) -> Optional[int]:
+        """Номер строки контакта (None, если его нет в списке)"""
+        return self._index.get(contact_id)
+
+    def contact(self, contact_id: str) -> Optional[Dict]:
+        row = self._index.get(contact_id)
+        return self._rows[row] if row is not None else None
+
+    def contact_ids(self) -> List[str]:
+        return [row['contact_id'] for row in self._rows]
+
+    @staticmethod
+    def _row(contact: Dict) -> Dict:
+        return {
+            'contact_id': contact['contact_id'],
+            'display_name': contact.get('display_name') or contact['contact_id'],
+            'is_online': bool(contact.get('is_online', False)),
+            'unread': 0
+        }
+
+    def _reindex(self, start: int = 0):
+        for position in range(start, len(self._rows)):
+            self._index[self._rows[position]['contact_id']] = position
+
+    def _changed(self, rows: Iterable[int]):
+        rows = list(rows)
+        if rows:
+            # Одна строка - перерисовка только ее, диапазон - видимой области
+            self.dataChanged.emit(self.index(min(rows)), self.index(max(rows)), [ContactRole])
+
+    def set_contacts(self, contacts: List[Dict]) -> int:
+        """Применение нового списка контактов разницей с текущим (возвращает число изменившихся строк)"""
+        new_rows = []
+        seen = set()
+        for contact in contacts:
+            if contact['contact_id'] not in seen:
+                seen.add(contact['contact_id'])
+                new_rows.append(self._row(contact))
+
+        changes = 0
+        # Удаление пропавших контактов, смежные строки - одним блоком с конца
+        position = len(self._rows) - 1
+        while position >= 0:
+            if self._rows[position]['contact_id'] in seen:
+                position -= 1
+                continue
+            last = position
+            while position >= 0 and self._rows[position]['contact_id'] not in seen:
+                position -= 1
+            self.beginRemoveRows(QModelIndex(), position + 1, last)
+            for row in self._rows[position + 1:last + 1]:
+                del self._index[row['contact_id']]
+            del self._rows[position + 1:last + 1]
+            self.endRemoveRows()
+            changes += last - position
+        if changes:
+            self._reindex()
+
+        # Проход по новому порядку: совпавшие строки обновляются, новые вставляются блоками
+        position = 0
+        updated = []
+        while position < len(new_rows):
+            contact_id = new_rows[position]['contact_id']
+            current = self._index.get(contact_id)
+            if current is None:
+                end = position
+                while end < len(new_rows) and new_rows[end]['contact_id'] not in self._index:
+                    end += 1
+                self.beginInsertRows(QModelIndex(), position, end - 1)
+                self._rows[position:position] = new_rows[position:end]
+                self._reindex(position)
+                self.endInsertRows()
+                changes += end - position
+                position = end
+                continue
+            if current != position:
+                # Контакт сменил место (например, новое отображаемое имя)
+                self.beginMoveRows(QModelIndex(), current, current, QModelIndex(), position)
+                self._rows.insert(position, self._rows.pop(current))
+                self._reindex(position)
+                self.endMoveRows()
+                changes += 1
+            row = self._rows[position]
+            new_row = new_rows[position]
+            if (row['display_name'], row['is_online']) != (new_row['display_name'], new_row['is_online']):
+                row['display_name'] = new_row['display_name']
+                row['is_online'] = new_row['is_online']
+                updated.append(position)
+            position += 1
+        self._changed(updated)
+        return changes + len(updated)
+
+    def apply_statuses(self, user_statuses: Dict[str, bool], partial: bool = False) -> int:
+        """Применение онлайн-статусов (возвращает число изменившихся строк)
+
+        partial - обновляются только контакты из user_statuses, иначе
+        отсутствующие считаются не в сети.
+        """
+        changed = []
+        if partial:
+            for contact_id, is_online in user_statuses.items():
+                position = self._index.get(contact_id)
+                if position is not None and self._rows[position]['is_online'] != bool(is_online):
+                    self._rows[position]['is_online'] = bool(is_online)
+                    changed.append(position)
+        else:
+            for position, row in enumerate(self._rows):
+                is_online = bool(user_statuses.get(row['contact_id'], False))
+                if row['is_online'] != is_online:
+                    row['is_online'] = is_online
+                    changed.append(position)
+        self._changed(changed)
+        return len(changed)
+
+    def apply_unread(self, counts: Dict[str, int], partial: bool = False) -> int:
+        """Применение счетчиков новых сообщений от сервера (возвращает число изменившихся строк)
+
+        partial - обновляются только контакты из counts, иначе у
+        отсутствующих непрочитанных нет.
+        """
+        changed = []
+        if partial:
+            for contact_id, unread in counts.items():
+                position = self._index.get(contact_id)
+                if position is not None and self._rows[position]['unread'] != unread:
+                    self._rows[position]['unread'] = unread
+                    changed.append(position)
+        else:
+            for position, row in enumerate(self._rows):
+                unread = counts.get(row['contact_id'], 0)
+                if row['unread'] != unread:
+                    row['unread'] = unread
+                    changed.append(position)
+        self._changed(changed)
+        return len(changed)
+
+    def add_unread(self, contact_id: str, count: int = 1) -> bool:
+        """Увеличение счетчика новых сообщений контакта"""
+        position = self._index.get(contact_id)
+        if position is None:
+            return False
+        self._rows[position]['unread'] += count
+        self._changed([position])
+        return True
+
+    def clear_unread(self, contact_id: str) -> bool:
+        """Сброс счетчика новых сообщений контакта"""
+        position = self._index.get(contact_id)
+        if position is None or not self._rows[position]['unread']:
+            return False
+        self._rows[position]['unread'] = 0
+        self._changed([position])
+        return True
+
+    def clear(self):
+        """Удаление всех контактов"""
+        self.beginResetModel()
+        self._rows = []
+        self._index = {}
+        self.endResetModel()
+
+
+class ContactDelegate(QStyledItemDelegate):
+    """Отрисовка строки контакта: статус, имя, счетчик сообщений и кнопки
+
+    Строки одной высоты, виджетов на строку нет: кнопки звонка и чата
+    рисуются кружками, нажатие на них определяет ContactListView по
+    button_at.
+    """
+
+    HEIGHT = 50
+    PADDING = 10
+    DOT = 12
+    BADGE = 20
+    BUTTON = 30
+    SPACING = 5
+
+    ONLINE = QColor("#27ae60")
+    OFFLINE = QColor("#95a5a6")
+    NAME_TEXT = QColor("#2c3e50")
+    OFFLINE_TEXT = QColor("#7f8c8d")
+    BADGE_BACKGROUND = QColor("#e74c3c")
+    CALL_BACKGROUND = QColor("#27ae60")
+    CHAT_BACKGROUND = QColor("#3498db")
+    SELECTED_BACKGROUND = QColor("#ecf0f1")
+    BORDER = QColor("#ecf0f1")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.name_font = QFont("Arial", 10, QFont.Bold)
+        self.status_font = QFont("Arial", 8)
+        self.status_bold_font = QFont("Arial", 8, QFont.Bold)
+        self.badge_font = QFont("Arial", 8, QFont.Bold)
+        self.button_font = QFont("Arial", 11)
+        self._name_metrics = QFontMetrics(self.name_font)
+        self._status_metrics = QFontMetrics(self.status_font)
+
+    def button_rects(self, rect: QRect):
+        """Прямоугольники кнопок звонка и чата в строке rect"""
+        top = rect.top() + (rect.height() - self.BUTTON) // 2
+        chat = QRect(rect.right() - self.PADDING - self.BUTTON + 1, top, self.BUTTON, self.BUTTON)
+        call = QRect(chat.left() - self.SPACING - self.BUTTON, top, self.BUTTON, self.BUTTON)
+        return call, chat
+
+    def button_at(self, rect: QRect, pos) -> Optional[str]:
+        """Кнопка под точкой pos: 'call', 'chat' или None"""
+        call, chat = self.button_rects(rect)
+        if call.contains(pos):
+            return 'call'
+        if chat.contains(pos):
+            return 'chat'
+        return None
+
+    def sizeHint(self, option, index) -> QSize:
+        return QSize(option.rect.width(), self.HEIGHT)
+
+    def paint(self, painter: QPainter, option, index):
+        row = self.parent().contacts_model.row_at(index.row())
+        rect = option.rect
+        online = row['is_online']
+
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(rect, self.SELECTED_BACKGROUND)
+        painter.setPen(self.BORDER)
+        painter.drawLine(rect.left(), rect.bottom(), rect.right(), rect.bottom())
+
+        # Индикатор онлайн-статуса
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(self.ONLINE if online else self.OFFLINE)
+        x = rect.left() + self.PADDING
+        painter.drawEllipse(QRect(x, rect.top() + (rect.height() - self.DOT) // 2, self.DOT, self.DOT))
+
+        call, chat = self.button_rects(rect)
+        right = call.left() - self.SPACING
+
+        # Счетчик новых сообщений
+        if row['unread']:
+            badge = QRect(right - self.BADGE, rect.top() + (rect.height() - self.BADGE) // 2,
+                          self.BADGE, self.BADGE)
+            painter.setBrush(self.BADGE_BACKGROUND)
+            painter.drawEllipse(badge)
+            painter.setFont(self.badge_font)
+            painter.setPen(QColor("white"))
+            painter.drawText(badge, Qt.AlignCenter, str(row['unread']) if row['unread'] < 100 else "99+")
+            painter.setPen(Qt.NoPen)
+            right = badge.left() - self.SPACING
+
+        # Имя и статус
+        text_left = x + self.DOT + self.PADDING
+        text_width = max(0, right - text_left)
+        name_height = self._name_metrics.height()
+        status_height = self._status_metrics.height()
+        top = rect.top() + (rect.height() - name_height - status_height - 2) // 2
+        painter.setFont(self.name_font)
+        painter.setPen(self.NAME_TEXT)
+        painter.drawText(QRect(text_left, top, text_width, name_height), Qt.AlignLeft | Qt.AlignVCenter,
+                         self._name_metrics.elidedText(row['display_name'], Qt.ElideRight, text_width))
+        painter.setFont(self.status_bold_font if online else self.status_font)
+        painter.setPen(self.ONLINE if online else self.OFFLINE_TEXT)
+        painter.drawText(QRect(text_left, top + name_height + 2, text_width, status_height),
+                         Qt.AlignLeft | Qt.AlignVCenter, "Онлайн" if online else "Офлайн")
+
+        # Кнопки звонка и чата
+        painter.setFont(self.button_font)
+        for button, background, text in ((call, self.CALL_BACKGROUND, "📞"), (chat, self.CHAT_BACKGROUND, "💬")):
+            painter.setPen(Qt.NoPen)
+            painter.setBrush(background)
+            painter.drawEllipse(button)
+            painter.setPen(QColor("white"))
+            painter.drawText(button, Qt.AlignCenter, text)
+        painter.restore()
+
+
+class ContactListView(QListView):
+    """Список контактов (модель + делегат, без виджета на строку)"""
+
+    # Нажата кнопка звонка / чата в строке контакта (contact_id)
+    call_requested = Signal(str)
+    chat_requested = Signal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.contacts_model = ContactListModel(self)
+        self.delegate = ContactDelegate(self)
+
+        self.setModel(self.contacts_model)
+        self.setItemDelegate(self.delegate)
+        # Высота строк одинакова: представление не опрашивает делегат для каждой строки
+        self.setUniformItemSizes(True)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+
+    def dataChanged(self, top_left, bottom_right, roles=None):
+        # QListView на каждое изменение данных перестраивает раскладку всех строк
+        # (O(n) на один статус). Высота строк постоянна - достаточно перерисовать их область
+        self.viewport().update(self.visualRect(top_left).united(self.visualRect(bottom_right)))
+
+    def mouseReleaseEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            pos = event.position().toPoint()
+            index = self.indexAt(pos)
+            if index.isValid():
+                button = self.delegate.button_at(self.visualRect(index), pos)
+                contact_id = self.contacts_model.row_at(index.row())['contact_id']
+                if button == 'call':
+                    self.call_requested.emit(contact_id)
+                elif button == 'chat':
+                    self.chat_requested.emit(contact_id)
+        super().mouseReleaseEvent(event)
@@ -3,7 +3,7 @@ import time
 from datetime import datetime
 from PySide6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                              QLabel, QLineEdit, QPushButton, QTextEdit, 
-                             QListWidget, QListWidgetItem, QSplitter, 
+                             QSplitter, 
                              QFrame, QMessageBox, QMenu, QDialog,
                              QInputDialog, QScrollArea, QSizePolicy)
 from PySide6.QtCore import Qt, Signal, QTimer, QThread, Slot
@@ -18,207 +18,30 @@ try:
 except ImportError:
     # Если client_config не найден, используем встроенный config
     from src.config import config
-from src.database.database import Database
+from src.database.message_cache import MessageCache
 from src.network.network_manager import NetworkManager
 from src.audio.audio_manager import AudioManager
+from src.audio.codec import negotiate_codec
+from src.network.client_transport import ClientTransport
+from src.ui.chat_view import ChatView
+from src.ui.contact_list import ContactListView
+from src.ui.message_bus import MessageBus
+from src.utils.logger import get_logger
 
-class ContactItem(QWidget):
-    """Виджет элемента контакта в списке"""
-    
-    def __init__(self, contact_data: dict, parent=None):
-        super().__init__(parent)
-        self.contact_data = contact_data
-        self.new_message_count = 0
-        self.init_ui()
-    
-    def init_ui(self):
-        """Инициализация интерфейса элемента контакта"""
-        layout = QHBoxLayout()
-        layout.setContentsMargins(10, 5, 10, 5)
-        layout.setSpacing(10)
-        
-        # Индикатор онлайн-статуса
-        self.status_indicator = QLabel()
-        self.status_indicator.setFixedSize(12, 12)
-        self.status_indicator.setStyleSheet("""
-            QLabel {
-                border-radius: 6px;
-                background-color: #95a5a6;
-            }
-        """)
-        
-        # Информация о контакте
-        contact_info = QVBoxLayout()
-        contact_info.setSpacing(2)
-        
-        self.name_label = QLabel(self.contact_data.get('display_name', self.contact_data['contact_id']))
-        self.name_label.setFont(QFont("Arial", 10, QFont.Bold))
-        self.name_label.setStyleSheet("color: #2c3e50;")
-        
-        self.status_label = QLabel("Офлайн")
-        self.status_label.setFont(QFont("Arial", 8))
-        self.status_label.setStyleSheet("color: #7f8c8d;")
-        
-        contact_info.addWidget(self.name_label)
-        contact_info.addWidget(self.status_label)
-        
-        # Индикатор новых сообщений
-        self.new_message_indicator = QLabel()
-        self.new_message_indicator.setFixedSize(20, 20)
-        self.new_message_indicator.setStyleSheet("""
-            QLabel {
-                border-radius: 10px;
-                background-color: #e74c3c;
-                color: white;
-                font-size: 10px;
-                font-weight: bold;
-                text-align: center;
-                padding: 2px;
-            }
-        """)
-        self.new_message_indicator.setAlignment(Qt.AlignCenter)
-        self.new_message_indicator.hide()  # Скрыт по умололчанию
-        
-        # Кнопки действий
-        actions_layout = QHBoxLayout()
-        actions_layout.setSpacing(5)
-        
-        # Кнопка звонка
-        self.call_button = QPushButton("📞")
-        self.call_button.setFixedSize(30, 30)
-        self.call_button.setStyleSheet("""
-            QPushButton {
-                background-color: #27ae60;
-                color: white;
-                border: none;
-                border-radius: 15px;
-                font-size: 14px;
-            }
-            QPushButton:hover {
-                background-color: #229954;
-            }
-            QPushButton:pressed {
-                background-color: #1e8449;
-            }
-        """)
-        
-        # Кнопка чата
-        self.chat_button = QPushButton("💬")
-        self.chat_button.setFixedSize(30, 30)
-        self.chat_button.setStyleSheet("""
-            QPushButton {
-                background-color: #3498db;
-                color: white;
-                border: none;
-                border-radius: 15px;
-                font-size: 14px;
-            }
-            QPushButton:hover {
-                background-color: #2980b9;
-            }
-            QPushButton:pressed {
-                background-color: #1f5f8b;
-            }
-        """)
-        
-        actions_layout.addWidget(self.call_button)
-        actions_layout.addWidget(self.chat_button)
-        
-        # Добавление всех элементов в layout
-        layout.addWidget(self.status_indicator)
-        layout.addLayout(contact_info)
-        layout.addStretch()
-        layout.addWidget(self.new_message_indicator)
-        layout.addLayout(actions_layout)
-        
-        self.setLayout(layout)
-        
-        # Подключение сигналов
-        self.call_button.clicked.connect(self.call_contact)
-        self.chat_button.clicked.connect(self.chat_with_contact)
-        
-        # Обновление статуса после создания всех элементов
-        self.update_status()
-    
-    def add_new_message_indicator(self):
-        """Добавление индикатора новых сообщений"""
-        self.new_message_count += 1
-        self.new_message_indicator.setText(str(self.new_message_count))
-        self.new_message_indicator.show()
-    
-    def update_new_message_indicator(self):
-        """Обновление счетчика новых сообщений"""
-        self.new_message_count += 1
-        self.new_message_indicator.setText(str(self.new_message_count))
-        self.new_message_indicator.show()
-    
-    def clear_new_message_indicator(self):
-        """Очистка индикатора новых сообщений"""
-        self.new_message_count = 0
-        self.new_message_indicator.hide()
-    
-    def update_status(self):
-        """Обновление онлайн-статуса"""
-        is_online = self.contact_data.get('is_online', False)
-        
-        if is_online:
-            self.status_indicator.setStyleSheet("""
-                QLabel {
-                    border-radius: 6px;
-                    background-color: #27ae60;
-                }
-            """)
-            self.status_label.setText("Онлайн")
-            self.status_label.setStyleSheet("color: #27ae60; font-weight: bold;")
-        else:
-            self.status_indicator.setStyleSheet("""
-                QLabel {
-                    border-radius: 6px;
-                    background-color: #95a5a6;
-                }
-            """)
-            self.status_label.setText("Офлайн")
-            self.status_label.setStyleSheet("color: #7f8c8d;")
-    
-    def call_contact(self):
-        """Начало звонка контакта"""
-        # Найти главное окно через иерархию родителей
-        main_window = self.find_main_window()
-        if main_window:
-            main_window.start_call.emit(self.contact_data['contact_id'])
-    
-    def chat_with_contact(self):
-        """Открытие чата с контактом"""
-        # Найти главное окно через иерархию родителей
-        main_window = self.find_main_window()
-        if main_window:
-            main_window.open_chat.emit(self.contact_data['contact_id'])
-    
-    def find_main_window(self):
-        """Поиск главного окна через иерархию родителей"""
-        parent = self.parent()
-        while parent:
-            if hasattr(parent, 'start_call') and hasattr(parent, 'open_chat'):
-                return parent
-            parent = parent.parent()
-        return None
+logger = get_logger(__name__)
 
 class ChatWidget(QWidget):
     """Виджет чата с конкретным пользователем"""
     
-    def __init__(self, contact_id: str, database: Database, parent=None):
+    def __init__(self, contact_id: str, cache: MessageCache, parent=None):
         super().__init__(parent)
         self.contact_id = contact_id
-        self.database = database
-        self.last_message_timestamp = None
-        self._processed_messages = set()  # Инициализация множества обработанных сообщений
+        self.cache = cache
+        self.older_requested = None  # before_id запрошенной у сервера страницы
         self.init_ui()
         self.load_messages()
-        
-        # Таймер для автоматического обновления чата
-        self.update_timer = QTimer()
-        self.update_timer.timeout.connect(self.check_for_new_messages)
-        self.update_timer.start(config.CHAT_UPDATE_INTERVAL)  # Используем настройку из конфига
+        # Новые сообщения приходят через MessageBus (handle_incoming_messages),
+        # страницы истории с сервера - через handle_history_response
     
     def init_ui(self):
         """Инициализация интерфейса чата"""
@@ -253,18 +76,16 @@ class ChatWidget(QWidget):
         header_layout.addStretch()
         header_layout.addWidget(self.header_call_button)
         
-        # Область сообщений
-        self.messages_area = QTextEdit()
-        self.messages_area.setReadOnly(True)
-        self.messages_area.setStyleSheet("""
-            QTextEdit {
+        # Область сообщений: рисуются только видимые строки, история подгружается страницами
+        main_window = self.find_main_window()
+        current_user_id = main_window.current_user_id if main_window else ""
+        self.messages_view = ChatView(current_user_id, self.load_older_messages, config.CHAT_PAGE_SIZE)
+        self.messages_view.setStyleSheet("""
+            QListView {
                 border: 1px solid #bdc3c7;
                 border-radius: 5px;
                 background-color: white;
-                color: #2c3e50;
                 padding: 10px;
-                font-family: Arial, sans-serif;
-                font-size: 10px;
             }
         """)
         
@@ -304,7 +125,7 @@ class ChatWidget(QWidget):
         
         # Добавление элементов в layout
         layout.addLayout(header_layout)
-        layout.addWidget(self.messages_area)
+        layout.addWidget(self.messages_view)
         layout.addLayout(input_layout)
         
         self.setLayout(layout)
@@ -315,137 +136,77 @@ class ChatWidget(QWidget):
         self.header_call_button.clicked.connect(self.call_contact)
     
     def load_messages(self):
-        """Загрузка истории сообщений"""
+        """Последняя страница истории из локального кэша, затем догрузка нового с сервера"""
+        self.older_requested = None
+        messages = self.cache.get_messages(self.contact_id, limit=config.CHAT_PAGE_SIZE)
+        self.messages_view.set_history(messages)
+        
+        # Пустой кэш - последняя страница с сервера, иначе - сообщения новее последнего в кэше
         main_window = self.find_main_window()
-        if main_window:
-            messages = self.database.get_messages(main_window.current_user_id, self.contact_id)
-            
-            for message in messages:
-                self.add_message_to_chat(message)
-                
-            # Установка времени последнего сообщения
-            if messages:
-                last_message = messages[-1]
-                self.last_message_timestamp = last_message.get('timestamp')
+        if main_window and main_window.network_manager:
+            main_window.network_manager.request_history(self.contact_id, after_id=self.cache.newest_id(self.contact_id),
+                                                        limit=config.CHAT_PAGE_SIZE)
+    
+    def load_older_messages(self, before_id: int, limit: int) -> list:
+        """Страница истории старше before_id (при прокрутке к началу чата)
+        
+        Сообщения берутся из кэша; если их там меньше страницы, недостающие
+        запрашиваются у сервера и вставляются при получении ответа.
+        """
+        messages = self.cache.get_messages(self.contact_id, limit=limit, before_id=before_id)
+        if len(messages) < limit and not self.cache.is_complete(self.contact_id):
+            cursor = messages[0]['id'] if messages else before_id
+            main_window = self.find_main_window()
+            if cursor != self.older_requested and main_window and main_window.network_manager:
+                if main_window.network_manager.request_history(self.contact_id, before_id=cursor, limit=limit):
+                    self.older_requested = cursor
+        return messages
+    
+    def reload_messages(self):
+        """Повторная загрузка истории (после восстановления соединения)"""
+        self.load_messages()
     
-    def check_for_new_messages(self):
-        """Проверка новых сообщений"""
-        main_window = self.find_main_window()
-        if not main_window:
+    def handle_history_response(self, response: dict):
+        """Страница истории диалога от сервера (уже поставлена в кэш главным окном)"""
+        messages = response.get('messages', [])
+        has_more = bool(response.get('has_more'))
+        if response.get('before_id') is not None:
+            self.messages_view.add_older(messages, has_more)
             return
-            
-        # Получение новых сообщений с момента последней проверки
-        if self.last_message_timestamp:
-            new_messages = self.database.get_messages_since(
-                main_window.current_user_id, 
-                self.contact_id, 
-                self.last_message_timestamp
-            )
-        else:
-            # Если это первая проверка, загружаем все сообщения
-            new_messages = self.database.get_messages(main_window.current_user_id, self.contact_id)
         
-        # Добавление новых сообщений в чат (только тех, которые не были обработаны через handle_incoming_message)
-        for message in new_messages:
-            # Проверяем, не было ли это сообщение уже обработано
-            message_key = f"{message['sender_id']}_{message['message_text']}_{message['timestamp']}"
-            if not hasattr(self, '_processed_messages') or message_key not in self._processed_messages:
-                self.add_message_to_chat(message)
-            
-        # Обновление времени последнего сообщения
-        if new_messages:
-            last_message = new_messages[-1]
-            self.last_message_timestamp = last_message.get('timestamp')
+        self.add_messages_to_chat(messages)
+        if response.get('after_id') is None:
+            # Последняя страница (кэш был пуст): более старые подгружаются при прокрутке
+            self.messages_view.has_more = has_more
+        elif has_more and messages:
+            main_window = self.find_main_window()
+            if main_window and main_window.network_manager:
+                main_window.network_manager.request_history(self.contact_id, after_id=messages[-1]['id'],
+                                                            limit=config.CHAT_PAGE_SIZE)
+    
+    def handle_incoming_messages(self, messages: list):
+        """Отображение пачки сообщений диалога, пришедших от сервера"""
+        self.add_messages_to_chat([{
+            'id': message.get('id'),
+            'sender_id': message.get('sender_id'),
+            'receiver_id': message.get('receiver_id'),
+            'message_text': message.get('message_text'),
+            'timestamp': datetime.fromtimestamp(message.get('timestamp', time.time())).isoformat()
+        } for message in messages])
     
     def add_message_to_chat(self, message: dict):
         """Добавление сообщения в чат"""
-        sender_id = message['sender_id']
-        message_text = message['message_text']
-        timestamp = message['timestamp']
-        
-        # Проверка на дублирование сообщений (упрощенная)
-        message_key = f"{sender_id}_{message_text}_{timestamp}"
-        if not hasattr(self, '_processed_messages'):
-            self._processed_messages = set()
-        
-        if message_key in self._processed_messages:
-            return  # Сообщение уже обработано
-        
-        self._processed_messages.add(message_key)
-        
-        # Ограничиваем размер множества обработанных сообщений
-        if len(self._processed_messages) > 100:
-            self._processed_messages.clear()
-        
-        # Форматирование времени
-        try:
-            if isinstance(timestamp, str):
-                dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-            else:
-                dt = datetime.fromtimestamp(timestamp)
-            time_str = dt.strftime("%H:%M")
-        except:
-            time_str = str(timestamp)
-        
-        # Определение стиля сообщения
-        main_window = self.find_main_window()
-        if not main_window:
-            print("Ошибка: не удалось найти главное окно")
+        self.add_messages_to_chat([message])
+    
+    def add_messages_to_chat(self, messages: list):
+        """Добавление нескольких сообщений в чат (уже показанные пропускаются)"""
+        if not messages:
             return
-            
-        # Надёжное определение собственного сообщения
-        current_user_id = main_window.current_user_id
-        print(f"Текущий пользователь: '{current_user_id}' (тип: {type(current_user_id)})")
-        
-        # Детальное сравнение
-        sender_clean = str(sender_id).strip()
-        current_clean = str(current_user_id).strip()
-        direct_comparison = (sender_id == current_user_id)
-        string_comparison = (sender_clean == current_clean)
-        
-        print(f"Прямое сравнение: {sender_id} == {current_user_id} = {direct_comparison}")
-        print(f"Строковое сравнение: '{sender_clean}' == '{current_clean}' = {string_comparison}")
-        
-        is_own_message = string_comparison
-        
-        print(f"Итоговое решение: собственное сообщение = {is_own_message}")
-        
-        if is_own_message:
-            # Собственное сообщение (справа)
-            print(f"✓ Отображаем СОБСТВЕННОЕ сообщение СПРАВА")
-            message_html = f"""
-                <div style="text-align: right; margin: 5px 0;">
-                    <div style="display: inline-block; max-width: 70%; background-color: #3498db; color: white; 
-                                padding: 8px 12px; border-radius: 15px; text-align: left;">
-                        {message_text}
-                    </div>
-                    <div style="font-size: 8px; color: #7f8c8d; margin-top: 2px;">{time_str}</div>
-                </div>
-            """
-        else:
-            # Сообщение собеседника (слева)
-            print(f"✓ Отображаем сообщение СОБЕСЕДНИКА СЛЕВА")
-            message_html = f"""
-                <div style="text-align: left; margin: 5px 0;">
-                    <div style="display: inline-block; max-width: 70%; background-color: #ecf0f1; color: #2c3e50; 
-                                padding: 8px 12px; border-radius: 15px;">
-                        {message_text}
-                    </div>
-                    <div style="font-size: 8px; color: #7f8c8d; margin-top: 2px;">{time_str}</div>
-                </div>
-            """
         
-        # Немедленное добавление в область сообщений
-        self.messages_area.append(message_html)
+        added = self.messages_view.append_messages(messages)
         
-        # Прокрутка к последнему сообщению
-        self.messages_area.ensureCursorVisible()
-        
-        # Обновление времени последнего сообщения для следующей проверки
-        self.last_message_timestamp = timestamp
-        
-        print(f"Сообщение успешно добавлено в чат")
-        print(f"=== КОНЕЦ ОТЛАДКИ ===")
+        if added:
+            logger.debug("Добавлено сообщений в чат: %d", added)
     
     def send_message(self):
         """Отправка сообщения"""
@@ -461,7 +222,7 @@ class ChatWidget(QWidget):
         # Надёжное получение ID текущего пользователя
         current_user_id = main_window.current_user_id
         if not current_user_id:
-            print("Ошибка: не удалось определить ID текущего пользователя")
+            logger.error("Не удалось определить ID текущего пользователя")
             return
         
         # Очистка поля ввода
@@ -485,7 +246,7 @@ class ChatWidget(QWidget):
             }
             main_window.network_manager.send_client_message(network_message)
         else:
-            print("Ошибка: сетевой менеджер не найден")
+            logger.error("Сетевой менеджер не найден")
     
     def call_contact(self):
         """Начало звонка контакту"""
@@ -505,8 +266,9 @@ class ChatWidget(QWidget):
     
     def closeEvent(self, event):
         """Обработка закрытия виджета чата"""
-        if hasattr(self, 'update_timer'):
-            self.update_timer.stop()
+        main_window = self.find_main_window()
+        if main_window:
+            main_window.message_bus.unsubscribe_conversation(self.contact_id, self.handle_incoming_messages)
         event.accept()
 
 class MainWindow(QMainWindow):
@@ -521,10 +283,33 @@ class MainWindow(QMainWindow):
         
         try:
             self.current_user_id = user_id
-            self.database = Database()
+            # История сообщений и список контактов - в локальном кэше пользователя;
+            # база сервера клиенту недоступна, все изменения - сообщениями протокола
+            self.message_cache = MessageCache(user_id)
             self.network_manager = None
             self.audio_manager = None
             self.current_chat = None
+            self.call_peer_id = None  # Собеседник текущего (или ожидающего ответа) звонка
+            
+            # Входящие кадры доставляются виджетам через шину, без опроса базы
+            self.message_bus = MessageBus(user_id, self)
+            self.message_bus.subscribe('message', self.handle_incoming_messages)
+            self.message_bus.subscribe('presence_snapshot', self.handle_presence_snapshot)
+            self.message_bus.subscribe('presence_delta', self.handle_presence_delta)
+            self.message_bus.subscribe('history_response', self.handle_history_response)
+            self.message_bus.subscribe('read_receipt', self.handle_read_receipt)
+            self.message_bus.subscribe('contact_list_response', self.handle_contact_list)
+            self.message_bus.subscribe('contact_add_response', self.handle_contact_added)
+            self.message_bus.subscribe('message_error', self.handle_message_error)
+            self.message_bus.subscribe('call_request', self.handle_incoming_call)
+            self.message_bus.subscribe('call_response', self.handle_call_answer)
+            self.message_bus.subscribe('call_media', self.handle_call_media)
+            self.message_bus.subscribe('call_end', self.handle_call_ended)
+            self.transport = None
+            
+            # Резервный режим при потере соединения: переподключение
+            self.reconnect_timer = QTimer(self)
+            self.reconnect_timer.timeout.connect(self.reconnect_to_server)
             
             self.init_ui()
             self.setup_network()
@@ -535,13 +320,8 @@ class MainWindow(QMainWindow):
             self.start_call.connect(self.handle_call_request)
             self.open_chat.connect(self.handle_chat_request)
             
-            # Таймер для обновления статуса контактов
-            self.contacts_update_timer = QTimer()
-            self.contacts_update_timer.timeout.connect(self.update_contacts_status)
-            self.contacts_update_timer.start(config.CONTACTS_UPDATE_INTERVAL)  # Используем настройку из конфига
-            
         except Exception as e:
-            print(f"Ошибка инициализации MainWindow: {e}")
+            logger.exception("Ошибка инициализации MainWindow: %s", e)
             raise
     
     def init_ui(self):
@@ -622,21 +402,16 @@ class MainWindow(QMainWindow):
             }
         """)
         
-        # Список контактов
-        self.contacts_list = QListWidget()
+        # Список контактов (модель + делегат, без виджета на строку)
+        self.contacts_list = ContactListView()
         self.contacts_list.setStyleSheet("""
-            QListWidget {
+            QListView {
                 border: none;
                 background-color: white;
             }
-            QListWidget::item {
-                border-bottom: 1px solid #ecf0f1;
-                padding: 5px;
-            }
-            QListWidget::item:selected {
-                background-color: #ecf0f1;
-            }
         """)
+        self.contacts_list.call_requested.connect(self.start_call.emit)
+        self.contacts_list.chat_requested.connect(self.open_chat.emit)
         
         # Кнопка добавления контакта
         add_contact_button = QPushButton("+ Добавить контакт")
@@ -732,169 +507,192 @@ class MainWindow(QMainWindow):
     def setup_network(self):
         """Настройка сетевого подключения"""
         try:
-            self.network_manager = NetworkManager(self.database)
+            self.network_manager = NetworkManager()
             
-            # Установка обработчика входящих сообщений
-            self.network_manager.message_callback = self.handle_incoming_message
+            # Кадры декодируются в сетевом потоке и приходят в поток интерфейса пачками
+            self.transport = ClientTransport(self.network_manager, self)
+            self.message_bus.attach(self.transport)
+            self.transport.connection_changed.connect(self.handle_connection_changed)
             
             # Попытка подключения к серверу
-            if self.network_manager.connect_to_server(config.SERVER_HOST, config.SERVER_PORT):
-                print(f"Подключение к серверу {config.SERVER_HOST}:{config.SERVER_PORT} установлено")
-                
-                # Отправка информации о статусе
-                status_message = {
-                    'type': 'status_update',
-                    'user_id': self.current_user_id,
-                    'is_online': True
-                }
-                self.network_manager.send_client_message(status_message)
-                
-                # Запрос списка пользователей
-                user_list_request = {
-                    'type': 'user_list_request',
-                    'user_id': self.current_user_id
-                }
-                self.network_manager.send_client_message(user_list_request)
-                
+            if self.connect_and_announce():
+                logger.info("Подключение к серверу %s:%s установлено", config.SERVER_HOST, config.SERVER_PORT)
             else:
-                print("Не удалось подключиться к серверу")
+                logger.warning("Не удалось подключиться к серверу")
+                self.handle_connection_changed(False)
                 
         except Exception as e:
-            print(f"Ошибка настройки сети: {e}")
-    
-    def handle_incoming_message(self, message: dict):
-        """Обработка входящих сообщений от сервера"""
-        message_type = message.get('type')
-        
-        if message_type == 'message':
-            # Обработка текстового сообщения
-            sender_id = message.get('sender_id')
-            receiver_id = message.get('receiver_id')
-            message_text = message.get('message_text')
-            timestamp = message.get('timestamp', time.time())
-            
-            # Надёжная проверка на собственные сообщения
-            current_user_id = self.current_user_id
-            
-            # Детальное сравнение
-            sender_clean = str(sender_id).strip()
-            current_clean = str(current_user_id).strip()
-            is_own_message = (sender_clean == current_clean)
-            
-                        # Сохранение сообщения в БД
-            if sender_id and receiver_id and message_text:
-                self.database.add_message(sender_id, receiver_id, message_text)
-                
-                # Немедленное обновление активного чата, если это относится к текущему чату
-                if self.current_chat and hasattr(self.current_chat, 'contact_id'):
-                    chat_contact_id = self.current_chat.contact_id
-                    
-                    # Показываем сообщение, если:
-                    # 1. Это сообщение от контакта к нам
-                    # 2. Это наше сообщение к контакту
-                    if ((sender_id == chat_contact_id and receiver_id == self.current_user_id) or
-                        (sender_id == self.current_user_id and receiver_id == chat_contact_id)):
-                        
-                        message_data = {
-                            'sender_id': sender_id,
-                            'receiver_id': receiver_id,
-                            'message_text': message_text,
-                            'timestamp': datetime.fromtimestamp(timestamp).isoformat()
-                        }
-                        
-                        # Немедленно добавляем сообщение в чат
-                        self.current_chat.add_message_to_chat(message_data)
-                        
-                        # Обновление времени последнего сообщения в чате
-                        self.current_chat.last_message_timestamp = message_data['timestamp']
-                        
-                        # Воспроизведение звука уведомления только для входящих сообщений
-                        if (sender_id != self.current_user_id and 
-                            self.audio_manager and 
-                            config.ENABLE_SOUND_NOTIFICATIONS):
-                            try:
-                                self.audio_manager.play_notification_sound()
-                            except:
-                                pass  # Игнорируем ошибки воспроизведения звука
-                
-                # Обновление индикатора новых сообщений в списке контактов
-                if config.ENABLE_VISUAL_NOTIFICATIONS:
-                    self.update_contact_message_indicator(sender_id, receiver_id)
+            logger.error("Ошибка настройки сети: %s", e)
+    
+    def connect_and_announce(self) -> bool:
+        """Подключение к серверу и отправка статуса
+        
+        Статусы контактов сервер присылает сам: снимок presence_snapshot
+        при подключении и presence_delta при изменениях. Список контактов
+        запрашивается при каждом подключении.
+        """
+        if not self.network_manager.connect_to_server(config.SERVER_HOST, config.SERVER_PORT,
+                                                      self.current_user_id):
+            return False
+        
+        # Отправка информации о статусе
+        status_message = {
+            'type': 'status_update',
+            'user_id': self.current_user_id,
+            'is_online': True
+        }
+        self.network_manager.send_client_message(status_message)
+        self.network_manager.request_contacts()
+        return True
+    
+    def handle_connection_changed(self, connected: bool):
+        """Переключение между доставкой через шину и резервным режимом (переподключение)"""
+        if connected:
+            self.reconnect_timer.stop()
+            # Однократная догрузка с сервера того, что пришло, пока соединения не было
+            if self.current_chat:
+                self.current_chat.reload_messages()
+            logger.info("Соединение с сервером восстановлено")
+        else:
+            logger.warning("Соединение с сервером потеряно, переход в резервный режим")
+            self.reconnect_timer.start(config.RECONNECT_INTERVAL)
+            # Без соединения статусы неизвестны: до снимка presence_snapshot все не в сети
+            self.apply_contact_statuses({})
+    
+    def reconnect_to_server(self):
+        """Попытка переподключения (по таймеру в резервном режиме)"""
+        if self.network_manager and self.connect_and_announce():
+            self.transport.set_connected(True)
+    
+    def handle_incoming_messages(self, messages: list):
+        """Обработка пачки входящих текстовых сообщений от сервера
+        
+        Открытый чат получает сообщения своего диалога напрямую из шины,
+        здесь - сохранение в локальный кэш, звук и индикаторы списка
+        контактов.
+        """
+        messages = [message for message in messages
+                    if message.get('sender_id') and message.get('receiver_id') and message.get('message_text')]
+        if not messages:
+            return
         
-        elif message_type == 'user_list_response':
-            # Обновление списка пользователей
-            users = message.get('users', [])
-            # Можно добавить логику обновления онлайн-статуса контактов
-            pass
+        # Сохранение в кэш (в потоке записи кэша, пакетами)
+        self.message_cache.store(messages)
+        
+        # Один звук уведомления на пачку входящих сообщений открытого чата
+        if (self.current_chat and self.audio_manager and config.ENABLE_SOUND_NOTIFICATIONS and
+            any(message['sender_id'] == self.current_chat.contact_id for message in messages)):
+            try:
+                self.audio_manager.play_notification_sound()
+            except:
+                pass  # Игнорируем ошибки воспроизведения звука
+        
+        # Сообщения открытого чата прочитаны сразу, остальные входящие - в счетчики
+        # списка контактов (так же их считает сервер, собственные сообщения не считаются)
+        incoming = [message for message in messages if message['receiver_id'] == self.current_user_id]
+        if self.current_chat:
+            contact_id = self.current_chat.contact_id
+            read_ids = [message['id'] for message in incoming
+                        if message['sender_id'] == contact_id and message.get('id') is not None]
+            if read_ids and self.network_manager:
+                self.network_manager.send_read_receipt(contact_id, max(read_ids))
+            incoming = [message for message in incoming if message['sender_id'] != contact_id]
+        
+        # Обновление индикатора новых сообщений в списке контактов
+        if config.ENABLE_VISUAL_NOTIFICATIONS:
+            for message in incoming:
+                self.update_contact_message_indicator(message['sender_id'], message['receiver_id'])
+    
+    def handle_presence_snapshot(self, messages: list):
+        """Полный снимок статусов при подключении: в сети только перечисленные контакты"""
+        self.apply_contact_statuses({user_id: True for user_id in messages[-1].get('online', [])})
+    
+    def handle_presence_delta(self, messages: list):
+        """Изменения статусов контактов (в порядке поступления)"""
+        changes = {message['user_id']: bool(message.get('is_online')) for message in messages
+                   if message.get('user_id')}
+        self.apply_contact_statuses(changes, partial=True)
+    
+    def handle_read_receipt(self, messages: list):
+        """Счетчики непрочитанных от сервера: снимок при подключении и ответы на отметки прочтения"""
+        try:
+            model = self.contacts_list.contacts_model
+            for message in messages:
+                counts = {state['contact_id']: int(state.get('unread', 0))
+                          for state in message.get('conversations', []) if state.get('contact_id')}
+                # Открытый чат читается сразу (например, снимок после переподключения)
+                if self.current_chat and counts.get(self.current_chat.contact_id):
+                    counts[self.current_chat.contact_id] = 0
+                    if self.network_manager:
+                        self.network_manager.send_read_receipt(self.current_chat.contact_id)
+                model.apply_unread(counts, partial=not message.get('snapshot'))
+        except Exception as e:
+            logger.error("Ошибка обновления счетчиков непрочитанных: %s", e)
+    
+    def handle_history_response(self, responses: list):
+        """Страницы истории от сервера: в кэш и в открытый чат этого диалога"""
+        for response in responses:
+            contact_id = response.get('contact_id')
+            if not response.get('success') or not contact_id or response.get('group_id') is not None:
+                continue
+            self.message_cache.store(response.get('messages', []))
+            # Страница без курсора или старше before_id без продолжения - история с начала в кэше
+            if not response.get('has_more') and response.get('after_id') is None:
+                self.message_cache.mark_complete(contact_id)
+            if self.current_chat and self.current_chat.contact_id == contact_id:
+                self.current_chat.handle_history_response(response)
     
     def update_contact_message_indicator(self, sender_id: str, receiver_id: str):
         """Обновление индикатора новых сообщений в списке контактов"""
         try:
             # Определяем, какой контакт отправил сообщение
             contact_id = sender_id if sender_id != self.current_user_id else receiver_id
-            
-            # Обновляем индикатор в списке контактов
-            for i in range(self.contacts_list.count()):
-                item = self.contacts_list.item(i)
-                contact_widget = self.contacts_list.itemWidget(item)
-                
-                if (hasattr(contact_widget, 'contact_data') and 
-                    contact_widget.contact_data['contact_id'] == contact_id):
-                    
-                    # Добавляем индикатор новых сообщений
-                    if not hasattr(contact_widget, 'new_message_indicator'):
-                        contact_widget.add_new_message_indicator()
-                    else:
-                        contact_widget.update_new_message_indicator()
-                    break
-                    
+            self.contacts_list.contacts_model.add_unread(contact_id)
         except Exception as e:
-            print(f"Ошибка обновления индикатора сообщений: {e}")
+            logger.error("Ошибка обновления индикатора сообщений: %s", e)
     
     def setup_audio(self):
         """Настройка аудио"""
         try:
             self.audio_manager = AudioManager()
-            print("Аудио менеджер инициализирован")
+            logger.info("Аудио менеджер инициализирован")
         except Exception as e:
-            print(f"Ошибка инициализации аудио: {e}")
+            logger.error("Ошибка инициализации аудио: %s", e)
     
     def load_contacts(self):
-        """Загрузка списка контактов"""
+        """Список контактов из кэша до ответа сервера (contact_list_response)"""
         try:
-            # Получение всех пользователей (кроме текущего)
-            all_users = self.database.get_all_users()
-            contacts = [user for user in all_users if user['user_id'] != self.current_user_id]
-            
-            # Очистка списка
-            self.contacts_list.clear()
-            
-            # Добавление контактов
-            for contact in contacts:
-                # Преобразование данных пользователя в формат контакта
-                contact_data = {
-                    'contact_id': contact['user_id'],
-                    'display_name': contact.get('display_name', contact['user_id']),
-                    'is_online': contact.get('is_online', False)
-                }
-                
-                # Создание виджета контакта
-                contact_widget = ContactItem(contact_data)
-                
-                # Создание элемента списка
-                item = QListWidgetItem()
-                item.setSizeHint(contact_widget.sizeHint())
-                
-                self.contacts_list.addItem(item)
-                self.contacts_list.setItemWidget(item, contact_widget)
-                
-                # Обновление статуса
-                contact_widget.update_status()
-            
-            print(f"Загружено {len(contacts)} контактов")
-            
+            contacts = self.message_cache.get_contacts()
+            if not self.contacts_list.contacts_model.rowCount():
+                self.contacts_list.contacts_model.set_contacts(contacts)
+            logger.info("Загружено %d контактов из кэша", len(contacts))
         except Exception as e:
-            print(f"Ошибка загрузки контактов: {e}")
+            logger.error("Ошибка загрузки контактов: %s", e)
+    
+    def handle_contact_list(self, messages: list):
+        """Список контактов от сервера: сохранение в кэш и применение к списку"""
+        contacts = messages[-1].get('contacts', [])
+        # Применение разницы с текущим списком: неизменившиеся строки не трогаются
+        self.contacts_list.contacts_model.set_contacts(contacts)
+        self.message_cache.store_contacts(contacts)
+        logger.info("Получено %d контактов", len(contacts))
+    
+    def handle_contact_added(self, messages: list):
+        """Ответ сервера на contact_add"""
+        for message in messages:
+            contact_id = message.get('contact_id')
+            if message.get('success'):
+                self.network_manager.request_contacts()
+                QMessageBox.information(self, "Успех", f"Контакт {contact_id} добавлен!")
+            else:
+                QMessageBox.warning(self, "Ошибка", f"Пользователь {contact_id} не найден")
+    
+    def handle_message_error(self, messages: list):
+        """Сервер не принял сообщение (очередь записи заполнена): текст можно отправить повторно"""
+        for message in messages:
+            logger.warning("Сообщение для %s не принято сервером: %s", message.get('receiver_id'),
+                           message.get('reason'))
+        self.statusBar().showMessage("Сервер перегружен, сообщение не отправлено - повторите позже", 5000)
     
     def add_contact(self):
         """Добавление нового контакта"""
@@ -908,26 +706,12 @@ class MainWindow(QMainWindow):
             if ok and contact_id.strip():
                 contact_id = contact_id.strip()
                 
-                # Проверка существования пользователя
-                user = self.database.get_user(contact_id)
-                
-                if user:
-                    # Добавление в контакты
-                    self.database.add_contact(self.current_user_id, contact_id)
-                    
-                    # Перезагрузка списка контактов
-                    self.load_contacts()
-                    
-                    QMessageBox.information(
-                        self, 
-                        "Успех", 
-                        f"Контакт {contact_id} добавлен!"
-                    )
-                else:
+                # Пользователя проверяет и добавляет сервер (ответ - contact_add_response)
+                if not self.network_manager or not self.network_manager.add_contact(contact_id):
                     QMessageBox.warning(
                         self, 
                         "Ошибка", 
-                        f"Пользователь {contact_id} не найден"
+                        "Не удалось добавить контакт: нет соединения с сервером"
                     )
                     
         except Exception as e:
@@ -959,40 +743,30 @@ class MainWindow(QMainWindow):
             )
     
     def start_voice_call(self, contact_id: str):
-        """Начало голосового звонка"""
+        """Начало голосового звонка: запрос собеседнику через сервер
+        
+        Голос пойдет через ретранслятор сервера, когда собеседник примет
+        звонок и сервер пришлет порты (call_media).
+        """
         try:
-            if self.audio_manager:
-                # Простой порт для аудио (в реальном приложении нужна более сложная логика)
-                audio_port = 5001
-                
-                # Начало звонка
-                success = self.audio_manager.start_audio_call(
-                    config.HOST, 
-                    audio_port, 
-                    is_caller=True
-                )
-                
-                if success:
-                    QMessageBox.information(
-                        self,
-                        "Звонок",
-                        f"Звонок с {contact_id} начат. Нажмите OK для завершения."
-                    )
-                    
-                    # Завершение звонка
-                    self.audio_manager.stop_audio_call()
-                else:
-                    QMessageBox.warning(
-                        self,
-                        "Ошибка",
-                        "Не удалось начать звонок"
-                    )
-            else:
-                QMessageBox.warning(
-                    self,
-                    "Ошибка",
-                    "Аудио не инициализировано"
-                )
+            if not self.audio_manager:
+                QMessageBox.warning(self, "Ошибка", "Аудио не инициализировано")
+                return
+            if self.call_peer_id:
+                QMessageBox.warning(self, "Ошибка", f"Уже идет звонок с {self.call_peer_id}")
+                return
+            
+            call_request = {
+                'type': 'call_request',
+                'caller_id': self.current_user_id,
+                'receiver_id': contact_id,
+                'codecs': self.audio_manager.offered_codecs()
+            }
+            if not self.network_manager or not self.network_manager.send_client_message(call_request):
+                QMessageBox.warning(self, "Ошибка", "Не удалось начать звонок: нет соединения с сервером")
+                return
+            self.call_peer_id = contact_id
+            self.statusBar().showMessage(f"Вызов {contact_id}...")
                 
         except Exception as e:
             QMessageBox.critical(
@@ -1001,6 +775,94 @@ class MainWindow(QMainWindow):
                 f"Ошибка при звонке: {str(e)}"
             )
     
+    def handle_incoming_call(self, messages: list):
+        """Входящий звонок: ответ call_response с выбранным кодеком"""
+        message = messages[-1]
+        caller_id = message.get('caller_id')
+        if not caller_id:
+            return
+        accepted = False
+        if self.audio_manager and not self.call_peer_id:
+            reply = QMessageBox.question(
+                self,
+                "Голосовой звонок",
+                f"Входящий звонок от {caller_id}. Принять?",
+                QMessageBox.Yes | QMessageBox.No,
+                QMessageBox.Yes
+            )
+            accepted = reply == QMessageBox.Yes
+        
+        call_response = {
+            'type': 'call_response',
+            'caller_id': caller_id,
+            'receiver_id': self.current_user_id,
+            'accepted': accepted
+        }
+        if accepted:
+            call_response['codec'] = negotiate_codec(message.get('codecs'))
+            self.call_peer_id = caller_id
+        self.network_manager.send_client_message(call_response)
+    
+    def handle_call_answer(self, messages: list):
+        """Ответ собеседника на наш звонок (при согласии дальше придет call_media)"""
+        message = messages[-1]
+        if message.get('receiver_id') != self.call_peer_id or message.get('accepted'):
+            return
+        self.call_peer_id = None
+        self.statusBar().clearMessage()
+        QMessageBox.information(self, "Звонок", f"{message.get('receiver_id')} отклонил звонок")
+    
+    def handle_call_media(self, messages: list):
+        """Сервер выделил порт ретранслятора: запуск записи и воспроизведения"""
+        message = messages[-1]
+        if not self.audio_manager or message.get('peer_id') != self.call_peer_id:
+            return
+        success = self.audio_manager.start_audio_call(
+            config.SERVER_HOST,
+            message['media_port'],
+            is_caller=True,
+            codec=message.get('codec')
+        )
+        if not success:
+            QMessageBox.warning(self, "Ошибка", "Не удалось начать звонок")
+            self.end_voice_call()
+            return
+        
+        self.statusBar().showMessage(f"Звонок с {self.call_peer_id}")
+        QMessageBox.information(
+            self,
+            "Звонок",
+            f"Звонок с {self.call_peer_id} начат. Нажмите OK для завершения."
+        )
+        self.end_voice_call()
+    
+    def end_voice_call(self):
+        """Завершение звонка: остановка аудио и call_end собеседнику"""
+        if not self.call_peer_id:
+            return
+        peer_id, self.call_peer_id = self.call_peer_id, None
+        if self.audio_manager:
+            self.audio_manager.stop_audio_call()
+        self.network_manager.send_client_message({
+            'type': 'call_end',
+            'caller_id': self.current_user_id,
+            'receiver_id': peer_id
+        })
+        self.statusBar().clearMessage()
+    
+    def handle_call_ended(self, messages: list):
+        """Звонок завершен собеседником или сервером (reason - причина от сервера)"""
+        if not self.call_peer_id:
+            return
+        self.call_peer_id = None
+        if self.audio_manager:
+            self.audio_manager.stop_audio_call()
+        reason = messages[-1].get('reason')
+        if reason:
+            self.statusBar().showMessage(f"Звонок завершен сервером: {reason}", 5000)
+        else:
+            self.statusBar().clearMessage()
+    
     def handle_chat_request(self, contact_id: str):
         """Обработка запроса на открытие чата"""
         try:
@@ -1013,72 +875,56 @@ class MainWindow(QMainWindow):
                 if child:
                     child.deleteLater()
             
+            # Отписка предыдущего чата от шины
+            if self.current_chat:
+                self.message_bus.unsubscribe_conversation(self.current_chat.contact_id,
+                                                          self.current_chat.handle_incoming_messages)
+            
             # Создание виджета чата
-            chat_widget = ChatWidget(contact_id, self.database, self.chat_area)
+            chat_widget = ChatWidget(contact_id, self.message_cache, self.chat_area)
             self.chat_area_layout.addWidget(chat_widget)
+            self.message_bus.subscribe_conversation(contact_id, chat_widget.handle_incoming_messages)
             
             # Сохранение ссылки на текущий чат
             self.current_chat = chat_widget
             
-            # Очистка индикатора новых сообщений для этого контакта
+            # Очистка индикатора новых сообщений для этого контакта и отметка на сервере
             self.clear_contact_message_indicator(contact_id)
+            if self.network_manager:
+                self.network_manager.send_read_receipt(contact_id)
             
-            print(f"Чат с {contact_id} открыт")
-            print(f"Текущий пользователь: {self.current_user_id}")
+            logger.debug("Чат с %s открыт (пользователь %s)", contact_id, self.current_user_id)
             
         except Exception as e:
-            print(f"Ошибка открытия чата: {e}")
+            logger.error("Ошибка открытия чата: %s", e)
     
     def clear_contact_message_indicator(self, contact_id: str):
         """Очистка индикатора новых сообщений для конкретного контакта"""
         try:
-            for i in range(self.contacts_list.count()):
-                item = self.contacts_list.item(i)
-                contact_widget = self.contacts_list.itemWidget(item)
-                
-                if (hasattr(contact_widget, 'contact_data') and 
-                    contact_widget.contact_data['contact_id'] == contact_id):
-                    
-                    if hasattr(contact_widget, 'clear_new_message_indicator'):
-                        contact_widget.clear_new_message_indicator()
-                    break
-                    
+            self.contacts_list.contacts_model.clear_unread(contact_id)
         except Exception as e:
-            print(f"Ошибка очистки индикатора сообщений: {e}")
+            logger.error("Ошибка очистки индикатора сообщений: %s", e)
     
-    def update_contacts_status(self):
-        """Обновление статуса контактов"""
+    def apply_contact_statuses(self, user_statuses: dict, partial: bool = False):
+        """Применение онлайн-статусов к строкам списка контактов
+        
+        partial - обновляются только контакты из user_statuses, иначе
+        отсутствующие считаются не в сети.
+        """
         try:
-            # Получение актуального статуса пользователей из БД
-            all_users = self.database.get_all_users()
-            user_statuses = {user['user_id']: user.get('is_online', False) for user in all_users}
-            
-            # Обновление статуса в списке контактов
-            for i in range(self.contacts_list.count()):
-                item = self.contacts_list.item(i)
-                contact_widget = self.contacts_list.itemWidget(item)
-                
-                if hasattr(contact_widget, 'contact_data'):
-                    contact_id = contact_widget.contact_data['contact_id']
-                    new_status = user_statuses.get(contact_id, False)
-                    
-                    # Обновление статуса только если он изменился
-                    if contact_widget.contact_data.get('is_online') != new_status:
-                        contact_widget.contact_data['is_online'] = new_status
-                        contact_widget.update_status()
-                        
+            self.contacts_list.contacts_model.apply_statuses(user_statuses, partial)
         except Exception as e:
-            print(f"Ошибка обновления статуса контактов: {e}")
+            logger.error("Ошибка обновления статуса контактов: %s", e)
     
     def closeEvent(self, event):
         """Обработка закрытия окна"""
         try:
             # Остановка таймеров
-            if hasattr(self, 'contacts_update_timer'):
-                self.contacts_update_timer.stop()
+            self.reconnect_timer.stop()
             
             # Отправка статуса офлайн
             if self.network_manager:
+                self.network_manager.disconnect_callback = None
                 status_message = {
                     'type': 'status_update',
                     'user_id': self.current_user_id,
@@ -1091,10 +937,10 @@ class MainWindow(QMainWindow):
             if self.audio_manager:
                 self.audio_manager.cleanup()
             
-            # Обновление статуса в БД
-            self.database.update_user_status(self.current_user_id, False)
+            # Запись оставшихся сообщений в кэш
+            self.message_cache.close()
             
         except Exception as e:
-            print(f"Ошибка при закрытии: {e}")
+            logger.error("Ошибка при закрытии: %s", e)
         
         event.accept()
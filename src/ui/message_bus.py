@@ -0,0 +1,86 @@
+from typing import Callable, Dict, List
+from PySide6.QtCore import QObject, Slot
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class MessageBus(QObject):
+    """Шина входящих сообщений клиента
+
+    Получает пачки кадров от ClientTransport уже в потоке интерфейса и
+    раздает их подписчикам: виджет открытого чата получает сообщения своего
+    диалога, остальные обработчики - сообщения нужного типа. Обработчик
+    вызывается один раз на пачку со списком подходящих сообщений. Опроса
+    базы в обычном режиме нет - виджеты обновляются только при поступлении
+    кадров.
+    """
+
+    def __init__(self, current_user_id: str, parent=None):
+        super().__init__(parent)
+        self.current_user_id = current_user_id
+        self._type_handlers: Dict[str, List[Callable]] = {}
+        self._conversation_handlers: Dict[str, List[Callable]] = {}
+        self.dispatched = 0
+        self.batches = 0
+
+    def attach(self, transport):
+        """Подключение к транспорту клиента"""
+        transport.messages_received.connect(self.dispatch)
+
+    def subscribe(self, message_type: str, handler: Callable):
+        """Подписка на сообщения указанного типа"""
+        self._type_handlers.setdefault(message_type, []).append(handler)
+
+    def unsubscribe(self, message_type: str, handler: Callable):
+        """Отписка от сообщений указанного типа"""
+        handlers = self._type_handlers.get(message_type, [])
+        if handler in handlers:
+            handlers.remove(handler)
+
+    def subscribe_conversation(self, contact_id: str, handler: Callable):
+        """Подписка на текстовые сообщения диалога с контактом"""
+        self._conversation_handlers.setdefault(contact_id, []).append(handler)
+
+    def unsubscribe_conversation(self, contact_id: str, handler: Callable):
+        """Отписка от сообщений диалога"""
+        handlers = self._conversation_handlers.get(contact_id, [])
+        if handler in handlers:
+            handlers.remove(handler)
+        if not handlers:
+            self._conversation_handlers.pop(contact_id, None)
+
+    def contact_for(self, message: Dict) -> str:
+        """Собеседник текущего пользователя в текстовом сообщении"""
+        sender_id = message.get('sender_id')
+        if str(sender_id).strip() == str(self.current_user_id).strip():
+            return message.get('receiver_id')
+        return sender_id
+
+    @Slot(list)
+    def dispatch(self, messages: List[Dict]):
+        """Раздача пачки кадров подписчикам (в потоке интерфейса)"""
+        self.dispatched += len(messages)
+        self.batches += 1
+
+        by_type: Dict[str, List[Dict]] = {}
+        by_conversation: Dict[str, List[Dict]] = {}
+        for message in messages:
+            message_type = message.get('type')
+            by_type.setdefault(message_type, []).append(message)
+            if message_type == 'message':
+                by_conversation.setdefault(self.contact_for(message), []).append(message)
+
+        for contact_id, batch in by_conversation.items():
+            for handler in list(self._conversation_handlers.get(contact_id, [])):
+                self._call(handler, batch)
+
+        for message_type, batch in by_type.items():
+            for handler in list(self._type_handlers.get(message_type, [])):
+                self._call(handler, batch)
+
+    def _call(self, handler: Callable, messages: List[Dict]):
+        try:
+            handler(messages)
+        except Exception as e:
+            logger.exception("Ошибка обработчика сообщений %s: %s", messages[0].get('type'), e)
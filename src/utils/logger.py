@@ -0,0 +1,77 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+import os
+from typing import Dict, Optional
+# Добавляем путь к src в PYTHONPATH
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+try:
+    from src.config import server_config as config
+except ImportError:
+    try:
+        from src.config import client_config as config
+    except ImportError:
+        from src.config import config
+
+# Общий логгер приложения: модули получают дочерние логгеры по имени модуля (src.network...)
+ROOT_LOGGER = 'src'
+LOG_FORMAT = '%(asctime)s %(levelname)-7s %(threadName)s %(name)s: %(message)s'
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Логгер модуля (передается __name__)"""
+    return logging.getLogger(name)
+
+
+def setup_logging(level: str = None, levels: Dict[str, str] = None, log_file: str = None,
+                  stream=None) -> logging.Logger:
+    """Настройка логирования приложения
+
+    Записи ставятся в очередь (QueueHandler) и пишутся в stdout и файл
+    отдельным потоком (QueueListener), поэтому обработчики сообщений не
+    ждут вывода и не конкурируют за блокировку stdout. Сообщения
+    форматируются лениво: аргументы подставляются, только если уровень
+    записи включен. levels - уровни отдельных модулей
+    ({'src.network.network_manager': 'DEBUG'}). Повторный вызов
+    перенастраивает логирование.
+    """
+    global _listener
+    shutdown_logging()
+
+    targets = [logging.StreamHandler(stream or sys.stdout)]
+    log_file = log_file if log_file is not None else config.LOG_FILE
+    if log_file:
+        targets.append(logging.FileHandler(log_file, encoding='utf-8'))
+    formatter = logging.Formatter(LOG_FORMAT)
+    for handler in targets:
+        handler.setFormatter(formatter)
+
+    records = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(records, *targets)
+    _listener.start()
+
+    root = logging.getLogger(ROOT_LOGGER)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(records))
+    root.setLevel(level or config.LOG_LEVEL)
+    root.propagate = False
+    for name, module_level in {**config.LOG_LEVELS, **(levels or {})}.items():
+        logging.getLogger(name).setLevel(module_level)
+    return root
+
+
+def shutdown_logging():
+    """Вывод оставшихся в очереди записей и остановка потока логирования"""
+    global _listener
+    if _listener:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
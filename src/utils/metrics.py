@@ -0,0 +1,281 @@
+import bisect
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import sys
+import os
+# Добавляем путь к src в PYTHONPATH
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Границы корзин гистограмм задержек (секунды): обработчики и запросы к БД - доли миллисекунды
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_value(value) -> str:
+    if isinstance(value, float):
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    return str(value)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metric:
+    """Метрика с метками: значения по кортежу значений меток
+
+    callback - функция, возвращающая текущее значение (или словарь
+    кортеж меток -> значение) в момент чтения: так выставляются счетчики и
+    размеры, которые уже хранит сам объект (очереди, подключения).
+    """
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 callback: Optional[Callable] = None):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.callback = callback
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def value(self, *labels) -> float:
+        """Текущее значение для значений меток"""
+        return self.samples().get(tuple(labels), 0)
+
+    def samples(self) -> Dict[Tuple, float]:
+        if self.callback:
+            value = self.callback()
+            return dict(value) if isinstance(value, dict) else {(): value}
+        with self._lock:
+            return dict(self._values)
+
+    def _label_text(self, values: Tuple, extra: str = '') -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, value in sorted(self.samples().items(), key=lambda item: tuple(map(str, item[0]))):
+            lines.append(f"{self.name}{self._label_text(values)} {_format_value(value)}")
+        return lines
+
+
+class ShardedMetric(Metric):
+    """Метрика, которую каждый поток обновляет в своей копии без блокировок
+
+    Обновление на пути сообщения - только словарь текущего потока
+    (threading.local), поэтому потоки не ждут друг друга и не теряют
+    приращения. Копии суммируются при чтении; копии завершившихся потоков
+    переносятся в общий итог.
+    """
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 callback: Optional[Callable] = None):
+        super().__init__(name, help, labels, callback)
+        self._local = threading.local()
+        self._shards: List[Tuple[threading.Thread, Dict]] = []  # (поток, его значения)
+
+    def _shard(self) -> Dict:
+        values = self._local.values = {}
+        with self._lock:
+            self._shards.append((threading.current_thread(), values))
+        return values
+
+    def _merge(self, total, value):
+        return total + value
+
+    def _collect(self) -> Dict[Tuple, object]:
+        with self._lock:
+            alive = []
+            for thread, values in self._shards:
+                if thread.is_alive():
+                    alive.append((thread, values))
+                else:
+                    for labels, value in values.items():
+                        self._values[labels] = self._merge(self._values[labels], value) \
+                            if labels in self._values else value
+            self._shards = alive
+            result = {labels: self._copy(value) for labels, value in self._values.items()}
+        for _, values in alive:
+            for labels, value in list(values.items()):
+                value = self._copy(value)
+                result[labels] = self._merge(result[labels], value) if labels in result else value
+        return result
+
+    def _copy(self, value):
+        return value
+
+
+class Counter(ShardedMetric):
+    """Монотонно растущий счетчик"""
+
+    kind = 'counter'
+
+    def inc(self, *labels, amount: float = 1):
+        try:
+            self._local.values[labels] += amount
+        except (AttributeError, KeyError):
+            values = getattr(self._local, 'values', None)
+            if values is None:
+                values = self._shard()
+            values[labels] = values.get(labels, 0) + amount
+
+    def samples(self) -> Dict[Tuple, float]:
+        if self.callback:
+            return super().samples()
+        return self._collect()
+
+
+class Gauge(Metric):
+    """Текущее значение (размер, число подключений)"""
+
+    kind = 'gauge'
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(ShardedMetric):
+    """Распределение наблюдений по корзинам с суммой и числом"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        try:
+            entry = self._local.values[labels]
+        except (AttributeError, KeyError):
+            values = getattr(self._local, 'values', None)
+            if values is None:
+                values = self._shard()
+            # Число наблюдений в каждой корзине (последняя - +Inf) и сумма
+            entry = values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        entry[bisect.bisect_left(self.buckets, value)] += 1
+        entry[-1] += value
+
+    def _merge(self, total, value):
+        return [a + b for a, b in zip(total, value)]
+
+    def _copy(self, value):
+        return list(value)
+
+    def counts(self) -> Dict[Tuple, int]:
+        """Число наблюдений по значениям меток"""
+        return {labels: sum(entry[:-1]) for labels, entry in self._collect().items()}
+
+    def count(self, *labels) -> int:
+        return self.counts().get(tuple(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, entry in sorted(self._collect().items(), key=lambda item: tuple(map(str, item[0]))):
+            cumulative = 0
+            for bound, observed in zip(self.buckets + (math.inf,), entry[:-1]):
+                cumulative += observed
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{self._label_text(values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(values)} {_format_value(entry[-1])}")
+            lines.append(f"{self.name}_count{self._label_text(values)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Набор метрик, выводимый в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = (), callback: Callable = None) -> Counter:
+        return self.register(Counter(name, help, labels, callback))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = (), callback: Callable = None) -> Gauge:
+        return self.register(Gauge(name, help, labels, callback))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Все метрики в формате Prometheus (text exposition 0.0.4)"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                logger.warning("Ошибка чтения метрики %s: %s", metric.name, e)
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    """HTTP-сервер метрик: GET /metrics возвращает registry.render()"""
+
+    def __init__(self, registry: Registry, host: str, port: int):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.httpd = None
+        self.thread = None
+
+    def start(self) -> bool:
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug("Запрос метрик %s: %s", self.address_string(), format % args)
+
+        try:
+            self.httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+        except OSError as e:
+            logger.error("Не удалось запустить сервер метрик на %s:%s: %s", self.host, self.port, e)
+            return False
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="metrics-http")
+        self.thread.daemon = True
+        self.thread.start()
+        logger.info("Метрики доступны на http://%s:%s/metrics", self.host, self.port)
+        return True
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
@@ -0,0 +1 @@
+# Тесты Aleph Messenger
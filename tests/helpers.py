@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Общие помощники сетевых тестов: свободный порт и ожидание условия
+"""
+
+import socket
+import time
+
+
+def free_port() -> int:
+    """Свободный TCP-порт на 127.0.0.1 для тестового сервера"""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for(condition, timeout: float = 5):
+    """Ожидание условия, выполняемого другим потоком (ответ сервера, доставка)"""
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    assert condition()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты списка сообщений чата: модель, постраничная история и прокрутка
+"""
+
+import os
+import sys
+import tempfile
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from PySide6.QtWidgets import QApplication
+
+from src.database.database import Database
+from src.ui.chat_view import ChatView, MessageListModel
+
+
+def application():
+    return QApplication.instance() or QApplication(sys.argv)
+
+
+def create_conversation(count: int) -> Database:
+    database = Database(os.path.join(tempfile.mkdtemp(), "test_chat_view.db"))
+    for i in range(count):
+        sender, receiver = ("user1", "user2") if i % 2 else ("user2", "user1")
+        database.add_message(sender, receiver, f"сообщение {i}")
+    return database
+
+
+def test_history_pages_by_id():
+    """get_messages с before_id возвращает предыдущую страницу в хронологическом порядке"""
+    database = create_conversation(25)
+    last = database.get_messages("user1", "user2", limit=10)
+    older = database.get_messages("user2", "user1", limit=10, before_id=last[0]['id'])
+    oldest = database.get_messages("user1", "user2", limit=10, before_id=older[0]['id'])
+
+    texts = [m['message_text'] for m in oldest + older + last]
+    assert texts == [f"сообщение {i}" for i in range(25)]
+    assert len(oldest) == 5
+    database.close()
+    print("✓ Страницы истории по id")
+
+
+def test_model_deduplicates():
+    """Модель не показывает одно сообщение дважды"""
+    application()
+    model = MessageListModel("user1")
+    pushed = {'sender_id': "user2", 'receiver_id': "user1", 'message_text': "привет", 'timestamp': 1700000000.0}
+    stored = {'id': 7, 'sender_id': "user1", 'receiver_id': "user2", 'message_text': "ответ",
+              'timestamp': "2024-01-01 10:00:00"}
+
+    assert model.append_messages([pushed, stored]) == 2
+    assert model.append_messages([pushed, dict(stored)]) == 0
+    assert model.prepend_messages([stored]) == 0
+    assert model.rowCount() == 2 and model.oldest_id() == 7
+    assert model.row_at(1)['own'] and not model.row_at(0)['own']
+    assert model.row_at(1)['time'] == "10:00"
+    print("✓ Повторные сообщения пропускаются")
+
+
+def test_scroll_up_loads_older_pages():
+    """Прокрутка к началу подгружает страницы без сдвига видимой области"""
+    app = application()
+    database = create_conversation(230)
+    view = ChatView("user1", lambda before_id, limit: database.get_messages(
+        "user1", "user2", limit=limit, before_id=before_id), page_size=50)
+    view.resize(400, 300)
+    view.show()
+    view.set_history(database.get_messages("user1", "user2", limit=50))
+    app.processEvents()
+    assert view.messages_model.rowCount() == 50
+
+    scrollbar = view.verticalScrollBar()
+    scrollbar.setValue(scrollbar.minimum())
+    app.processEvents()
+    assert view.messages_model.rowCount() == 100
+    # Видимой осталась та же строка, что была вверху до подгрузки
+    assert view.indexAt(view.viewport().rect().topLeft()).row() >= 50
+
+    while view.has_more:
+        scrollbar.setValue(scrollbar.minimum())
+        app.processEvents()
+    assert view.messages_model.rowCount() == 230
+    assert view.messages_model.row_at(0)['message_text'] == "сообщение 0"
+
+    # Новое сообщение при положении внизу прокручивает список к нему
+    view.scrollToBottom()
+    app.processEvents()
+    view.append_messages([{'sender_id': "user2", 'receiver_id': "user1",
+                           'message_text': "новое", 'timestamp': 1700000000.0}])
+    app.processEvents()
+    assert scrollbar.value() == scrollbar.maximum()
+
+    view.close()
+    database.close()
+    print("✓ Подгрузка истории при прокрутке вверх")
+
+
+def main():
+    """Главная функция тестирования"""
+    print("=" * 50)
+    print("Тестирование списка сообщений")
+    print("=" * 50)
+
+    tests = [
+        test_history_pages_by_id,
+        test_model_deduplicates,
+        test_scroll_up_loads_older_pages,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"✗ {test.__name__} - ОШИБКА: {e}")
+
+    print(f"РЕЗУЛЬТАТ: {passed}/{len(tests)} тестов пройдено")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
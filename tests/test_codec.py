@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты кодеков голосового звонка: передискретизация, µ-law и выбор кодека
+"""
+
+import os
+import sys
+
+import numpy as np
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from src.audio.codec import Codec, MuLawCodec, Resampler, available_codecs, create_codec, negotiate_codec
+from src.config import client_config
+
+
+def tone(frequency: float, rate: int, seconds: float) -> np.ndarray:
+    t = np.arange(int(rate * seconds)) / rate
+    return (10000 * np.sin(2 * np.pi * frequency * t)).astype(np.int16)
+
+
+def test_resampler():
+    """44.1 -> 16 -> 44.1 кГц кадрами по 20 мс: длины кадров и тон в полосе без искажений"""
+    down = Resampler(44100, 16000, 882)
+    up = Resampler(16000, 44100, 320)
+    assert down.frame_out == 320 and up.frame_out == 882
+    signal = tone(1000, 44100, 1.0)
+    output = []
+    for start in range(0, len(signal), 882):
+        frame = down.process(signal[start:start + 882].tobytes())
+        assert len(frame) == 320 * 2
+        output.append(up.process(frame))
+    output = np.frombuffer(b''.join(output), dtype=np.int16).astype(np.float64)
+
+    # Тон 1 кГц приходит с задержкой фильтров; сравнение с аналитически задержанным тоном
+    delay = down.delay + up.delay
+    t = np.arange(len(output)) / 44100 - delay
+    expected = 10000 * np.sin(2 * np.pi * 1000 * t)
+    steady = slice(2000, len(output) - 2000)
+    error = output[steady] - expected[steady]
+    snr = 10 * np.log10(np.sum(expected[steady] ** 2) / np.sum(error ** 2))
+    assert snr > 60, snr
+
+    # Частоты выше полосы кодека не проходят
+    down.reset()
+    high = np.frombuffer(down.process(tone(12000, 44100, 0.02).tobytes()), dtype=np.int16)
+    assert np.abs(high[100:]).max() < 100
+
+    try:
+        Resampler(44100, 16000, 1024)
+        assert False, "кадр с дробным числом отсчетов принят"
+    except ValueError:
+        pass
+    print(f"✓ Передискретизация: SNR {snr:.0f} дБ, задержка {delay * 1000:.1f} мс")
+
+
+def test_mulaw():
+    """µ-law: значения G.711, ошибка не больше шага сегмента, размер кадра вдвое меньше"""
+    codec = MuLawCodec(16000, 320)
+    samples = np.array([0, 1, -1, 100, -100, 1000, -1000, 32767, -32768] + [0] * 311, dtype=np.int16)
+    payload = codec.encode(samples.tobytes())
+    assert len(payload) == 320 and payload[0] == 0xFF and payload[7] == 0x80 and payload[8] == 0x00
+    decoded = np.frombuffer(codec.decode(payload), dtype=np.int16).astype(np.int32)
+    error = np.abs(decoded - samples)
+    # Шаг квантования растет с амплитудой: относительная ошибка в пределах 1/16 сегмента
+    assert np.all(error[:7] <= np.maximum(8, np.abs(samples[:7]) // 16))
+    assert codec.bitrate == 128000 and create_codec('pcm').bitrate == 16 * client_config.AUDIO_SAMPLE_RATE
+
+    try:
+        codec.decode(b'\x00' * 100)
+        assert False, "кадр неверной длины принят"
+    except ValueError:
+        pass
+    print("✓ G.711 µ-law")
+
+
+def test_negotiation():
+    """Выбор кодека: первый из предложенных и доступных, без списка - несжатый PCM"""
+    available = available_codecs()
+    assert 'pcmu' in available and available[-1] == 'pcm'
+    assert negotiate_codec(['unknown', 'pcmu', 'pcm']) == 'pcmu'
+    assert negotiate_codec(None) == 'pcm' and negotiate_codec([]) == 'pcm'
+    codec = create_codec('pcmu', 44100, 882)
+    assert codec.sample_rate == client_config.AUDIO_CODEC_SAMPLE_RATE and codec.frame_samples == 320
+    pcm = create_codec('pcm', 44100, 882)
+    assert type(pcm) is Codec and pcm.sample_rate == 44100 and pcm.frame_samples == 882
+    print(f"✓ Выбор кодека, доступны: {available}")
+
+
+def main():
+    """Главная функция тестирования"""
+    print("=" * 50)
+    print("Тестирование кодеков звонка")
+    print("=" * 50)
+
+    tests = [
+        test_resampler,
+        test_mulaw,
+        test_negotiation,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"✗ {test.__name__} - ОШИБКА: {e}")
+
+    print(f"РЕЗУЛЬТАТ: {passed}/{len(tests)} тестов пройдено")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
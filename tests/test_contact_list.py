@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты списка контактов: применение разницы, статусы и счетчики по contact_id, кнопки строки
+"""
+
+import os
+import sys
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from PySide6.QtCore import QPoint, Qt
+from PySide6.QtTest import QTest
+from PySide6.QtWidgets import QApplication, QWidget
+
+from src.ui.contact_list import ContactListModel, ContactListView
+
+
+def application():
+    return QApplication.instance() or QApplication(sys.argv)
+
+
+def contacts(*names, online=()):
+    return [{'contact_id': name, 'display_name': name.upper(), 'is_online': name in online} for name in names]
+
+
+class Changes:
+    """Сигналы модели, полученные представлением"""
+
+    def __init__(self, model):
+        self.events = []
+        model.rowsInserted.connect(lambda _, first, last: self.events.append(('insert', first, last)))
+        model.rowsRemoved.connect(lambda _, first, last: self.events.append(('remove', first, last)))
+        model.rowsMoved.connect(lambda _, first, last, __, row: self.events.append(('move', first, row)))
+        model.dataChanged.connect(lambda top, bottom, _: self.events.append(('update', top.row(), bottom.row())))
+        model.modelReset.connect(lambda: self.events.append(('reset',)))
+
+
+def test_set_contacts_applies_diff():
+    """Повторная загрузка списка меняет только разницу и сохраняет счетчики"""
+    application()
+    model = ContactListModel()
+    changes = Changes(model)
+    assert model.set_contacts(contacts("a", "c", "d", "e")) == 4
+    assert changes.events == [('insert', 0, 3)]
+    model.add_unread("c", 3)
+
+    # Без изменений - ни одного сигнала
+    changes.events.clear()
+    assert model.set_contacts(contacts("a", "c", "d", "e")) == 0
+    assert changes.events == []
+
+    # Добавлен b, удален d, e в сети
+    assert model.set_contacts(contacts("a", "b", "c", "e", online={"e"})) == 3
+    assert changes.events == [('remove', 2, 2), ('insert', 1, 1), ('update', 3, 3)]
+    assert model.contact_ids() == ["a", "b", "c", "e"]
+    assert [model.row_of(name) for name in "abce"] == [0, 1, 2, 3] and model.row_of("d") is None
+    assert model.contact("c")['unread'] == 3 and model.contact("e")['is_online']
+
+    # Смена порядка (новое отображаемое имя) - перемещение строки
+    changes.events.clear()
+    model.set_contacts(contacts("e", "a", "b", "c", online={"e"}))
+    assert model.contact_ids() == ["e", "a", "b", "c"] and changes.events == [('move', 3, 0)]
+    assert model.row_of("e") == 0 and model.row_of("c") == 3 and model.contact("c")['unread'] == 3
+    print("✓ Загрузка контактов применяет только разницу")
+
+
+def test_statuses_and_unread_by_id():
+    """Статус и счетчик меняют одну строку, полный снимок - только отличающиеся"""
+    application()
+    model = ContactListModel()
+    names = [f"user{i}" for i in range(1000)]
+    model.set_contacts(contacts(*names))
+    changes = Changes(model)
+
+    assert model.apply_statuses({"user500": True, "user501": False, "нет такого": True}, partial=True) == 1
+    assert changes.events == [('update', 500, 500)]
+    assert model.contact("user500")['is_online'] and not model.contact("user499")['is_online']
+
+    # Полный снимок: отсутствующие не в сети
+    changes.events.clear()
+    assert model.apply_statuses({"user10": True}) == 2
+    assert changes.events == [('update', 10, 500)]
+    assert model.apply_statuses({"user10": True}) == 0
+
+    changes.events.clear()
+    assert model.add_unread("user999") and model.add_unread("user999") and not model.add_unread("нет такого")
+    assert model.contact("user999")['unread'] == 2
+    assert model.clear_unread("user999") and not model.clear_unread("user999")
+    assert changes.events == [('update', 999, 999)] * 3
+
+    # Счетчики от сервера: снимок обнуляет отсутствующие, ответ на отметку - только свой контакт
+    model.add_unread("user1")
+    changes.events.clear()
+    assert model.apply_unread({"user5": 4, "user7": 1}) == 3
+    assert model.apply_unread({"user5": 0}, partial=True) == 1
+    assert [model.contact(name)['unread'] for name in ("user1", "user5", "user7")] == [0, 0, 1]
+    assert changes.events == [('update', 1, 7), ('update', 5, 5)]
+    print("✓ Статусы и счетчики по contact_id")
+
+
+def test_view_buttons():
+    """Нажатия на кнопки строки дают сигналы звонка и чата с contact_id"""
+    application()
+    view = ContactListView()
+    view.resize(300, 400)
+    view.contacts_model.set_contacts(contacts("a", "b", online={"b"}))
+    view.contacts_model.add_unread("b", 150)
+    view.show()
+    QApplication.processEvents()
+    calls, chats = [], []
+    view.call_requested.connect(calls.append)
+    view.chat_requested.connect(chats.append)
+
+    rect = view.visualRect(view.contacts_model.index(1))
+    assert rect.height() == view.delegate.HEIGHT
+    call, chat = view.delegate.button_rects(rect)
+    QTest.mouseClick(view.viewport(), Qt.LeftButton, pos=call.center())
+    QTest.mouseClick(view.viewport(), Qt.LeftButton, pos=chat.center())
+    QTest.mouseClick(view.viewport(), Qt.LeftButton, pos=QPoint(rect.left() + 30, rect.center().y()))
+    assert calls == ["b"] and chats == ["b"]
+    # Строки рисуются делегатом: дочерних виджетов в области списка нет
+    assert not view.viewport().findChildren(QWidget)
+    view.grab()
+    print("✓ Кнопки строки контакта")
+
+
+def main():
+    """Главная функция тестирования"""
+    print("=" * 50)
+    print("Тестирование списка контактов")
+    print("=" * 50)
+
+    tests = [
+        test_set_contacts_applies_diff,
+        test_statuses_and_unread_by_id,
+        test_view_buttons,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"✗ {test.__name__} - ОШИБКА: {e}")
+
+    print(f"РЕЗУЛЬТАТ: {passed}/{len(tests)} тестов пройдено")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
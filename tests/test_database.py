@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты слоя базы данных: пул соединений, схема и запросы сообщений
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from src.database.database import Database, conversation_key
+from src.database.write_behind import MessageWriteQueue
+
+
+def create_database(name: str, **kwargs) -> Database:
+    return Database(os.path.join(tempfile.mkdtemp(), name), **kwargs)
+
+
+def test_pool_wal_and_synchronous():
+    """Соединения пула открываются в режиме WAL с заданным synchronous"""
+    database = create_database("test_pool.db", synchronous="FULL")
+    with database.connection() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 2  # FULL
+    database.close()
+    print("✓ WAL и synchronous настроены")
+
+
+def test_pool_nested_and_concurrent():
+    """Вложенные вызовы не блокируются, параллельные потоки не теряют записи"""
+    database = create_database("test_pool_threads.db")
+
+    with database.connection():
+        # Вложенный вызов метода внутри открытого соединения
+        assert database.add_message("user1", "user2", "вложенное")
+
+    def writer(n):
+        for i in range(50):
+            assert database.add_message(f"user{n}", "user1", f"сообщение {i}")
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with database.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0] == 401
+    assert len(database.pool._all) <= database.pool.size
+    database.close()
+    print("✓ Вложенные и параллельные вызовы")
+
+
+def test_migration_of_existing_database():
+    """Файл со старой схемой получает ключ диалога, индекс и триггер"""
+    db_path = os.path.join(tempfile.mkdtemp(), "test_migration.db")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('''
+            CREATE TABLE messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sender_id TEXT NOT NULL,
+                receiver_id TEXT NOT NULL,
+                message_text TEXT NOT NULL,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                is_read BOOLEAN DEFAULT FALSE
+            )
+        ''')
+        conn.executemany("INSERT INTO messages (sender_id, receiver_id, message_text) VALUES (?, ?, ?)",
+                         [("user1", "user2", "старое 1"), ("user2", "user1", "старое 2"),
+                          ("user3", "user1", "другой диалог")])
+
+    database = Database(db_path)
+    with database.connection() as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] >= 1
+        assert conn.execute("SELECT COUNT(*) FROM messages WHERE conversation IS NULL").fetchone()[0] == 0
+        plan = conn.execute("EXPLAIN QUERY PLAN SELECT * FROM messages WHERE conversation = ? ORDER BY id DESC",
+                            (conversation_key("user1", "user2"),)).fetchall()
+        assert 'idx_messages_conversation' in str(plan)
+        # Вставка без ключа (старый клиент с общим файлом БД) заполняется триггером
+        conn.execute("INSERT INTO messages (sender_id, receiver_id, message_text) VALUES ('user2', 'user1', 'raw')")
+
+    texts = [m['message_text'] for m in database.get_messages("user2", "user1")]
+    assert texts == ["старое 1", "старое 2", "raw"]
+    database.close()
+
+    # Повторное открытие не применяет миграцию заново
+    Database(db_path).close()
+    print("✓ Миграция существующей базы")
+
+
+def test_message_ids_loaded_on_open():
+    """Счетчик id читается при открытии базы: выдача id не берет соединение из пула"""
+    db_path = os.path.join(tempfile.mkdtemp(), "test_message_ids_open.db")
+    database = Database(db_path)
+    for i in range(3):
+        assert database.add_message("user1", "user2", f"сообщение {i}")
+    with database.connection() as conn:
+        conn.execute("DELETE FROM messages WHERE id = 3")
+    database.close()
+
+    def no_connection():
+        raise AssertionError("выдача id заняла соединение из пула")
+
+    database = Database(db_path)
+    connection, database.pool.connection = database.pool.connection, no_connection
+    # id удаленного сообщения не выдается повторно
+    assert database.allocate_message_ids(2) == 4 and database.last_message_id() == 5
+    database.pool.connection = connection
+    database.close()
+    print("✓ Счетчик id сообщений загружен при открытии")
+
+
+def test_write_behind_flush_and_stop():
+    """Очередь пишет пакетами, flush и stop дожидаются записи"""
+    database = create_database("test_write_behind.db")
+    writer = MessageWriteQueue(database, batch_size=100, flush_interval=0.01)
+    writer.start()
+
+    for i in range(250):
+        writer.enqueue({'sender_id': "user1", 'receiver_id': "user2",
+                        'message_text': f"пакет {i}", 'timestamp': time.time()})
+    assert writer.flush(timeout=5)
+    assert len(database.get_messages("user1", "user2", limit=1000)) == 250
+    assert writer.batches >= 3
+
+    # Все, что поставлено до stop(), записывается
+    for i in range(30):
+        writer.enqueue({'sender_id': "user2", 'receiver_id': "user1", 'message_text': f"хвост {i}"})
+    writer.stop(timeout=5)
+    assert writer.written == 280
+    texts = [m['message_text'] for m in database.get_messages("user1", "user2", limit=1000)]
+    assert texts[0] == "пакет 0" and texts[-1] == "хвост 29"
+    database.close()
+    print("✓ Отложенная запись сообщений")
+
+
+def test_write_behind_full_queue_rejects():
+    """Заполненная очередь не блокирует отправителя: сообщение отклоняется"""
+    database = create_database("test_write_behind_full.db")
+    writer = MessageWriteQueue(database, batch_size=10, flush_interval=0.01, max_pending=3)
+    # Поток записи не запущен - очередь не разбирается
+    messages = [{'sender_id': "user1", 'receiver_id': "user2", 'message_text': f"полная {i}"} for i in range(5)]
+    started = time.monotonic()
+    assert [writer.enqueue(message) for message in messages] == [True, True, True, False, False]
+    assert time.monotonic() - started < 1
+    assert writer.rejected == 2 and writer.pending() == 3
+
+    writer.start()
+    writer.stop(timeout=5)
+    assert writer.written == 3 and writer.pending() == 0
+    database.close()
+    print("✓ Переполненная очередь записи отклоняет сообщения")
+
+
+def test_write_behind_failed_batch():
+    """Пакет, который не записывается, отбрасывается после повторов, очередь продолжает работу"""
+    database = create_database("test_write_behind_failed.db")
+    writer = MessageWriteQueue(database, batch_size=100, flush_interval=0.01, max_retries=2)
+    writer.start()
+
+    # Сообщение без текста: ошибка при подготовке строк пакета
+    writer.enqueue({'sender_id': "user1", 'receiver_id': "user2"})
+    assert writer.flush(timeout=5)
+    wait_until = time.time() + 5
+    while writer.dropped == 0 and time.time() < wait_until:
+        time.sleep(0.01)
+    assert writer.dropped == 1 and writer.pending() == 0
+
+    writer.enqueue({'sender_id': "user1", 'receiver_id': "user2", 'message_text': "после сбоя"})
+    assert writer.flush(timeout=5)
+    writer.stop(timeout=5)
+    assert writer.written == 1
+    assert [m['message_text'] for m in database.get_messages("user1", "user2")] == ["после сбоя"]
+    database.close()
+    print("✓ Отбрасывание незаписываемого пакета")
+
+
+def test_keyset_history_pages():
+    """Страницы по id до и после курсора, другие диалоги не попадают в выборку"""
+    database = create_database("test_keyset.db")
+    for i in range(120):
+        database.add_message("user1", "user2", f"сообщение {i}")
+        database.add_message("user1", "user3", f"другой {i}")
+    key = conversation_key("user2", "user1")
+
+    latest = database.get_messages_before(key, limit=50)
+    assert [m['message_text'] for m in latest] == [f"сообщение {i}" for i in range(70, 120)]
+    older = database.get_messages_before(key, latest[0]['id'], 50)
+    oldest = database.get_messages_before(key, older[0]['id'], 50)
+    assert len(oldest) == 20 and oldest[0]['message_text'] == "сообщение 0"
+    assert database.get_messages_before(key, oldest[0]['id'], 50) == []
+
+    newer = database.get_messages_after(key, oldest[-1]['id'], 50)
+    assert newer == older
+    assert database.get_messages_after(key, None, 5) == oldest[:5]
+    assert database.get_messages_after(key, latest[-1]['id'], 50) == []
+    database.close()
+    print("✓ Постраничная выборка по курсору id")
+
+
+def main():
+    """Главная функция тестирования"""
+    print("=" * 50)
+    print("Тестирование базы данных")
+    print("=" * 50)
+
+    tests = [
+        test_pool_wal_and_synchronous,
+        test_pool_nested_and_concurrent,
+        test_migration_of_existing_database,
+        test_message_ids_loaded_on_open,
+        test_write_behind_flush_and_stop,
+        test_write_behind_failed_batch,
+        test_write_behind_full_queue_rejects,
+        test_keyset_history_pages,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"✗ {test.__name__} - ОШИБКА: {e}")
+
+    print(f"РЕЗУЛЬТАТ: {passed}/{len(tests)} тестов пройдено")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
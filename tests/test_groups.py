@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты групповых чатов: состав групп, индекс подключенных участников и рассылка group_message
+"""
+
+import os
+import sys
+import tempfile
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from src.database.database import Database, group_conversation
+from src.network.groups import GroupIndex
+from src.network.network_manager import NetworkManager
+from tests.helpers import free_port, wait_for
+
+
+def test_group_index():
+    """Подключенные участники группы меняются вместе с подключениями и составом"""
+    database = Database(os.path.join(tempfile.mkdtemp(), "test_groups.db"))
+    groups = GroupIndex(database)
+    groups.connect("user1")
+    group_id = groups.create("Команда", "user1", ["user2", "user3"])
+
+    assert database.get_group_members(group_id) and groups.members(group_id) == {"user1", "user2", "user3"}
+    assert groups.online_members(group_id) == ["user1"]
+    groups.connect("user2")
+    assert sorted(groups.online_members(group_id)) == ["user1", "user2"]
+    assert groups.is_member(group_id, "user3") and not groups.is_member(group_id, "admin")
+
+    assert groups.add_members(group_id, ["admin"])
+    groups.connect("admin")
+    assert sorted(groups.online_members(group_id)) == ["admin", "user1", "user2"]
+    assert groups.remove_member(group_id, "user2")
+    groups.disconnect("admin")
+    assert groups.online_members(group_id) == ["user1"]
+    assert sorted(database.get_group_members(group_id)) == ["admin", "user1", "user3"]
+
+    # Новый индекс загружает состав из БД
+    assert GroupIndex(database).members(group_id) == {"admin", "user1", "user3"}
+    database.close()
+    print("✓ Индекс участников групп")
+
+
+def test_group_history_pages():
+    """Сообщения группы хранятся в отдельном диалоге и выбираются страницами"""
+    database = Database(os.path.join(tempfile.mkdtemp(), "test_groups.db"))
+    group_id = database.create_group("Команда", "user1", ["user2"])
+    conversation = group_conversation(group_id)
+    database.add_messages([{'sender_id': f"user{i % 2 + 1}", 'receiver_id': conversation,
+                            'message_text': f"группа {i}"} for i in range(30)])
+    database.add_message("user1", "user2", "лично")
+
+    latest = database.get_messages_before(conversation, limit=20)
+    older = database.get_messages_before(conversation, latest[0]['id'], limit=20)
+    assert len(latest) == 20 and len(older) == 10
+    assert older[0]['message_text'] == "группа 0" and latest[-1]['message_text'] == "группа 29"
+    assert [m['message_text'] for m in database.get_messages("user1", "user2")] == ["лично"]
+    database.close()
+    print("✓ История группы по курсору")
+
+
+def test_server_group_message():
+    """group_message доходит до подключенных участников и не доходит до остальных"""
+    database = Database(os.path.join(tempfile.mkdtemp(), "test_groups.db"))
+    port = free_port()
+    server = NetworkManager(database)
+    assert server.start_server('127.0.0.1', port, mode='asyncio')
+    clients = {}
+    received = {}
+    try:
+        for user_id in ("user1", "user2", "user3"):
+            client = NetworkManager(database)
+            received[user_id] = []
+            client.message_callback = received[user_id].append
+            assert client.connect_to_server('127.0.0.1', port, user_id)
+            clients[user_id] = client
+
+        def of_type(user_id, message_type):
+            return [m for m in received[user_id] if m['type'] == message_type]
+
+        clients["user1"].create_group("Команда", ["user2"])
+        wait_for(lambda: of_type("user2", 'group_update'))
+        group_id = of_type("user2", 'group_update')[0]['group_id']
+        assert of_type("user1", 'group_update')[0]['members'] == ["user1", "user2"]
+
+        clients["user2"].send_group_message(group_id, "привет группе")
+        wait_for(lambda: of_type("user1", 'group_message') and of_type("user2", 'group_message'))
+        assert of_type("user1", 'group_message')[0]['message_text'] == "привет группе"
+
+        # Не участник не может писать в группу и не получает ее сообщений
+        clients["user3"].send_group_message(group_id, "чужое")
+        clients["user1"].request_history(group_id=group_id)
+        wait_for(lambda: of_type("user1", 'history_response'))
+        history = of_type("user1", 'history_response')[0]
+        assert history['success'] and [m['message_text'] for m in history['messages']] == ["привет группе"]
+        assert not of_type("user3", 'group_message')
+
+        clients["user3"].request_history(group_id=group_id)
+        wait_for(lambda: of_type("user3", 'history_response'))
+        assert not of_type("user3", 'history_response')[0]['success']
+
+        # Ключ группы вместо собеседника в личных запросах не открывает доступ к группе
+        clients["user3"].request_history(contact_id=group_conversation(group_id))
+        wait_for(lambda: len(of_type("user3", 'history_response')) == 2)
+        denied = of_type("user3", 'history_response')[1]
+        assert not denied['success'] and denied['messages'] == []
+        clients["user3"].send_client_message({'type': 'message', 'sender_id': "user3",
+                                              'receiver_id': group_conversation(group_id),
+                                              'message_text': "подброшено в группу"})
+        clients["user1"].request_history(group_id=group_id)
+        wait_for(lambda: len(of_type("user1", 'history_response')) == 2)
+        assert [m['message_text'] for m in of_type("user1", 'history_response')[1]['messages']] == ["привет группе"]
+        assert [m['message_text'] for m in database.get_messages_before(group_conversation(group_id))] == \
+            ["привет группе"]
+        assert not of_type("user1", 'message') and not of_type("user2", 'message')
+    finally:
+        for client in clients.values():
+            client.stop_server()
+        server.stop_server()
+        database.close()
+    print("✓ Рассылка group_message участникам")
+
+
+def main():
+    """Главная функция тестирования"""
+    print("=" * 50)
+    print("Тестирование групповых чатов")
+    print("=" * 50)
+
+    tests = [
+        test_group_index,
+        test_group_history_pages,
+        test_server_group_message,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"✗ {test.__name__} - ОШИБКА: {e}")
+
+    print(f"РЕЗУЛЬТАТ: {passed}/{len(tests)} тестов пройдено")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты буфера воспроизведения голосовых пакетов: заголовок, порядок, потери и адаптивная задержка
+"""
+
+import os
+import sys
+
+import numpy as np
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from src.audio.jitter_buffer import (JitterBuffer, MediaPacket, conceal, pack_packet, unpack_packet,
+                                     unwrap_sequence)
+from src.config import client_config
+
+FRAME_SAMPLES = 160
+SAMPLE_RATE = 8000
+FRAME = FRAME_SAMPLES / SAMPLE_RATE  # 20 мс
+
+
+def frame(value: int) -> bytes:
+    return np.full(FRAME_SAMPLES, value, dtype=np.int16).tobytes()
+
+
+def make_buffer(**kwargs) -> JitterBuffer:
+    kwargs.setdefault('min_delay', 2 * FRAME)
+    kwargs.setdefault('max_delay', 10 * FRAME)
+    return JitterBuffer(SAMPLE_RATE, FRAME_SAMPLES, 1, capacity=32, **kwargs)
+
+
+def packet(number: int, payloads: dict) -> MediaPacket:
+    sequence = number % 65536
+    payloads.setdefault(sequence, frame(sequence % 1000 + 1))
+    return MediaPacket(sequence, number * FRAME_SAMPLES, payloads[sequence])
+
+
+def test_packet_header():
+    """Заголовок пакета: разбор, переход номера через 65535, чужие датаграммы"""
+    original = MediaPacket(65535, 2 ** 32 - 1, b'\x01\x02' * 10, ssrc=0xDEADBEEF)
+    data = pack_packet(original)
+    assert len(data) == 12 + 20 and unpack_packet(data) == original
+    assert unwrap_sequence(2, 65534) == 65538 and unwrap_sequence(65534, 65538) == 65534
+    for garbage in (b'', b'\x00' * 11, b'\x00' * 2048):
+        try:
+            unpack_packet(garbage)
+            assert False, "датаграмма без заголовка принята"
+        except ValueError:
+            pass
+    print("✓ Заголовок голосового пакета")
+
+
+def test_reorder_and_loss():
+    """Пакеты не по порядку играются по номерам, потерянные заполняются, опоздавшие отбрасываются"""
+    buffer = make_buffer()
+    payloads = {}
+    # Номер 4 приходит после 5, номер 6 потерян, номер 2 опаздывает к своему кадру
+    arrivals = [(0, 0.000), (1, 0.020), (3, 0.060), (5, 0.090), (4, 0.095), (7, 0.140),
+                (8, 0.160), (9, 0.180), (2, 0.200)]
+    played = []
+    now = 0.0
+    position = 0
+    for _ in range(14):
+        while position < len(arrivals) and arrivals[position][1] <= now:
+            number, arrival = arrivals[position]
+            buffer.push(packet(number, payloads), arrival)
+            position += 1
+        data = buffer.pop(now)
+        played.append(next((n for n, p in payloads.items() if p is data), None))
+        now += FRAME
+    sequence = [n for n in played if n is not None]
+    assert sequence == [0, 1, 3, 4, 5, 7, 8, 9], played
+    assert played.index(3) - played.index(1) == 2  # вместо 2 - заполнение, не пауза
+    stats = buffer.snapshot()
+    assert stats['late'] == 1 and stats['concealed'] >= 2 and stats['played'] >= 8
+    print(f"✓ Порядок и потери: {sequence}")
+
+
+def test_wraparound():
+    """Номера пакетов продолжаются через 65535 без сброса буфера"""
+    buffer = make_buffer()
+    payloads = {}
+    first = 65530
+    played = []
+    for step in range(20):
+        buffer.push(packet(first + step, payloads), step * FRAME)
+        data = buffer.pop(step * FRAME + FRAME / 2)
+        played.extend(n for n, p in payloads.items() if p is data)
+    assert played == [n % 65536 for n in range(first, first + len(played))] and len(played) >= 15
+    assert buffer.stats['resets'] == 0 and buffer.stats['late'] == 0
+    print("✓ Переход номера через 65535")
+
+
+def test_adaptive_delay():
+    """Задержка растет при джиттере, в пределах максимума; потери не увеличивают задержку"""
+    rng = np.random.default_rng(1)
+    buffer = make_buffer()
+    payloads = {}
+    for number in range(200):
+        buffer.push(packet(number, payloads), number * FRAME + rng.exponential(0.03))
+    assert buffer.min_frames < buffer.target <= buffer.max_frames
+    assert buffer.delay <= 10 * FRAME + 1e-9
+
+    # Ровный поток с 10% потерь: задержка воспроизведения остается постоянной
+    buffer = make_buffer()
+    delays = []
+    position = 0
+    packets = [packet(number, payloads) for number in range(300)]
+    now = FRAME / 2
+    while now < 300 * FRAME:
+        while position < len(packets) and position * FRAME <= now:
+            if position % 10 != 5:
+                buffer.push(packets[position], position * FRAME)
+            position += 1
+        data = buffer.pop(now)
+        for number, payload in payloads.items():
+            if payload is data:
+                delays.append(now - number * FRAME)
+        now += FRAME
+    assert max(delays) - min(delays) < 1e-6 and buffer.stats['dropped'] == 0
+    print(f"✓ Адаптивная задержка: {buffer.delay * 1000:.0f} мс, при потерях без роста")
+
+
+def test_concealment():
+    """Потерянный кадр - затухающий повтор последнего, длинная потеря - тишина"""
+    previous = frame(1000)
+    first = np.frombuffer(conceal(previous, 1, len(previous)), dtype=np.int16)
+    second = np.frombuffer(conceal(previous, 2, len(previous)), dtype=np.int16)
+    assert 0 < second[0] < first[0] < 1000
+    assert conceal(previous, client_config.AUDIO_PLC_MAX_FRAMES + 1, len(previous)) == bytes(len(previous))
+    assert conceal(None, 1, 320) == bytes(320)
+    print("✓ Заполнение потерь")
+
+
+def main():
+    """Главная функция тестирования"""
+    print("=" * 50)
+    print("Тестирование буфера воспроизведения")
+    print("=" * 50)
+
+    tests = [
+        test_packet_header,
+        test_reorder_and_loss,
+        test_wraparound,
+        test_adaptive_delay,
+        test_concealment,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"✗ {test.__name__} - ОШИБКА: {e}")
+
+    print(f"РЕЗУЛЬТАТ: {passed}/{len(tests)} тестов пройдено")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
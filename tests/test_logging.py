@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты логирования: уровни модулей, ленивое форматирование и вывод через очередь
+"""
+
+import io
+import logging.handlers
+import os
+import sys
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from src.utils.logger import get_logger, setup_logging, shutdown_logging
+
+
+class Costly:
+    """Аргумент, который считает свои преобразования в строку"""
+
+    def __init__(self):
+        self.formatted = 0
+
+    def __str__(self):
+        self.formatted += 1
+        return "дорого"
+
+
+def test_levels():
+    """Отключенные уровни не форматируются, уровень модуля переопределяет общий"""
+    stream = io.StringIO()
+    setup_logging('INFO', levels={'src.network.verbose': 'DEBUG'}, log_file='', stream=stream)
+    try:
+        quiet = get_logger('src.network.quiet')
+        verbose = get_logger('src.network.verbose')
+        argument = Costly()
+        quiet.debug("скрыто %s", argument)
+        quiet.info("видно %s", 1)
+        verbose.debug("подробно %s", argument)
+    finally:
+        shutdown_logging()
+    output = stream.getvalue()
+    assert "скрыто" not in output and "видно 1" in output and "подробно дорого" in output
+    assert argument.formatted == 1
+    print("✓ Уровни логирования модулей")
+
+
+def test_queued_handler():
+    """Логгеры модулей только ставят записи в очередь, вывод - в потоке логирования"""
+    stream = io.StringIO()
+    root = setup_logging('DEBUG', log_file='', stream=stream)
+    try:
+        assert [type(handler) for handler in root.handlers] == [logging.handlers.QueueHandler]
+        logger = get_logger('src.tests')
+        for i in range(100):
+            logger.debug("запись %d", i)
+    finally:
+        shutdown_logging()  # дожидается вывода всей очереди
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 100 and lines[-1].endswith("src.tests: запись 99")
+    print("✓ Вывод через очередь")
+
+
+def main():
+    """Главная функция тестирования"""
+    print("=" * 50)
+    print("Тестирование логирования")
+    print("=" * 50)
+
+    tests = [
+        test_levels,
+        test_queued_handler,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"✗ {test.__name__} - ОШИБКА: {e}")
+
+    print(f"РЕЗУЛЬТАТ: {passed}/{len(tests)} тестов пройдено")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
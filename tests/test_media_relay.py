@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты ретранслятора голосовых пакетов: пересылка, чужие адреса и порты звонков на сервере
+"""
+
+import os
+import socket
+import sys
+import tempfile
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from src.database.database import Database
+from src.network.media_relay import MediaRelay
+from src.network.network_manager import NetworkManager
+from tests.helpers import free_port, wait_for
+
+
+def udp_client() -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    sock.settimeout(2)
+    return sock
+
+
+def test_relay_forwarding():
+    """Пакеты идут собеседнику с порта, на который он отправляет свои, чужие адреса отбрасываются, завершение закрывает порты"""
+    relay = MediaRelay('127.0.0.1', 0, 0, idle_timeout=30, check_host=True)
+    assert relay.start()
+    alice, bob, stranger = udp_client(), udp_client(), udp_client()
+    try:
+        call = relay.allocate("user1", "user2", '127.0.0.1', '127.0.0.1')
+        alice_port, bob_port = call.ports
+        assert relay.call_of("user2") is call
+
+        # Первый пакет запоминает адрес участника; собеседника еще нет - пакет не пересылается
+        alice.sendto(b'a0', ('127.0.0.1', alice_port))
+        wait_for(lambda: call.peers[0] is not None)
+        bob.sendto(b'b0', ('127.0.0.1', bob_port))
+        data, source = alice.recvfrom(2048)
+        assert data == b'b0' and source == ('127.0.0.1', alice_port)
+        alice.sendto(b'a1' * 100, ('127.0.0.1', alice_port))
+        data, source = bob.recvfrom(2048)
+        assert data == b'a1' * 100 and source == ('127.0.0.1', bob_port)
+
+        # Чужой адрес на порт участника не пересылается
+        stranger.sendto(b'x', ('127.0.0.1', alice_port))
+        wait_for(lambda: relay.dropped_packets == 2)
+        assert relay.relayed_packets == 2
+
+        # Новый звонок участника завершает прежний; порты освобождаются
+        second = relay.allocate("user2", "user3")
+        assert relay.call_of("user1") is None and relay.call_of("user2") is second
+        assert relay.release_user("user3") and not relay.calls
+        wait_for(lambda: call.sockets[0].fileno() == -1 and second.sockets[1].fileno() == -1)
+    finally:
+        relay.stop()
+        for sock in (alice, bob, stranger):
+            sock.close()
+    print("✓ Пересылка пакетов ретранслятором")
+
+
+def test_relay_idle_expiry():
+    """Звонок без пакетов дольше idle_timeout завершается сам"""
+    expired = []
+    relay = MediaRelay('127.0.0.1', 0, 0, idle_timeout=0.2, on_expire=expired.append)
+    assert relay.start()
+    try:
+        call = relay.allocate("user1", "user2")
+        wait_for(lambda: not relay.calls)
+        assert relay.expired_calls == 1 and relay.call_of("user1") is None
+        wait_for(lambda: expired)
+        assert expired == [call]
+    finally:
+        relay.stop()
+    print("✓ Завершение неактивного звонка")
+
+
+def test_server_call_media():
+    """call_request -> call_response: оба участника получают порты или call_end с причиной"""
+    database = Database(os.path.join(tempfile.mkdtemp(), "test_media_relay.db"))
+    port = free_port()
+    server = NetworkManager(database)
+    assert server.start_server('127.0.0.1', port, mode='asyncio') and server.media_relay
+    clients = {}
+    received = {}
+    try:
+        for user_id in ("user1", "user2"):
+            client = NetworkManager(database)
+            received[user_id] = []
+            client.message_callback = received[user_id].append
+            assert client.connect_to_server('127.0.0.1', port, user_id)
+            clients[user_id] = client
+
+        def of_type(user_id, message_type):
+            return [m for m in received[user_id] if m['type'] == message_type]
+
+        clients["user1"].send_client_message({'type': 'call_request', 'caller_id': "user1",
+                                              'receiver_id': "user2", 'codecs': ["opus", "pcmu", "pcm"]})
+        wait_for(lambda: of_type("user2", 'call_request'))
+        assert of_type("user2", 'call_request')[0]['codecs'] == ["opus", "pcmu", "pcm"]
+
+        # Звонок пользователю не в сети отклоняется сразу
+        clients["user1"].send_client_message({'type': 'call_request', 'caller_id': "user1", 'receiver_id': "user3"})
+        wait_for(lambda: of_type("user1", 'call_response'))
+        assert of_type("user1", 'call_response')[0]['reason'] == 'offline'
+
+        clients["user2"].send_client_message({'type': 'call_response', 'caller_id': "user1",
+                                              'receiver_id': "user2", 'accepted': True, 'codec': "pcmu"})
+        wait_for(lambda: of_type("user1", 'call_media') and of_type("user2", 'call_media'))
+        caller_media, receiver_media = of_type("user1", 'call_media')[0], of_type("user2", 'call_media')[0]
+        assert caller_media['peer_id'] == "user2" and receiver_media['peer_id'] == "user1"
+        assert caller_media['codec'] == "pcmu" and caller_media['call_id'] == receiver_media['call_id']
+        call = server.media_relay.call_of("user1")
+        assert call.ports == (caller_media['media_port'], receiver_media['media_port'])
+
+        # Голос между участниками через порты из call_media
+        alice, bob = udp_client(), udp_client()
+        try:
+            alice.sendto(b'hello', ('127.0.0.1', caller_media['media_port']))
+            wait_for(lambda: call.peers[0] is not None)
+            bob.sendto(b'hi', ('127.0.0.1', receiver_media['media_port']))
+            assert alice.recvfrom(2048)[0] == b'hi'
+        finally:
+            alice.close()
+            bob.close()
+
+        clients["user2"].send_client_message({'type': 'call_end', 'caller_id': "user2", 'receiver_id': "user1"})
+        wait_for(lambda: of_type("user1", 'call_end'))
+        assert not server.media_relay.calls
+        assert server.metrics.get('aleph_media_packets_relayed_total').value() == 1
+
+        # Звонок без голосовых пакетов завершается ретранслятором с уведомлением обоих
+        server.media_relay.idle_timeout = 0.2
+        clients["user2"].send_client_message({'type': 'call_response', 'caller_id': "user1",
+                                              'receiver_id': "user2", 'accepted': True})
+        wait_for(lambda: [m for m in of_type("user1", 'call_end') if m.get('reason') == 'media_timeout'] and
+                 [m for m in of_type("user2", 'call_end') if m.get('reason') == 'media_timeout'])
+
+        # Без ретранслятора принятый звонок сразу завершается с причиной
+        server.media_relay.stop()
+        server.media_relay = None
+        clients["user2"].send_client_message({'type': 'call_response', 'caller_id': "user1",
+                                              'receiver_id': "user2", 'accepted': True})
+        wait_for(lambda: [m for m in of_type("user1", 'call_end') if m.get('reason') == 'no_media_relay'] and
+                 [m for m in of_type("user2", 'call_end') if m.get('reason') == 'no_media_relay'])
+    finally:
+        for client in clients.values():
+            client.stop_server()
+        server.stop_server()
+        database.close()
+    print("✓ Порты звонка выдаются сервером")
+
+
+def main():
+    """Главная функция тестирования"""
+    print("=" * 50)
+    print("Тестирование ретранслятора звонков")
+    print("=" * 50)
+
+    tests = [
+        test_relay_forwarding,
+        test_relay_idle_expiry,
+        test_server_call_media,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"✗ {test.__name__} - ОШИБКА: {e}")
+
+    print(f"РЕЗУЛЬТАТ: {passed}/{len(tests)} тестов пройдено")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты транспорта и шины входящих сообщений клиента
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from PySide6.QtWidgets import QApplication
+
+from src.ui.message_bus import MessageBus
+from tests.helpers import free_port
+
+
+def application():
+    # QApplication, а не QCoreApplication: тесты виджетов могут идти в том же процессе
+    return QApplication.instance() or QApplication(sys.argv)
+
+
+def wait_for(condition, timeout: float = 5.0) -> bool:
+    """Обработка событий Qt до выполнения условия"""
+    app = application()
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        app.processEvents()
+        time.sleep(0.005)
+    return condition()
+
+
+def text_message(sender_id: str, receiver_id: str, text: str) -> dict:
+    return {'type': 'message', 'sender_id': sender_id, 'receiver_id': receiver_id,
+            'message_text': text, 'timestamp': time.time()}
+
+
+def create_transport(user_id: str = "user1"):
+    """Транспорт без подключения и шина, подписанная на него"""
+    from src.database.database import Database
+    from src.network.client_transport import ClientTransport
+    from src.network.network_manager import NetworkManager
+
+    application()
+    database = Database(os.path.join(tempfile.mkdtemp(), "test_message_bus.db"))
+    transport = ClientTransport(NetworkManager(database))
+    bus = MessageBus(user_id)
+    bus.attach(transport)
+    return transport, bus
+
+
+def test_routing_from_network_thread():
+    """Кадры из чужого потока доставляются в потоке интерфейса нужному диалогу"""
+    transport, bus = create_transport()
+    chat_user2, chat_user3, all_messages, threads = [], [], [], []
+
+    def record(target):
+        def handler(messages):
+            threads.append(threading.current_thread())
+            target.extend(message['message_text'] for message in messages)
+        return handler
+
+    bus.subscribe_conversation("user2", record(chat_user2))
+    bus.subscribe_conversation("user3", record(chat_user3))
+    bus.subscribe('message', record(all_messages))
+
+    def network_thread():
+        transport.enqueue([text_message("user2", "user1", "входящее")])
+        transport.enqueue([text_message("user1", "user2", "исходящее"),
+                           text_message("user3", "user1", "другой диалог")])
+
+    sender = threading.Thread(target=network_thread)
+    sender.start()
+    sender.join()
+
+    assert wait_for(lambda: len(all_messages) == 3)
+    assert chat_user2 == ["входящее", "исходящее"]
+    assert chat_user3 == ["другой диалог"]
+    assert all(thread is threading.main_thread() for thread in threads)
+    print("✓ Маршрутизация сообщений по диалогам в поток интерфейса")
+
+
+def test_burst_coalesced():
+    """500 сообщений, пришедших до обработки событий, доставляются одной пачкой"""
+    transport, bus = create_transport()
+    calls = []
+    bus.subscribe_conversation("user2", lambda messages: calls.append(len(messages)))
+
+    def network_thread():
+        # Каждое чтение из сокета дает от одного до нескольких кадров
+        for i in range(0, 500, 5):
+            transport.enqueue([text_message("user2", "user1", f"пачка {j}") for j in range(i, i + 5)])
+
+    sender = threading.Thread(target=network_thread)
+    sender.start()
+    sender.join()
+
+    assert wait_for(lambda: sum(calls) == 500)
+    assert calls == [500] and transport.batches == 1
+    assert transport.pending() == 0
+    print("✓ 500 сообщений доставлены одним вызовом обработчика")
+
+
+def test_unsubscribe_and_failing_handler():
+    """Отписанный чат не получает сообщений, ошибка обработчика не ломает доставку"""
+    transport, bus = create_transport()
+    received = []
+
+    def failing(messages):
+        raise RuntimeError("ошибка виджета")
+
+    bus.subscribe_conversation("user2", failing)
+    bus.subscribe_conversation("user2", received.extend)
+    transport.enqueue([text_message("user2", "user1", "первое")])
+    assert wait_for(lambda: len(received) == 1)
+
+    bus.unsubscribe_conversation("user2", failing)
+    bus.unsubscribe_conversation("user2", received.extend)
+    transport.enqueue([text_message("user2", "user1", "второе")])
+    assert wait_for(lambda: bus.dispatched == 2)
+    assert len(received) == 1
+    print("✓ Отписка и изоляция ошибок обработчиков")
+
+
+def test_disconnect_callback():
+    """Клиент сообщает о потере соединения, но не о штатной остановке"""
+    from src.database.database import Database
+    from src.network.network_manager import NetworkManager
+
+    database = Database(os.path.join(tempfile.mkdtemp(), "test_message_bus.db"))
+    port = free_port()
+    server = NetworkManager(database)
+    assert server.start_server('127.0.0.1', port, mode='asyncio')
+
+    lost, stopped = [], []
+    client = NetworkManager(database)
+    client.disconnect_callback = lambda: lost.append(True)
+    assert client.connect_to_server('127.0.0.1', port, 'user1')
+    other = NetworkManager(database)
+    other.disconnect_callback = lambda: stopped.append(True)
+    assert other.connect_to_server('127.0.0.1', port, 'user2')
+
+    other.stop_server()
+    server.stop_server()
+    deadline = time.time() + 5
+    while not lost and time.time() < deadline:
+        time.sleep(0.01)
+    assert lost and not stopped
+    print("✓ Уведомление о потере соединения")
+
+
+def main():
+    """Главная функция тестирования"""
+    print("=" * 50)
+    print("Тестирование шины сообщений")
+    print("=" * 50)
+
+    tests = [
+        test_routing_from_network_thread,
+        test_burst_coalesced,
+        test_unsubscribe_and_failing_handler,
+        test_disconnect_callback,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"✗ {test.__name__} - ОШИБКА: {e}")
+
+    print(f"РЕЗУЛЬТАТ: {passed}/{len(tests)} тестов пройдено")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты локального кэша сообщений клиента: дедупликация по id, страницы и догрузка с сервера
+"""
+
+import os
+import sys
+import tempfile
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from src.database.database import Database
+from src.database.message_cache import MessageCache, cache_path
+from src.network.network_manager import NetworkManager
+from tests.helpers import free_port, wait_for
+
+
+def message(message_id, sender="user2", receiver="user1"):
+    return {'id': message_id, 'sender_id': sender, 'receiver_id': receiver,
+            'message_text': f"сообщение {message_id}", 'timestamp': "2024-01-01 10:00:00"}
+
+
+def test_cache_dedup_and_pages():
+    """Повторно полученные сообщения не дублируются, страницы по id, отметка полноты и контакты сохраняются"""
+    path = os.path.join(tempfile.mkdtemp(), "user1.db")
+    cache = MessageCache("user1", path)
+    cache.store([message(i, *(("user1", "user2") if i % 2 else ("user2", "user1"))) for i in range(1, 121)])
+    # Та же страница еще раз, сообщение без id и другой диалог
+    cache.store([message(i) for i in range(100, 121)] + [dict(message(None), id=None)] + [message(500, "user3")])
+    cache.mark_complete("user2")
+
+    last = cache.get_messages("user2", limit=50)
+    assert [m['id'] for m in last] == list(range(71, 121))
+    older = cache.get_messages("user2", limit=50, before_id=last[0]['id'])
+    assert [m['id'] for m in older] == list(range(21, 71))
+    assert cache.newest_id("user2") == 120 and cache.newest_id("user3") == 500
+    assert cache.is_complete("user2") and not cache.is_complete("user3")
+    assert cache.store_contacts([{'contact_id': "user3", 'display_name': "Третий", 'is_online': True},
+                                 {'contact_id': "user2", 'display_name': None}])
+    cache.close()
+
+    reopened = MessageCache("user1", path)
+    assert len(reopened.get_messages("user2", limit=1000)) == 120 and reopened.is_complete("user2")
+    # Список контактов сохраняется в порядке сервера, статусы - нет
+    assert reopened.get_contacts() == [{'contact_id': "user3", 'display_name': "Третий", 'is_online': False},
+                                       {'contact_id': "user2", 'display_name': None, 'is_online': False}]
+    reopened.close()
+    assert cache_path("user 1/..").endswith("user_1_...db")
+    print("✓ Дедупликация по id и страницы кэша")
+
+
+def test_unwritten_messages_read_without_flush():
+    """Еще не записанные сообщения видны при чтении, поток интерфейса не ждет записи"""
+    path = os.path.join(tempfile.mkdtemp(), "user1.db")
+    # Пакет пишется только при остановке: все сообщения пока в памяти
+    cache = MessageCache("user1", path, batch_size=10000, flush_interval=3600)
+
+    def no_flush(timeout=None):
+        raise AssertionError("чтение кэша ждет записи")
+
+    flush, cache.writer.flush = cache.writer.flush, no_flush
+    cache.store([message(i) for i in range(1, 61)] + [message(100, "user3")])
+    assert cache.writer.pending() == 61
+    assert [m['id'] for m in cache.get_messages("user2", limit=20)] == list(range(41, 61))
+    assert [m['id'] for m in cache.get_messages("user2", limit=20, before_id=41)] == list(range(21, 41))
+    assert cache.newest_id("user2") == 60 and cache.newest_id("user3") == 100
+    assert cache.get_messages("user2", limit=1)[0]['message_text'] == "сообщение 60"
+    cache.writer.flush = flush
+    cache.close()
+
+    reopened = MessageCache("user1", path)
+    assert [m['id'] for m in reopened.get_messages("user2", limit=20)] == list(range(41, 61))
+    reopened.close()
+    print("✓ Незаписанные сообщения читаются из памяти")
+
+
+def test_complete_marks_outside_write_queue():
+    """Отметка полноты не занимает очередь сообщений и сохраняется не раньше своих сообщений"""
+    path = os.path.join(tempfile.mkdtemp(), "user1.db")
+    cache = MessageCache("user1", path, flush_interval=0.01)
+
+    def reopened_complete(contact_id):
+        reopened = MessageCache("user1", path)
+        try:
+            return reopened.is_complete(contact_id)
+        finally:
+            reopened.close()
+
+    # Очередь пуста - отметка пишется сразу
+    cache.mark_complete("user3")
+    assert cache.writer.pending() == 0 and reopened_complete("user3")
+
+    # Есть незаписанные сообщения - отметка пишется вместе с пакетом, опустошающим очередь
+    cache.store([message(i) for i in range(1, 11)])
+    cache.mark_complete("user2")
+    assert cache.writer.pending() == 10 and cache.is_complete("user2")
+    assert cache.flush(timeout=5)
+    assert cache.writer.written == 10 and reopened_complete("user2")
+    cache.close()
+    print("✓ Отметки полноты вне очереди записи")
+
+
+def test_cache_backfill_from_server():
+    """Пустой кэш заполняется ответами history_response; после этого чат открывается без сервера"""
+    database = Database(os.path.join(tempfile.mkdtemp(), "test_message_cache.db"))
+    for i in range(130):
+        database.add_message(*(("user1", "user2") if i % 2 else ("user2", "user1")), f"сообщение {i}")
+    port = free_port()
+    server = NetworkManager(database)
+    assert server.start_server('127.0.0.1', port, mode='asyncio')
+    cache = MessageCache("user1", os.path.join(tempfile.mkdtemp(), "user1.db"))
+    client = NetworkManager(database)
+    responses = []
+    client.message_callback = lambda frame: frame['type'] == 'history_response' and responses.append(frame)
+    try:
+        assert client.connect_to_server('127.0.0.1', port, "user1")
+
+        # Последняя страница, затем вся история постранично к началу
+        assert client.request_history("user2", limit=50)
+        while True:
+            wait_for(lambda: responses)
+            response = responses.pop()
+            cache.store(response['messages'])
+            if not response['has_more']:
+                cache.mark_complete("user2")
+                break
+            assert client.request_history("user2", before_id=response['messages'][0]['id'], limit=50)
+
+        # Догрузка после переподключения: только новее последнего в кэше
+        database.add_message("user2", "user1", "пока не было соединения")
+        assert client.request_history("user2", after_id=cache.newest_id("user2"), limit=50)
+        wait_for(lambda: responses)
+        response = responses.pop()
+        assert [m['message_text'] for m in response['messages']] == ["пока не было соединения"]
+        cache.store(response['messages'])
+    finally:
+        client.stop_server()
+        server.stop_server()
+
+    messages = cache.get_messages("user2", limit=1000)
+    assert len(messages) == 131 and messages[0]['message_text'] == "сообщение 0"
+    assert cache.is_complete("user2")
+    cache.close()
+    database.close()
+    print("✓ Догрузка истории с сервера в кэш")
+
+
+def main():
+    """Главная функция тестирования"""
+    print("=" * 50)
+    print("Тестирование кэша сообщений клиента")
+    print("=" * 50)
+
+    tests = [
+        test_cache_dedup_and_pages,
+        test_unwritten_messages_read_without_flush,
+        test_complete_marks_outside_write_queue,
+        test_cache_backfill_from_server,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"✗ {test.__name__} - ОШИБКА: {e}")
+
+    print(f"РЕЗУЛЬТАТ: {passed}/{len(tests)} тестов пройдено")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
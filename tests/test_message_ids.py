@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты id сообщений, выдаваемых сервером: порядок доставки и отсутствие дублей
+при одновременной доставке кадров и догрузке истории
+"""
+
+import os
+import random
+import sys
+import tempfile
+import threading
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from PySide6.QtWidgets import QApplication
+
+from src.database.database import Database
+from src.database.write_behind import MessageWriteQueue
+from src.network.network_manager import NetworkManager
+from src.ui.chat_view import MessageListModel
+from tests.helpers import free_port, wait_for
+
+
+def application():
+    return QApplication.instance() or QApplication(sys.argv)
+
+
+def message(message_id):
+    return {'id': message_id, 'sender_id': "user2", 'receiver_id': "user1",
+            'message_text': f"сообщение {message_id}", 'timestamp': 1700000000.0 + message_id}
+
+
+def test_model_interleaved_paths():
+    """Кадры, догрузка новее курсора и страницы старше в случайном порядке: каждое сообщение один раз"""
+    application()
+    rng = random.Random(7)
+    for _ in range(20):
+        # id диалога не подряд: между ними сообщения других диалогов
+        ids = sorted(rng.sample(range(1, 5000), 400))
+        model = MessageListModel("user1")
+        pushed = 200
+        model.append_messages([message(i) for i in ids[150:pushed]])
+        while pushed < len(ids) or model.oldest_id() != ids[0]:
+            path = rng.random()
+            if path < 0.4 and pushed < len(ids):
+                # Кадр нового сообщения
+                count = rng.randint(1, 5)
+                model.append_messages([message(i) for i in ids[pushed:pushed + count]])
+                pushed += count
+            elif path < 0.7:
+                # Догрузка после курсора, отстающего от уже показанных кадров
+                start = rng.randrange(0, pushed)
+                model.append_messages([message(i) for i in ids[start:min(start + 50, pushed)]])
+            else:
+                # Страница старше самого старого показанного
+                end = ids.index(model.oldest_id())
+                model.prepend_messages([message(i) for i in ids[max(0, end - 50):end + rng.randint(0, 3)]])
+        shown = [model.row_at(row)['id'] for row in range(model.rowCount())]
+        assert shown == ids, (len(shown), len(ids))
+        assert model.newest_id() == ids[-1]
+    print("✓ Вперемешку кадры и догрузка: без дублей и пропусков")
+
+
+def test_server_ids_under_load():
+    """Потоковый сервер: id в кадрах монотонны у каждого клиента, история и кадры сходятся без дублей"""
+    application()
+    database = Database(os.path.join(tempfile.mkdtemp(), "test_message_ids.db"))
+    for i in range(20):
+        database.add_message("user1", "user2", f"до сервера {i}")
+    port = free_port()
+    server = NetworkManager(database)
+    assert server.start_server('127.0.0.1', port, mode='threaded')
+
+    frames = []
+    responses = []
+    receiver = NetworkManager(database)
+    receiver.message_callback = lambda frame: (frames if frame['type'] == 'message' else responses).append(frame)
+    sender_ids = ["user2", "user3", "admin"]
+    senders = [NetworkManager(database) for _ in sender_ids]
+    try:
+        assert receiver.connect_to_server('127.0.0.1', port, "user1")
+        for sender, user_id in zip(senders, sender_ids):
+            assert sender.connect_to_server('127.0.0.1', port, user_id)
+        per_sender = 150
+
+        def burst(sender, user_id):
+            for i in range(per_sender):
+                sender.send_client_message({'type': 'message', 'sender_id': user_id, 'receiver_id': "user1",
+                                            'message_text': f"{user_id} {i}"})
+
+        threads = [threading.Thread(target=burst, args=(sender, user_id))
+                   for sender, user_id in zip(senders, sender_ids)]
+        for thread in threads:
+            thread.start()
+        # Пока идут кадры, клиент догружает историю диалога с user2 страницами после курсора
+        cursor = 0
+        backfill = []
+        while any(thread.is_alive() for thread in threads) or len(frames) < per_sender * len(senders):
+            responses.clear()
+            assert receiver.request_history("user2", after_id=cursor, limit=20)
+            wait_for(lambda: responses)
+            page = responses[0]['messages']
+            backfill.extend(page)
+            if page:
+                cursor = page[-1]['id']
+            if len(frames) >= per_sender * len(senders):
+                break
+        for thread in threads:
+            thread.join()
+        wait_for(lambda: len(frames) == per_sender * len(senders), timeout=10)
+
+        # Кадры каждому клиенту идут в порядке id
+        frame_ids = [frame['id'] for frame in frames]
+        assert frame_ids == sorted(frame_ids) and len(set(frame_ids)) == len(frame_ids)
+
+        # Кадры и догруженные страницы диалога с user2 в порядке поступления дают каждое сообщение один раз
+        model = MessageListModel("user1")
+        rows = [frame for frame in frames if frame['sender_id'] == "user2"] + backfill
+        random.Random(1).shuffle(rows)
+        for row in rows:
+            model.append_messages([row])
+        server.message_writer.flush(5)
+        expected = [row['id'] for row in database.get_messages("user1", "user2", limit=1000)]
+        shown = [model.row_at(row)['id'] for row in range(model.rowCount())]
+        pushed_ids = {frame['id'] for frame in frames if frame['sender_id'] == "user2"}
+        assert pushed_ids <= set(expected)
+        assert shown == [message_id for message_id in expected if message_id in set(shown)]
+        assert len(shown) == len(set(shown)) and pushed_ids <= set(shown)
+    finally:
+        for client in [receiver] + senders:
+            client.stop_server()
+        server.stop_server()
+        database.close()
+    print(f"✓ id сервера: {len(frames)} кадров по порядку, догрузка без дублей")
+
+
+def test_full_write_queue_rejected():
+    """asyncio-сервер с заполненной очередью записи не ждет ее: отправитель получает message_error"""
+    database = Database(os.path.join(tempfile.mkdtemp(), "test_message_rejected.db"))
+    port = free_port()
+    server = NetworkManager(database)
+    assert server.start_server('127.0.0.1', port, mode='asyncio')
+    writer = server.message_writer
+    # Очередь на одно сообщение без потока записи: второе сообщение не помещается
+    server.message_writer = MessageWriteQueue(database, max_pending=1)
+    frames = []
+    client = NetworkManager()
+    client.message_callback = frames.append
+    try:
+        assert client.connect_to_server('127.0.0.1', port, "user1")
+        for text in ("первое", "второе"):
+            client.send_client_message({'type': 'message', 'sender_id': "user1", 'receiver_id': "user2",
+                                        'message_text': text})
+        wait_for(lambda: any(frame['type'] == 'message_error' for frame in frames))
+        delivered = [frame['message_text'] for frame in frames if frame['type'] == 'message']
+        error = next(frame for frame in frames if frame['type'] == 'message_error')
+        assert delivered == ["первое"] and server.message_writer.rejected == 1
+        assert error['reason'] == 'server_busy' and error['message_text'] == "второе"
+        # Цикл событий продолжает обслуживать соединение
+        client.send_client_message({'type': 'user_list_request', 'user_id': "user1"})
+        wait_for(lambda: any(frame['type'] == 'user_list_response' for frame in frames))
+        assert not server.message_writer.flush(0.1)
+    finally:
+        client.stop_server()
+        server.message_writer = writer
+        server.stop_server()
+        database.close()
+    print("✓ Заполненная очередь записи: message_error вместо блокировки")
+
+
+def main():
+    """Главная функция тестирования"""
+    print("=" * 50)
+    print("Тестирование id сообщений")
+    print("=" * 50)
+
+    tests = [
+        test_model_interleaved_paths,
+        test_server_ids_under_load,
+        test_full_write_queue_rejected,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"✗ {test.__name__} - ОШИБКА: {e}")
+
+    print(f"РЕЗУЛЬТАТ: {passed}/{len(tests)} тестов пройдено")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты метрик: формат Prometheus и HTTP-эндпоинт сервера
+"""
+
+import os
+import sys
+import tempfile
+import urllib.request
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from src.database.database import Database
+from src.network.network_manager import NetworkManager
+from src.utils.metrics import MetricsServer, Registry
+from tests.helpers import free_port, wait_for
+
+
+def test_exposition_format():
+    """Счетчики, значения и гистограммы в текстовом формате Prometheus"""
+    registry = Registry()
+    received = registry.counter('test_received_total', "Входящие", ('type',))
+    registry.gauge('test_online', "Подключено", callback=lambda: 3)
+    latency = registry.histogram('test_seconds', "Задержка", ('type',), buckets=(0.001, 0.01))
+    received.inc('message')
+    received.inc('message', amount=2)
+    received.inc('say "hi"\\')
+    for value in (0.0005, 0.001, 0.005, 0.5):
+        latency.observe(value, 'message')
+
+    lines = registry.render().splitlines()
+    assert '# TYPE test_received_total counter' in lines
+    assert 'test_received_total{type="message"} 3' in lines
+    assert 'test_received_total{type="say \\"hi\\"\\\\"} 1' in lines
+    assert 'test_online 3' in lines
+    assert 'test_seconds_bucket{type="message",le="0.001"} 2' in lines
+    assert 'test_seconds_bucket{type="message",le="0.01"} 3' in lines
+    assert 'test_seconds_bucket{type="message",le="+Inf"} 4' in lines
+    assert 'test_seconds_count{type="message"} 4' in lines
+    assert latency.count('message') == 4 and received.value('message') == 3
+    print("✓ Формат Prometheus")
+
+
+def test_server_endpoint():
+    """Сообщения, задержки обработчиков и запросы к БД видны на /metrics"""
+    database = Database(os.path.join(tempfile.mkdtemp(), "test_metrics.db"))
+    port = free_port()
+    server = NetworkManager(database)
+    assert server.start_server('127.0.0.1', port)
+    metrics_server = MetricsServer(server.metrics, '127.0.0.1', 0)
+    assert metrics_server.start()
+    clients = []
+    try:
+        for user_id in ("user1", "user2"):
+            client = NetworkManager(database)
+            assert client.connect_to_server('127.0.0.1', port, user_id)
+            clients.append(client)
+        clients[0].send_client_message({'type': 'message', 'sender_id': 'user1',
+                                        'receiver_id': 'user2', 'message_text': "привет"})
+        wait_for(lambda: server.messages_received.value('message') >= 1)
+        server.message_writer.flush(5)
+
+        with urllib.request.urlopen(f"http://127.0.0.1:{metrics_server.port}/metrics", timeout=5) as response:
+            assert response.headers['Content-Type'].startswith('text/plain')
+            lines = response.read().decode('utf-8').splitlines()
+        assert 'aleph_messages_received_total{type="auth_request"} 2' in lines
+        assert 'aleph_messages_received_total{type="message"} 1' in lines
+        # Сообщение доставлено получателю и отправителю
+        assert 'aleph_messages_sent_total{type="message"} 2' in lines
+        assert 'aleph_handler_seconds_count{type="message"} 1' in lines
+        assert 'aleph_users_online 2' in lines and 'aleph_connections 2' in lines
+        assert any(line.startswith('aleph_db_query_seconds_count{method="add_messages"}') for line in lines)
+        assert 'aleph_outbound_queued_bytes 0' in lines
+        print("✓ Эндпоинт метрик сервера")
+    finally:
+        for client in clients:
+            client.stop_server()
+        metrics_server.stop()
+        server.stop_server()
+        database.close()
+
+
+def main():
+    """Главная функция тестирования"""
+    print("=" * 50)
+    print("Тестирование метрик")
+    print("=" * 50)
+
+    tests = [
+        test_exposition_format,
+        test_server_endpoint,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"✗ {test.__name__} - ОШИБКА: {e}")
+
+    print(f"РЕЗУЛЬТАТ: {passed}/{len(tests)} тестов пройдено")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
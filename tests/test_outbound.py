@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты очередей отправки: переполнение, частичная запись и получатель, который не читает
+"""
+
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from src.config import server_config
+from src.database.database import Database
+from src.network.network_manager import NetworkManager
+from src.network.outbound import (OutboundQueue, send_frames,
+                                  OVERFLOW_COALESCE, OVERFLOW_DISCONNECT, OVERFLOW_DROP_OLDEST)
+from tests.helpers import free_port, wait_for
+
+
+def drain(sock: socket.socket):
+    """Чтение и отбрасывание всего, что приходит в сокет"""
+    try:
+        while sock.recv(262144):
+            pass
+    except OSError:
+        pass
+
+
+def test_overflow_policies():
+    """disconnect отказывает, drop_oldest отбрасывает старые кадры, coalesce заменяет статусы"""
+    queue = OutboundQueue(max_bytes=100, policy=OVERFLOW_DISCONNECT)
+    assert queue.push(b'a' * 60) and queue.push(b'b' * 40)
+    assert not queue.push(b'c')
+    assert queue.take_nowait() == [b'a' * 60, b'b' * 40] and queue.depth == 0
+
+    queue = OutboundQueue(max_bytes=100, policy=OVERFLOW_DROP_OLDEST)
+    for frame in (b'1' * 40, b'2' * 40, b'3' * 40):
+        assert queue.push(frame)
+    assert queue.take_nowait() == [b'2' * 40, b'3' * 40] and queue.dropped == 1
+    assert queue.push(b'x' * 500) and queue.take_nowait() == [b'x' * 500]
+
+    queue = OutboundQueue(max_bytes=100, policy=OVERFLOW_COALESCE)
+    assert queue.push(b'user1 online', key=('presence', 'user1'))
+    assert queue.push(b'message')
+    for i in range(50):
+        assert queue.push(f'user1 {i:>6}'.encode(), key=('presence', 'user1'))
+    assert queue.take_nowait() == [b'user1     49', b'message'] and queue.coalesced == 50
+    queue.close()
+    assert not queue.push(b'after close') and queue.take() == []
+    print("✓ Действия при переполнении очереди")
+
+
+def test_partial_sends():
+    """Кадры доходят целиком при частичной записи sendmsg в маленький буфер"""
+    writer, reader = socket.socketpair()
+    writer.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+    frames = [bytes([i]) * (i * 997 % 20000 + 1) for i in range(200)]
+    received = bytearray()
+
+    def read():
+        while len(received) < sum(map(len, frames)):
+            time.sleep(0.001)  # читаем медленнее, чем пишем
+            received.extend(reader.recv(3000))
+
+    thread = threading.Thread(target=read)
+    thread.start()
+    for i in range(0, len(frames), 64):
+        send_frames(writer, frames[i:i + 64])
+    thread.join(10)
+    writer.close()
+    reader.close()
+    assert bytes(received) == b''.join(frames)
+    print("✓ Частичная запись sendmsg")
+
+
+def test_stalled_reader():
+    """Получатель, который не читает, не задерживает сообщения остальным"""
+    database = Database(os.path.join(tempfile.mkdtemp(), "test_outbound.db"))
+    max_bytes = server_config.OUTBOUND_QUEUE_MAX_BYTES
+    server_config.OUTBOUND_QUEUE_MAX_BYTES = 1024 * 1024
+    try:
+        for mode in ('threaded', 'asyncio'):
+            port = free_port()
+            server = NetworkManager(database)
+            assert server.start_server('127.0.0.1', port, mode=mode)
+            clients = []
+            try:
+                # Старые клиенты: получатель с маленьким буфером приема, который перестает читать,
+                # и отправитель потока, который быстро читает и отбрасывает копии своих сообщений
+                stalled = socket.socket()
+                stalled.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+                stalled.connect(('127.0.0.1', port))
+                stalled.sendall(json.dumps({'type': 'status_update', 'user_id': 'stalled'}).encode('utf-8'))
+                flooder = socket.create_connection(('127.0.0.1', port))
+                flooder.sendall(json.dumps({'type': 'status_update', 'user_id': 'flooder'}).encode('utf-8'))
+                threading.Thread(target=drain, args=(flooder,), daemon=True).start()
+
+                arrivals = {}
+                sender = NetworkManager(database)
+                receiver = NetworkManager(database)
+                receiver.message_callback = lambda m: arrivals.setdefault(m.get('message_text'), time.perf_counter())
+                for client, user_id in ((sender, "user1"), (receiver, "user2")):
+                    assert client.connect_to_server('127.0.0.1', port, user_id)
+                    clients.append(client)
+                wait_for(lambda: {'stalled', 'flooder'} <= set(server.connected_users))
+
+                # Поток больших сообщений зависшему получателю вперемешку с короткими от user1 для user2
+                flood = json.dumps({'type': 'message', 'sender_id': 'flooder', 'receiver_id': 'stalled',
+                                    'message_text': 'x' * 20000}).encode('utf-8')
+                sent = {}
+                for i in range(400):
+                    flooder.sendall(flood)
+                    if i % 25 == 0:
+                        sent[f"ping {i}"] = time.perf_counter()
+                        sender.send_client_message({'type': 'message', 'sender_id': 'user1',
+                                                    'receiver_id': 'user2', 'message_text': f"ping {i}"})
+                        time.sleep(0.01)
+
+                deadline = time.time() + 10
+                while not set(sent) <= set(arrivals) and time.time() < deadline:
+                    time.sleep(0.01)
+                latencies = [arrivals[text] - started for text, started in sent.items() if text in arrivals]
+                assert len(latencies) == len(sent), f"доставлено {len(latencies)} из {len(sent)}"
+                assert max(latencies) < 2.0
+
+                # Зависший получатель отключен по переполнению очереди, остальные обслуживаются
+                wait_for(lambda: 'stalled' not in server.connected_users)
+                assert server.overflow_disconnects >= 1
+                assert server.outbound_stats()['max_depth'] <= server_config.OUTBOUND_QUEUE_MAX_BYTES
+                print(f"✓ [{mode}] Зависший получатель: задержка остальным до "
+                      f"{max(latencies) * 1000:.0f} мс, соединение закрыто при переполнении")
+                stalled.close()
+                flooder.close()
+            finally:
+                for client in clients:
+                    client.stop_server()
+                server.stop_server()
+    finally:
+        server_config.OUTBOUND_QUEUE_MAX_BYTES = max_bytes
+        database.close()
+
+
+def main():
+    """Главная функция тестирования"""
+    print("=" * 50)
+    print("Тестирование очередей отправки")
+    print("=" * 50)
+
+    tests = [
+        test_overflow_policies,
+        test_partial_sends,
+        test_stalled_reader,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"✗ {test.__name__} - ОШИБКА: {e}")
+
+    print(f"РЕЗУЛЬТАТ: {passed}/{len(tests)} тестов пройдено")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты онлайн-статусов: наблюдатели контактов, снимок при подключении и presence_delta
+"""
+
+import os
+import sys
+import tempfile
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from src.database.database import Database
+from src.network.network_manager import NetworkManager
+from src.network.presence import PresenceTracker
+from tests.helpers import free_port, wait_for
+
+
+def create_database() -> Database:
+    database = Database(os.path.join(tempfile.mkdtemp(), "test_presence.db"))
+    # user1 следит за user2, user2 - за user3, у user3 контактов нет (видит всех)
+    database.add_contact("user1", "user2")
+    database.add_contact("user2", "user3")
+    return database
+
+
+def test_tracker_recipients():
+    """Изменение получают только подключенные наблюдатели контакта"""
+    database = create_database()
+    presence = PresenceTracker(database)
+
+    assert presence.connect("user1") == []
+    # Повторный status_update уже подключенного пользователя не читает контакты из БД
+    loads = []
+    get_contacts = database.get_contacts
+    database.get_contacts = lambda user_id: loads.append(user_id) or get_contacts(user_id)
+    assert presence.connect("user1") is None
+    assert loads == []
+    assert presence.connect("user2") == ["user1"]
+    assert sorted(presence.connect("user3")) == ["user2"]
+    assert sorted(presence.snapshot("user3")) == ["user1", "user2"]
+    assert presence.snapshot("user1") == ["user2"]
+
+    # user3 видит всех: получает изменения любого пользователя
+    assert sorted(presence.disconnect("user2")) == ["user1", "user3"]
+    assert presence.disconnect("user2") is None
+
+    # Добавление контакта: user3 больше не видит всех
+    presence.add_contact("user3", "user1")
+    assert presence.disconnect("user1") == ["user3"]
+    assert presence.connect("admin") == []
+    database.close()
+    print("✓ Получатели изменений статуса")
+
+
+def test_checkpoint_writes_batched_statuses():
+    """Статусы и last_seen попадают в БД только при записи, одним пакетом"""
+    database = create_database()
+    presence = PresenceTracker(database, checkpoint_interval=3600)
+    presence.start()
+
+    presence.connect("user1")
+    presence.connect("user2")
+    for _ in range(1000):
+        presence.touch("user1")
+    assert not database.get_user("user1")['is_online']
+    assert presence.pending() == 2
+
+    assert presence.checkpoint() == 2
+    assert database.get_user("user1")['is_online'] and database.get_user("user1")['last_seen']
+    assert presence.checkpoint() == 0
+
+    # Остановка записывает изменения, накопленные после последней записи
+    presence.disconnect("user2")
+    presence.stop(timeout=5)
+    assert not database.get_user("user2")['is_online']
+    assert database.get_user("user1")['is_online']
+    assert presence.checkpoints == 2
+    database.close()
+    print("✓ Пакетная запись статусов")
+
+
+def test_server_presence_delta():
+    """Снимок при подключении и presence_delta только наблюдателям"""
+    database = create_database()
+    port = free_port()
+    server = NetworkManager(database)
+    assert server.start_server('127.0.0.1', port, mode='asyncio')
+    clients = {}
+    received = {}
+    try:
+        def connect(user_id):
+            client = NetworkManager(database)
+            received[user_id] = []
+            client.message_callback = received[user_id].append
+            assert client.connect_to_server('127.0.0.1', port, user_id)
+            clients[user_id] = client
+
+        def presence(user_id, message_type):
+            return [m for m in received[user_id] if m['type'] == message_type]
+
+        connect("user1")
+        wait_for(lambda: presence("user1", 'presence_snapshot'))
+        assert presence("user1", 'presence_snapshot')[0]['online'] == []
+
+        connect("user2")
+        wait_for(lambda: presence("user1", 'presence_delta'))
+        assert presence("user1", 'presence_delta')[0]['user_id'] == "user2"
+        assert presence("user1", 'presence_delta')[0]['is_online']
+
+        connect("user3")
+        wait_for(lambda: presence("user2", 'presence_delta'))
+        wait_for(lambda: presence("user3", 'presence_snapshot'))
+        assert sorted(presence("user3", 'presence_snapshot')[0]['online']) == ["user1", "user2"]
+
+        clients.pop("user2").stop_server()
+        wait_for(lambda: presence("user3", 'presence_delta'))
+        wait_for(lambda: len(presence("user1", 'presence_delta')) == 2)
+        assert not presence("user1", 'presence_delta')[1]['is_online']
+        # user1 не следит за user3 - его подключение не рассылалось
+        assert all(m['user_id'] == "user2" for m in presence("user1", 'presence_delta'))
+    finally:
+        for client in clients.values():
+            client.stop_server()
+        server.stop_server()
+        database.close()
+    print("✓ Рассылка presence_delta наблюдателям")
+
+
+def test_server_contact_list():
+    """contact_list_request и contact_add: список со статусами и ответ на добавление"""
+    database = create_database()
+    port = free_port()
+    server = NetworkManager(database)
+    assert server.start_server('127.0.0.1', port, mode='asyncio')
+    clients = {}
+    received = {}
+    try:
+        for user_id in ("user2", "user3"):
+            client = NetworkManager()
+            received[user_id] = []
+            client.message_callback = received[user_id].append
+            assert client.connect_to_server('127.0.0.1', port, user_id)
+            clients[user_id] = client
+
+        def of_type(user_id, message_type):
+            return [m for m in received[user_id] if m['type'] == message_type]
+
+        assert clients["user2"].request_contacts() and clients["user3"].request_contacts()
+        wait_for(lambda: of_type("user2", 'contact_list_response') and of_type("user3", 'contact_list_response'))
+        contacts = of_type("user2", 'contact_list_response')[0]['contacts']
+        assert [(c['contact_id'], c['is_online']) for c in contacts] == [("user3", True)]
+        # Без контактов - все пользователи, кроме самого пользователя
+        everyone = {c['contact_id'] for c in of_type("user3", 'contact_list_response')[0]['contacts']}
+        assert "user3" not in everyone and {"user1", "user2"} <= everyone
+
+        assert clients["user2"].add_contact("user1") and clients["user2"].add_contact("nobody")
+        wait_for(lambda: len(of_type("user2", 'contact_add_response')) == 2)
+        assert [(m['contact_id'], m['success']) for m in of_type("user2", 'contact_add_response')] == \
+            [("user1", True), ("nobody", False)]
+        assert sorted(c['contact_id'] for c in database.get_contacts("user2")) == ["user1", "user3"]
+    finally:
+        for client in clients.values():
+            client.stop_server()
+        server.stop_server()
+        database.close()
+    print("✓ Список контактов и добавление через сервер")
+
+
+def main():
+    """Главная функция тестирования"""
+    print("=" * 50)
+    print("Тестирование онлайн-статусов")
+    print("=" * 50)
+
+    tests = [
+        test_tracker_recipients,
+        test_checkpoint_writes_batched_statuses,
+        test_server_presence_delta,
+        test_server_contact_list,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"✗ {test.__name__} - ОШИБКА: {e}")
+
+    print(f"РЕЗУЛЬТАТ: {passed}/{len(tests)} тестов пройдено")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
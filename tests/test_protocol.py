@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты формата сообщений: кадры с длиной, потоковый декодер и согласование версии
+"""
+
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from src.config import server_config
+from src.network.protocol import (EncodedMessage, FrameDecoder, ProtocolError, encode_message,
+                                  LEGACY_PROTOCOL_VERSION, FRAMED_PROTOCOL_VERSION)
+from tests.helpers import free_port, wait_for
+
+
+def random_message(rng: random.Random) -> dict:
+    """Случайное сообщение, иногда больше 4 КБ и с многобайтовыми символами"""
+    size = rng.choice([1, 10, 100, 3000, 20000])
+    text = ''.join(rng.choice('abcxyz {}"\\ñжё€😀') for _ in range(size))
+    return {'type': 'message', 'sender_id': 'user1', 'receiver_id': 'user2',
+            'message_text': text, 'seq': rng.randint(0, 10 ** 9)}
+
+
+def fragment(data: bytes, rng: random.Random):
+    """Разрезание потока на куски случайной длины (от 1 байта до нескольких сообщений)"""
+    position = 0
+    while position < len(data):
+        size = rng.choice([1, 2, 3, 7, 64, 1500, 4096, 65536])
+        yield data[position:position + size]
+        position += size
+
+
+def decode_stream(chunks, version: int):
+    decoder = FrameDecoder(version)
+    decoded = []
+    for chunk in chunks:
+        decoder.feed(chunk)
+        decoded.extend(decoder.messages())
+    assert decoder.pending() == 0
+    return decoded
+
+
+def test_fuzz_fragmented_and_coalesced():
+    """Случайно разрезанные и склеенные потоки декодируются без потерь"""
+    rng = random.Random(20240501)
+    for version in (LEGACY_PROTOCOL_VERSION, FRAMED_PROTOCOL_VERSION):
+        for _ in range(50):
+            messages = [random_message(rng) for _ in range(rng.randint(1, 30))]
+            stream = b''.join(encode_message(m, version) for m in messages)
+            assert decode_stream(fragment(stream, rng), version) == messages
+    print("✓ Фрагментированные и склеенные потоки декодированы корректно")
+
+
+def test_version_switch_mid_stream():
+    """Смена версии между сообщениями одного буфера (после auth_response)"""
+    auth = {'type': 'auth_request', 'user_id': 'user1', 'protocol_version': 2}
+    after = [{'type': 'heartbeat', 'user_id': 'user1', 'n': i} for i in range(5)]
+    # Байт длины кадра вне UTF-8 после объекта старой версии - не ошибка кодировки
+    after.insert(0, {'type': 'presence_snapshot', 'online': ["x" * 100]})
+    assert 0x80 <= encode_message(after[0], FRAMED_PROTOCOL_VERSION)[3] < 0xc0
+    stream = encode_message(auth, LEGACY_PROTOCOL_VERSION) + b''.join(
+        encode_message(m, FRAMED_PROTOCOL_VERSION) for m in after)
+
+    decoder = FrameDecoder()
+    decoder.feed(stream)
+    decoded = []
+    for message in decoder.messages():
+        decoded.append(message)
+        if message['type'] == 'auth_request':
+            decoder.version = FRAMED_PROTOCOL_VERSION
+    assert decoded == [auth] + after
+    print("✓ Переключение версии внутри буфера")
+
+
+def test_oversized_frame_rejected():
+    """Кадр больше лимита отклоняется до чтения полезной нагрузки"""
+    decoder = FrameDecoder(FRAMED_PROTOCOL_VERSION, max_frame_size=1024)
+    decoder.feed((2048).to_bytes(4, 'big'))
+    try:
+        list(decoder.messages())
+    except ProtocolError:
+        print("✓ Слишком большой кадр отклонен")
+        return
+    raise AssertionError("ProtocolError не возбуждено")
+
+
+def test_malformed_json_rejected():
+    """Обрыв на любом байте ждет продолжения, ошибка JSON и кадры не-объекты - ProtocolError"""
+    message = {'type': 'message', 'message_text': 'ж "\\ 😀', 'values': [-0.0015, 1e-07, 2.0, True, False, None]}
+    data = encode_message(message, LEGACY_PROTOCOL_VERSION)
+    for cut in range(1, len(data)):
+        decoder = FrameDecoder()
+        decoder.feed(data[:cut])
+        assert list(decoder.messages()) == [], data[:cut]
+        decoder.feed(data[cut:])
+        assert list(decoder.messages()) == [message]
+
+    payloads = [(LEGACY_PROTOCOL_VERSION, data) for data in
+                (b'{"type": 1 x}', b'{"type": tru}', b'{"type" 1}', b'{"a": "\\uZZZZ"}', b'{"a": 1.x}', b'[1, 2]')]
+    payloads += [(FRAMED_PROTOCOL_VERSION, encode_message(value, FRAMED_PROTOCOL_VERSION))
+                 for value in ([1, 2], "текст", 5, None)]
+    for version, data in payloads:
+        decoder = FrameDecoder(version)
+        decoder.feed(data)
+        try:
+            list(decoder.messages())
+        except ProtocolError:
+            continue
+        raise AssertionError(f"ProtocolError не возбуждено для {data!r}")
+    print("✓ Некорректный JSON и не-объекты отклонены")
+
+
+def test_throughput():
+    """Пропускная способность декодера на склеенном потоке"""
+    rng = random.Random(7)
+    messages = [{'type': 'message', 'sender_id': 'u1', 'receiver_id': 'u2',
+                 'message_text': 'x' * rng.randint(10, 200)} for _ in range(20000)]
+    stream = b''.join(encode_message(m, FRAMED_PROTOCOL_VERSION) for m in messages)
+
+    started = time.perf_counter()
+    decoded = decode_stream(fragment(stream, rng), FRAMED_PROTOCOL_VERSION)
+    elapsed = time.perf_counter() - started
+
+    assert len(decoded) == len(messages)
+    print(f"✓ Декодирование: {len(messages) / elapsed:.0f} сообщений/с, "
+          f"{len(stream) / elapsed / 1e6:.1f} МБ/с")
+
+
+def test_fan_out_encodes_once():
+    """Рассылка: один объект bytes на версию, каждый получатель декодирует сообщение"""
+    from src.database.database import Database
+    from src.network.network_manager import NetworkManager
+
+    class Sink:
+        def __init__(self):
+            self.chunks = []
+
+        def sendall(self, data):
+            self.chunks.append(data)
+
+    server = NetworkManager(Database(os.path.join(tempfile.mkdtemp(), "test_fan_out.db")))
+    sinks = [Sink() for _ in range(6)]
+    for i, sink in enumerate(sinks):
+        server.decoders[sink] = FrameDecoder(FRAMED_PROTOCOL_VERSION if i % 2 else LEGACY_PROTOCOL_VERSION)
+    message = {'type': 'message', 'sender_id': 'user1', 'receiver_id': 'user2', 'message_text': 'всем ✓'}
+
+    assert server.fan_out(message, sinks) == len(sinks)
+    for version in (LEGACY_PROTOCOL_VERSION, FRAMED_PROTOCOL_VERSION):
+        chunks = [sink.chunks[0] for i, sink in enumerate(sinks) if (i % 2) == (version == FRAMED_PROTOCOL_VERSION)]
+        assert all(chunk is chunks[0] for chunk in chunks)
+        assert chunks[0] == encode_message(message, version)
+        assert decode_stream([chunks[0]], version) == [message]
+
+    encoded = EncodedMessage(message)
+    assert encoded.for_version(FRAMED_PROTOCOL_VERSION) is encoded.for_version(FRAMED_PROTOCOL_VERSION)
+    server.database.close()
+    print("✓ Рассылка: сообщение кодируется один раз на версию протокола")
+
+
+def test_server_negotiation():
+    """Сервер обслуживает старого и нового клиента, большой user_list_response доходит целиком"""
+    from src.database.database import Database
+    from src.network.network_manager import NetworkManager
+
+    db_path = os.path.join(tempfile.mkdtemp(), "test_protocol.db")
+    database = Database(db_path)
+    for i in range(300):
+        database.add_user(f"protocol_user_{i}", f"Пользователь протокола {i}")
+
+    for mode in ('threaded', 'asyncio'):
+        port = free_port()
+        server = NetworkManager(database)
+        assert server.start_server('127.0.0.1', port, mode=mode)
+        try:
+            # Новый клиент: согласование версии 2
+            client = NetworkManager(database)
+            received = []
+            client.message_callback = received.append
+            assert client.connect_to_server('127.0.0.1', port, 'user1')
+            assert client.protocol_version == FRAMED_PROTOCOL_VERSION
+            client.send_client_message({'type': 'user_list_request', 'user_id': 'user1'})
+
+            # Старый клиент: один JSON без кадра и без protocol_version
+            legacy = socket.create_connection(('127.0.0.1', port))
+            legacy.sendall(json.dumps({'type': 'auth_request', 'user_id': 'user2'}).encode('utf-8'))
+            legacy_decoder = FrameDecoder(LEGACY_PROTOCOL_VERSION)
+            legacy.settimeout(5)
+            legacy_decoder.recv_from(legacy)
+            response = next(legacy_decoder.messages())
+            assert response['success'] and response['protocol_version'] == LEGACY_PROTOCOL_VERSION
+
+            wait_for(lambda: any(m['type'] == 'user_list_response' for m in received))
+            user_list = [m for m in received if m['type'] == 'user_list_response']
+            assert len(user_list[0]['users']) >= 300
+            print(f"✓ [{mode}] Согласование версии и сообщение "
+                  f"{len(json.dumps(user_list[0]))} байт доставлено целиком")
+
+            legacy.close()
+            client.stop_server()
+        finally:
+            server.stop_server()
+
+
+def test_history_request():
+    """history_request возвращает страницы истории по курсору только участнику диалога"""
+    from src.database.database import Database
+    from src.network.network_manager import NetworkManager
+
+    database = Database(os.path.join(tempfile.mkdtemp(), "test_history.db"))
+    for i in range(120):
+        database.add_message("user1", "user2", f"история {i}")
+
+    port = free_port()
+    server = NetworkManager(database)
+    assert server.start_server('127.0.0.1', port, mode='asyncio')
+    try:
+        client = NetworkManager(database)
+        received = []
+        client.message_callback = received.append
+        assert client.connect_to_server('127.0.0.1', port, 'user1')
+
+        def request(**kwargs):
+            received.clear()
+            assert client.request_history("user2", **kwargs)
+            deadline = time.time() + 5
+            while time.time() < deadline:
+                responses = [m for m in received if m['type'] == 'history_response']
+                if responses:
+                    return responses[0]
+                time.sleep(0.01)
+            raise AssertionError("history_response не получен")
+
+        latest = request(limit=50)
+        assert latest['success'] and latest['has_more']
+        assert latest['messages'][-1]['message_text'] == "история 119"
+        older = request(before_id=latest['messages'][0]['id'], limit=100)
+        assert len(older['messages']) == 70 and not older['has_more']
+        assert older['messages'][0]['message_text'] == "история 0"
+        newer = request(after_id=older['messages'][-1]['id'], limit=10)
+        assert [m['id'] for m in newer['messages']] == [m['id'] for m in latest['messages'][:10]]
+
+        # Запрос от имени другого пользователя отклоняется
+        client.current_user_id = "user2"
+        rejected = request()
+        assert not rejected['success'] and rejected['messages'] == []
+        client.stop_server()
+    finally:
+        server.stop_server()
+        database.close()
+    print("✓ Запрос истории по курсору через сервер")
+
+
+def test_database_off_event_loop():
+    """В asyncio-режиме обработчики не обращаются к БД из потока цикла событий"""
+    from src.database.database import Database
+    from src.network.network_manager import NetworkManager
+
+    database = Database(os.path.join(tempfile.mkdtemp(), "test_off_loop.db"))
+    threads = {}
+    for name in ('get_user', 'add_user', 'get_all_users', 'get_contacts', 'add_contact', 'get_user_groups',
+                 'create_group', 'get_group', 'add_group_members', 'remove_group_member', 'add_messages'):
+        def traced(*args, __method=getattr(database, name), __name=name):
+            threads.setdefault(__name, set()).add(threading.current_thread().name)
+            return __method(*args)
+        setattr(database, name, traced)
+
+    write_behind = server_config.MESSAGE_WRITE_BEHIND
+    server_config.MESSAGE_WRITE_BEHIND = False  # add_messages - при обработке сообщения
+    port = free_port()
+    server = NetworkManager(database)
+    assert server.start_server('127.0.0.1', port, mode='asyncio')
+    try:
+        received = []
+        client = NetworkManager()
+        client.message_callback = received.append
+        assert client.connect_to_server('127.0.0.1', port, 'user1')
+        client.send_client_message({'type': 'status_update', 'user_id': 'user1', 'is_online': True})
+        client.send_client_message({'type': 'user_list_request', 'user_id': 'user1'})
+        assert client.add_contact('user2') and client.create_group("Комната", ['user2', 'user3'])
+        wait_for(lambda: any(m['type'] == 'group_update' for m in received))
+        group_id = next(m['group_id'] for m in received if m['type'] == 'group_update')
+        client.send_client_message({'type': 'group_add_members', 'user_id': 'user1', 'group_id': group_id,
+                                    'members': ['admin']})
+        client.send_client_message({'type': 'message', 'sender_id': 'user1', 'receiver_id': 'user2',
+                                    'message_text': "привет"})
+        client.send_client_message({'type': 'group_leave', 'user_id': 'user1', 'group_id': group_id})
+        wait_for(lambda: [m for m in received if m['type'] == 'group_update'][-1]['members'] == ['admin', 'user2',
+                                                                                                 'user3'])
+        wait_for(lambda: any(m['type'] == 'message' for m in received))
+        client.stop_server()
+    finally:
+        server.stop_server()
+        server_config.MESSAGE_WRITE_BEHIND = write_behind
+        database.close()
+    assert {'get_user', 'get_contacts', 'get_user_groups', 'add_contact', 'create_group',
+            'get_group', 'add_group_members', 'remove_group_member', 'add_messages'} <= set(threads)
+    assert not any("asyncio-server" in names for names in threads.values()), threads
+    print("✓ Обращения к БД выполняются вне цикла событий")
+
+
+def main():
+    """Главная функция тестирования"""
+    print("=" * 50)
+    print("Тестирование протокола")
+    print("=" * 50)
+
+    tests = [
+        test_fuzz_fragmented_and_coalesced,
+        test_version_switch_mid_stream,
+        test_oversized_frame_rejected,
+        test_malformed_json_rejected,
+        test_throughput,
+        test_fan_out_encodes_once,
+        test_server_negotiation,
+        test_history_request,
+        test_database_off_event_loop,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"✗ {test.__name__} - ОШИБКА: {e}")
+
+    print(f"РЕЗУЛЬТАТ: {passed}/{len(tests)} тестов пройдено")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты счетчиков непрочитанных: курсор прочтения в базе и события read_receipt
+"""
+
+import os
+import sys
+import tempfile
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from src.database.database import Database
+from src.network.network_manager import NetworkManager
+from tests.helpers import free_port, wait_for
+
+
+def unread(database, user_id):
+    return {state['contact_id']: state['unread'] for state in database.get_unread_counts(user_id)}
+
+
+def test_counters_and_cursor():
+    """Счетчик растет при вставке, отметка двигает курсор только вперед, состояние сохраняется"""
+    path = os.path.join(tempfile.mkdtemp(), "test_read_state.db")
+    database = Database(path)
+    for i in range(5):
+        database.add_message("user2", "user1", f"от user2 {i}")
+    database.add_message("user1", "user2", "ответ")
+    database.add_messages([{'sender_id': "user3", 'receiver_id': "user1", 'message_text': "от user3"},
+                           {'sender_id': "user3", 'receiver_id': "group:1", 'message_text': "в группу"}])
+    assert unread(database, "user1") == {"user2": 5, "user3": 1}
+    assert unread(database, "user2") == {"user1": 1}
+
+    ids = [m['id'] for m in database.get_messages("user1", "user2") if m['sender_id'] == "user2"]
+    state = database.mark_conversation_read("user1", "user2", ids[2])
+    assert state == {'contact_id': "user2", 'last_read_id': ids[2], 'unread': 2}
+    # Курсор назад не двигается
+    assert database.mark_conversation_read("user1", "user2", ids[0])['last_read_id'] == ids[2]
+    assert [m['is_read'] for m in database.get_messages("user1", "user2") if m['sender_id'] == "user2"] == \
+        [True, True, True, False, False]
+
+    # Отметка раньше записи сообщения (write-behind): покрытое курсором не считается
+    next_id = database.allocate_message_ids(2)
+    assert database.mark_conversation_read("user1", "user2", next_id)['unread'] == 0
+    database.add_messages([{'id': next_id, 'sender_id': "user2", 'receiver_id': "user1", 'message_text': "уже прочитано"},
+                           {'id': next_id + 1, 'sender_id': "user2", 'receiver_id': "user1", 'message_text': "новое"}])
+    assert unread(database, "user1") == {"user2": 1, "user3": 1}
+    database.mark_messages_as_read("user3", "user1")
+    database.close()
+
+    reopened = Database(path)
+    assert unread(reopened, "user1") == {"user2": 1}
+    assert reopened.mark_conversation_read("user1", "user2")['unread'] == 0
+    assert unread(reopened, "user1") == {}
+    reopened.close()
+    print("✓ Счетчики и курсор прочтения")
+
+
+def test_read_receipt_over_network():
+    """Снимок непрочитанных при подключении, отметка прочтения и ответ с новым счетчиком"""
+    database = Database(os.path.join(tempfile.mkdtemp(), "test_read_state.db"))
+    port = free_port()
+    server = NetworkManager(database)
+    assert server.start_server('127.0.0.1', port, mode='asyncio')
+    sender = NetworkManager(database)
+    sent = []
+    sender.message_callback = lambda frame: frame['type'] == 'message' and sent.append(frame)
+    receipts = []
+    receiver = NetworkManager(database)
+    receiver.message_callback = lambda frame: frame['type'] == 'read_receipt' and receipts.append(frame)
+    try:
+        assert sender.connect_to_server('127.0.0.1', port, "user2")
+        for i in range(3):
+            sender.send_client_message({'type': 'message', 'sender_id': "user2", 'receiver_id': "user1",
+                                        'message_text': f"пока не в сети {i}"})
+        # Сообщения могут быть еще в очереди write-behind - в снимок они тоже попадают
+        wait_for(lambda: len(sent) == 3)
+
+        assert receiver.connect_to_server('127.0.0.1', port, "user1")
+        wait_for(lambda: receipts)
+        snapshot = receipts.pop()
+        assert snapshot['snapshot'] and [(s['contact_id'], s['unread']) for s in snapshot['conversations']] == \
+            [("user2", 3)]
+
+        first_id = database.get_messages("user1", "user2")[0]['id']
+        assert receiver.send_read_receipt("user2", first_id)
+        wait_for(lambda: receipts)
+        assert receipts.pop()['conversations'] == [{'contact_id': "user2", 'last_read_id': first_id, 'unread': 2}]
+
+        # Отметка за другого пользователя не принимается
+        assert receiver.send_client_message({'type': 'read_receipt', 'user_id': "user3", 'contact_id': "user2"})
+        assert receiver.send_read_receipt("user2")
+        wait_for(lambda: receipts)
+        assert receipts.pop()['conversations'][0]['unread'] == 0 and not receipts
+        receiver.stop_server()
+
+        # Повторное подключение: непрочитанных нет
+        receiver = NetworkManager(database)
+        receiver.message_callback = lambda frame: frame['type'] == 'read_receipt' and receipts.append(frame)
+        assert receiver.connect_to_server('127.0.0.1', port, "user1")
+        wait_for(lambda: receipts)
+        assert receipts.pop()['conversations'] == []
+        assert unread(database, "user3") == {}
+    finally:
+        receiver.stop_server()
+        sender.stop_server()
+        server.stop_server()
+        database.close()
+    print("✓ read_receipt: снимок при подключении и отметка прочтения")
+
+
+def main():
+    """Главная функция тестирования"""
+    print("=" * 50)
+    print("Тестирование счетчиков непрочитанных")
+    print("=" * 50)
+
+    tests = [
+        test_counters_and_cursor,
+        test_read_receipt_over_network,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"✗ {test.__name__} - ОШИБКА: {e}")
+
+    print(f"РЕЗУЛЬТАТ: {passed}/{len(tests)} тестов пройдено")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
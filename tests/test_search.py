@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты полнотекстового поиска по сообщениям: индекс messages_fts, права доступа,
+порядок и страницы результатов, запрос search_request
+"""
+
+import os
+import sys
+import tempfile
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from src.database.database import Database, group_conversation
+from src.network.network_manager import NetworkManager
+from tests.helpers import free_port, wait_for
+
+
+def texts(result):
+    return [m['message_text'] for m in result['messages']]
+
+
+def test_search_scope_and_pages():
+    """Только диалоги и группы пользователя, релевантные раньше, страницы без повторов"""
+    database = Database(os.path.join(tempfile.mkdtemp(), "test_search.db"))
+    database.add_message("user1", "user2", "Отчет готов")
+    database.add_message("user2", "user1", "отчет, отчет и еще раз ОТЧЕТ")
+    database.add_message("user3", "user2", "чужой отчет")
+    group_id = database.create_group("Команда", "user2", ["user1"])
+    database.add_messages([{'sender_id': "user2", 'receiver_id': group_conversation(group_id),
+                            'message_text': "отчет в группе"}])
+    database.add_message("user1", "user3", "Отчет и план")
+
+    # Все слова запроса, регистр не важен; выше - больше вхождений и короче текст,
+    # при равной релевантности - новые раньше
+    assert texts(database.search_messages("user1", "отчет")) == \
+        ["отчет, отчет и еще раз ОТЧЕТ", "отчет в группе", "Отчет готов", "Отчет и план"]
+    assert texts(database.search_messages("user1", "ПЛАН отчет")) == ["Отчет и план"]
+    assert texts(database.search_messages("user1", "отчет", "user3")) == ["Отчет и план"]
+    assert texts(database.search_messages("user1", "отчет", group_conversation(group_id))) == ["отчет в группе"]
+    # Не участник группы и чужие диалоги
+    assert texts(database.search_messages("user3", "отчет", group_conversation(group_id))) == []
+    assert texts(database.search_messages("user3", "отчет")) == ["чужой отчет", "Отчет и план"]
+    # Синтаксис FTS5 в запросе не действует: операторы - обычные слова
+    assert texts(database.search_messages("user1", '(отчет" план*')) == ["Отчет и план"]
+    assert texts(database.search_messages("user1", "отчет OR план")) == []
+    assert database.search_messages("user1", " ,.!? ") == {'messages': [], 'cursor': None}
+
+    seen, cursor = [], None
+    while True:
+        page = database.search_messages("user1", "отчет", limit=3, cursor=cursor)
+        seen += texts(page)
+        cursor = page['cursor']
+        if cursor is None:
+            break
+        assert len(page['messages']) == 3
+    assert seen == texts(database.search_messages("user1", "отчет", limit=10))
+    database.close()
+    print("✓ Поиск: доступ, релевантность и страницы")
+
+
+def test_index_sync():
+    """Индекс следует за вставкой мимо Database, изменением и удалением; миграция индексирует старую базу"""
+    path = os.path.join(tempfile.mkdtemp(), "test_search.db")
+    database = Database(path)
+    with database.connection() as conn:
+        # Старый клиент с общим файлом БД: строка без ключа диалога
+        conn.execute("INSERT INTO messages (sender_id, receiver_id, message_text) VALUES ('user2', 'user1', 'черновик')")
+        conn.commit()
+    assert texts(database.search_messages("user1", "черновик", "user2")) == ["черновик"]
+
+    with database.connection() as conn:
+        conn.execute("UPDATE messages SET message_text = 'итоговый текст' WHERE message_text = 'черновик'")
+        conn.execute("UPDATE messages SET is_read = TRUE")
+        conn.commit()
+    assert texts(database.search_messages("user1", "черновик")) == []
+    assert texts(database.search_messages("user1", "итоговый")) == ["итоговый текст"]
+    with database.connection() as conn:
+        conn.execute("DELETE FROM messages")
+        conn.execute("INSERT INTO messages_fts (messages_fts) VALUES ('integrity-check')")
+        conn.commit()
+    assert texts(database.search_messages("user1", "итоговый")) == []
+
+    # База предыдущей версии: сообщения без индекса
+    database.add_message("user1", "user2", "старое сообщение")
+    with database.connection() as conn:
+        for name in ("messages_fts_delete", "messages_fts_update"):
+            conn.execute(f"DROP TRIGGER {name}")
+        conn.execute("DROP TABLE messages_fts")
+        conn.execute("PRAGMA user_version = 3")
+        conn.execute("INSERT INTO messages (sender_id, receiver_id, message_text, conversation) "
+                     "VALUES ('user2', 'user1', 'еще одно старое сообщение', 'user1|user2')")
+        conn.commit()
+    database.close()
+
+    reopened = Database(path)
+    assert texts(reopened.search_messages("user2", "старое сообщение")) == \
+        ["старое сообщение", "еще одно старое сообщение"]
+    reopened.close()
+    print("✓ Синхронизация индекса и миграция")
+
+
+def test_search_request_over_network():
+    """search_request: страницы с курсором, сообщения из очереди write-behind, отказ чужой группе"""
+    database = Database(os.path.join(tempfile.mkdtemp(), "test_search.db"))
+    group_id = database.create_group("Команда", "user2", ["user3"])
+    port = free_port()
+    server = NetworkManager(database)
+    assert server.start_server('127.0.0.1', port, mode='asyncio')
+    sender = NetworkManager(database)
+    delivered = []
+    sender.message_callback = lambda frame: frame['type'] == 'message' and delivered.append(frame)
+    responses = []
+    client = NetworkManager(database)
+    client.message_callback = lambda frame: frame['type'] == 'search_response' and responses.append(frame)
+    try:
+        assert sender.connect_to_server('127.0.0.1', port, "user2")
+        assert client.connect_to_server('127.0.0.1', port, "user1")
+        for i in range(3):
+            sender.send_client_message({'type': 'message', 'sender_id': "user2", 'receiver_id': "user1",
+                                        'message_text': f"встреча номер {i}"})
+        wait_for(lambda: len(delivered) == 3)
+
+        assert client.search_messages("встреча", contact_id="user2", limit=2)
+        wait_for(lambda: responses)
+        first = responses.pop()
+        assert first['success'] and first['query'] == "встреча" and len(first['messages']) == 2
+        assert client.search_messages("встреча", contact_id="user2", cursor=first['cursor'], limit=2)
+        wait_for(lambda: responses)
+        second = responses.pop()
+        assert second['cursor'] is None and len(second['messages']) == 1
+        assert sorted(m['message_text'] for m in first['messages'] + second['messages']) == \
+            [f"встреча номер {i}" for i in range(3)]
+
+        assert client.search_messages("встреча", group_id=group_id)
+        wait_for(lambda: responses)
+        assert not responses.pop()['success']
+    finally:
+        client.stop_server()
+        sender.stop_server()
+        server.stop_server()
+        database.close()
+    print("✓ search_request: страницы и доступ")
+
+
+def main():
+    """Главная функция тестирования"""
+    print("=" * 50)
+    print("Тестирование поиска по сообщениям")
+    print("=" * 50)
+
+    tests = [
+        test_search_scope_and_pages,
+        test_index_sync,
+        test_search_request_over_network,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"✗ {test.__name__} - ОШИБКА: {e}")
+
+    print(f"РЕЗУЛЬТАТ: {passed}/{len(tests)} тестов пройдено")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
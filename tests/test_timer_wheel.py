@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты колеса таймеров и keepalive: равномерная отправка heartbeat и закрытие неактивных соединений
+"""
+
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+# Добавляем путь к корню проекта в PYTHONPATH
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, project_root)
+
+from src.config import server_config as config
+from src.database.database import Database
+from src.network.network_manager import NetworkManager
+from src.network.protocol import FrameDecoder, FRAMED_PROTOCOL_VERSION
+from src.network.timer_wheel import TimerWheel
+from tests.helpers import free_port, wait_for
+
+
+class FakeConnection:
+    """Соединение в памяти; отвечающий клиент отмечает активность на каждый heartbeat"""
+
+    def __init__(self, server, clock, responds):
+        self.server = server
+        self.clock = clock
+        self.responds = responds
+        self.heartbeats = 0
+        self.closed = False
+
+    def sendall(self, data: bytes):
+        self.heartbeats += 1
+        if self.responds:
+            self.server.last_activity[self] = self.clock[0]
+
+    def fileno(self) -> int:
+        return -1 if self.closed else 3
+
+    def shutdown(self, how):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+
+def test_wheel_schedule_cancel_advance():
+    """Срабатывание в свой тик, отмена, задержки длиннее оборота и долгая пауза"""
+    wheel = TimerWheel(tick=1.0, slots=8, origin=0.0)
+    wheel.schedule("a", 3)
+    wheel.schedule("b", 20)
+    wheel.schedule("c", 3)
+    wheel.cancel("c")
+    assert len(wheel) == 2 and "c" not in wheel
+
+    assert wheel.advance(2.5) == []
+    assert wheel.advance(3.0) == ["a"]
+    assert wheel.advance(19.9) == []
+    assert wheel.advance(20.0) == ["b"]
+
+    # Перестановка таймера заменяет прежний
+    wheel.schedule("d", 2)
+    wheel.schedule("d", 5)
+    assert wheel.advance(23) == []
+    assert sorted(wheel.advance(1000) + ["x"]) == ["d", "x"] and len(wheel) == 0
+    print("✓ Колесо таймеров")
+
+
+def test_keepalive_smoothing_and_eviction():
+    """Тысячи клиентов: heartbeat распределены по интервалу, молчащие закрываются"""
+    database = Database(os.path.join(tempfile.mkdtemp(), "test_keepalive.db"))
+    server = NetworkManager(database)
+    base = time.monotonic()
+    clock = [base]
+    count = 3000
+
+    connections = []
+    for i in range(count):
+        connection = FakeConnection(server, clock, responds=(i % 2 == 0))
+        server.decoders[connection] = FrameDecoder(FRAMED_PROTOCOL_VERSION)
+        server.track_connection(connection, now=base)
+        connections.append(connection)
+
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    per_second = {}
+    try:
+        elapsed = 0.0
+        while elapsed < 3 * config.HEARTBEAT_INTERVAL + config.ONLINE_TIMEOUT:
+            elapsed += config.TIMER_WHEEL_TICK
+            clock[0] = base + elapsed
+            sent = server.process_keepalive(clock[0])
+            per_second[int(elapsed)] = per_second.get(int(elapsed), 0) + sent
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    # В среднем count / HEARTBEAT_INTERVAL в секунду, без всплеска на всех сразу
+    average = count / config.HEARTBEAT_INTERVAL
+    first_interval = sum(per_second.get(second, 0) for second in range(config.HEARTBEAT_INTERVAL))
+    assert first_interval >= 0.95 * count
+    peak = max(per_second.values())
+    assert peak < 2 * average, peak
+
+    # Молчащие закрыты, отвечающие продолжают получать heartbeat
+    silent = connections[1::2]
+    responding = connections[::2]
+    assert server.reaped_connections == len(silent)
+    assert all(c.closed and c not in server.decoders for c in silent)
+    assert not any(c.closed for c in responding)
+    assert len(server.keepalive) == len(responding)
+    assert all(c.heartbeats >= 4 for c in responding)
+    database.close()
+    print(f"✓ Heartbeat вразброс (макс. {peak}/с при среднем {average:.0f}/с), "
+          f"закрыто неактивных: {server.reaped_connections}")
+
+
+def test_reap_in_event_loop():
+    """asyncio-сервер закрывает неактивное соединение в цикле событий, а не в потоке heartbeat"""
+    database = Database(os.path.join(tempfile.mkdtemp(), "test_keepalive.db"))
+    port = free_port()
+    server = NetworkManager(database)
+    assert server.start_server('127.0.0.1', port, mode='asyncio')
+    disconnect_threads = []
+    handle_disconnect = server.handle_disconnect
+    server.handle_disconnect = lambda connection: (disconnect_threads.append(threading.current_thread().name),
+                                                   handle_disconnect(connection))
+    silent = socket.create_connection(('127.0.0.1', port))
+    try:
+        silent.sendall(b'{"type": "status_update", "user_id": "user1"}')
+        wait_for(lambda: "user1" in server.connected_users)
+        connection = server.connected_users["user1"][0]
+
+        # Вызов из потока теста, как из потока heartbeat
+        server.reap_connection(connection, config.CONNECTION_TIMEOUT + 1)
+        wait_for(lambda: "user1" not in server.connected_users)
+        assert server.reaped_connections == 1
+        assert disconnect_threads and set(disconnect_threads) == {"asyncio-server"}
+        # Соединение закрыто сервером: после уже отправленных кадров - конец потока
+        silent.settimeout(5)
+        while silent.recv(65536):
+            pass
+    finally:
+        silent.close()
+        server.stop_server()
+        database.close()
+    print("✓ Закрытие неактивного соединения в цикле событий")
+
+
+def test_concurrent_client_sends():
+    """heartbeat_ack из потока приема и сообщения потока интерфейса не перемешивают кадры"""
+    database = Database(os.path.join(tempfile.mkdtemp(), "test_client_sends.db"))
+    port = free_port()
+    server = NetworkManager(database)
+    assert server.start_server('127.0.0.1', port, mode='asyncio')
+    client = NetworkManager()
+    try:
+        assert client.connect_to_server('127.0.0.1', port, "user1")
+        # Большие кадры: sendall отправляет каждый несколькими частями
+        frame = {'type': 'heartbeat_ack', 'user_id': "user1", 'padding': "x" * 300000}
+
+        def send():
+            for _ in range(20):
+                assert client.send_client_message(frame)
+
+        threads = [threading.Thread(target=send) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wait_for(lambda: server.messages_received.value('heartbeat_ack') == 80, timeout=20)
+        assert "user1" in server.connected_users
+        client.stop_server()
+    finally:
+        server.stop_server()
+        database.close()
+    print("✓ Параллельная отправка клиента не портит поток кадров")
+
+
+def main():
+    """Главная функция тестирования"""
+    print("=" * 50)
+    print("Тестирование keepalive")
+    print("=" * 50)
+
+    tests = [
+        test_wheel_schedule_cancel_advance,
+        test_keepalive_smoothing_and_eviction,
+        test_reap_in_event_loop,
+        test_concurrent_client_sends,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"✗ {test.__name__} - ОШИБКА: {e}")
+
+    print(f"РЕЗУЛЬТАТ: {passed}/{len(tests)} тестов пройдено")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())